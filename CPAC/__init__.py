@@ -35,10 +35,24 @@ def _docs_prefix() -> str:
     return DOCS_URL_PREFIX
 
 
-license_notice = f"""Copyright (C) 2022-2024 C-PAC Developers.
+def __getattr__(name: str) -> str:
+    """Build ``license_notice`` on first access.
+
+    The notice links to the docs for this version, which imports
+    :py:mod:`CPAC.utils` and checks that the versioned docs exist, so it
+    is deferred to keep ``import CPAC`` fast.
+    """
+    if name == "license_notice":
+        notice = f"""Copyright (C) 2022-2024 C-PAC Developers.
 
 This program comes with ABSOLUTELY NO WARRANTY. This is free software,
 and you are welcome to redistribute it under certain conditions. For
 details, see {_docs_prefix()}/license or the COPYING and
 COPYING.LESSER files included in the source code."""
+        globals()[name] = notice
+        return notice
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
 __all__ = ["license_notice", "version", "__version__"]
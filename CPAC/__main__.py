@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-# Copyright (C) 2018-2024  C-PAC Developers
+# Copyright (C) 2018-2026  C-PAC Developers
 
 # This file is part of C-PAC.
 
@@ -15,16 +15,16 @@
 
 # You should have received a copy of the GNU Lesser General Public
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Command-line interface for C-PAC.
+
+Commands import what they use when they run, so that ``cpac --help`` and
+each command only pay for their own imports.
+"""
+
 import os
 
 import click
 from click_aliases import ClickAliasedGroup
-import pkg_resources as p
-
-from CPAC.utils.docs import version_report
-from CPAC.utils.monitoring.custom_logging import getLogger
-
-logger = getLogger("CPAC")
 
 # CLI tree
 #
@@ -50,6 +50,10 @@ logger = getLogger("CPAC")
 #         cpac utils data_config build <data settings file>
 #     cpac utils pipe_config
 #         cpac utils pipe_config new_template
+#     cpac utils resource-model
+#         cpac utils resource-model build <model> <callback logs...>
+#         cpac utils resource-model inspect <model>
+#         cpac utils resource-model export <model> <csv>
 
 
 @click.group()
@@ -61,8 +65,10 @@ def main():
 def version():
     """Display environment version information."""
     import CPAC
+    from CPAC.utils.docs import version_report
+    from CPAC.utils.monitoring.custom_logging import getLogger
 
-    logger.info(
+    getLogger("CPAC").info(
         "Environment\n===========\n%s\nC-PAC version: %s",
         version_report(),
         CPAC.__version__,
@@ -76,6 +82,8 @@ def version():
 @click.option("--ndmg-mode", "--ndmg_mode", is_flag=True)
 @click.option("--debug", is_flag=True)
 def run(data_config, pipe_config=None, num_cores=None, ndmg_mode=False, debug=False):
+    import pkg_resources as p
+
     if not pipe_config:
         pipe_config = p.resource_filename(
             "CPAC", os.path.join("resources", "configs", "pipeline_config_template.yml")
@@ -496,6 +504,73 @@ def new_group_template():
     util_copy_template("group_config")
 
 
+@utils.group(name="resource-model", aliases=["resource_model"], cls=ClickAliasedGroup)
+def resource_model():
+    """Learn per-node memory and runtime from callback logs."""
+
+
+@resource_model.command(name="build")
+@click.argument("model")
+@click.argument("callback_logs", nargs=-1, required=True)
+def build_resource_model(model, callback_logs):
+    """Add CALLBACK_LOGS (files or directories) to MODEL and refit it."""
+    from CPAC.utils.monitoring.resource_model import (
+        find_callback_logs,
+        ResourceModel,
+    )
+
+    learned = ResourceModel.load(model) if os.path.exists(model) else ResourceModel()
+    added = sum(learned.ingest(log) for log in find_callback_logs(callback_logs))
+    learned.fit().save(model)
+    click.echo(
+        f"Added {added} observations; {model} models {len(learned.fits)} node types."
+    )
+
+
+@resource_model.command(name="inspect")
+@click.argument("model")
+@click.option("--node", default=None, help="Predict for this node.")
+@click.option(
+    "--shape",
+    default=None,
+    help="Input data shape for --node, comma-separated (e.g., 64,64,36,200).",
+)
+@click.option("--threads", default=1, show_default=True, help="Threads for --node.")
+def inspect_resource_model(model, node=None, shape=None, threads=1):
+    """Summarize MODEL, or predict one node's usage."""
+    from CPAC.utils.monitoring.resource_model import ResourceModel
+
+    learned = ResourceModel.load(model)
+    if node is None:
+        for row in learned.summary():
+            click.echo(
+                f"{row['node_type']}: {row['samples']} samples, "
+                f"max {row['max_memory_gb']:.2f} GB, "
+                f"median {row['median_runtime_seconds']:.1f} s"
+            )
+        return
+    prediction = learned.predict(
+        node, [int(dim) for dim in shape.split(",")] if shape else None, threads
+    )
+    if prediction is None:
+        click.echo(f"{node}: not in {model}")
+    else:
+        click.echo(
+            f"{node}: {prediction.memory_gb:.2f} GB, "
+            f"{prediction.runtime_seconds:.1f} s"
+        )
+
+
+@resource_model.command(name="export")
+@click.argument("model")
+@click.argument("output")
+def export_resource_model(model, output):
+    """Write MODEL's per-node-type summary to OUTPUT as CSV."""
+    from CPAC.utils.monitoring.resource_model import ResourceModel
+
+    ResourceModel.load(model).export(output)
+
+
 @utils.group(cls=ClickAliasedGroup)
 def tools():
     pass
@@ -563,6 +638,8 @@ def test():
 @click.option("--list", "-l", "show_list", is_flag=True)
 @click.option("--filter", "-f", "pipeline_filter", default="")
 def run_suite(show_list: bool | str = False, pipeline_filter=""):
+    import pkg_resources as p
+
     from CPAC.pipeline import cpac_runner
 
     test_config_dir = p.resource_filename(
@@ -617,7 +694,9 @@ def run_suite(show_list: bool | str = False, pipeline_filter=""):
             cpac_runner.run(data, pipe)
 
     if show_list:
-        logger.info("%s\n", show_list)
+        from CPAC.utils.monitoring.custom_logging import getLogger
+
+        getLogger("CPAC").info("%s\n", show_list)
 
 
 @test.group(cls=ClickAliasedGroup)
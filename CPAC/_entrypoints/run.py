@@ -30,26 +30,8 @@ from warnings import simplefilter
 
 import yaml
 
-from CPAC import __version__, license_notice
-from CPAC.pipeline import AVAILABLE_PIPELINE_CONFIGS
-from CPAC.pipeline.random_state import set_up_random_state
-from CPAC.pipeline.schema import str_to_bool1_1
-from CPAC.utils.bids_utils import (
-    cl_strip_brackets,
-    create_cpac_data_config,
-    load_cpac_data_config,
-    load_yaml_config,
-    sub_list_filter_by_labels,
-)
-from CPAC.utils.configuration import Configuration, preconfig_yaml, set_subject
-from CPAC.utils.configuration.yaml_template import (
-    create_yaml_from_template,
-    hash_data_config,
-    upgrade_pipeline_to_1_8,
-)
-from CPAC.utils.docs import DOCS_URL_PREFIX
-from CPAC.utils.monitoring import failed_to_start, FMLOGGER, log_nodes_cb, WFLOGGER
-from CPAC.utils.utils import update_nested_dict
+from CPAC import __version__
+from CPAC.resources.preconfigs import AVAILABLE_PIPELINE_CONFIGS, preconfig_path
 
 simplefilter(action="ignore", category=FutureWarning)
 DEFAULT_TMP_DIR = "/tmp"
@@ -111,6 +93,9 @@ def resolve_aws_credential(source: Path | str) -> str:
 
 def run_main():
     """Run this function if not importing as a script."""
+    from CPAC import license_notice
+    from CPAC.utils.docs import DOCS_URL_PREFIX
+
     parser = argparse.ArgumentParser(
         description="C-PAC Pipeline Runner. " + license_notice
     )
@@ -154,7 +139,7 @@ def run_main():
         "pipeline_file to read data directly from an "
         "S3 bucket. This may require AWS S3 credentials "
         "specified via the --aws_input_creds option.",
-        default=preconfig_yaml("default"),
+        default=preconfig_path("default"),
     )
     parser.add_argument(
         "--group-file",
@@ -422,6 +407,15 @@ def run_main():
         help="Skips bids validation.",
         action="store_true",
     )
+    parser.add_argument(
+        "--bids-index",
+        "--bids_index",
+        help="SQLite file in which to keep an index of the files in bids_dir "
+        "between runs, so that relaunching only rereads the JSON sidecars that "
+        "changed. The file is created if it does not exist and can be shared "
+        "by runs on the same dataset.",
+        default=None,
+    )
 
     parser.add_argument(
         "--anat-only",
@@ -454,6 +448,16 @@ def run_main():
         action="store_true",
     )
 
+    parser.add_argument(
+        "--metrics_port",
+        "--metrics-port",
+        help="Serve live scheduler and node metrics in the Prometheus text "
+        "format at /metrics on this port (enables live_metrics). You need to "
+        'bind the port using the Docker flag "-p".',
+        type=int,
+        default=None,
+    )
+
     parser.add_argument(
         "--freesurfer_dir",
         "--freesurfer-dir",
@@ -481,6 +485,8 @@ def run_main():
         sys.exit(0)
 
     elif args.analysis_level == "group":
+        from CPAC.utils.monitoring import FMLOGGER, WFLOGGER
+
         if not args.group_file or not os.path.exists(args.group_file):
             import pkg_resources as p
 
@@ -524,6 +530,28 @@ def run_main():
             sys.exit(0)
 
     elif args.analysis_level in ["test_config", "participant"]:
+        from CPAC.pipeline.random_state import set_up_random_state
+        from CPAC.pipeline.schema import str_to_bool1_1
+        from CPAC.utils.bids_utils import (
+            cl_strip_brackets,
+            create_cpac_data_config,
+            load_cpac_data_config,
+            load_yaml_config,
+            sub_list_filter_by_labels,
+        )
+        from CPAC.utils.configuration import (
+            Configuration,
+            preconfig_yaml,
+            set_subject,
+        )
+        from CPAC.utils.configuration.yaml_template import (
+            create_yaml_from_template,
+            hash_data_config,
+            upgrade_pipeline_to_1_8,
+        )
+        from CPAC.utils.monitoring import FMLOGGER, log_nodes_cb, WFLOGGER
+        from CPAC.utils.utils import update_nested_dict
+
         # check to make sure that the input directory exists
         if (
             not args.data_config_file
@@ -707,6 +735,9 @@ def run_main():
                 args.runtime_buffer
             )
 
+        if args.metrics_port is not None:
+            c["pipeline_setup"]["system_config"]["live_metrics"] = True
+
         if args.save_working_dir is not False:
             c["pipeline_setup"]["working_directory"]["remove_working_dir"] = False
         if isinstance(args.save_working_dir, str):
@@ -789,6 +820,7 @@ def run_main():
                 args.aws_input_creds,
                 args.skip_bids_validator,
                 only_one_anat=False,
+                index_path=args.bids_index,
             )
         else:
             sub_list = load_cpac_data_config(
@@ -900,6 +932,23 @@ def run_main():
                         e,
                     )
 
+            metrics = None
+            if args.metrics_port is not None:
+                from CPAC.utils.monitoring.metrics import metrics_server
+
+                try:
+                    metrics = metrics_server(
+                        c["pipeline_setup"]["pipeline_name"],
+                        c["pipeline_setup"]["log_directory"]["path"],
+                        port=args.metrics_port,
+                    )
+                except OSError as e:
+                    WFLOGGER.warning(
+                        "The run will continue without serving live metrics, "
+                        "because the metrics server failed to start: %s\n",
+                        e,
+                    )
+
             plugin_args = {
                 "n_procs": int(
                     c["pipeline_setup"]["system_config"]["max_cores_per_participant"]
@@ -939,6 +988,8 @@ def run_main():
 
             if monitoring:
                 monitoring.join(10)
+            if metrics:
+                metrics.shutdown()
 
             if args.analysis_level == "test_config":
                 if exitcode == 0:
@@ -962,6 +1013,8 @@ if __name__ == "__main__":
     try:
         run_main()
     except Exception as exception:
+        from CPAC.utils.monitoring import failed_to_start
+
         # if we hit an exception before the pipeline starts to build but
         # we're still able to create a logfile, log the error in the file
         failed_to_start(
@@ -30,6 +30,7 @@ from CPAC.pipeline.cpac_ga_model_generator import (
     create_merged_copefile,
 )
 from CPAC.utils import correlation
+from CPAC.utils.utils import zscore
 
 
 def joint_mask(subjects, mask_file=None):
@@ -60,34 +61,118 @@ def joint_mask(subjects, mask_file=None):
     return mask_file
 
 
-def calc_mdmrs(D, regressor, cols, permutations):
+def prepare_subjects_data(subjects, mask_file, float32=False):
+    """Write every subject's masked, z-scored timeseries to a memory-mappable array.
+
+    Each CWAS batch can then map the same file read-only instead of
+    reloading and normalizing every subject's 4D image.
+
+    Parameters
+    ----------
+    subjects : dict of strings:strings
+        A length `N` dict of id and file paths of the nifti files of subjects
+    mask_file : string
+        Path to a mask file in nifti format
+    float32 : bool, optional
+        Store the data in single precision, halving its footprint
+
+    Returns
+    -------
+    subjects_data_file : string
+        .npy file of shape (subjects, voxels in mask, timepoints), each
+        voxel's timeseries z-scored
+    """
+    mask = nib.load(mask_file).get_fdata().astype("bool")
+    mask_indices = np.where(mask)
+    subject_files = list(subjects.values())
+    dtype = np.float32 if float32 else np.float64
+    timepoints = nib.load(subject_files[0]).shape[-1]
+
+    subjects_data_file = os.path.join(os.getcwd(), "subjects_data.npy")
+    partial_file = f"{subjects_data_file}.partial"
+    subjects_data = np.lib.format.open_memmap(
+        partial_file,
+        mode="w+",
+        dtype=dtype,
+        shape=(len(subject_files), len(mask_indices[0]), timepoints),
+    )
+    for i, subject_file in enumerate(subject_files):
+        subjects_data[i] = zscore(
+            nib.load(subject_file).get_fdata(dtype=dtype)[mask_indices], 1
+        )
+    subjects_data.flush()
+    del subjects_data
+    os.replace(partial_file, subjects_data_file)
+    return subjects_data_file
+
+
+def calc_mdmrs(D, regressor, cols, permutations, random_state=None):
     """Calculate pseudo-F values and significance probabilities."""
     cols = np.array(cols, dtype=np.int32)
-    F_set, p_set = mdmr(D, regressor, cols, permutations)
+    F_set, p_set = mdmr(D, regressor, cols, permutations, random_state)
     return F_set, p_set
 
 
-def calc_subdists(subjects_data, voxel_range):
-    """Calculate the subdistributions of the subjects data."""
+def calc_subdists(subjects_data, voxel_range, max_memory_gb=1.0, z_scored=False):
+    """Calculate the subdistributions of the subjects data.
+
+    Seed-connectivity profiles are computed for blocks of seed voxels at once,
+    with one matrix product per subject, and blocks are sized to keep the
+    profiles within ``max_memory_gb``. Unless ``z_scored`` (as
+    :py:func:`prepare_subjects_data` writes it), the data are z-scored once,
+    in a copy beyond ``max_memory_gb``.
+    """
     subjects, voxels, _ = subjects_data.shape
+    if not z_scored:
+        subjects_data = zscore(subjects_data, 2)
+    voxel_range = np.asarray(voxel_range)
     D = np.zeros((len(voxel_range), subjects, subjects))
-    for i, v in enumerate(voxel_range):
-        profiles = np.zeros((subjects, voxels))
+    # a block's profiles, their copy without seed voxels and one subject's
+    # correlations
+    block_size = int(
+        max(1, max_memory_gb * 1024**3 // (8 * voxels * (2 * subjects + 1)))
+    )
+    for first in range(0, len(voxel_range), block_size):
+        seeds = voxel_range[first : first + block_size]
+        profiles = np.zeros((len(seeds), subjects, voxels))
         for si in range(subjects):
-            profiles[si] = correlation(subjects_data[si, v], subjects_data[si])
-        profiles = np.clip(np.nan_to_num(profiles), -0.9999, 0.9999)
-        profiles = np.arctanh(np.delete(profiles, v, 1))
-        D[i] = correlation(profiles, profiles)
+            subject_data = subjects_data[si]
+            profiles[:, si] = correlation(
+                subject_data[seeds], subject_data, z_scored=True
+            )
+        np.nan_to_num(profiles, copy=False)
+        np.clip(profiles, -0.9999, 0.9999, out=profiles)
+        # drop each seed's own voxel from its profiles
+        keep = np.ones((len(seeds), voxels), dtype=bool)
+        keep[np.arange(len(seeds)), seeds] = False
+        profiles = (
+            profiles.transpose(0, 2, 1)[keep]
+            .reshape(len(seeds), voxels - 1, subjects)
+            .transpose(0, 2, 1)
+        )
+        np.arctanh(profiles, out=profiles)
+        profiles = zscore(profiles, 2)
+        D[first : first + len(seeds)] = np.clip(
+            np.matmul(profiles, profiles.transpose(0, 2, 1)) / (voxels - 1), -1.0, 1.0
+        )
 
     return np.sqrt(2.0 * (1.0 - D))
 
 
 def calc_cwas(
-    subjects_data, regressor, regressor_selected_cols, permutations, voxel_range
+    subjects_data,
+    regressor,
+    regressor_selected_cols,
+    permutations,
+    voxel_range,
+    random_state=None,
+    z_scored=False,
 ):
     """Calculate CWAS pseudo-F values and significance probabilities."""
-    D = calc_subdists(subjects_data, voxel_range)
-    F_set, p_set = calc_mdmrs(D, regressor, regressor_selected_cols, permutations)
+    D = calc_subdists(subjects_data, voxel_range, z_scored=z_scored)
+    F_set, p_set = calc_mdmrs(
+        D, regressor, regressor_selected_cols, permutations, random_state
+    )
     return F_set, p_set
 
 
@@ -108,6 +193,8 @@ def nifti_cwas(
     columns_string,
     permutations,
     voxel_range,
+    subjects_data_file=None,
+    random_state=None,
 ):
     """Perform CWAS for a group of subjects.
 
@@ -126,6 +213,12 @@ def nifti_cwas(
     voxel_range : ndarray
         Indexes from range of voxels (inside the mask) to perform cwas on.
         Index ordering is based on the np.where(mask) command
+    subjects_data_file : string, optional
+        .npy file from :py:func:`prepare_subjects_data` for the same
+        subjects and mask. If given, it is memory-mapped instead of loading
+        every subject's nifti file.
+    random_state : int or None, optional
+        Seed for the permutations. Defaults to the pipeline random seed.
 
     Returns
     -------
@@ -194,17 +287,26 @@ def nifti_cwas(
     if len(subject_files) != regressor.shape[0]:
         msg = "Number of subjects does not match regressor size"
         raise ValueError(msg)
-    mask = nib.load(mask_file).get_fdata().astype("bool")
-    mask_indices = np.where(mask)
-    subjects_data = np.array(
-        [
-            nib.load(subject_file).get_fdata().astype("float64")[mask_indices]
-            for subject_file in subject_files
-        ]
-    )
+    if subjects_data_file is not None:
+        subjects_data = np.load(subjects_data_file, mmap_mode="r")
+    else:
+        mask = nib.load(mask_file).get_fdata().astype("bool")
+        mask_indices = np.where(mask)
+        subjects_data = np.array(
+            [
+                nib.load(subject_file).get_fdata().astype("float64")[mask_indices]
+                for subject_file in subject_files
+            ]
+        )
 
     F_set, p_set = calc_cwas(
-        subjects_data, regressor, regressor_selected_cols, permutations, voxel_range
+        subjects_data,
+        regressor,
+        regressor_selected_cols,
+        permutations,
+        voxel_range,
+        random_state,
+        z_scored=subjects_data_file is not None,
     )
     cwd = os.getcwd()
     F_file = os.path.join(cwd, "pseudo_F.npy")
@@ -1,5 +1,8 @@
 import numpy as np
 
+from CPAC.pipeline.random_state import random_seed
+from CPAC.utils.utils import check_random_state
+
 
 def check_rank(X):
     k = X.shape[1]
@@ -9,57 +12,35 @@ def check_rank(X):
 
 
 def hat(X):
+    """Return the hat matrix of one or a stack of ``(..., n, k)`` designs."""
     Q1, _ = np.linalg.qr(X)
-    return Q1.dot(Q1.T)
+    return np.matmul(Q1, np.swapaxes(Q1, -1, -2))
 
 
 def gower(D):
-    n = D.shape[0]
-    A = -0.5 * (D**2)
-    I = np.eye(n, n)
-    uno = np.ones((n, 1))
-    C = I - (1.0 / n) * uno.dot(uno.T)
-    return C.dot(A).dot(C)
+    """Gower-center one or a stack of ``(..., n, n)`` distance matrices.
 
-
-def gen_h2(x, cols, indexperm):
-    H = gen_h(x, cols, indexperm)
-    other_cols = [i for i in range(x.shape[1]) if i not in cols]
-    Xj = x[:, other_cols]
-    return H - hat(Xj)
+    Equivalent to ``C.dot(A).dot(C)`` with ``A = -0.5 * D**2`` and centering
+    matrix ``C = I - 1/n 11'``, computed by subtracting row and column means.
+    """
+    A = -0.5 * (D**2)
+    return (
+        A
+        - A.mean(axis=-1, keepdims=True)
+        - A.mean(axis=-2, keepdims=True)
+        + A.mean(axis=(-2, -1), keepdims=True)
+    )
 
 
 def permute_design(x, cols, indexperm):
-    Xj = x.copy()
-    Xj[:, cols] = Xj[indexperm][:, cols]
-    return Xj
-
-
-def gen_h(x, cols, indexperm):
-    x = permute_design(x, cols, indexperm)
-    return hat(x)
-
-
-def gen_h2_perms(x, cols, perms):
-    nperms, nobs = perms.shape
-    H2perms = np.zeros((nobs**2, nperms))
-    for i in range(nperms):
-        H2 = gen_h2(x, cols, perms[i, :])
-        H2perms[:, i] = H2.flatten()
+    """Permute the rows of columns ``cols`` of design ``x``.
 
-    return H2perms
-
-
-def gen_ih_perms(x, cols, perms):
-    nperms, nobs = perms.shape
-    I = np.eye(nobs, nobs)
-
-    IHperms = np.zeros((nobs**2, nperms))
-    for i in range(nperms):
-        IH = I - gen_h(x, cols, perms[i, :])
-        IHperms[:, i] = IH.flatten()
-
-    return IHperms
+    ``indexperm`` can be one ``(n,)`` permutation or a ``(nperms, n)`` stack,
+    which returns a ``(nperms, n, k)`` stack of designs.
+    """
+    Xj = np.repeat(x[np.newaxis], len(np.atleast_2d(indexperm)), axis=0)
+    Xj[..., cols] = x[np.atleast_2d(indexperm)][..., cols]
+    return Xj if np.ndim(indexperm) > 1 else Xj[0]
 
 
 def calc_ssq_fast(Hs, Gs, transpose=True):
@@ -76,7 +57,38 @@ def ftest_fast(Hs, IHs, Gs, df_among, df_resid, **ssq_kwrds):
     return (SS_among / df_among) / (SS_resid / df_resid)
 
 
-def mdmr(D, X, columns, permutations):
+def mdmr(D, X, columns, permutations, random_state=None, max_memory_gb=1.0):
+    """Multivariate distance matrix regression.
+
+    Permutations are generated and tested in blocks against all voxels, and
+    only the count of permuted pseudo-F values at least as large as the
+    observed ones is kept.
+
+    Parameters
+    ----------
+    D : ndarray
+        ``(voxels, subjects, subjects)`` distance matrices
+    X : ndarray
+        ``(subjects, regressors)`` design, without intercept
+    columns : ndarray
+        indices of the columns of interest in the design with a leading
+        intercept column
+    permutations : int
+        number of permutations, including the unpermuted design
+    random_state : int, RandomState or None, optional
+        seed for the permutations. Defaults to
+        :py:func:`CPAC.pipeline.random_state.random_seed`, and to NumPy's
+        global random state if no seed is set.
+    max_memory_gb : float, optional
+        cap on the memory used by each block of permutations
+
+    Returns
+    -------
+    F : ndarray
+        pseudo-F statistic for every voxel
+    p_vals : ndarray
+        significance probabilities of ``F``
+    """
     check_rank(X)
 
     subjects = X.shape[0]
@@ -86,28 +98,57 @@ def mdmr(D, X, columns, permutations):
 
     voxels = D.shape[0]
     Gs = np.zeros((subjects**2, voxels))
-    for di in range(voxels):
-        Gs[:, di] = gower(D[di]).flatten()
+    # center blocks of voxels at a time to bound the temporary copies
+    block_size = max(1, 2**24 // subjects**2)
+    for first in range(0, voxels, block_size):
+        G = gower(D[first : first + block_size])
+        Gs[:, first : first + block_size] = G.reshape(G.shape[0], subjects**2).T
 
     X1 = np.hstack((np.ones((subjects, 1)), X))
     columns = columns.copy()  # removed a +1
 
     regressors = X1.shape[1]
 
-    permutation_indexes = np.zeros((permutations, subjects), dtype=int)
-    permutation_indexes[0, :] = range(subjects)
-    for i in range(1, permutations):
-        permutation_indexes[i, :] = np.random.permutation(subjects)
-
-    H2perms = gen_h2_perms(X1, columns, permutation_indexes)
-    IHperms = gen_ih_perms(X1, columns, permutation_indexes)
-
     df_among = len(columns)
     df_resid = subjects - regressors
 
-    F_perms = ftest_fast(H2perms, IHperms, Gs, df_among, df_resid)
-
-    p_vals = (F_perms[1:, :] >= F_perms[0, :]).sum(axis=0).astype("float")
+    if random_state is None:
+        random_state = random_seed()
+    random_state = check_random_state(random_state)
+
+    # the nuisance columns are never permuted, so their projection is shared
+    other_cols = [i for i in range(regressors) if i not in columns]
+    H_nuisance = hat(X1[:, other_cols])
+    I = np.eye(subjects, subjects)  # noqa: E741
+
+    # H2 and I - H for each permutation, and its F row
+    block_size = int(
+        max(1, max_memory_gb * 1024**3 // (8 * (3 * subjects**2 + voxels)))
+    )
+    F = None
+    exceedances = np.zeros(voxels, dtype=int)
+    for first in range(0, permutations, block_size):
+        permutation_indexes = np.array(
+            [
+                np.arange(subjects) if i == 0 else random_state.permutation(subjects)
+                for i in range(first, min(first + block_size, permutations))
+            ]
+        )
+        H = hat(permute_design(X1, columns, permutation_indexes))
+        F_perms = ftest_fast(
+            (H - H_nuisance).reshape(len(H), subjects**2),
+            (I - H).reshape(len(H), subjects**2),
+            Gs,
+            df_among,
+            df_resid,
+            transpose=False,
+        )
+        if F is None:
+            F = F_perms[0, :]
+            F_perms = F_perms[1:, :]
+        exceedances += (F_perms >= F).sum(axis=0)
+
+    p_vals = exceedances.astype("float")
     p_vals /= permutations
 
-    return F_perms[0, :], p_vals
+    return F, p_vals
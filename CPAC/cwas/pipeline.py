@@ -3,16 +3,18 @@ import os
 import nipype.interfaces.utility as util
 
 from CPAC.pipeline import nipype_pipeline_engine as pe
+from CPAC.pipeline.random_state import random_seed
 from CPAC.utils.interfaces.function import Function
 from .cwas import (
     create_cwas_batches,
     joint_mask,
     merge_cwas_batches,
     nifti_cwas,
+    prepare_subjects_data,
 )
 
 
-def create_cwas(name="cwas", working_dir=None, crash_dir=None):
+def create_cwas(name="cwas", working_dir=None, crash_dir=None, float32=False):
     """
     Connectome Wide Association Studies.
 
@@ -22,6 +24,8 @@ def create_cwas(name="cwas", working_dir=None, crash_dir=None):
     ----------
     name : string, optional
         Name of the workflow.
+    float32 : bool, optional
+        Keep the shared masked group data in single precision.
 
     Returns
     -------
@@ -56,6 +60,7 @@ def create_cwas(name="cwas", working_dir=None, crash_dir=None):
 
     CWAS Procedure:
 
+    0. Write the masked group data once to a file every batch memory-maps
     1. Calculate spatial correlation of a voxel
     2. Correlate spatial z-score maps for every subject pair
     3. Convert matrix to distance matrix, `1-r`
@@ -141,6 +146,8 @@ def create_cwas(name="cwas", working_dir=None, crash_dir=None):
                 "columns_string",
                 "permutations",
                 "voxel_range",
+                "subjects_data_file",
+                "random_state",
             ],
             output_names=["result_batch"],
             function=nifti_cwas,
@@ -149,6 +156,8 @@ def create_cwas(name="cwas", working_dir=None, crash_dir=None):
         name="cwas_batch",
         iterfield="voxel_range",
     )
+    if random_seed() is not None:
+        ncwas.inputs.random_state = random_seed()
 
     jmask = pe.Node(
         Function(
@@ -160,6 +169,17 @@ def create_cwas(name="cwas", working_dir=None, crash_dir=None):
         name="joint_mask",
     )
 
+    subjects_data = pe.Node(
+        Function(
+            input_names=["subjects", "mask_file", "float32"],
+            output_names=["subjects_data_file"],
+            function=prepare_subjects_data,
+            as_module=True,
+        ),
+        name="cwas_subjects_data",
+    )
+    subjects_data.inputs.float32 = float32
+
     mcwasb = pe.Node(
         Function(
             input_names=["cwas_batches", "mask_file", "z_score", "permutations"],
@@ -178,6 +198,10 @@ def create_cwas(name="cwas", working_dir=None, crash_dir=None):
     workflow.connect(jmask, "joint_mask", ccb, "mask_file")
     workflow.connect(inputspec, "parallel_nodes", ccb, "batches")
 
+    # Write the masked group data once for all batches
+    workflow.connect(jmask, "joint_mask", subjects_data, "mask_file")
+    workflow.connect(inputspec, "subjects", subjects_data, "subjects")
+
     # Compute CWAS over batches of voxels
     workflow.connect(jmask, "joint_mask", ncwas, "mask_file")
     workflow.connect(inputspec, "subjects", ncwas, "subjects")
@@ -187,6 +211,7 @@ def create_cwas(name="cwas", working_dir=None, crash_dir=None):
     workflow.connect(inputspec, "columns", ncwas, "columns_string")
 
     workflow.connect(ccb, "batch_list", ncwas, "voxel_range")
+    workflow.connect(subjects_data, "subjects_data_file", ncwas, "subjects_data_file")
 
     # Merge the computed CWAS data
     workflow.connect(ncwas, "result_batch", mcwasb, "cwas_batches")
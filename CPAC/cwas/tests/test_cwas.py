@@ -372,3 +372,173 @@ def test_distances():
     ffile = op.join(sdir, "iq_meanFD+age+sex.mdmr", "fperms_FSIQ.desc")
     np.array(robjects.r("as.matrix(attach.big.matrix('%s'))" % ffile))
     n = np.sqrt(dmats.shape[0])
+
+
+def _synthetic_group(tmp_path, n_subjects=6, shape=(4, 4, 3, 25)):
+    """Write random subject images, a mask and a phenotype file to disk."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(2014)
+    subjects = {}
+    for i in range(n_subjects):
+        subjects[f"sub-{i}"] = str(tmp_path / f"sub-{i}.nii.gz")
+        nib.Nifti1Image(rng.normal(size=shape), np.eye(4)).to_filename(
+            subjects[f"sub-{i}"]
+        )
+    mask = np.zeros(shape[:3])
+    mask[1:, 1:, :] = 1
+    mask_file = str(tmp_path / "mask.nii.gz")
+    nib.Nifti1Image(mask, np.eye(4)).to_filename(mask_file)
+    regressor_file = str(tmp_path / "pheno.csv")
+    pd.DataFrame(
+        {
+            "participant": list(subjects),
+            "age": rng.uniform(8, 80, n_subjects),
+            "iq": rng.normal(100, 15, n_subjects),
+        }
+    ).to_csv(regressor_file, index=False)
+    return subjects, mask_file, regressor_file
+
+
+@pytest.mark.parametrize("float32", [False, True])
+def test_prepare_subjects_data(tmp_path, monkeypatch, float32):
+    """Test batches read from the shared array match batches loading niftis."""
+    import numpy as np
+
+    from CPAC.cwas.cwas import nifti_cwas, prepare_subjects_data
+
+    subjects, mask_file, regressor_file = _synthetic_group(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    subjects_data_file = prepare_subjects_data(subjects, mask_file, float32)
+    subjects_data = np.load(subjects_data_file, mmap_mode="r")
+    assert subjects_data.shape == (6, 27, 25)
+    assert subjects_data.dtype == (np.float32 if float32 else np.float64)
+    # every voxel's timeseries is z-scored once, for all batches
+    np.testing.assert_allclose(subjects_data.mean(axis=2), 0, atol=1e-5)
+    np.testing.assert_allclose(subjects_data.std(axis=2), 1, rtol=1e-5)
+
+    voxel_range = np.arange(5, 12)
+    results = []
+    for data_file in [None, subjects_data_file]:
+        np.random.seed(1)  # noqa: NPY002
+        F_file, p_file, _ = nifti_cwas(
+            subjects,
+            mask_file,
+            regressor_file,
+            "participant",
+            "age",
+            20,
+            voxel_range,
+            subjects_data_file=data_file,
+        )
+        results.append((np.load(F_file), np.load(p_file)))
+    np.testing.assert_allclose(
+        results[0][0], results[1][0], rtol=1e-4 if float32 else 1e-12
+    )
+    np.testing.assert_array_equal(results[0][1], results[1][1])
+
+
+@pytest.mark.parametrize("max_memory_gb", [1.0, 1e-6])
+@pytest.mark.parametrize("z_scored", [False, True])
+def test_calc_subdists(max_memory_gb, z_scored):
+    """Test blocked distances match one voxel and one subject at a time."""
+    import numpy as np
+
+    from CPAC.cwas.cwas import calc_subdists
+    from CPAC.utils import correlation
+    from CPAC.utils.utils import zscore
+
+    rng = np.random.default_rng(2014)
+    subjects_data = rng.normal(size=(5, 30, 40))
+    voxel_range = np.arange(3, 11)
+
+    expected = np.zeros((len(voxel_range), 5, 5))
+    for i, v in enumerate(voxel_range):
+        profiles = np.zeros((5, 30))
+        for si in range(5):
+            profiles[si] = correlation(subjects_data[si, v], subjects_data[si])
+        profiles = np.clip(np.nan_to_num(profiles), -0.9999, 0.9999)
+        profiles = np.arctanh(np.delete(profiles, v, 1))
+        expected[i] = correlation(profiles, profiles)
+    expected = np.sqrt(2.0 * (1.0 - expected))
+
+    np.testing.assert_allclose(
+        calc_subdists(
+            zscore(subjects_data, 2) if z_scored else subjects_data,
+            voxel_range,
+            max_memory_gb,
+            z_scored,
+        ),
+        expected,
+        # the square root amplifies rounding on the zero diagonal
+        atol=1e-7,
+    )
+
+
+def test_gower():
+    """Test mean-subtraction Gower centering matches explicit centering matrices."""
+    import numpy as np
+
+    from CPAC.cwas.mdmr import gower
+
+    rng = np.random.default_rng(2014)
+    D = rng.uniform(size=(3, 6, 6))
+    D = D + D.transpose(0, 2, 1)
+    C = np.eye(6) - np.ones((6, 6)) / 6
+    for stacked, single in zip(gower(D), D):
+        expected = C.dot(-0.5 * single**2).dot(C)
+        np.testing.assert_allclose(stacked, expected, atol=1e-12)
+        np.testing.assert_allclose(gower(single), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize("max_memory_gb", [1.0, 1e-5])
+def test_mdmr_permutation_blocks(max_memory_gb):
+    """Test blocked permutations match one QR per permutation with stored F's."""
+    import numpy as np
+
+    from CPAC.cwas.mdmr import gower, hat, mdmr
+
+    rng = np.random.default_rng(2014)
+    subjects, voxels, permutations = 9, 7, 40
+    points = rng.normal(size=(voxels, subjects, 3))
+    D = np.linalg.norm(points[:, :, np.newaxis] - points[:, np.newaxis], axis=-1)
+    X = rng.normal(size=(subjects, 2))
+    columns = np.array([1])
+
+    X1 = np.hstack((np.ones((subjects, 1)), X))
+    Gs = np.stack([gower(D[v]).flatten() for v in range(voxels)], axis=1)
+    perms = np.random.RandomState(5)
+    F_perms = np.zeros((permutations, voxels))
+    for i in range(permutations):
+        indexperm = np.arange(subjects) if i == 0 else perms.permutation(subjects)
+        Xp = X1.copy()
+        Xp[:, columns] = Xp[indexperm][:, columns]
+        H2 = hat(Xp) - hat(X1[:, [0, 2]])
+        IH = np.eye(subjects) - hat(Xp)
+        F_perms[i] = (H2.flatten().dot(Gs) / 1) / (IH.flatten().dot(Gs) / 6)
+    expected_p = (F_perms[1:] >= F_perms[0]).sum(axis=0) / permutations
+
+    F, p_vals = mdmr(D, X, columns, permutations, 5, max_memory_gb)
+    np.testing.assert_allclose(F, F_perms[0], rtol=1e-10)
+    np.testing.assert_array_equal(p_vals, expected_p)
+
+
+def test_mdmr_random_state():
+    """Test MDMR permutations follow the pipeline random seed."""
+    import numpy as np
+
+    from CPAC.cwas.mdmr import mdmr
+    from CPAC.pipeline.random_state import set_up_random_state
+
+    rng = np.random.default_rng(2014)
+    points = rng.normal(size=(4, 10, 3))
+    D = np.linalg.norm(points[:, :, np.newaxis] - points[:, np.newaxis], axis=-1)
+    X = rng.normal(size=(10, 1))
+    try:
+        set_up_random_state(77)
+        seeded = mdmr(D, X, np.array([1]), 30)
+        assert np.array_equal(seeded[1], mdmr(D, X, np.array([1]), 30)[1])
+        assert np.array_equal(seeded[1], mdmr(D, X, np.array([1]), 30, 77)[1])
+    finally:
+        set_up_random_state(None)
@@ -21,10 +21,9 @@ from nipype.interfaces import afni, fsl, utility as util
 from nipype.interfaces.afni import preprocess, utils as afni_utils
 
 from CPAC.func_preproc.utils import (
-    chunk_ts,
     notch_filter_motion,
     oned_text_concat,
-    split_ts_chunks,
+    split_ts,
 )
 from CPAC.generate_motion_statistics import (
     affine_file_from_params_file,
@@ -442,40 +441,23 @@ def get_motion_ref(wf, cfg, strat_pool, pipe_num, opt=None):
 def motion_correct_3dvolreg(wf, cfg, strat_pool, pipe_num):
     """Calculate motion parameters with 3dvolreg."""
     if int(cfg.pipeline_setup["system_config"]["max_cores_per_participant"]) > 1:
-        chunk_imports = ["import nibabel as nib"]
-        chunk = pe.Node(
-            Function(
-                input_names=["func_file", "n_chunks", "chunk_size"],
-                output_names=["TR_ranges"],
-                function=chunk_ts,
-                imports=chunk_imports,
-            ),
-            name=f"chunk_{pipe_num}",
-        )
-
-        # chunk.inputs.n_chunks = int(cfg.pipeline_setup['system_config'][
-        #                              'max_cores_per_participant'])
-
-        # 10-TR sized chunks
-        chunk.inputs.chunk_size = 10
-
-        node, out = strat_pool.get_data("desc-preproc_bold")
-        wf.connect(node, out, chunk, "func_file")
-
-        split_imports = ["import os", "import subprocess"]
         split = pe.Node(
             Function(
-                input_names=["func_file", "tr_ranges"],
+                input_names=["func_file", "n_cpus", "mem_gb"],
                 output_names=["split_funcs"],
-                function=split_ts_chunks,
-                imports=split_imports,
+                function=split_ts,
             ),
             name=f"split_{pipe_num}",
         )
+        split.inputs.n_cpus = int(
+            cfg.pipeline_setup["system_config"]["max_cores_per_participant"]
+        )
+        split.inputs.mem_gb = cfg.pipeline_setup["system_config"][
+            "maximum_memory_per_participant"
+        ]
 
         node, out = strat_pool.get_data("desc-preproc_bold")
         wf.connect(node, out, split, "func_file")
-        wf.connect(chunk, "TR_ranges", split, "tr_ranges")
 
         out_split_func = pe.Node(
             interface=util.IdentityInterface(fields=["out_file"]),
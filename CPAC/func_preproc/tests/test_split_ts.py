@@ -0,0 +1,134 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests and a benchmark for splitting timeseries into chunks."""
+
+import os
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pytest
+import nibabel as nib
+
+from CPAC.func_preproc.utils import chunk_ts, split_ts
+from CPAC.registration.registration import apply_transform
+
+
+def _write_ts(path: Path, n_trs: int, shape=(16, 16, 12)) -> str:
+    """Write a compressed int16 timeseries with a 2-second TR."""
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 1000, size=(*shape, n_trs), dtype=np.int16)
+    img = nib.Nifti1Image(data, np.diag([3, 3, 3.5, 1]))
+    img.header.set_data_dtype(np.int16)
+    img.header.set_zooms((3, 3, 3.5, 2))
+    img.to_filename(path)
+    return str(path)
+
+
+def test_split_ts_roundtrip(tmp_path, monkeypatch):
+    """Test chunks are uncompressed, in order, and reassemble the timeseries."""
+    func_file = _write_ts(tmp_path / "sub-1_bold.nii.gz", 40)
+    monkeypatch.chdir(tmp_path)
+    split_funcs = split_ts(func_file, n_cpus=3)
+    assert [os.path.basename(chunk) for chunk in split_funcs] == [
+        "sub-1_bold_0.nii",
+        "sub-1_bold_1.nii",
+        "sub-1_bold_2.nii",
+    ]
+    chunks = [nib.load(chunk) for chunk in split_funcs]
+    assert [chunk.shape[3] for chunk in chunks] == [14, 14, 12]
+    original = nib.load(func_file)
+    for chunk in chunks:
+        assert chunk.get_data_dtype() == np.int16
+        assert chunk.header.get_zooms() == original.header.get_zooms()
+        np.testing.assert_array_equal(chunk.affine, original.affine)
+    np.testing.assert_array_equal(
+        np.concatenate([np.asanyarray(chunk.dataobj) for chunk in chunks], axis=3),
+        np.asanyarray(original.dataobj),
+    )
+
+
+def test_split_ts_memory_bound(tmp_path, monkeypatch):
+    """Test chunks shrink to fit in memory, and one chunk isn't copied."""
+    func_file = _write_ts(tmp_path / "sub-1_bold.nii.gz", 30)
+    monkeypatch.chdir(tmp_path)
+    assert split_ts(func_file, n_cpus=1) == [func_file]
+    volume_gb = 16 * 16 * 12 * 4 / 1024**3
+    split_funcs = split_ts(func_file, n_cpus=2, mem_gb=volume_gb * 2 * 4 * 8)
+    assert [nib.load(chunk).shape[3] for chunk in split_funcs] == [8, 8, 8, 6]
+    # chunks resampled to a grid twice the size are half as long
+    reference = _write_ts(tmp_path / "template.nii.gz", 1, shape=(32, 16, 12))
+    split_funcs = split_ts(
+        func_file, n_cpus=2, mem_gb=volume_gb * 2 * 4 * 8, reference=reference
+    )
+    assert [nib.load(chunk).shape[3] for chunk in split_funcs] == [4] * 7 + [2]
+
+
+@pytest.mark.parametrize("reg_tool", ["ants", "fsl"])
+def test_apply_transform_splits_once(reg_tool):
+    """Test parallel transforms split the timeseries in one node."""
+    wf = apply_transform("warp_ts", reg_tool, time_series=True, num_cpus=4, mem_gb=8)
+    split = wf.get_node("split_warp_ts")
+    assert split.inputs.n_cpus == 4  # noqa: PLR2004
+    assert split.inputs.mem_gb == 8  # noqa: PLR2004
+    assert wf.get_node("chunk_warp_ts") is None
+    assert ("reference", "reference") in wf._graph.get_edge_data(
+        wf.get_node("inputspec"), split
+    )["connect"]
+
+
+def _split_10_trs(func_file: str) -> list[str]:
+    """Split like ``3dcalc`` per 10-TR chunk: each chunk re-reads the input."""
+    split_funcs = []
+    for chunk_idx, (start, stop) in enumerate(chunk_ts(func_file, chunk_size=10)):
+        out_file = os.path.join(
+            os.getcwd(),
+            os.path.basename(func_file).replace(".nii.gz", f"_{chunk_idx}.nii.gz"),
+        )
+        func_img = nib.load(func_file)
+        nib.Nifti1Image(
+            func_img.dataobj[..., start : stop + 1], func_img.affine, func_img.header
+        ).to_filename(out_file)
+        split_funcs.append(out_file)
+    return split_funcs
+
+
+def test_benchmark_split_ts(tmp_path, monkeypatch, record_property):
+    """Benchmark splitting a 1,200-TR timeseries for 8 CPUs.
+
+    The 10-TR scheme is emulated with NiBabel, since each ``3dcalc`` call
+    decompresses the input from its start.
+    """
+    func_file = _write_ts(tmp_path / "sub-1_bold.nii.gz", 1200)
+    results = {}
+    for scheme, split in {
+        "10-TR": _split_10_trs,
+        "adaptive": lambda func_file: split_ts(func_file, n_cpus=8, mem_gb=16),
+    }.items():
+        workdir = tmp_path / scheme
+        workdir.mkdir()
+        monkeypatch.chdir(workdir)
+        before = perf_counter()
+        split_funcs = split(func_file)
+        results[scheme] = {
+            "seconds": perf_counter() - before,
+            "chunks": len(split_funcs),
+            "disk_bytes": sum(os.path.getsize(chunk) for chunk in split_funcs),
+        }
+    record_property("split_ts", results)
+    assert results["10-TR"]["chunks"] == 120  # noqa: PLR2004
+    assert results["adaptive"]["chunks"] == 8  # noqa: PLR2004
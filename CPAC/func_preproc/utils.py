@@ -66,6 +66,117 @@ def split_ts_chunks(func_file, tr_ranges):
     return split_funcs
 
 
+MIN_CHUNK_SIZE = 10
+"""fewest TRs per chunk when chunks are sized by CPUs"""
+CHUNK_MEMORY_FACTOR = 4
+"""single-precision copies of a chunk held in memory while it's processed"""
+
+
+def adaptive_chunk_size(n_trs, n_cpus=1, volume_gb=None, mem_gb=None):
+    """Return how many TRs to put in each chunk of a timeseries.
+
+    Chunks are sized to give each CPU one chunk, but no smaller than
+    :py:data:`MIN_CHUNK_SIZE` TRs, and no larger than lets ``n_cpus``
+    chunks be processed at once in ``mem_gb``.
+
+    Parameters
+    ----------
+    n_trs : int
+        number of TRs in the timeseries
+
+    n_cpus : int
+        number of chunks to process in parallel
+
+    volume_gb : float, optional
+        size of one single-precision volume of the timeseries
+
+    mem_gb : float, optional
+        memory available to process chunks in parallel
+
+    Returns
+    -------
+    int
+
+    Examples
+    --------
+    >>> adaptive_chunk_size(1200, 8)
+    150
+    >>> adaptive_chunk_size(1200, 8, volume_gb=0.004, mem_gb=8)
+    62
+    >>> adaptive_chunk_size(25, 8)
+    10
+    >>> adaptive_chunk_size(8, 8)
+    8
+    """
+    n_cpus = max(int(n_cpus), 1)
+    chunk_size = max(math.ceil(n_trs / n_cpus), MIN_CHUNK_SIZE)
+    if volume_gb and mem_gb:
+        fits = int(mem_gb / (n_cpus * volume_gb * CHUNK_MEMORY_FACTOR))
+        chunk_size = min(chunk_size, max(fits, 1))
+    return min(chunk_size, n_trs)
+
+
+def split_ts(func_file, n_cpus=1, mem_gb=None, reference=None):
+    """Split a timeseries into chunks to process in parallel.
+
+    The timeseries is read once, in order, and written into uncompressed
+    chunks sized by :py:func:`adaptive_chunk_size`. A timeseries that fits
+    in one chunk isn't copied. Chunks are sized by the larger volume of the
+    timeseries and ``reference``, so chunks resampled to another grid (e.g.,
+    a template) also fit in ``mem_gb``.
+
+    Parameters
+    ----------
+    func_file : str
+        path to a 4D NIfTI image
+
+    n_cpus : int
+        number of chunks to process in parallel
+
+    mem_gb : float, optional
+        memory available to process chunks in parallel
+
+    reference : str, optional
+        path to the image chunks will be resampled to
+
+    Returns
+    -------
+    split_funcs : list of str
+        paths to the chunks, in order
+    """
+    import os
+
+    import numpy as np
+    import nibabel as nib
+
+    from CPAC.func_preproc.utils import adaptive_chunk_size
+
+    # keep the file open so compressed images are decompressed only once
+    func_img = nib.load(func_file, keep_file_open=True)
+    n_trs = func_img.shape[3]
+    n_voxels = np.prod(func_img.shape[:3])
+    if reference:
+        n_voxels = max(n_voxels, np.prod(nib.load(reference).shape[:3]))
+    volume_gb = n_voxels * np.dtype(np.float32).itemsize / 1024**3
+    chunk_size = adaptive_chunk_size(n_trs, n_cpus, volume_gb, mem_gb)
+    if chunk_size >= n_trs:
+        return [func_file]
+
+    basename = os.path.basename(func_file)
+    for ext in (".nii.gz", ".nii"):
+        if basename.endswith(ext):
+            basename = basename[: -len(ext)]
+            break
+    split_funcs = []
+    for chunk_idx, start in enumerate(range(0, n_trs, chunk_size)):
+        out_file = os.path.join(os.getcwd(), f"{basename}_{chunk_idx}.nii")
+        chunk = func_img.dataobj[..., start : start + chunk_size]
+        chunk_img = func_img.__class__(chunk, func_img.affine, func_img.header)
+        chunk_img.to_filename(out_file)
+        split_funcs.append(out_file)
+    return split_funcs
+
+
 def oned_text_concat(in_files):
     out_file = os.path.join(
         os.getcwd(), os.path.basename(in_files[0].replace("_0", ""))
@@ -48,16 +48,16 @@ def convert_pvalue_to_r(datafile, p_value, two_tailed=False):
         correlation threshold value
     """
     import numpy as np
-    import nibabel as nib
     import scipy.stats
 
+    from CPAC.utils.nifti_utils import image_metadata
+
     # Get two-tailed distribution
     if two_tailed:
         p_value = p_value / 2
 
-    # Load in data and number of time pts
-    img = nib.load(datafile).get_fdata()
-    t_pts = img.shape[-1]
+    # Read number of time pts from the header
+    t_pts = image_metadata(datafile).shape[-1]
 
     # N-2 degrees of freedom with Pearson correlation (two sample means)
     deg_freedom = t_pts - 2
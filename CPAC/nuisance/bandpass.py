@@ -4,16 +4,14 @@ from pathlib import Path
 import numpy as np
 from numpy.typing import NDArray
 import nibabel as nib
-from scipy.fftpack import fft, ifft
+from scipy.fft import irfft, rfft
 
 
-def ideal_bandpass(data, sample_period, bandpass_freqs):
+def _frequency_mask(sample_length, sample_period, bandpass_freqs):
+    """Return the padded FFT length and the real-FFT bins an ideal bandpass keeps."""
     # Derived from YAN Chao-Gan 120504 based on REST.
     sample_freq = 1.0 / sample_period
-    sample_length = data.shape[0]
-
-    data_p = np.zeros(int(2 ** np.ceil(np.log2(sample_length))))
-    data_p[:sample_length] = data
+    n_fft = int(2 ** np.ceil(np.log2(sample_length)))
 
     LowCutoff, HighCutoff = bandpass_freqs
 
@@ -21,29 +19,68 @@ def ideal_bandpass(data, sample_period, bandpass_freqs):
         low_cutoff_i = 0
     elif LowCutoff > sample_freq / 2.0:
         # Cutoff beyond fs/2 (all-stop filter)
-        low_cutoff_i = int(data_p.shape[0] / 2)
+        low_cutoff_i = int(n_fft / 2)
     else:
-        low_cutoff_i = np.ceil(LowCutoff * data_p.shape[0] * sample_period).astype(
-            "int"
-        )
+        low_cutoff_i = np.ceil(LowCutoff * n_fft * sample_period).astype("int")
 
-    if HighCutoff > sample_freq / 2.0 or HighCutoff is None:
+    if HighCutoff is None or HighCutoff > sample_freq / 2.0:
         # Cutoff beyond fs/2 or unspecified (become a highpass filter)
-        high_cutoff_i = int(data_p.shape[0] / 2)
+        high_cutoff_i = int(n_fft / 2)
     else:
-        high_cutoff_i = np.fix(HighCutoff * data_p.shape[0] * sample_period).astype(
-            "int"
-        )
+        high_cutoff_i = np.fix(HighCutoff * n_fft * sample_period).astype("int")
 
-    freq_mask = np.zeros_like(data_p, dtype="bool")
+    # the mask is symmetric about fs/2, so only the non-negative half is needed
+    freq_mask = np.zeros(n_fft // 2 + 1, dtype="bool")
     freq_mask[low_cutoff_i : high_cutoff_i + 1] = True
-    freq_mask[data_p.shape[0] - high_cutoff_i : data_p.shape[0] + 1 - low_cutoff_i] = (
-        True
-    )
+    return n_fft, freq_mask
 
-    f_data = fft(data_p)
-    f_data[freq_mask is not True] = 0.0
-    return np.real_if_close(ifft(f_data)[:sample_length])
+
+def ideal_bandpass(data, sample_period, bandpass_freqs, axis=0):
+    """Apply an ideal bandpass filter along one axis of an array.
+
+    Parameters
+    ----------
+    data : ndarray
+        Timeseries, or array of timeseries along ``axis``. float32 input is
+        filtered in single precision.
+    sample_period : float
+        Length of sampling period in seconds.
+    bandpass_freqs : tuple
+        Tuple containing the bandpass frequencies. (LowCutoff_HighPass HighCutoff_LowPass)
+    axis : int, optional
+        Time axis of ``data``.
+
+    Returns
+    -------
+    ndarray
+        Filtered ``data``
+    """
+    sample_length = data.shape[axis]
+    n_fft, freq_mask = _frequency_mask(sample_length, sample_period, bandpass_freqs)
+    f_data = rfft(data, n=n_fft, axis=axis)
+    f_data[(slice(None),) * (axis % data.ndim) + (~freq_mask,)] = 0.0
+    return np.take(irfft(f_data, n=n_fft, axis=axis), range(sample_length), axis=axis)
+
+
+def _bandpass_nonzero_voxels(data, sample_period, bandpass_freqs, max_memory_gb):
+    """Demean and bandpass every nonzero voxel of a 4D array in place."""
+    mask = (data != 0).sum(-1) != 0
+    Y = data[mask]
+    n_fft = int(2 ** np.ceil(np.log2(Y.shape[-1])))
+    if max_memory_gb:
+        # padded input, spectrum and padded output per voxel
+        chunk_size = int(
+            max(1, max_memory_gb * 1024**3 // (4 * n_fft * Y.dtype.itemsize))
+        )
+    else:
+        chunk_size = max(Y.shape[0], 1)
+    for first in range(0, Y.shape[0], chunk_size):
+        Yc = Y[first : first + chunk_size]
+        Yc = Yc - Yc.mean(axis=-1, keepdims=True)
+        Y[first : first + chunk_size] = ideal_bandpass(
+            Yc, sample_period, bandpass_freqs, axis=-1
+        )
+    data[mask] = Y
 
 
 def read_1D(one_D: Path | str) -> tuple[list[str], NDArray]:
@@ -62,7 +99,14 @@ def read_1D(one_D: Path | str) -> tuple[list[str], NDArray]:
     return header, regressor
 
 
-def bandpass_voxels(realigned_file, regressor_file, bandpass_freqs, sample_period=None):
+def bandpass_voxels(
+    realigned_file,
+    regressor_file,
+    bandpass_freqs,
+    sample_period=None,
+    dtype="float64",
+    max_memory_gb=None,
+):
     """Performs ideal bandpass filtering on each voxel time-series.
 
     Parameters
@@ -74,6 +118,13 @@ def bandpass_voxels(realigned_file, regressor_file, bandpass_freqs, sample_perio
     sample_period : float, optional
         Length of sampling period in seconds.  If not specified,
         this value is read from the nifti file provided.
+    dtype : {'float64', 'float32'}, optional
+        Precision in which to load and filter NIfTI data. 'float32' halves
+        the memory footprint.
+    max_memory_gb : float, optional
+        Cap on the working memory used to filter voxels. Voxels are filtered in
+        chunks small enough to respect it. If not given, all voxels are
+        filtered in one pass.
 
     Returns
     -------
@@ -82,10 +133,7 @@ def bandpass_voxels(realigned_file, regressor_file, bandpass_freqs, sample_perio
 
     """
     nii = nib.load(realigned_file)
-    data = nii.get_fdata().astype("float64")
-    mask = (data != 0).sum(-1) != 0
-    Y = data[mask].T
-    Yc = Y - np.tile(Y.mean(0), (Y.shape[0], 1))
+    data = nii.get_fdata(dtype=dtype)
 
     if not sample_period:
         hdr = nii.header
@@ -94,11 +142,7 @@ def bandpass_voxels(realigned_file, regressor_file, bandpass_freqs, sample_perio
         if sample_period > 20.0:
             sample_period /= 1000.0
 
-    Y_bp = np.zeros_like(Y)
-    for j in range(Y.shape[1]):
-        Y_bp[:, j] = ideal_bandpass(Yc[:, j], sample_period, bandpass_freqs)
-
-    data[mask] = Y_bp.T
+    _bandpass_nonzero_voxels(data, sample_period, bandpass_freqs, max_memory_gb)
     img = nib.Nifti1Image(data, header=nii.header, affine=nii.affine)
     bandpassed_file = os.path.join(os.getcwd(), "bandpassed_demeaned_filtered.nii.gz")
     img.to_filename(bandpassed_file)
@@ -108,14 +152,8 @@ def bandpass_voxels(realigned_file, regressor_file, bandpass_freqs, sample_perio
     if regressor_file is not None:
         if regressor_file.endswith(".nii.gz") or regressor_file.endswith(".nii"):
             nii = nib.load(regressor_file)
-            data = nii.get_fdata().astype("float64")
-            mask = (data != 0).sum(-1) != 0
-            Y = data[mask].T
-            Yc = Y - np.tile(Y.mean(0), (Y.shape[0], 1))
-            Y_bp = np.zeros_like(Y)
-            for j in range(Y.shape[1]):
-                Y_bp[:, j] = ideal_bandpass(Yc[:, j], sample_period, bandpass_freqs)
-            data[mask] = Y_bp.T
+            data = nii.get_fdata(dtype=dtype)
+            _bandpass_nonzero_voxels(data, sample_period, bandpass_freqs, max_memory_gb)
 
             img = nib.Nifti1Image(data, header=nii.header, affine=nii.affine)
             regressor_bandpassed_file = os.path.join(
@@ -127,15 +165,8 @@ def bandpass_voxels(realigned_file, regressor_file, bandpass_freqs, sample_perio
             header: list[str]
             regressor: NDArray
             header, regressor = read_1D(regressor_file)
-            Yc = regressor - np.tile(regressor.mean(0), (regressor.shape[0], 1))
-            Y_bp = np.zeros_like(Yc)
-
-            # Modify to allow just 1 regressor column
-            shape = (
-                regressor.shape[0] if len(regressor.shape) < 1 else regressor.shape[1]
-            )
-            for j in range(shape):
-                Y_bp[:, j] = ideal_bandpass(Yc[:, j], sample_period, bandpass_freqs)
+            Yc = regressor - regressor.mean(0)
+            Y_bp = ideal_bandpass(Yc, sample_period, bandpass_freqs)
 
             regressor_bandpassed_file = os.path.join(
                 os.getcwd(), "regressor_bandpassed_demeaned_filtered.1D"
@@ -2085,6 +2085,7 @@ def ICA_AROMA_ANTsreg(wf, cfg, strat_pool, pipe_num, opt=None):
         time_series=True,
         num_cpus=num_cpus,
         num_ants_cores=num_ants_cores,
+        mem_gb=cfg.pipeline_setup["system_config"]["maximum_memory_per_participant"],
     )
     apply_xfm.inputs.inputspec.interpolation = cfg.registration_workflows[
         "functional_registration"
@@ -2209,6 +2210,7 @@ def ICA_AROMA_ANTsEPIreg(wf, cfg, strat_pool, pipe_num, opt=None):
         time_series=True,
         num_cpus=num_cpus,
         num_ants_cores=num_ants_cores,
+        mem_gb=cfg.pipeline_setup["system_config"]["maximum_memory_per_participant"],
     )
     apply_xfm.inputs.inputspec.interpolation = cfg.registration_workflows[
         "functional_registration"
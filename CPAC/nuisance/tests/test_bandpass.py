@@ -20,12 +20,15 @@ from importlib.abc import Traversable
 from importlib.resources import files
 from pathlib import Path
 
+import numpy as np
 from numpy.typing import NDArray
 import pytest
+import nibabel as nib
 
-from CPAC.nuisance.bandpass import read_1D
+from CPAC.nuisance.bandpass import bandpass_voxels, ideal_bandpass, read_1D
 
 RAW_ONE_D: Traversable = files("CPAC").joinpath("nuisance/tests/regressors.1D")
+RNG = np.random.default_rng(120504)
 
 
 @pytest.mark.parametrize("start_line", list(range(6)))
@@ -46,3 +49,70 @@ def test_read_1D(start_line: int, tmp_path: Path) -> None:
     assert data.shape == (10, 29)
     # all header lines should be captured
     assert len(header) == 5 - start_line
+
+
+def _fft_bandpass(data: NDArray, sample_period: float, bandpass_freqs: list) -> NDArray:
+    """Filter one timeseries with a full complex FFT, one column at a time."""
+    sample_length = data.shape[0]
+    data_p = np.zeros(int(2 ** np.ceil(np.log2(sample_length))))
+    data_p[:sample_length] = data
+    low = np.ceil(bandpass_freqs[0] * data_p.shape[0] * sample_period).astype(int)
+    high = np.fix(bandpass_freqs[1] * data_p.shape[0] * sample_period).astype(int)
+    freq_mask = np.zeros_like(data_p, dtype="bool")
+    freq_mask[low : high + 1] = True
+    freq_mask[data_p.shape[0] - high : data_p.shape[0] + 1 - low] = True
+    f_data = np.fft.fft(data_p)
+    f_data[~freq_mask] = 0.0
+    return np.real(np.fft.ifft(f_data)[:sample_length])
+
+
+@pytest.mark.parametrize("trs", [100, 128])
+def test_ideal_bandpass(trs: int) -> None:
+    """Test the real-FFT filter matches a full complex FFT per column."""
+    data = RNG.normal(size=(trs, 7))
+    bandpass_freqs = [0.01, 0.1]
+    expected = np.stack(
+        [_fft_bandpass(column, 2.0, bandpass_freqs) for column in data.T], axis=1
+    )
+    filtered = ideal_bandpass(data, 2.0, bandpass_freqs)
+    assert filtered.any()
+    np.testing.assert_allclose(filtered, expected, atol=1e-12)
+    np.testing.assert_allclose(
+        ideal_bandpass(data.T, 2.0, bandpass_freqs, axis=-1), expected.T, atol=1e-12
+    )
+
+
+@pytest.mark.parametrize(
+    "dtype,max_memory_gb", [("float64", None), ("float64", 1e-6), ("float32", None)]
+)
+def test_bandpass_voxels(
+    dtype: str,
+    max_memory_gb: float | None,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test whole-image filtering against per-voxel filtering."""
+    data = RNG.normal(100, 5, (4, 5, 3, 90))
+    data[0] = 0
+    in_file = tmp_path / "bold.nii.gz"
+    nib.Nifti1Image(data, np.eye(4)).to_filename(in_file)
+    regressor = tmp_path / "regressor.1D"
+    np.savetxt(regressor, data[1, 1, 1])
+    monkeypatch.chdir(tmp_path)
+    bandpass_freqs = [0.01, 0.1]
+
+    bandpassed_file, regressor_file = bandpass_voxels(
+        str(in_file), str(regressor), bandpass_freqs, 2.0, dtype, max_memory_gb
+    )
+
+    expected = np.zeros_like(data)
+    for index in np.ndindex(data.shape[:3]):
+        if data[index].any():
+            expected[index] = _fft_bandpass(
+                data[index] - data[index].mean(), 2.0, bandpass_freqs
+            )
+    atol = 1e-4 if dtype == "float32" else 1e-10
+    np.testing.assert_allclose(
+        nib.load(bandpassed_file).get_fdata(), expected, atol=atol
+    )
+    np.testing.assert_allclose(read_1D(regressor_file)[1], expected[1, 1, 1], atol=atol)
@@ -1,4 +1,7 @@
+import numpy as np
 import pytest
+import nibabel as nib
+from nipype.algorithms.confounds import _cosine_drift, _full_rank
 
 from CPAC.nuisance.utils import compcor
 
@@ -23,3 +26,26 @@ def test_TR_string_to_float():
 
     with pytest.raises(Exception):
         compcor.TR_string_to_float("ms")
+
+
+@pytest.mark.parametrize("max_memory_gb", [None, 1e-6])
+def test_cosine_filter(tmp_path, monkeypatch, max_memory_gb):
+    """Test batched cosine filter matches per-voxel least squares."""
+    rng = np.random.default_rng(1086)
+    data = rng.normal(100, 5, (6, 5, 4, 80)) + np.linspace(0, 20, 80)
+    data[0] = 0
+    in_dir = tmp_path / "in"
+    in_dir.mkdir()
+    in_file = str(in_dir / "bold.nii.gz")
+    nib.Nifti1Image(data, np.eye(4)).to_filename(in_file)
+    monkeypatch.chdir(tmp_path)
+
+    out_file = compcor.cosine_filter(in_file, 2.0, max_memory_gb=max_memory_gb)
+
+    X = _full_rank(_cosine_drift(128, 2.0 * np.arange(80)))[0][:, :-1]
+    expected = np.zeros_like(data)
+    for index in np.ndindex(data.shape[:3]):
+        betas = np.linalg.lstsq(X, data[index], rcond=None)[0]
+        expected[index] = data[index] - X.dot(betas)
+    np.testing.assert_allclose(nib.load(out_file).get_fdata(), expected, atol=1e-8)
+    assert not nib.load(out_file).get_fdata()[0].any()
@@ -89,6 +89,7 @@ def cosine_filter(
     remove_mean=True,
     axis=-1,
     failure_mode="error",
+    max_memory_gb=None,
 ):
     """
     Apply cosine filter to the input BOLD image using the discrete cosine transform (DCT) method.
@@ -112,6 +113,10 @@ def cosine_filter(
     failure_mode : {'error', 'ignore'}, optional
         Specifies how to handle failure modes. If set to 'error', the function raises an error.
         If set to 'ignore', it returns the input data unchanged in case of failure. Default is 'error'.
+    max_memory_gb : float, optional
+        Cap on the working memory used to filter voxels. Voxels are filtered in
+        chunks small enough to respect it. If not given, all nonzero voxels are
+        filtered in one pass.
 
     Returns
     -------
@@ -128,7 +133,8 @@ def cosine_filter(
     #     * Removed caluclation and return of `non_constant_regressors`
     #     * Modified docstring to reflect local changes
     #     * Updated style to match C-PAC codebase
-    #     * Updated to use generator and iterate over voxel time series to optimize memory usage.
+    #     * Fit all nonzero voxel time series at once with one pseudo-inverse of
+    #       the design matrix, optionally in memory-bounded chunks of voxels.
 
     # ORIGINAL WORK'S ATTRIBUTION NOTICE:
     #    Copyright (c) 2009-2016, Nipype developers
@@ -149,13 +155,6 @@ def cosine_filter(
 
     # Modifications copyright (C) 2019 - 2024  C-PAC Developers
     try:
-
-        def voxel_generator():
-            for i in range(datashape[0]):
-                for j in range(datashape[1]):
-                    for k in range(datashape[2]):
-                        yield input_data[i, j, k, :]
-
         from nipype.algorithms.confounds import _cosine_drift, _full_rank
 
         input_img = nib.load(input_image_path)
@@ -172,36 +171,35 @@ def cosine_filter(
         X_with_mean = X_full
         X_without_mean = X_full[:, :-1] if X_full.shape[1] > 1 else X_full
 
-        # Reshape the input data to bring the time dimension to the last axis if it's not already
-        if axis != -1:
-            reshaped_data = np.moveaxis(input_data, axis, -1)
-        else:
-            reshaped_data = input_data
-
-        reshaped_output_data = np.zeros_like(reshaped_data)
-
         # Choose the appropriate X matrix
         X = X_without_mean if remove_mean else X_with_mean
 
-        voxel_gen = voxel_generator()
+        # Bring the time dimension to the last axis and flatten to
+        # (voxels, timepoints); all-zero voxels have all-zero residuals
+        voxels = np.moveaxis(input_data, axis, -1).reshape(-1, timepoints)
+        residuals = np.zeros_like(voxels)
+        nonzero = np.flatnonzero(np.any(voxels != 0, axis=1))
 
-        for i in range(reshaped_data.shape[0]):
-            IFLOGGER.info(
-                f"calculating {i+1} of {reshaped_data.shape[0]} row of voxels"
-            )
-            for j in range(reshaped_data.shape[1]):
-                for k in range(reshaped_data.shape[2]):
-                    voxel_time_series = next(voxel_gen)
-                    betas = np.linalg.lstsq(X, voxel_time_series.T, rcond=None)[0]
-
-                    residuals = voxel_time_series - X.dot(betas)
-                    reshaped_output_data[i, j, k, :] = residuals
-
-        # Move the time dimension back to its original position if it was reshaped
-        if axis != -1:
-            output_data = np.moveaxis(reshaped_output_data, -1, axis)
+        # betas = pinv(X) @ y for every voxel, so one pseudo-inverse serves all
+        X_pinv = np.linalg.pinv(X)
+        if max_memory_gb:
+            chunk_size = int(max(1, max_memory_gb * 1024**3 // (timepoints * 8 * 3)))
         else:
-            output_data = reshaped_output_data
+            chunk_size = max(nonzero.size, 1)
+        IFLOGGER.info(
+            f"calculating residuals for {nonzero.size} of {voxels.shape[0]} voxels"
+            f" in {-(-nonzero.size // chunk_size)} chunk(s)"
+        )
+        for first in range(0, nonzero.size, chunk_size):
+            chunk = nonzero[first : first + chunk_size]
+            voxel_time_series = voxels[chunk]
+            betas = voxel_time_series @ X_pinv.T
+            residuals[chunk] = voxel_time_series - betas @ X.T
+
+        # Move the time dimension back to its original position
+        output_data = np.moveaxis(
+            residuals.reshape((*np.delete(datashape, axis), timepoints)), -1, axis
+        )
 
         hdr = input_img.header
         output_img = nib.Nifti1Image(output_data, header=hdr, affine=input_img.affine)
@@ -16,28 +16,9 @@
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
 """The C-PAC pipeline and its underlying infrastructure."""
 
-import os
-
-import pkg_resources as p
-
 from CPAC.pipeline.nipype_pipeline_engine.monkeypatch import patch_base_interface
+from CPAC.resources.preconfigs import ALL_PIPELINE_CONFIGS, AVAILABLE_PIPELINE_CONFIGS
 
 patch_base_interface()  # Monkeypatch Nipypes BaseInterface class
 
-ALL_PIPELINE_CONFIGS = os.listdir(
-    p.resource_filename("CPAC", os.path.join("resources", "configs"))
-)
-ALL_PIPELINE_CONFIGS = [
-    x.split("_")[2].replace(".yml", "")
-    for x in ALL_PIPELINE_CONFIGS
-    if "pipeline_config" in x
-]
-ALL_PIPELINE_CONFIGS.sort()
-AVAILABLE_PIPELINE_CONFIGS = [
-    preconfig
-    for preconfig in ALL_PIPELINE_CONFIGS
-    if preconfig not in ["benchmark-ANTS", "monkey-ABCD"]
-    and not preconfig.startswith("regtest-")
-]
-
 __all__ = ["ALL_PIPELINE_CONFIGS", "AVAILABLE_PIPELINE_CONFIGS"]
@@ -1384,6 +1384,7 @@ def run_cwas_group(
     plugin_args,
     z_score,
     inclusion=None,
+    float32=False,
 ):
     """Run a group-level CWAS analysis."""
     import os
@@ -1449,6 +1450,7 @@ def run_cwas_group(
                 name=f"MDMR_{df_scan}",
                 working_dir=working_dir,
                 crash_dir=crash_dir,
+                float32=float32,
             )
             cwas_wf.inputs.inputspec.subjects = func_paths
             cwas_wf.inputs.inputspec.roi = roi_file
@@ -1467,6 +1469,8 @@ def run_cwas(pipeline_config):
 
     import yaml
 
+    from CPAC.pipeline.random_state import set_up_random_state
+
     pipeline_config = os.path.abspath(pipeline_config)
 
     pipeconfig_dct = yaml.safe_load(open(pipeline_config, "r"))
@@ -1491,6 +1495,12 @@ def run_cwas(pipeline_config):
     parallel_nodes = pipeconfig_dct["mdmr"]["parallel_nodes"]
     inclusion = pipeconfig_dct["mdmr"]["inclusion_list"]
     z_score = pipeconfig_dct["mdmr"]["zscore"]
+    float32 = pipeconfig_dct["mdmr"].get("float32", False)
+    seed = pipeconfig_dct["pipeline_setup"]["system_config"].get("random_seed")
+
+    if seed in ("None", "none"):
+        seed = None
+    set_up_random_state(seed)
 
     if not inclusion or "None" in inclusion or "none" in inclusion:
         inclusion = None
@@ -1509,6 +1519,7 @@ def run_cwas(pipeline_config):
         plugin_args,
         z_score,
         inclusion=inclusion,
+        float32=float32,
     )
 
 
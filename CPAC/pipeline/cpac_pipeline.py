@@ -25,6 +25,7 @@ import shutil
 import sys
 import time
 from time import strftime
+from typing import Optional
 
 import yaml
 import nipype
@@ -132,6 +133,7 @@ from CPAC.pipeline import nipype_pipeline_engine as pe
 from CPAC.pipeline.check_outputs import check_outputs
 from CPAC.pipeline.engine import initiate_rpool, NodeBlock
 from CPAC.pipeline.nipype_pipeline_engine.plugins import (
+    GlobalScheduler,
     LegacyMultiProcPlugin,
     MultiProcPlugin,
 )
@@ -199,9 +201,11 @@ from CPAC.utils.docs import version_report
 from CPAC.utils.monitoring import (
     FMLOGGER,
     getLogger,
+    log_nipype_to_thread_file,
     log_nodes_cb,
     log_nodes_initial,
     LOGTAIL,
+    set_callback_logger_name,
     set_up_logger,
     WARNING_FREESURFER_OFF_WITH_DATA,
     WFLOGGER,
@@ -230,6 +234,7 @@ def run_workflow(
     plugin="MultiProc",
     plugin_args=None,
     test_config=False,
+    scheduler: Optional[GlobalScheduler] = None,
 ) -> int:
     """Prepare and, optionally, run the C-PAC workflow.
 
@@ -250,6 +255,10 @@ def run_workflow(
     plugin_args : dictionary (optional);
                   default={'status_callback': log_nodes_cb}
         plugin-specific arguments for the workflow plugin
+    test_config : bool (optional); default=False
+        build the workflow without running it
+    scheduler : GlobalScheduler (optional); default=None
+        run on this scheduler's shared worker pool instead of ``plugin``
 
     Returns
     -------
@@ -285,25 +294,27 @@ def run_workflow(
     if c.pipeline_setup["Debugging"]["verbose"]:
         set_up_logger("CPAC.engine", level="debug", log_dir=log_dir, mock=True)
 
-    config.update_config(
-        {
-            "logging": {
-                "log_directory": log_dir,
-                "log_to_file": bool(
-                    getattr(c.pipeline_setup["log_directory"], "run_logging", True)
-                ),
-            },
-            "execution": {
-                "crashfile_format": "txt",
-                "resource_monitor_frequency": 0.2,
-                "stop_on_first_crash": c[
-                    "pipeline_setup", "system_config", "fail_fast"
-                ],
-            },
-        }
-    )
+    nipype_config = {
+        "logging": {
+            "log_directory": log_dir,
+            "log_to_file": bool(
+                getattr(c.pipeline_setup["log_directory"], "run_logging", True)
+            ),
+        },
+        "execution": {
+            "crashfile_format": "txt",
+            "resource_monitor_frequency": 0.2,
+            "stop_on_first_crash": c["pipeline_setup", "system_config", "fail_fast"],
+        },
+    }
+    config.update_config(nipype_config)
     config.enable_resource_monitor()
-    logging.update_logging(config)
+    if scheduler is None:
+        logging.update_logging(config)
+    elif nipype_config["logging"]["log_to_file"]:
+        # participants share this process under a global scheduler, and
+        # Nipype's file logging is process-wide
+        log_nipype_to_thread_file(log_dir)
 
     # Start timing here
     pipeline_start_time = time.time()
@@ -328,13 +339,30 @@ def run_workflow(
         "pipeline_setup", "system_config", "raise_insufficient"
     ]
     plugin_args["status_callback"] = log_nodes_cb
+    if c["pipeline_setup", "system_config", "job_priority"]:
+        plugin_args["scheduler"] = c["pipeline_setup", "system_config", "job_priority"]
+    if c["pipeline_setup", "system_config", "live_metrics"]:
+        plugin_args["metrics"] = {
+            "participant": subject_id,
+            "path": os.path.join(log_dir, "metrics.json"),
+        }
+    if c["pipeline_setup", "system_config", "observed_usage", "resource_model"]:
+        plugin_args["resource_model"] = {
+            "path": c[
+                "pipeline_setup", "system_config", "observed_usage", "resource_model"
+            ],
+            "buffer": c["pipeline_setup", "system_config", "observed_usage", "buffer"],
+        }
 
     # perhaps in future allow user to set threads maximum
     # this is for centrality mostly
     # import mkl
-    os.environ["OMP_NUM_THREADS"] = str(num_omp_cores)
-    os.environ["MKL_NUM_THREADS"] = "1"  # str(num_cores_per_sub)
-    os.environ["ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS"] = str(num_ants_cores)
+    thread_environ = {
+        "OMP_NUM_THREADS": str(num_omp_cores),
+        "MKL_NUM_THREADS": "1",  # str(num_cores_per_sub)
+        "ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS": str(num_ants_cores),
+    }
+    os.environ.update(thread_environ)
 
     # TODO: TEMPORARY
     # TODO: solve the UNet model hanging issue during MultiProc
@@ -575,8 +603,11 @@ Please, make yourself aware of how it works and its assumptions:
         except IOError:
             pass
 
-        # Add handler to callback log file
-        set_up_logger("callback", cb_log_filename, "debug", log_dir, mock=True)
+        # Add handler to callback log file; participants share a process
+        # under a global scheduler, so each needs its own callback logger
+        callback_logger = "callback" if scheduler is None else f"callback_{subject_id}"
+        set_callback_logger_name(callback_logger)
+        set_up_logger(callback_logger, cb_log_filename, "debug", log_dir, mock=True)
 
         # Log initial information from all the nodes
         log_nodes_initial(workflow)
@@ -591,7 +622,19 @@ Please, make yourself aware of how it works and its assumptions:
                 nipype_version,
             )
 
-        if plugin_args["n_procs"] == 1:
+        if scheduler is not None:
+            # the shared workers started before this participant, so its
+            # Nipype settings and environment go with each of its jobs
+            plugin = scheduler.plugin(
+                subject_id,
+                plugin_args,
+                settings={
+                    "config": nipype_config,
+                    "resource_monitor": config.resource_monitor,
+                    "environ": thread_environ,
+                },
+            )
+        elif plugin_args["n_procs"] == 1:
             plugin = "Linear"
         if not plugin or plugin == "LegacyMultiProc":
             plugin = LegacyMultiProcPlugin(plugin_args)
@@ -801,6 +844,8 @@ CPAC run error:
 """
 
     finally:
+        if scheduler is not None:
+            log_nipype_to_thread_file(None)
         if workflow:
             if os.path.exists(cb_log_filename):
                 resource_report(cb_log_filename, num_cores_per_sub, WFLOGGER)
@@ -1,4 +1,4 @@
-# Copyright (C) 2022-2024  C-PAC Developers
+# Copyright (C) 2022-2026  C-PAC Developers
 
 # This file is part of C-PAC.
 
@@ -30,6 +30,7 @@ from CPAC.utils.configuration import check_pname, Configuration, set_subject
 from CPAC.utils.configuration.yaml_template import upgrade_pipeline_to_1_8
 from CPAC.utils.ga import track_run
 from CPAC.utils.monitoring import failed_to_start, log_nodes_cb, WFLOGGER
+from CPAC.utils.s3 import gather_s3_paths, prefetch_s3
 
 
 # Run condor jobs
@@ -259,6 +260,60 @@ def run_T1w_longitudinal(sublist, cfg):
             )
 
 
+def run_global_scheduler(
+    sublist, c, pipeline_timing_info, p_name, plugin_args, test_config
+) -> int:
+    """Run participants' workflows on one shared worker pool.
+
+    The pool and its memory and CPU budgets are the run's total:
+    ``num_participants_at_once`` times each participant's cores and memory.
+    Each participant starts as soon as that budget has headroom.
+
+    Returns
+    -------
+    int
+        exit code
+    """
+    from functools import partial
+
+    from CPAC.pipeline.cpac_pipeline import run_workflow
+    from CPAC.pipeline.nipype_pipeline_engine.plugins import GlobalScheduler
+    from CPAC.utils.utils import check_config_resources
+
+    sub_mem_gb, num_cores_per_sub, _, _ = check_config_resources(c)
+    participants_at_once = c[
+        "pipeline_setup", "system_config", "num_participants_at_once"
+    ]
+    scheduler = GlobalScheduler(
+        memory_gb=sub_mem_gb * participants_at_once,
+        n_procs=max(int(num_cores_per_sub * participants_at_once), 1),
+    )
+    WFLOGGER.info(
+        "Running %d participants on one pool of %d workers and %0.2f GB",
+        len(sublist),
+        scheduler.ledger.processors,
+        scheduler.ledger.memory_gb,
+    )
+    return scheduler.run_participants(
+        (
+            set_subject(sub, c)[0],
+            partial(
+                run_workflow,
+                sub,
+                c,
+                True,
+                pipeline_timing_info,
+                p_name,
+                None,
+                dict(plugin_args),
+                test_config,
+                scheduler=scheduler,
+            ),
+        )
+        for sub in sublist
+    )
+
+
 def run(
     subject_list_file,
     config_file=None,
@@ -479,6 +534,23 @@ def run(
                     % c.pipeline_setup["working_directory"]["path"]
                 )
                 raise Exception(err)
+
+        if not test_config and c["pipeline_setup", "Amazon-AWS", "prefetch_inputs"]:
+            # download S3 inputs up front, in parallel, to where each
+            # participant's check_for_s3 nodes will find them
+            prefetch_s3(
+                {
+                    **gather_s3_paths(
+                        {
+                            key: value
+                            for key, value in c.dict().items()
+                            if key != "pipeline_setup"
+                        }
+                    ),
+                    **gather_s3_paths(sublist),
+                },
+                os.path.join(c["pipeline_setup", "working_directory", "path"], p_name),
+            )
         """
         if not os.path.exists(c.pipeline_setup['log_directory']['path']):
             try:
@@ -646,6 +718,17 @@ def run(
         """
         # END LONGITUDINAL TEMPLATE PIPELINE
 
+        # Share one worker pool and resource budget among participants
+        if c["pipeline_setup", "system_config", "global_scheduler"]:
+            return run_global_scheduler(
+                sublist,
+                c,
+                pipeline_timing_info,
+                p_name,
+                plugin_args,
+                test_config,
+            )
+
         # If it only allows one, run it linearly
         if c.pipeline_setup["system_config"]["num_participants_at_once"] == 1:
             for sub in sublist:
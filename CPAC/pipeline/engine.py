@@ -16,10 +16,8 @@
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
 import ast
 import copy
-import hashlib
 from importlib.resources import files
-from itertools import chain
-import json
+from itertools import chain, product
 import os
 import re
 from typing import Optional
@@ -39,6 +37,7 @@ from CPAC.image_utils.statistical_transforms import (
 from CPAC.pipeline import nipype_pipeline_engine as pe
 from CPAC.pipeline.check_outputs import ExpectedOutputs
 from CPAC.pipeline.nodeblock import NodeBlockFunction
+from CPAC.pipeline.provenance import sidecar_config
 from CPAC.pipeline.utils import (
     MOVEMENT_FILTER_KEYS,
     name_fork,
@@ -567,12 +566,142 @@ class ResourcePool:
             return flat_prov
         return None
 
+    @staticmethod
+    def _variant_strat(json_info, spread):
+        """Return the variants of a strategy, with ``NO-`` for each it lacks.
+
+        ``spread`` is every variant of the strategy's resource.
+        """
+        variant_strat = set()
+        for val in json_info.get("CpacVariant", {}).values():
+            variant_strat.add(val[0] if isinstance(val, list) else val)
+        for spread_label in spread:
+            if "NO-" in spread_label:
+                continue
+            if spread_label not in variant_strat:
+                variant_strat.add(f"NO-{spread_label}")
+        return variant_strat
+
+    def _combine_strats(self, total_pool, linked_resources, variant_pool):
+        """Combine one strategy of each input, skipping incompatible combinations.
+
+        Returns the same combinations, in the same order, as deduplicating
+        ``itertools.product(*total_pool)`` and then dropping each
+        combination in which linked inputs disagree about a variant they
+        share. Each input's provenances are interned to integer IDs so
+        duplicates are dropped before combining, and each linked input's
+        strategies are indexed by the variants it shares with the inputs
+        it's linked to, so only compatible strategies are combined.
+        """
+        # intern provenances: an input's strategy IDs index its unique provenances
+        inputs = []
+        for sub_pool in total_pool:
+            interned = {}
+            for prov in sub_pool:
+                interned.setdefault(str(prov), prov)
+            inputs.append(list(interned.values()))
+        if not linked_resources:
+            return list(product(*inputs))
+
+        spreads = {
+            label: set(variant_pool[label])
+            for linked in linked_resources
+            for label in linked
+            if label in variant_pool
+        }
+        variant_strats = {}
+
+        def variant_strat(i, strat_id, label):
+            key = (i, strat_id, label)
+            if key not in variant_strats:
+                strat_resource, strat_idx = self.generate_prov_string(
+                    inputs[i][strat_id]
+                )
+                variant_strats[key] = self._variant_strat(
+                    self.get_json(strat_resource, strat=strat_idx), spreads[label]
+                )
+            return variant_strats[key]
+
+        # linked pairs conflict when they disagree about any variant in both
+        # spreads; a variant of ``None`` never conflicts
+        pairs = {}
+        for linked in linked_resources:
+            for xlabel in linked:
+                for ylabel in linked:
+                    if xlabel != ylabel and (ylabel, xlabel) not in pairs:
+                        pairs[(xlabel, ylabel)] = (
+                            spreads[xlabel] & spreads[ylabel]
+                        ) - {None}
+
+        input_resources = [
+            {self.generate_prov_string(prov)[0] for prov in provs} for provs in inputs
+        ]
+        owners = {}
+        for i, resources in enumerate(input_resources):
+            if len(resources) == 1:
+                owners[next(iter(resources))] = i
+        if any(len(resources) != 1 for resources in input_resources) or any(
+            label not in owners for pair in pairs for label in pair
+        ):
+            # inputs aren't one resource each, so check each combination
+            combinations = []
+            for chosen in product(*(range(len(provs)) for provs in inputs)):
+                # later inputs of a resource take precedence
+                strats = {}
+                for i, strat_id in enumerate(chosen):
+                    resource = self.generate_prov_string(inputs[i][strat_id])[0]
+                    strats[resource] = (i, strat_id)
+                if all(
+                    variant_strat(*strats[xlabel], xlabel) & shared
+                    == variant_strat(*strats[ylabel], ylabel) & shared
+                    for (xlabel, ylabel), shared in pairs.items()
+                ):
+                    combinations.append(
+                        tuple(inputs[i][strat_id] for i, strat_id in enumerate(chosen))
+                    )
+            return combinations
+
+        # index each pair's later input's strategies by their shared variants
+        checks = [[] for _ in inputs]
+        for pair, shared in pairs.items():
+            earlier_label, later_label = sorted(pair, key=owners.get)
+            earlier, later = owners[earlier_label], owners[later_label]
+            index = {}
+            for strat_id in range(len(inputs[later])):
+                index.setdefault(
+                    frozenset(variant_strat(later, strat_id, later_label) & shared),
+                    set(),
+                ).add(strat_id)
+            checks[later].append((earlier, earlier_label, shared, index))
+
+        combinations = []
+
+        def combine(chosen):
+            i = len(chosen)
+            if i == len(inputs):
+                combinations.append(
+                    tuple(inputs[j][strat_id] for j, strat_id in enumerate(chosen))
+                )
+                return
+            candidates = range(len(inputs[i]))
+            for earlier, label, shared, index in checks[i]:
+                allowed = index.get(
+                    frozenset(variant_strat(earlier, chosen[earlier], label) & shared),
+                    set(),
+                )
+                candidates = [
+                    strat_id for strat_id in candidates if strat_id in allowed
+                ]
+            for strat_id in candidates:
+                combine([*chosen, strat_id])
+
+        combine([])
+        return combinations
+
     def get_strats(self, resources, debug=False):
         # TODO: NOTE: NOT COMPATIBLE WITH SUB-RPOOL/STRAT_POOLS
         # TODO: (and it doesn't have to be)
 
-        import itertools
-
         linked_resources = []
         resource_list = []
         if debug:
@@ -653,110 +782,19 @@ class ResourcePool:
         # TODO: and the actual resource is encoded in the tag: of the last item, every time!
         # keying the strategies to the resources, inverting it
         if len_inputs > 1:
-            strats = itertools.product(*total_pool)
-
-            # we now currently have "strats", the combined permutations of all the strategies, as a list of tuples, each tuple combining one version of input each, being one of the permutations.
-            # OF ALL THE DIFFERENT INPUTS. and they are tagged by their fetched inputs with {name}:{strat}.
-            # so, each tuple has ONE STRAT FOR EACH INPUT, so if there are three inputs, each tuple will have 3 items.
+            # each combination has ONE STRAT FOR EACH INPUT, so if there are
+            # three inputs, each combination will have 3 items, skipping
+            # duplicates and combinations of incompatible linked inputs
             new_strats = {}
-
-            # get rid of duplicates - TODO: refactor .product
-            strat_str_list = []
-            strat_list_list = []
-            for strat_tuple in strats:
-                strat_list = list(copy.deepcopy(strat_tuple))
-                strat_str = str(strat_list)
-                if strat_str not in strat_str_list:
-                    strat_str_list.append(strat_str)
-                    strat_list_list.append(strat_list)
+            strat_list_list = self._combine_strats(
+                total_pool, linked_resources, variant_pool
+            )
 
             if debug:
                 verbose_logger = getLogger("CPAC.engine")
                 verbose_logger.debug("len(strat_list_list): %s\n", len(strat_list_list))
-            for strat_list in strat_list_list:
-                json_dct = {}
-                for strat in strat_list:
-                    # strat is a prov list for a single resource/input
-                    strat_resource, strat_idx = self.generate_prov_string(strat)
-                    strat_json = self.get_json(strat_resource, strat=strat_idx)
-                    json_dct[strat_resource] = strat_json
-
-                drop = False
-                if linked_resources:
-                    for linked in linked_resources:  # <--- 'linked' is each tuple
-                        if drop:
-                            break
-                        for xlabel in linked:
-                            if drop:
-                                break
-                            xjson = copy.deepcopy(json_dct[xlabel])
-                            for ylabel in linked:
-                                if xlabel == ylabel:
-                                    continue
-                                yjson = copy.deepcopy(json_dct[ylabel])
-
-                                if "CpacVariant" not in xjson:
-                                    xjson["CpacVariant"] = {}
-                                if "CpacVariant" not in yjson:
-                                    yjson["CpacVariant"] = {}
-
-                                current_strat = []
-                                for key, val in xjson["CpacVariant"].items():
-                                    if isinstance(val, list):
-                                        current_strat.append(val[0])
-                                    else:
-                                        current_strat.append(val)
-                                current_spread = list(set(variant_pool[xlabel]))
-                                for spread_label in current_spread:
-                                    if "NO-" in spread_label:
-                                        continue
-                                    if spread_label not in current_strat:
-                                        current_strat.append(f"NO-{spread_label}")
-
-                                other_strat = []
-                                for key, val in yjson["CpacVariant"].items():
-                                    if isinstance(val, list):
-                                        other_strat.append(val[0])
-                                    else:
-                                        other_strat.append(val)
-                                other_spread = list(set(variant_pool[ylabel]))
-                                for spread_label in other_spread:
-                                    if "NO-" in spread_label:
-                                        continue
-                                    if spread_label not in other_strat:
-                                        other_strat.append(f"NO-{spread_label}")
-
-                                for variant in current_spread:
-                                    in_current_strat = False
-                                    in_other_strat = False
-                                    in_other_spread = False
-
-                                    if variant is None:
-                                        in_current_strat = True
-                                        if None in other_spread:
-                                            in_other_strat = True
-                                    if variant in current_strat:
-                                        in_current_strat = True
-                                    if variant in other_strat:
-                                        in_other_strat = True
-                                    if variant in other_spread:
-                                        in_other_spread = True
-
-                                    if not in_other_strat:
-                                        if in_other_spread:
-                                            if in_current_strat:
-                                                drop = True
-                                                break
-
-                                    if in_other_strat:
-                                        if in_other_spread:
-                                            if not in_current_strat:
-                                                drop = True
-                                                break
-                                if drop:
-                                    break
-                if drop:
-                    continue
+            for strat_tuple in strat_list_list:
+                strat_list = list(copy.deepcopy(strat_tuple))
 
                 # make the merged strat label from the multiple inputs
                 # strat_list is actually the merged CpacProvenance lists
@@ -1586,12 +1624,8 @@ class NodeBlock:
                 opts = [None]
             all_opts += opts
 
-        sidecar_additions = {
-            "CpacConfigHash": hashlib.sha1(
-                json.dumps(cfg.dict(), sort_keys=True).encode("utf-8")
-            ).hexdigest(),
-            "CpacConfig": cfg.dict(),
-        }
+        config = sidecar_config(cfg)
+        sidecar_additions = {"CpacConfigHash": config.hash, "CpacConfig": config}
 
         if cfg["pipeline_setup"]["output_directory"].get("user_defined"):
             sidecar_additions["UserDefined"] = cfg["pipeline_setup"][
@@ -2515,6 +2549,8 @@ def ingress_pipeconfig_paths(wf, cfg, rpool, unique_id, creds_path=None):
                         "template",
                         "template_name",
                         "tag",
+                        "cache_dir",
+                        "cache_max_gb",
                     ],
                     output_names=["resampled_template"],
                     function=resolve_resolution,
@@ -2528,6 +2564,13 @@ def ingress_pipeconfig_paths(wf, cfg, rpool, unique_id, creds_path=None):
             resampled_template.inputs.template = val
             resampled_template.inputs.template_name = key
             resampled_template.inputs.tag = tag
+            if cfg["pipeline_setup", "template_cache", "path"]:
+                resampled_template.inputs.cache_dir = cfg[
+                    "pipeline_setup", "template_cache", "path"
+                ]
+                resampled_template.inputs.cache_max_gb = cfg[
+                    "pipeline_setup", "template_cache", "max_size_gb"
+                ]
 
             node = resampled_template
             output = "resampled_template"
@@ -26,7 +26,7 @@
 
 #     Prior to release 0.12, Nipype was licensed under a BSD license.
 
-# Modifications Copyright (C) 2022-2024 C-PAC Developers
+# Modifications Copyright (C) 2022-2026 C-PAC Developers
 
 # This file is part of C-PAC.
 
@@ -59,7 +59,6 @@ from typing import Any, ClassVar, Optional
 from numpy import prod
 from traits.trait_base import Undefined
 from traits.trait_handlers import TraitListObject
-from nibabel import load
 from nipype.interfaces.utility import Function
 from nipype.pipeline import engine as pe
 from nipype.pipeline.engine.utils import (
@@ -75,6 +74,7 @@ from nipype.utils.filemanip import fname_presuffix
 from nipype.utils.functions import getsource
 
 from CPAC.utils.monitoring import getLogger, WFLOGGER
+from CPAC.utils.nifti_utils import image_metadata
 
 # set global default mem_gb
 DEFAULT_MEM_GB = 2.0
@@ -343,10 +343,10 @@ class Node(pe.Node):  # noqa: D101
                     multiplicand, getattr(self, "_mem_x", {}).get("mode")
                 )
             if _check_mem_x_path(multiplicand):
-                return get_data_size(
-                    _grab_first_path(multiplicand),
-                    getattr(self, "_mem_x", {}).get("mode"),
-                )
+                path = _grab_first_path(multiplicand)
+                # recorded in callback logs for learned resource models
+                self.input_data_shape = image_metadata(path).shape
+                return get_data_size(path, getattr(self, "_mem_x", {}).get("mode"))
             return 1
 
         if hasattr(self, "_mem_x"):
@@ -785,7 +785,7 @@ def get_data_size(filepath, mode="xyzt"):
     int or float
     """
     if isinstance(filepath, str):
-        data_shape = load(filepath).shape
+        data_shape = image_metadata(filepath).shape
     elif isinstance(filepath, tuple) and len(filepath) == 4:  # noqa: PLR2004
         data_shape = filepath
     if mode == "t":
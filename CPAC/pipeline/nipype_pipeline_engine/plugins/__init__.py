@@ -1,4 +1,4 @@
-# Copyright (C) 2022 - 2024  C-PAC Developers
+# Copyright (C) 2022 - 2026  C-PAC Developers
 
 # This file is part of C-PAC.
 
@@ -18,6 +18,9 @@
 
 from nipype.pipeline.plugins import *  # noqa: F403
 
+# Share one worker pool among participants
+from .global_scheduler import GlobalMultiProcPlugin, GlobalScheduler  # noqa: F401
+
 # Override LegacyMultiProc
 from .legacymultiproc import LegacyMultiProcPlugin  # noqa: F401
 
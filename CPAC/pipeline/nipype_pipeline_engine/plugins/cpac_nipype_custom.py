@@ -5,6 +5,9 @@
 # CHANGES:
 #     * Supports just-in-time dynamic memory allocation
 #     * Supports overriding memory estimates via a log file and a buffer
+#     * Supports memory estimates and job ordering from a learned resource model
+#     * Supports critical-path job priorities with backfilling
+#     * Supports live scheduler and node metrics
 
 # ORIGINAL WORK'S ATTRIBUTION NOTICE:
 #     Copyright (c) 2009-2016, Nipype developers
@@ -23,7 +26,7 @@
 
 #     Prior to release 0.12, Nipype was licensed under a BSD license.
 
-# Modifications Copyright (C) 2022-2024  C-PAC Developers
+# Modifications Copyright (C) 2022-2026  C-PAC Developers
 
 # This file is part of C-PAC.
 """
@@ -31,9 +34,14 @@ Custom methods for Nipype pipeline plugins.
 
 * _prerun_check method to tell which Nodes use too many resources.
 * _check_resources to account for the main process' memory usage.
+* _reserve and _release hooks for resources shared beyond one plugin.
+* memory estimates and job order from a learned resource model.
+* critical-path job priorities with backfilling.
+* live scheduler and node metrics.
 """
 
 from copy import deepcopy
+from datetime import datetime
 import gc
 import json
 from logging import INFO
@@ -41,7 +49,9 @@ import platform
 import resource
 import sys
 from textwrap import indent
+from time import time
 from traceback import format_exception
+from typing import Optional
 
 from numpy import flatnonzero
 from nipype.pipeline.engine import Node as NipypeNode
@@ -49,6 +59,7 @@ from nipype.pipeline.plugins.multiproc import logger
 
 from CPAC.pipeline.nipype_pipeline_engine import MapNode, UNDEFINED_SIZE
 from CPAC.utils.monitoring import log_nodes_cb
+from .critical_path import Backfill, critical_path_lengths, DEFAULT_RUNTIME_SECONDS
 
 OVERHEAD_MEMORY_ESTIMATE: float = 1  # estimate of C-PAC + Nipype overhead (GB)
 
@@ -98,6 +109,30 @@ def parse_previously_observed_mem_gb(callback_log_path):
         }
 
 
+def parse_previously_observed_runtimes(callback_log_path):
+    """Parse the previously observed runtimes.
+
+    Parameters
+    ----------
+    callback_log_path : str
+        Path to the callback.log file.
+
+    Returns
+    -------
+    dict
+        Dictionary of per-node runtimes (seconds).
+    """
+    with open(callback_log_path, "r") as cbl:
+        return {
+            line["id"].split(".", 1)[-1]: (
+                datetime.fromisoformat(line["finish"])
+                - datetime.fromisoformat(line["start"])
+            ).total_seconds()
+            for line in [json.loads(line) for line in cbl.readlines()]
+            if line.get("start") and line.get("finish")
+        }
+
+
 # pylint: disable=too-few-public-methods, missing-class-docstring
 class CpacNipypeCustomPluginMixin:
     def __init__(self, plugin_args=None):
@@ -112,9 +147,43 @@ class CpacNipypeCustomPluginMixin:
                     plugin_args["runtime"]["usage"]
                 ).items()
             }
+            self._observed_runtimes = parse_previously_observed_runtimes(
+                plugin_args["runtime"]["usage"]
+            )
+        if plugin_args.get("resource_model"):
+            from CPAC.utils.monitoring.resource_model import ResourceModel
+
+            self.resource_model = ResourceModel.load(
+                plugin_args["resource_model"]["path"]
+            )
+            self._resource_model_buffer = (
+                1 + plugin_args["resource_model"].get("buffer", 0) / 100
+            )
+            self._predicted_runtimes = {}
+        self._metrics = None
+        if plugin_args.get("metrics"):
+            from CPAC.utils.monitoring.metrics import NodeMetrics
+
+            self._metrics = NodeMetrics(**plugin_args["metrics"])
         super().__init__(plugin_args=plugin_args)
         self.peak = 0
         self._stats = None
+        self._runtime_estimates = {}
+        self._critical_paths = None
+        self._started = {}
+
+    def run(self, graph, config, updatehash=False):
+        """Run a graph, recording live metrics if configured."""
+        from CPAC.utils.monitoring.metrics import set_node_metrics
+
+        # status callbacks run in this thread
+        set_node_metrics(self._metrics)
+        try:
+            return super().run(graph, config, updatehash=updatehash)
+        finally:
+            if self._metrics is not None:
+                self._metrics.finish()
+            set_node_metrics(None)
 
     def _check_resources_(self, running_tasks):
         """Make sure resources are available."""
@@ -136,12 +205,35 @@ class CpacNipypeCustomPluginMixin:
 
         return free_memory_gb, free_processors
 
+    def _reserve(
+        self, jobid: int, mem_gb: float, n_procs: int, force: bool = False
+    ) -> bool:
+        """Claim resources for a job about to start.
+
+        Resources are only counted within this plugin by default, so the
+        claim always succeeds. Plugins that share resources with others
+        override this to refuse jobs that no longer fit.
+        """
+        return True
+
+    def _release(self, jobid: int) -> None:
+        """Return resources claimed by :py:meth:`_reserve`."""
+
+    def _runs_locally(self, jobid: int, updatehash: bool) -> bool:
+        """Check whether to run this job in the main process instead of a worker."""
+        return updatehash or self.procs[jobid].run_without_submitting
+
     def _clean_exception(self, jobid, graph):
         traceback = format_exception(*sys.exc_info())
         self._clean_queue(jobid, graph, result={"result": None, "traceback": traceback})
 
-    def _override_memory_estimate(self, node: NipypeNode) -> None:
-        """Override node memory estimate with provided runtime memory usage, buffered."""
+    def _override_memory_estimate(self, node: NipypeNode) -> bool:
+        """Override node memory estimate with provided runtime memory usage, buffered.
+
+        Returns
+        -------
+        bool : updated?
+        """
         if hasattr(node, "list_node_names"):
             for _node_id in node.list_node_names():
                 # drop top-level node name
@@ -149,11 +241,110 @@ class CpacNipypeCustomPluginMixin:
         else:
             node_id = node.fullname.split(".", 1)[-1]
         if self._match_for_overrides(node, node_id):
-            return
+            return True
         while "." in node_id:  # iterate through levels of specificity
             node_id = node_id.rsplit(".", 1)[0]
             if self._match_for_overrides(node, node_id):
-                return
+                return True
+        return False
+
+    def _predict(self, node: NipypeNode):
+        """Predict a node's memory and runtime from the learned resource model.
+
+        Returns
+        -------
+        Prediction or None
+            ``None`` without a prediction, including for nodes whose memory
+            scales with inputs of unknown size
+        """
+        from CPAC.utils.monitoring.resource_model import node_input_shape
+
+        shape = node_input_shape(node)
+        if shape is None and getattr(node, "mem_x", None):
+            return None
+        return self.resource_model.predict(node.fullname, shape, node.n_procs)
+
+    def _predict_memory_estimate(self, node: NipypeNode) -> bool:
+        """Override node memory estimate with the learned model's, buffered.
+
+        Returns
+        -------
+        bool : updated?
+        """
+        prediction = self._predict(node)
+        if prediction is None:
+            return False
+        node.override_mem_gb(prediction.memory_gb * self._resource_model_buffer)
+        return True
+
+    def _predicted_runtime(self, jobid: int) -> float:
+        """Return a job's predicted runtime in seconds (0 if unknown)."""
+        if jobid not in self._predicted_runtimes:
+            prediction = self._predict(self.procs[jobid])
+            self._predicted_runtimes[jobid] = (
+                0.0 if prediction is None else prediction.runtime_seconds
+            )
+        return self._predicted_runtimes[jobid]
+
+    def _runtime_estimate(self, jobid: int) -> float:
+        """Return a job's runtime (s) from observations, a model or its threads."""
+        if jobid not in self._runtime_estimates:
+            node = self.procs[jobid]
+            estimate = getattr(self, "_observed_runtimes", {}).get(
+                node.fullname.split(".", 1)[-1]
+            )
+            if estimate is None and hasattr(self, "resource_model"):
+                estimate = self._predicted_runtime(jobid) or None
+            if estimate is None:
+                # multithreaded nodes (e.g., ANTs registration) are the long ones
+                estimate = DEFAULT_RUNTIME_SECONDS * max(node.n_procs, 1)
+            self._runtime_estimates[jobid] = estimate
+        return self._runtime_estimates[jobid]
+
+    def _critical_path(self, jobid: int) -> float:
+        """Return a job's runtime plus its longest chain of dependents' runtimes."""
+        if self._critical_paths is None or len(self._critical_paths) != len(self.procs):
+            # first use, or MapNodes have been expanded
+            self._critical_paths = critical_path_lengths(
+                self.depidx,
+                [self._runtime_estimate(job) for job in range(len(self.procs))],
+            )
+        return self._critical_paths[jobid]
+
+    def _backfill(self) -> Optional[Backfill]:
+        """Return this round's backfilling state for the critical-path scheduler."""
+        if self.plugin_args.get("scheduler") != "critical_path":
+            return None
+        now = time()
+        return Backfill(
+            now,
+            [
+                (
+                    self._started.get(jobid, now) + self._runtime_estimate(jobid),
+                    self.procs[jobid].mem_gb,
+                    self.procs[jobid].n_procs,
+                )
+                for _, jobid in self.pending_tasks
+            ],
+        )
+
+    def _sort_jobs(self, jobids, scheduler="tsort"):
+        """Sort ready jobs.
+
+        Beyond Nipype's schedulers:
+
+        "runtime" (the default when a resource model is loaded)
+            longest predicted runtime first, so long jobs don't end up alone
+            at the end of a run
+
+        "critical_path"
+            longest estimated chain of remaining runtime first
+        """
+        if scheduler == "critical_path":
+            return sorted(jobids, key=self._critical_path, reverse=True)
+        if hasattr(self, "resource_model") and scheduler in {None, "runtime"}:
+            return sorted(jobids, key=self._predicted_runtime, reverse=True)
+        return super()._sort_jobs(jobids, scheduler=scheduler or "tsort")
 
     def _match_for_overrides(self, node, node_id):
         """Match node memory estimate with provided runtime memory usage key.
@@ -186,9 +377,14 @@ class CpacNipypeCustomPluginMixin:
         overrun_message_mem = None
         overrun_message_th = None
         for node in graph.nodes():
-            if hasattr(self, "runtime"):
-                self._override_memory_estimate(node)
-            elif hasattr(node, "throttle"):
+            overridden = hasattr(self, "runtime") and self._override_memory_estimate(
+                node
+            )
+            if not overridden and hasattr(self, "resource_model"):
+                overridden = self._predict_memory_estimate(node)
+            if not (overridden or hasattr(self, "runtime")) and hasattr(
+                node, "throttle"
+            ):
                 # for a throttled node without an observation run,
                 # assume all available memory will be needed
                 node._mem_gb = self.memory_gb - OVERHEAD_MEMORY_ESTIMATE
@@ -291,6 +487,23 @@ class CpacNipypeCustomPluginMixin:
                 tasks_list_msg,
             )
             self._stats = stats
+        if self._metrics is not None:
+            self._metrics.update_scheduler(
+                ready_jobs=num_ready,
+                running_jobs=num_pending,
+                free_memory_gb=free_memory_gb,
+                reserved_memory_gb=sum(
+                    self.procs[jobid].mem_gb for _, jobid in self.pending_tasks
+                ),
+                overhead_memory_gb=self.peak,
+                total_memory_gb=self.memory_gb,
+                free_processors=free_processors,
+                reserved_processors=sum(
+                    self.procs[jobid].n_procs for _, jobid in self.pending_tasks
+                ),
+                total_processors=self.processors,
+            )
+            self._metrics.write()
 
         if self.raise_insufficient:
             if free_memory_gb < self.peak or free_processors == 0:
@@ -305,6 +518,7 @@ class CpacNipypeCustomPluginMixin:
                 return
 
         jobids = self._sort_jobs(jobids, scheduler=self.plugin_args.get("scheduler"))
+        backfill = self._backfill()
 
         # Run garbage collector before potentially submitting jobs
         gc.collect()
@@ -343,10 +557,42 @@ class CpacNipypeCustomPluginMixin:
                     next_job_gb,
                     next_job_th,
                 )
+                if backfill is not None:
+                    backfill.hold(
+                        next_job_gb, next_job_th, free_memory_gb, free_processors
+                    )
+                continue
+            if (
+                backfill is not None
+                and not force_allocate_job
+                and not backfill.allows(
+                    self._runtime_estimate(jobid), next_job_gb, next_job_th
+                )
+            ):
+                logger.debug(
+                    "Not backfilling job %s ID=%d (%0.2fGB, %d threads) ahead of "
+                    "a higher-priority job.",
+                    self.procs[jobid].fullname,
+                    jobid,
+                    next_job_gb,
+                    next_job_th,
+                )
+                continue
+            if not self._reserve(jobid, next_job_gb, next_job_th, force_allocate_job):
+                logger.debug(
+                    "Deferring job %s ID=%d (%0.2fGB, %d threads).",
+                    self.procs[jobid].fullname,
+                    jobid,
+                    next_job_gb,
+                    next_job_th,
+                )
                 continue
 
             free_memory_gb -= next_job_gb
             free_processors -= next_job_th
+            self._started[jobid] = time()
+            if backfill is not None:
+                backfill.start(self._runtime_estimate(jobid), next_job_gb, next_job_th)
             logger.debug(
                 "Allocating %s ID=%d (%0.2fGB, %d threads). Free: "
                 "%0.2fGB, %d threads.",
@@ -367,7 +613,7 @@ class CpacNipypeCustomPluginMixin:
                 continue
 
             # updatehash and run_without_submitting are also run locally
-            if updatehash or self.procs[jobid].run_without_submitting:
+            if self._runs_locally(jobid, updatehash):
                 logger.debug("Running node %s on master thread", self.procs[jobid])
                 try:
                     self.procs[jobid].run(updatehash=updatehash)
@@ -392,6 +638,7 @@ class CpacNipypeCustomPluginMixin:
                 self._status_callback(self.procs[jobid], "start")
             tid = self._submit_job(deepcopy(self.procs[jobid]), updatehash=updatehash)
             if tid is None:
+                self._release(jobid)
                 self.proc_done[jobid] = False
                 self.proc_pending[jobid] = False
             else:
@@ -0,0 +1,151 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Critical-path job priorities and backfilling for the MultiProc plugins.
+
+With the ``critical_path`` scheduler, ready jobs start in order of the longest
+chain of runtime that each one holds up (itself plus its slowest chain of
+dependents), so long chains like registration → warps → derivatives start
+early instead of setting a participant's wall time at the end of the run.
+
+The first ready job that doesn't fit holds the resources it's waiting for
+(`EASY backfilling <https://doi.org/10.1109/71.932708>`_): lower-priority
+jobs still start in the meantime, but only if they're predicted to finish
+before it could start anyway, or fit in what it will leave free.
+"""
+
+from math import inf
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from scipy.sparse import csr_matrix, spmatrix
+
+DEFAULT_RUNTIME_SECONDS: float = 60
+"""runtime assumed per thread a node requests, without an observation"""
+
+
+def critical_path_lengths(
+    dependencies: spmatrix, runtimes: Sequence[float]
+) -> np.ndarray:
+    """Return each job's runtime plus its longest chain of dependents' runtimes.
+
+    Parameters
+    ----------
+    dependencies : sparse matrix
+        nonzero at ``[i, j]`` if job ``j`` depends on job ``i`` (like
+        ``DistributedPluginBase.depidx``)
+
+    runtimes : sequence of float
+        each job's (estimated) runtime
+
+    Examples
+    --------
+    >>> # 0 → 1 → 3 and 0 → 2
+    >>> dependencies = csr_matrix(([1, 1, 1], ([0, 1, 0], [1, 3, 2])), shape=(4, 4))
+    >>> critical_path_lengths(dependencies, [1, 5, 2, 1]).tolist()
+    [7.0, 6.0, 2.0, 1.0]
+    """
+    dependencies = csr_matrix(dependencies)
+    dependencies.eliminate_zeros()
+    indptr, indices = dependencies.indptr, dependencies.indices
+    lengths = np.full(len(runtimes), np.nan)
+    for root in range(len(runtimes)):
+        stack = [root]
+        while stack:
+            job = stack[-1]
+            if not np.isnan(lengths[job]):
+                stack.pop()
+                continue
+            dependents = indices[indptr[job] : indptr[job + 1]]
+            unvisited = dependents[np.isnan(lengths[dependents])]
+            if unvisited.size:
+                stack.extend(unvisited.tolist())
+                continue
+            stack.pop()
+            lengths[job] = runtimes[job] + (
+                lengths[dependents].max() if dependents.size else 0
+            )
+    return lengths
+
+
+class Backfill:
+    """Resources held for the first ready job that doesn't fit.
+
+    Parameters
+    ----------
+    now : float
+        current time (s)
+
+    running : iterable of 3-tuples
+        ``(predicted finish time, memory GB, threads)`` of running jobs
+
+    Examples
+    --------
+    >>> backfill = Backfill(now=0, running=[(100, 4, 2), (10, 2, 1)])
+    >>> backfill.allows(runtime_seconds=500, mem_gb=1, n_procs=1)
+    True
+    >>> backfill.hold(mem_gb=6, n_procs=3, free_memory_gb=1, free_processors=0)
+    >>> backfill.shadow_time, backfill.extra
+    (100, (1, 0))
+    >>> backfill.allows(runtime_seconds=50, mem_gb=1, n_procs=1)
+    True
+    >>> backfill.allows(runtime_seconds=500, mem_gb=1, n_procs=1)
+    False
+    >>> backfill.allows(runtime_seconds=500, mem_gb=1, n_procs=0)
+    True
+    >>> backfill.extra
+    (0, 0)
+    """
+
+    def __init__(self, now: float, running: Iterable[tuple[float, float, int]]):
+        self.now = now
+        self.running = list(running)
+        self.shadow_time: Optional[float] = None
+        """when the held job is predicted to fit"""
+        self.extra: tuple[float, int] = (0, 0)
+        """memory and threads the held job will leave free at ``shadow_time``"""
+
+    def hold(
+        self,
+        mem_gb: float,
+        n_procs: int,
+        free_memory_gb: float,
+        free_processors: int,
+    ) -> None:
+        """Hold resources for a job that doesn't fit, unless already holding."""
+        if self.shadow_time is not None:
+            return
+        self.shadow_time = inf
+        free = (free_memory_gb, free_processors)
+        for finish, job_gb, job_procs in sorted(self.running):
+            free = (free[0] + job_gb, free[1] + job_procs)
+            if free[0] >= mem_gb and free[1] >= n_procs:
+                self.shadow_time = max(finish, self.now)
+                self.extra = (free[0] - mem_gb, free[1] - n_procs)
+                return
+
+    def allows(self, runtime_seconds: float, mem_gb: float, n_procs: int) -> bool:
+        """Check whether a job that fits now may start without delaying a held job."""
+        if self.shadow_time is None or self.now + runtime_seconds <= self.shadow_time:
+            return True
+        if mem_gb <= self.extra[0] and n_procs <= self.extra[1]:
+            self.extra = (self.extra[0] - mem_gb, self.extra[1] - n_procs)
+            return True
+        return False
+
+    def start(self, runtime_seconds: float, mem_gb: float, n_procs: int) -> None:
+        """Count a job started this round as running."""
+        self.running.append((self.now + runtime_seconds, mem_gb, n_procs))
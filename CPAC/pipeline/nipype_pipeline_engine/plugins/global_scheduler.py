@@ -0,0 +1,458 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Schedule nodes from many participants' workflows on one shared worker pool.
+
+Each participant's workflow runs in a thread of the main process with its own
+:py:class:`GlobalMultiProcPlugin`. Those plugins submit to one
+:py:class:`~concurrent.futures.ProcessPoolExecutor` and claim memory and CPUs
+from one :py:class:`ResourceLedger`, so cores left idle by one participant
+(e.g., during a serial ANTs stage) are used by the others.
+
+Nipype's config and file logging are process-wide, so each participant's
+settings travel with its jobs and are applied in the worker that runs them
+(:py:func:`run_participant_node`), and its thread in the main process logs
+to its own ``pypeline.log``
+(:py:func:`~CPAC.utils.monitoring.custom_logging.log_nipype_to_thread_file`).
+
+If a worker dies (e.g., killed for running out of memory), the jobs in the
+pool at the time fail, and the scheduler replaces the pool for later jobs.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import multiprocessing as mp
+import os
+import threading
+from time import sleep
+from traceback import format_exception
+from typing import Callable, Iterable, Optional
+
+from numpy import flatnonzero
+from nipype import config as nipype_config, logging as nipype_logging
+from nipype.pipeline.plugins.multiproc import logger, process_initializer, run_node
+
+from .cpac_nipype_custom import OVERHEAD_MEMORY_ESTIMATE
+from .multiproc import MultiProcPlugin
+
+_WORKER_SETTINGS: dict = {}
+"""participant settings last applied in this worker process"""
+
+
+def apply_participant_settings(settings: dict) -> None:
+    """Apply a participant's Nipype settings to this process.
+
+    Parameters
+    ----------
+    settings : dict
+        ``config``: sections for :py:meth:`nipype.utils.config.NipypeConfig.update_config`,
+        including the participant's log directory;
+        ``resource_monitor``: whether to monitor nodes' resources;
+        ``environ``: environment variables (e.g., thread counts)
+    """
+    if _WORKER_SETTINGS.get("settings") == settings:
+        return
+    os.environ.update(settings.get("environ", {}))
+    nipype_config.update_config(settings.get("config", {}))
+    if settings.get("resource_monitor"):
+        nipype_config.enable_resource_monitor()
+    else:
+        nipype_config.disable_resource_monitor()
+    nipype_logging.update_logging(nipype_config)
+    _WORKER_SETTINGS["settings"] = settings
+
+
+def run_participant_node(settings: dict, node, updatehash: bool, taskid: int) -> dict:
+    """Run a node in a worker with its participant's Nipype settings.
+
+    A worker runs one job at a time, so process-wide settings are the
+    participant's for the whole job.
+    """
+    apply_participant_settings(settings)
+    return run_node(node, updatehash, taskid)
+
+
+class ResourceLedger:
+    """Thread-safe memory and CPU budget shared by participants.
+
+    Participants are *preparing* from :py:meth:`start` until their workflow
+    starts running (:py:meth:`run`), and *waiting* while they have ready jobs
+    that haven't started.
+
+    Fairness is by CPUs: a participant at or over its share
+    (``processors`` / running participants) can't claim more while another
+    participant below its share is waiting.
+
+    Examples
+    --------
+    >>> ledger = ResourceLedger(memory_gb=8, processors=4)
+    >>> for participant in "AB":
+    ...     ledger.start(participant)
+    ...     ledger.run(participant)
+    >>> ledger.try_reserve("A", 0, 1, 2)
+    True
+    >>> ledger.set_waiting("B", True)
+    >>> ledger.try_reserve("A", 1, 1, 1)
+    False
+    >>> ledger.try_reserve("B", 0, 1, 2)
+    True
+    >>> ledger.free()
+    (6.0, 0)
+    >>> ledger.release("A", 0)
+    >>> ledger.free()
+    (7.0, 2)
+    """
+
+    def __init__(self, memory_gb: float, processors: int) -> None:
+        self.memory_gb = float(memory_gb)
+        self.processors = int(processors)
+        self._lock = threading.Lock()
+        self._reserved: dict[str, dict[int, tuple[float, int]]] = {}
+        self._preparing: set[str] = set()
+        self._running: set[str] = set()
+        self._waiting: set[str] = set()
+
+    def _usage(self, participant: str) -> tuple[float, int]:
+        jobs = self._reserved.get(participant, {}).values()
+        return sum(job[0] for job in jobs), sum(job[1] for job in jobs)
+
+    def _free(self) -> tuple[float, int]:
+        usage = [self._usage(participant) for participant in self._reserved]
+        return (
+            self.memory_gb - sum(mem_gb for mem_gb, _ in usage),
+            self.processors - sum(n_procs for _, n_procs in usage),
+        )
+
+    def free(self) -> tuple[float, int]:
+        """Return unclaimed memory (GB) and CPUs."""
+        with self._lock:
+            return self._free()
+
+    def usage(self, participant: str) -> tuple[float, int]:
+        """Return the memory (GB) and CPUs claimed by one participant."""
+        with self._lock:
+            return self._usage(participant)
+
+    def start(self, participant: str) -> None:
+        """Admit a participant whose workflow is being prepared."""
+        with self._lock:
+            self._preparing.add(participant)
+
+    def run(self, participant: str) -> None:
+        """Mark a participant's workflow as running."""
+        with self._lock:
+            self._preparing.discard(participant)
+            self._running.add(participant)
+            self._reserved.setdefault(participant, {})
+
+    def finish(self, participant: str) -> None:
+        """Drop a participant and release anything it still holds."""
+        with self._lock:
+            for group in (self._preparing, self._running, self._waiting):
+                group.discard(participant)
+            self._reserved.pop(participant, None)
+
+    def set_waiting(self, participant: str, waiting: bool) -> None:
+        """Record whether a participant has ready jobs that haven't started."""
+        with self._lock:
+            if waiting:
+                self._waiting.add(participant)
+            else:
+                self._waiting.discard(participant)
+
+    def try_reserve(
+        self,
+        participant: str,
+        jobid: int,
+        mem_gb: float,
+        n_procs: int,
+        force: bool = False,
+    ) -> bool:
+        """Claim resources for a job if they're free and the claim is fair."""
+        with self._lock:
+            if not force:
+                free_memory_gb, free_processors = self._free()
+                if mem_gb > free_memory_gb or n_procs > free_processors:
+                    return False
+                share = self.processors / max(len(self._running | {participant}), 1)
+                if self._usage(participant)[1] >= share and any(
+                    self._usage(other)[1] < share
+                    for other in self._waiting - {participant}
+                ):
+                    return False
+            self._reserved.setdefault(participant, {})[jobid] = (mem_gb, n_procs)
+            return True
+
+    def release(self, participant: str, jobid: int) -> None:
+        """Release a job's claim."""
+        with self._lock:
+            self._reserved.get(participant, {}).pop(jobid, None)
+
+    def has_headroom(self, min_memory_gb: float = OVERHEAD_MEMORY_ESTIMATE) -> bool:
+        """Check whether another participant can start.
+
+        That is, whether every admitted participant is running, none is
+        waiting on resources, and at least a CPU and ``min_memory_gb`` are
+        free.
+        """
+        with self._lock:
+            free_memory_gb, free_processors = self._free()
+            return (
+                not (self._preparing or self._waiting)
+                and free_processors >= 1
+                and free_memory_gb >= min_memory_gb
+            )
+
+
+class GlobalMultiProcPlugin(MultiProcPlugin):
+    """MultiProc plugin for one participant in a :py:class:`GlobalScheduler`.
+
+    Jobs go to the scheduler's shared worker pool, and free resources are
+    whatever the scheduler's :py:class:`ResourceLedger` hasn't given to any
+    participant. Jobs always run in workers, since the main process's working
+    directory is shared by every participant's thread. Jobs carry
+    ``settings`` (see :py:func:`apply_participant_settings`), if given.
+
+    A job whose worker dies is recorded as a failed node, so the participant
+    carries on without it rather than waiting on it forever.
+    """
+
+    def __init__(
+        self,
+        plugin_args: Optional[dict],
+        scheduler: "GlobalScheduler",
+        participant: str,
+        settings: Optional[dict] = None,
+    ) -> None:
+        self._scheduler = scheduler
+        self._participant = participant
+        self._settings = settings
+        super().__init__(
+            plugin_args={
+                **(plugin_args or {}),
+                "memory_gb": scheduler.ledger.memory_gb,
+                "n_procs": scheduler.ledger.processors,
+            }
+        )
+
+    @property
+    def ledger(self) -> ResourceLedger:
+        """The scheduler's shared resource ledger."""
+        return self._scheduler.ledger
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """The scheduler's shared worker pool."""
+        return self._scheduler.pool
+
+    @pool.setter
+    def pool(self, pool: ProcessPoolExecutor) -> None:
+        # no workers have started in the per-plugin pool MultiProcPlugin makes
+        pool.shutdown(wait=False)
+
+    def run(self, graph, config, updatehash=False):
+        """Run this participant's graph on the shared pool."""
+        self.ledger.run(self._participant)
+        return super().run(graph, config, updatehash=updatehash)
+
+    def _check_resources_(self, running_tasks):
+        """Return resources no participant has claimed."""
+        return self.ledger.free()
+
+    def _reserve(self, jobid, mem_gb, n_procs, force=False):
+        return self.ledger.try_reserve(self._participant, jobid, mem_gb, n_procs, force)
+
+    def _release(self, jobid):
+        self.ledger.release(self._participant, jobid)
+
+    def _runs_locally(self, jobid, updatehash):
+        return False
+
+    def _async_callback(self, args: Future, taskid: Optional[int] = None) -> None:
+        """Record a job's result, or a failure if its worker died."""
+        try:
+            result = args.result()
+        except Exception as exception:  # pylint: disable=broad-except
+            # e.g., BrokenProcessPool; run_node catches the node's own errors
+            result = {
+                "result": None,
+                "traceback": format_exception(
+                    type(exception), exception, exception.__traceback__
+                ),
+                "taskid": taskid,
+            }
+        self._taskresult[result["taskid"]] = result
+
+    def _submit_job(self, node, updatehash=False):
+        """Submit a job to the shared pool with this participant's settings."""
+        self._taskid += 1
+        # Don't allow streaming outputs
+        if getattr(node.interface, "terminal_output", "") == "stream":
+            node.interface.terminal_output = "allatonce"
+        if self._settings is None:
+            job = (run_node, node, updatehash, self._taskid)
+        else:
+            job = (run_participant_node, self._settings, node, updatehash, self._taskid)
+        result_future = self._scheduler.submit(*job)
+        result_future.add_done_callback(
+            partial(self._async_callback, taskid=self._taskid)
+        )
+        self._task_obj[self._taskid] = result_future
+        logger.debug(
+            "[GlobalMultiProc] Submitted task %s (taskid=%d).",
+            node.fullname,
+            self._taskid,
+        )
+        return self._taskid
+
+    def _send_procs_to_workers(self, updatehash=False, graph=None):
+        super()._send_procs_to_workers(updatehash=updatehash, graph=graph)
+        ready = flatnonzero(
+            ~self.proc_done & (self.depidx.sum(axis=0) == 0).__array__()
+        )
+        self.ledger.set_waiting(self._participant, len(ready) > 0)
+
+    def _task_finished_cb(self, jobid, *args, **kwargs):
+        self._release(jobid)
+        return super()._task_finished_cb(jobid, *args, **kwargs)
+
+    def _clean_queue(self, jobid, graph, result=None):
+        self._release(jobid)
+        return super()._clean_queue(jobid, graph, result=result)
+
+    def _postrun_check(self):
+        """Leave the shared pool running for other participants."""
+        self.ledger.set_waiting(self._participant, False)
+
+
+class GlobalScheduler:
+    """One worker pool and resource budget for all participants in a run.
+
+    Parameters
+    ----------
+    memory_gb : float
+        memory budget shared by all participants
+
+    n_procs : int
+        worker processes, and the CPU budget shared by all participants
+
+    mp_context : str, optional
+        name of the multiprocessing context for the worker pool
+    """
+
+    def __init__(
+        self, memory_gb: float, n_procs: int, mp_context: Optional[str] = None
+    ) -> None:
+        self.ledger = ResourceLedger(memory_gb, n_procs)
+        self._cwd = os.getcwd()
+        self._mp_context = mp_context
+        self._pool_lock = threading.Lock()
+        self.pool = self._start_pool()
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        """Start a worker pool."""
+        pool = ProcessPoolExecutor(
+            max_workers=self.ledger.processors,
+            initializer=process_initializer,
+            initargs=(self._cwd,),
+            mp_context=mp.get_context(self._mp_context),
+        )
+        # Start the workers now: forked workers all start at the first
+        # submission, and forking while participants' threads hold locks
+        # (e.g., logging's) can deadlock the workers.
+        pool.submit(os.getpid).result()
+        return pool
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Submit a job to the shared pool, replacing the pool if it's broken."""
+        pool = self.pool
+        try:
+            return pool.submit(fn, *args)
+        except BrokenProcessPool:
+            with self._pool_lock:
+                # another participant may have replaced it already
+                if self.pool is pool:
+                    logger.warning(
+                        "[GlobalMultiProc] A worker died; starting a new worker pool."
+                    )
+                    pool.shutdown(wait=False)
+                    self.pool = self._start_pool()
+            return self.submit(fn, *args)
+
+    def plugin(
+        self,
+        participant: str,
+        plugin_args: Optional[dict] = None,
+        settings: Optional[dict] = None,
+    ) -> GlobalMultiProcPlugin:
+        """Return a plugin to run one participant's workflow with.
+
+        ``settings`` are applied in workers before each of the participant's
+        jobs (see :py:func:`apply_participant_settings`).
+        """
+        return GlobalMultiProcPlugin(plugin_args, self, participant, settings)
+
+    def run_participants(
+        self,
+        participants: Iterable[tuple[str, Callable[[], int]]],
+        poll_sleep_secs: float = 2.0,
+    ) -> int:
+        """Run participants, starting each as soon as there is headroom.
+
+        Parameters
+        ----------
+        participants : iterable of 2-tuples
+            ``(participant, run)``, where ``run`` builds and runs the
+            participant's workflow with :py:meth:`plugin` and returns an exit
+            code
+
+        poll_sleep_secs : float
+            how often to check for headroom
+
+        Returns
+        -------
+        int
+            1 if any participant failed, else 0
+        """
+        exitcodes: list[int] = []
+        threads: list[threading.Thread] = []
+
+        def _run(participant: str, run: Callable[[], int]) -> None:
+            try:
+                exitcodes.append(run())
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Participant %s failed", participant)
+                exitcodes.append(1)
+            finally:
+                self.ledger.finish(participant)
+
+        try:
+            for participant, run in participants:
+                while threads and not self.ledger.has_headroom():
+                    sleep(poll_sleep_secs)
+                logger.info("[GlobalMultiProc] Starting participant %s", participant)
+                self.ledger.start(participant)
+                thread = threading.Thread(
+                    target=_run, args=(participant, run), name=participant
+                )
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        finally:
+            self.pool.shutdown()
+        return int(any(exitcodes))
@@ -0,0 +1,121 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Pipeline configurations shared by the JSON sidecars that record them.
+
+Every output's sidecar records the pipeline configuration (``CpacConfig``)
+and its hash (``CpacConfigHash``). Rather than copying the configuration
+into each sidecar in the graph, sidecars hold one shared
+:py:class:`SidecarConfig` per pipeline, which deep copies of sidecars keep
+sharing and pickling stores once per graph. It's expanded to JSON only when
+a sidecar is written (:py:func:`expand_sidecar`).
+
+The configuration can change while the graph is built (e.g., atlases are
+gathered into it), so it's hashed each time it's recorded, and sidecars
+share one :py:class:`SidecarConfig` per distinct configuration.
+"""
+
+from copy import deepcopy
+import hashlib
+import json
+from typing import Any, Optional
+from weakref import WeakValueDictionary
+
+_SIDECAR_CONFIGS: WeakValueDictionary = WeakValueDictionary()
+"""{configuration hash: shared configuration}"""
+
+
+def _config_hash(config: dict) -> str:
+    """Hash a configuration as ``CpacConfigHash``."""
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SidecarConfig:
+    """A snapshot of a pipeline configuration and its hash.
+
+    Examples
+    --------
+    >>> config = SidecarConfig({"pipeline_setup": {"pipeline_name": "test"}})
+    >>> config.hash
+    'd767193d448dea89e5bdef7817a7e1912555431a'
+    >>> deepcopy({"CpacConfig": config})["CpacConfig"] is config
+    True
+    >>> json.dumps({"CpacConfig": config}, default=expand_sidecar)
+    '{"CpacConfig": {"pipeline_setup": {"pipeline_name": "test"}}}'
+    """
+
+    __slots__ = ("__weakref__", "_config", "hash")
+
+    def __init__(self, config: dict, config_hash: Optional[str] = None) -> None:
+        self._config = deepcopy(config)
+        self.hash = config_hash or _config_hash(self._config)
+
+    def to_dict(self) -> dict:
+        """Return a copy of the configuration for a sidecar."""
+        return deepcopy(self._config)
+
+    def __copy__(self) -> "SidecarConfig":
+        """Share this configuration."""
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "SidecarConfig":
+        """Share this configuration."""
+        return self
+
+    def __eq__(self, other: object) -> bool:
+        """Compare configurations by hash."""
+        if isinstance(other, SidecarConfig):
+            return self.hash == other.hash
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        """Hash by configuration hash."""
+        return hash(self.hash)
+
+    def __repr__(self) -> str:
+        """Represent by hash, stable across processes for Nipype's input hashes."""
+        return f"SidecarConfig({self.hash!r})"
+
+    def __getstate__(self) -> tuple[dict, str]:
+        """Pickle the configuration and its hash."""
+        return self._config, self.hash
+
+    def __setstate__(self, state: tuple[dict, str]) -> None:
+        """Unpickle the configuration and its hash."""
+        self._config, self.hash = state
+
+
+def sidecar_config(cfg) -> SidecarConfig:
+    """Return the shared sidecar record of a pipeline configuration as it is now.
+
+    The configuration is hashed on every call and copied only the first time
+    each distinct configuration is recorded.
+    """
+    config = cfg.dict()
+    config_hash = _config_hash(config)
+    shared = _SIDECAR_CONFIGS.get(config_hash)
+    if shared is None:
+        shared = SidecarConfig(config, config_hash)
+        _SIDECAR_CONFIGS[config_hash] = shared
+    return shared
+
+
+def expand_sidecar(value: Any) -> Any:
+    """Expand a shared configuration for :py:func:`json.dumps`."""
+    if isinstance(value, SidecarConfig):
+        return value.to_dict()
+    msg = f"Object of type {type(value).__name__} is not JSON serializable"
+    raise TypeError(msg)
@@ -443,6 +443,10 @@ latest_schema = Schema(
                 "path": str,
                 "remove_working_dir": bool1_1,
             },
+            "template_cache": {
+                "path": Maybe(str),
+                "max_size_gb": Number,
+            },
             "log_directory": {
                 "run_logging": bool1_1,
                 "path": str,
@@ -481,6 +485,11 @@ latest_schema = Schema(
             "system_config": {
                 "fail_fast": bool1_1,
                 "FSLDIR": Maybe(str),
+                "global_scheduler": bool1_1,
+                "job_priority": Maybe(
+                    In({"critical_path", "mem_thread", "runtime", "tsort"})
+                ),
+                "live_metrics": bool1_1,
                 "on_grid": {
                     "run": bool1_1,
                     "resource_manager": Maybe(str),
@@ -500,12 +509,14 @@ latest_schema = Schema(
                 ),
                 "observed_usage": {
                     "callback_log": Maybe(str),
+                    "resource_model": Maybe(str),
                     "buffer": Number,
                 },
             },
             "Amazon-AWS": {
                 "aws_output_bucket_credentials": Maybe(str),
                 "s3_encryption": bool1_1,
+                "prefetch_inputs": bool1_1,
             },
             "Debugging": {
                 "verbose": bool1_1,
@@ -0,0 +1,238 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests and a synthetic-DAG benchmark for critical-path job priorities."""
+
+from itertools import pairwise
+from typing import NamedTuple
+
+import networkx as nx
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from CPAC.pipeline.nipype_pipeline_engine import Node, Workflow
+from CPAC.pipeline.nipype_pipeline_engine.plugins import MultiProcPlugin
+from CPAC.pipeline.nipype_pipeline_engine.plugins.critical_path import (
+    Backfill,
+    critical_path_lengths,
+)
+from CPAC.utils.interfaces.function import Function
+
+MEMORY_GB = 16
+PROCESSORS = 8
+
+
+class Job(NamedTuple):
+    """A synthetic job."""
+
+    runtime: float
+    mem_gb: float
+    n_procs: int
+
+
+def _simulate(
+    jobs: list[Job],
+    edges: list[tuple[int, int]],
+    scheduler: str,
+    estimates: list[float],
+) -> float:
+    """Return the makespan of a DAG scheduled like ``_send_procs_to_workers``.
+
+    Jobs are ordered and backfilled by their ``estimates`` and run for their
+    actual ``runtime``.
+    """
+    dependencies = csr_matrix(
+        ([1] * len(edges), tuple(zip(*edges))), shape=(len(jobs), len(jobs))
+    )
+    critical_paths = critical_path_lengths(dependencies, estimates)
+    waiting_on = np.asarray(dependencies.sum(axis=0)).ravel()
+    started: set[int] = set()
+    running: list[tuple[float, int]] = []
+    now = 0.0
+    while len(started) < len(jobs) or running:
+        ready = [
+            jobid
+            for jobid in range(len(jobs))
+            if jobid not in started and waiting_on[jobid] == 0
+        ]
+        if scheduler == "critical_path":
+            ready.sort(key=lambda jobid: critical_paths[jobid], reverse=True)
+            backfill = Backfill(
+                now,
+                [
+                    (start + estimates[jobid], jobs[jobid].mem_gb, jobs[jobid].n_procs)
+                    for start, jobid in running
+                ],
+            )
+        free_memory_gb = MEMORY_GB - sum(jobs[jobid].mem_gb for _, jobid in running)
+        free_processors = PROCESSORS - sum(jobs[jobid].n_procs for _, jobid in running)
+        for jobid in ready:
+            job = jobs[jobid]
+            if job.n_procs > free_processors or job.mem_gb > free_memory_gb:
+                if scheduler == "critical_path":
+                    backfill.hold(
+                        job.mem_gb, job.n_procs, free_memory_gb, free_processors
+                    )
+                continue
+            if scheduler == "critical_path":
+                if not backfill.allows(estimates[jobid], job.mem_gb, job.n_procs):
+                    continue
+                backfill.start(estimates[jobid], job.mem_gb, job.n_procs)
+            free_memory_gb -= job.mem_gb
+            free_processors -= job.n_procs
+            started.add(jobid)
+            running.append((now, jobid))
+        now = min(start + jobs[jobid].runtime for start, jobid in running)
+        for start, jobid in list(running):
+            if start + jobs[jobid].runtime <= now:
+                running.remove((start, jobid))
+                for dependent in dependencies[jobid].indices:
+                    waiting_on[dependent] -= 1
+    return now
+
+
+def _registration_tail() -> tuple[list[Job], list[tuple[int, int]]]:
+    """Return short independent jobs ahead of a long registration chain."""
+    jobs = [Job(30, 1, 1) for _ in range(24)]
+    jobs += [Job(600, 8, PROCESSORS), Job(200, 2, 1), Job(200, 2, 1)]
+    return jobs, [(24, 25), (25, 26)]
+
+
+def _wide_job_behind_long_jobs() -> tuple[list[Job], list[tuple[int, int]]]:
+    """Return a wide job that lower-priority long jobs could starve."""
+    jobs = [Job(10, 1, 1)] + [Job(100 + 10 * i, 1, 1) for i in range(1, PROCESSORS)]
+    jobs += [Job(1000, 1, 1) for _ in range(1, PROCESSORS)]
+    jobs += [Job(1000, 4, PROCESSORS), Job(1000, 1, 1)]
+    # as each of the first jobs finishes, it readies a long, narrow job
+    edges = [(i, PROCESSORS - 1 + i) for i in range(1, PROCESSORS)]
+    # the first job readies the wide job early, which readies another long job
+    edges += [(0, 2 * PROCESSORS - 1), (2 * PROCESSORS - 1, 2 * PROCESSORS)]
+    return jobs, edges
+
+
+def _random_layered(seed: int) -> tuple[list[Job], list[tuple[int, int]]]:
+    """Return a random layered DAG shaped like a participant's workflow."""
+    rng = np.random.default_rng(seed)
+    layers = [list(range(start, start + 12)) for start in range(0, 96, 12)]
+    jobs = [
+        Job(
+            float(rng.lognormal(3, 1)),
+            float(rng.uniform(0.5, 4)),
+            int(rng.choice([1, 1, 1, 2, 4, PROCESSORS])),
+        )
+        for _ in range(96)
+    ]
+    edges = [
+        (int(parent), child)
+        for upper, lower in pairwise(layers)
+        for child in lower
+        for parent in rng.choice(upper, size=rng.integers(1, 3), replace=False)
+    ]
+    return jobs, edges
+
+
+SUITE = {
+    "registration_tail": _registration_tail(),
+    "wide_job_behind_long_jobs": _wide_job_behind_long_jobs(),
+    **{f"random_layered_{seed}": _random_layered(seed) for seed in range(8)},
+}
+
+
+@pytest.mark.parametrize("noise", [0, 0.5])
+def test_benchmark_synthetic_dags(noise, record_property):
+    """Benchmark critical-path priorities against graph order."""
+    rng = np.random.default_rng(0)
+    makespans = {}
+    for name, (jobs, edges) in SUITE.items():
+        estimates = [
+            job.runtime * float(rng.lognormal(0, noise)) if noise else job.runtime
+            for job in jobs
+        ]
+        makespans[name] = {
+            scheduler: _simulate(jobs, edges, scheduler, estimates)
+            for scheduler in ("tsort", "critical_path")
+        }
+        record_property(name, makespans[name])
+    assert (
+        makespans["registration_tail"]["critical_path"]
+        < makespans["registration_tail"]["tsort"]
+    )
+    total = {
+        scheduler: sum(makespan[scheduler] for makespan in makespans.values())
+        for scheduler in ("tsort", "critical_path")
+    }
+    record_property("total", total)
+    assert total["critical_path"] < total["tsort"]
+
+
+def test_backfill_keeps_wide_job_from_starving():
+    """Test lower-priority jobs don't take resources a held job waits for."""
+    jobs, edges = _wide_job_behind_long_jobs()
+    estimates = [job.runtime for job in jobs]
+    # the wide job starts once the first jobs have all finished
+    assert _simulate(jobs, edges, "critical_path", estimates) == 170 + 1000 + 1000
+    assert _simulate(jobs, edges, "tsort", estimates) == 170 + 1000 + 1000 + 1000
+
+
+def _nap(seconds):
+    import time
+
+    time.sleep(seconds)
+    return seconds
+
+
+def _node(name: str, n_procs: int = 1) -> Node:
+    node = Node(
+        Function(input_names=["seconds"], output_names=["out"], function=_nap),
+        name=name,
+        mem_gb=0.1,
+        n_procs=n_procs,
+    )
+    node.inputs.seconds = 0.1
+    return node
+
+
+def test_plugin_critical_path(tmp_path):
+    """Test the plugin orders ready jobs by critical path and runs them all."""
+    wf = Workflow(name="critical_path", base_dir=str(tmp_path))
+    wf.config["execution"]["poll_sleep_duration"] = 0.05
+    short = [_node(f"short_{i}") for i in range(3)]
+    chain = [_node("register", n_procs=2), _node("warp"), _node("derive")]
+    wf.add_nodes(short)
+    wf.connect(chain[0], "out", chain[1], "seconds")
+    wf.connect(chain[1], "out", chain[2], "seconds")
+    plugin_args = {"n_procs": 2, "memory_gb": 4, "scheduler": "critical_path"}
+
+    plugin = MultiProcPlugin(plugin_args=dict(plugin_args))
+    try:
+        graph = nx.DiGraph()
+        graph.add_nodes_from(short)
+        graph.add_edges_from(pairwise(chain))
+        plugin._generate_dependency_list(graph)
+        ready = [plugin.procs.index(node) for node in [*short, chain[0]]]
+        ordered = plugin._sort_jobs(ready, scheduler="critical_path")
+        assert plugin.procs[ordered[0]] is chain[0]
+        # register (2 threads) + warp + derive
+        assert plugin._critical_path(ordered[0]) == pytest.approx(4 * 60)
+    finally:
+        plugin.pool.shutdown()
+
+    wf.run(plugin=MultiProcPlugin(plugin_args=dict(plugin_args)))
+    for node in [*short, *chain]:
+        assert (
+            tmp_path / "critical_path" / node.name / f"result_{node.name}.pklz"
+        ).exists()
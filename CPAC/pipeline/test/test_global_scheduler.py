@@ -0,0 +1,244 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for the cross-participant global scheduler."""
+
+import os
+import threading
+
+import pytest
+
+from CPAC.pipeline.nipype_pipeline_engine import Node, Workflow
+from CPAC.pipeline.nipype_pipeline_engine.plugins import GlobalScheduler
+from CPAC.pipeline.nipype_pipeline_engine.plugins.global_scheduler import (
+    ResourceLedger,
+)
+from CPAC.utils.interfaces.function import Function
+from CPAC.utils.monitoring import log_nipype_to_thread_file
+
+PARTICIPANTS = 3
+NODES = 4
+
+
+def _nap(seconds):
+    import time
+
+    time.sleep(seconds)
+    return seconds
+
+
+def _workflow(participant: str, base_dir: str) -> Workflow:
+    """Build a workflow with a serial chain beside parallel nodes."""
+    wf = Workflow(name=participant, base_dir=base_dir)
+    wf.config["execution"]["poll_sleep_duration"] = 0.05
+    previous = None
+    for i in range(NODES):
+        node = Node(
+            Function(input_names=["seconds"], output_names=["out"], function=_nap),
+            name=f"nap_{i}",
+            mem_gb=0.1,
+        )
+        if previous is None or i % 2:
+            node.inputs.seconds = 0.2
+            wf.add_nodes([node])
+        else:
+            wf.connect(previous, "out", node, "seconds")
+        previous = node
+    return wf
+
+
+def test_ledger_admission():
+    """Test participants are admitted only once the budget has headroom."""
+    ledger = ResourceLedger(memory_gb=4, processors=2)
+    assert ledger.has_headroom()
+    ledger.start("A")
+    assert not ledger.has_headroom()
+    ledger.run("A")
+    assert ledger.has_headroom()
+    assert ledger.try_reserve("A", 0, 1, 2)
+    assert not ledger.has_headroom()
+    assert not ledger.try_reserve("A", 1, 1, 1)
+    assert ledger.try_reserve("A", 1, 1, 1, force=True)
+    ledger.finish("A")
+    assert ledger.free() == (4, 2)
+
+
+def test_global_scheduler(tmp_path):
+    """Test participants share one pool without exceeding its budget."""
+    scheduler = GlobalScheduler(memory_gb=2, n_procs=2)
+    peak = {"processors": 0}
+    lock = threading.Lock()
+    reserve = scheduler.ledger.try_reserve
+
+    def try_reserve(*args, **kwargs):
+        reserved = reserve(*args, **kwargs)
+        with lock:
+            peak["processors"] = max(
+                peak["processors"],
+                scheduler.ledger.processors - scheduler.ledger.free()[1],
+            )
+        return reserved
+
+    scheduler.ledger.try_reserve = try_reserve
+    results = {}
+
+    def run(participant):
+        results[participant] = _workflow(participant, str(tmp_path)).run(
+            plugin=scheduler.plugin(participant, {"raise_insufficient": True})
+        )
+        return 0
+
+    exitcode = scheduler.run_participants(
+        (
+            (f"sub-{i}", lambda participant=f"sub-{i}": run(participant))
+            for i in range(PARTICIPANTS)
+        ),
+        poll_sleep_secs=0.05,
+    )
+    assert exitcode == 0
+    assert len(results) == PARTICIPANTS
+    for graph in results.values():
+        assert all(node.result.outputs.out == pytest.approx(0.2) for node in graph)
+    assert peak["processors"] == scheduler.ledger.processors
+    assert scheduler.ledger.free() == (2, 2)
+
+
+def test_global_scheduler_failure(tmp_path):
+    """Test a failing participant doesn't stop the others."""
+    scheduler = GlobalScheduler(memory_gb=2, n_procs=2)
+
+    def fail():
+        msg = "build failed"
+        raise RuntimeError(msg)
+
+    def run():
+        _workflow("sub-ok", str(tmp_path)).run(plugin=scheduler.plugin("sub-ok"))
+        return 0
+
+    assert (
+        scheduler.run_participants(
+            [("sub-bad", fail), ("sub-ok", run)], poll_sleep_secs=0.05
+        )
+        == 1
+    )
+    assert (tmp_path / "sub-ok" / "nap_3" / "result_nap_3.pklz").exists()
+
+
+def _die(seconds):
+    import os
+    import signal
+    import time
+
+    time.sleep(seconds)
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_global_scheduler_worker_killed(tmp_path):
+    """Test a killed worker fails its jobs and later jobs get a new pool."""
+    scheduler = GlobalScheduler(memory_gb=2, n_procs=2)
+    wf = _workflow("sub-killed", str(tmp_path))
+    wf.config["execution"]["crashdump_dir"] = str(tmp_path / "crash")
+    killer = Node(
+        Function(input_names=["seconds"], output_names=["out"], function=_die),
+        name="killed",
+        mem_gb=0.1,
+    )
+    killer.inputs.seconds = 0.1
+    wf.add_nodes([killer])
+    errors = []
+    pool = scheduler.pool
+
+    def run_killed():
+        try:
+            wf.run(plugin=scheduler.plugin("sub-killed"))
+        except RuntimeError as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=run_killed, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), "participant hung on a dead worker"
+    assert errors
+    assert list((tmp_path / "crash").glob("crash-*killed*"))
+
+    def run():
+        _workflow("sub-ok", str(tmp_path)).run(plugin=scheduler.plugin("sub-ok"))
+        return 0
+
+    assert scheduler.run_participants([("sub-ok", run)], poll_sleep_secs=0.05) == 0
+    assert scheduler.pool is not pool
+    assert (tmp_path / "sub-ok" / "nap_3" / "result_nap_3.pklz").exists()
+
+
+def _participant_environ(variable):
+    import os
+
+    return os.environ.get(variable)
+
+
+def test_participant_settings(tmp_path):
+    """Test each participant's jobs and threads use its own logs and environment."""
+    scheduler = GlobalScheduler(memory_gb=2, n_procs=2)
+    outputs = {}
+
+    def run(participant):
+        log_dir = tmp_path / participant / "logs"
+        log_dir.mkdir(parents=True)
+        wf = Workflow(name=participant, base_dir=str(tmp_path))
+        wf.config["execution"]["poll_sleep_duration"] = 0.05
+        for i in range(NODES):
+            node = Node(
+                Function(
+                    input_names=["variable"],
+                    output_names=["out"],
+                    function=_participant_environ,
+                ),
+                name=f"environ_{i}",
+                mem_gb=0.1,
+            )
+            node.inputs.variable = "CPAC_TEST_PARTICIPANT"
+            wf.add_nodes([node])
+        settings = {
+            "config": {"logging": {"log_directory": str(log_dir), "log_to_file": True}},
+            "environ": {"CPAC_TEST_PARTICIPANT": participant},
+        }
+        log_nipype_to_thread_file(str(log_dir))
+        try:
+            graph = wf.run(plugin=scheduler.plugin(participant, settings=settings))
+        finally:
+            log_nipype_to_thread_file(None)
+        outputs[participant] = {node.result.outputs.out for node in graph}
+        return 0
+
+    participants = [f"sub-{i}" for i in range(PARTICIPANTS)]
+    assert (
+        scheduler.run_participants(
+            (
+                (participant, lambda participant=participant: run(participant))
+                for participant in participants
+            ),
+            poll_sleep_secs=0.05,
+        )
+        == 0
+    )
+    assert "CPAC_TEST_PARTICIPANT" not in os.environ
+    for participant in participants:
+        assert outputs[participant] == {participant}
+        log = (tmp_path / participant / "logs" / "pypeline.log").read_text()
+        assert f'"{participant}.environ_0"' in log
+        assert not [
+            other for other in participants if other != participant and other in log
+        ]
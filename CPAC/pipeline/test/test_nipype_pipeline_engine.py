@@ -130,3 +130,58 @@ def test_Workflow(tmpdir):  # pylint: disable=invalid-name
         out_node.mem_gb
         == DEFAULT_MEM_GB + get_data_size(example_filepath, "xyzt") * 0.1
     )
+
+
+def test_mem_x_benchmark(monkeypatch, record_property, tmp_path):
+    """Benchmark ``mem_x`` estimates for a 100-run data config.
+
+    Estimates are compared reloading each image per node (as before) to the
+    memoized header-only lookup.
+    """
+    from time import perf_counter
+
+    import numpy as np
+    import nibabel as nib
+
+    from CPAC.pipeline.nipype_pipeline_engine import engine
+    from CPAC.utils.nifti_utils import _image_metadata, ImageMetadata
+
+    runs, nodes_per_run = 100, 40
+    bold_files = []
+    for run in range(runs):
+        bold_files.append(str(tmp_path / f"sub-{run}_bold.nii.gz"))
+        nib.save(
+            nib.Nifti1Image(np.zeros((16, 16, 12, 60), dtype=np.float32), np.eye(4)),
+            bold_files[-1],
+        )
+
+    def build():
+        estimates = []
+        for bold_file in bold_files:
+            for i in range(nodes_per_run):
+                node = Node(
+                    IdentityInterface(fields=["bold"]),
+                    name=f"node_{i}",
+                    mem_gb=0.1,
+                    mem_x=(1e-6, "bold"),
+                )
+                node.inputs.bold = bold_file
+                estimates.append(node.mem_gb)
+        return estimates
+
+    def reload_image(path):
+        return ImageMetadata(nib.load(path).shape, (), None)
+
+    with monkeypatch.context() as patched:
+        patched.setattr(engine, "image_metadata", reload_image)
+        start = perf_counter()
+        legacy = build()
+        legacy_time = perf_counter() - start
+    _image_metadata.cache_clear()
+    start = perf_counter()
+    cached = build()
+    cached_time = perf_counter() - start
+    record_property("legacy_seconds", legacy_time)
+    record_property("header_cache_seconds", cached_time)
+    assert cached == legacy
+    assert cached_time < legacy_time
@@ -0,0 +1,144 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests and a benchmark for sidecars sharing one pipeline configuration."""
+
+from copy import deepcopy
+import hashlib
+import json
+import pickle
+from time import perf_counter
+
+import pytest
+
+from CPAC.pipeline.nipype_pipeline_engine import Node
+from CPAC.pipeline.provenance import sidecar_config
+from CPAC.utils.configuration import Preconfiguration
+from CPAC.utils.interfaces.function import Function
+from CPAC.utils.utils import write_output_json
+
+FORKS = 16
+"""strategies per output in the benchmark"""
+OUTPUTS = 200
+"""outputs per strategy in the benchmark"""
+
+
+@pytest.fixture(scope="module")
+def cfg():
+    """Return a forking preconfiguration."""
+    return Preconfiguration("fmriprep-options")
+
+
+def _sidecar(config, config_hash) -> dict:
+    return {
+        "CpacProvenance": ["T1w:anat_ingress", "desc-preproc_T1w:anat_preproc"],
+        "Description": "A preprocessed T1w image",
+        "CpacConfigHash": config_hash,
+        "CpacConfig": config,
+    }
+
+
+def test_written_sidecars_unchanged(cfg, tmp_path):
+    """Test sidecars are written as they were with embedded configurations."""
+    config = sidecar_config(cfg)
+    assert sidecar_config(cfg) is config
+    embedded = cfg.dict()
+    embedded_hash = hashlib.sha1(
+        json.dumps(embedded, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    assert config.hash == embedded_hash
+    shared_path = write_output_json(
+        deepcopy(_sidecar(config, config.hash)), "shared", basedir=str(tmp_path)
+    )
+    embedded_path = write_output_json(
+        _sidecar(embedded, embedded_hash), "embedded", basedir=str(tmp_path)
+    )
+    with (
+        open(shared_path, encoding="utf-8") as shared,
+        open(embedded_path, encoding="utf-8") as embedded_file,
+    ):
+        assert shared.read() == embedded_file.read()
+
+
+def test_config_changed_between_records():
+    """Test sidecars record the configuration as it is when they're connected."""
+    cfg = Preconfiguration("fmriprep-options")
+    before = sidecar_config(cfg)
+    cfg.timeseries_extraction["tse_atlases"] = {"Avg": ["/atlases/test.nii.gz"]}
+    after = sidecar_config(cfg)
+    assert after is not before
+    assert (
+        after.hash
+        == hashlib.sha1(
+            json.dumps(cfg.dict(), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+    )
+    assert after.to_dict()["timeseries_extraction"]["tse_atlases"] == {
+        "Avg": ["/atlases/test.nii.gz"]
+    }
+    assert "tse_atlases" not in before.to_dict()["timeseries_extraction"]
+    assert sidecar_config(cfg) is after
+
+
+def test_write_json_node_hash_is_stable(cfg):
+    """Test a sidecar-writing node's hash doesn't depend on the config's identity."""
+    config = sidecar_config(cfg)
+    hashes = set()
+    for shared in (config, pickle.loads(pickle.dumps(config))):
+        node = Node(
+            Function(
+                input_names=["json_data", "filename"],
+                output_names=["json_file"],
+                function=write_output_json,
+            ),
+            name="json_T1w",
+        )
+        node.inputs.json_data = _sidecar(shared, shared.hash)
+        hashes.add(node.inputs.get_hashval()[1])
+    assert len(hashes) == 1
+
+
+def test_benchmark_forked_sidecars(cfg, record_property):
+    """Benchmark the sidecar work of building a heavily forked graph.
+
+    For every output of every strategy, ``NodeBlock.connect_block`` records
+    the configuration, and ``ResourcePool.get_strats`` deep-copies inputs'
+    sidecars; the graph is then pickled.
+    """
+
+    def build(record) -> tuple[float, int]:
+        before = perf_counter()
+        sidecars = []
+        for _ in range(FORKS):
+            for _ in range(OUTPUTS):
+                config, config_hash = record()
+                sidecars.append(deepcopy(_sidecar(config, config_hash)))
+        seconds = perf_counter() - before
+        return seconds, len(pickle.dumps(sidecars))
+
+    def embedded():
+        return cfg.dict(), hashlib.sha1(
+            json.dumps(cfg.dict(), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def shared():
+        config = sidecar_config(cfg)
+        return config, config.hash
+
+    results = {"embedded": build(embedded), "shared": build(shared)}
+    record_property("seconds", {k: v[0] for k, v in results.items()})
+    record_property("pickled_bytes", {k: v[1] for k, v in results.items()})
+    assert results["shared"][1] < results["embedded"][1] / 100
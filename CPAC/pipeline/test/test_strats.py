@@ -0,0 +1,289 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests and a benchmark for combining strategies of node block inputs."""
+
+import copy
+from itertools import product
+from time import perf_counter
+
+import pytest
+
+from CPAC.pipeline import ALL_PIPELINE_CONFIGS
+from CPAC.pipeline.engine import ResourcePool
+from CPAC.utils.configuration.configuration import preconfig_yaml
+from CPAC.utils.utils import update_nested_dict
+
+FORK_POINTS = {
+    "brain_extraction": ["anatomical_preproc", "brain_extraction", "using"],
+    "registration": [
+        "registration_workflows",
+        "anatomical_registration",
+        "registration",
+        "using",
+    ],
+    "motion_correction": [
+        "functional_preproc",
+        "motion_estimates_and_correction",
+        "motion_correction",
+        "using",
+    ],
+    "func_masking": ["functional_preproc", "func_masking", "using"],
+    "nuisance_regression": [
+        "nuisance_corrections",
+        "2-nuisance_regression",
+        "Regressors",
+    ],
+}
+"""configuration keys of options that fork the synthetic resource pool"""
+INPUTS = [
+    ("desc-preproc_bold", "space-bold_desc-brain_mask"),
+    ("desc-brain_T1w", "space-T1w_desc-brain_mask"),
+    "from-T1w_to-template_mode-image_xfm",
+    "from-bold_to-T1w_mode-image_desc-linear_xfm",
+]
+"""inputs of a node block registering a functional image to a template"""
+
+
+def _preconfig(name: str) -> dict:
+    """Load a preconfiguration's YAML and the YAML it's based on."""
+    preconfig = preconfig_yaml(name, load=True)
+    base = preconfig.pop("FROM", None)
+    if base is None:
+        return preconfig
+    return update_nested_dict(_preconfig(base), preconfig)
+
+
+def _forks(preconfig: dict) -> dict[str, list[str]]:
+    """Return the options at each fork point of a preconfiguration."""
+    forks = {}
+    for fork, keys in FORK_POINTS.items():
+        options = preconfig
+        for key in keys:
+            options = options.get(key, {}) if isinstance(options, dict) else {}
+        if not isinstance(options, list) or not options:
+            options = [None]
+        forks[fork] = [
+            option.get("Name", str(i)) if isinstance(option, dict) else str(option)
+            for i, option in enumerate(options)
+        ]
+    return forks
+
+
+def _forked_pool(forks: dict[str, list[str]]) -> ResourcePool:
+    """Build a resource pool forked like a pipeline with the given options."""
+    rpool = ResourcePool()
+
+    def add(resource, prov, variants):
+        json_info = {"CpacProvenance": prov}
+        if variants:
+            json_info["CpacVariant"] = copy.deepcopy(variants)
+        rpool.rpool.setdefault(resource, {})[str(prov)] = {
+            "data": (f"{prov[-1]}_node", "out_file"),
+            "json": json_info,
+        }
+
+    def variant(fork, resource, node_name):
+        return {resource: [node_name]} if len(forks[fork]) > 1 else {}
+
+    t1w = ["T1w:anat_ingress"]
+    bold = ["bold:func_ingress"]
+    anat = []
+    for option in forks["brain_extraction"]:
+        node = f"brain_mask_{option}"
+        mask_variant = variant("brain_extraction", "space-T1w_desc-brain_mask", node)
+        mask = [t1w, f"space-T1w_desc-brain_mask:{node}"]
+        add("space-T1w_desc-brain_mask", mask, mask_variant)
+        brain = [t1w, mask, f"desc-brain_T1w:brain_extraction_{option}"]
+        add("desc-brain_T1w", brain, mask_variant)
+        anat.append((brain, mask_variant))
+        for reg in forks["registration"]:
+            node = f"register_{reg}"
+            add(
+                "from-T1w_to-template_mode-image_xfm",
+                [brain, f"from-T1w_to-template_mode-image_xfm:{node}"],
+                {
+                    **mask_variant,
+                    **variant(
+                        "registration", "from-T1w_to-template_mode-image_xfm", node
+                    ),
+                },
+            )
+    for mc in forks["motion_correction"]:
+        node = f"motion_correction_{mc}"
+        mc_variant = variant("motion_correction", "desc-motion_bold", node)
+        motion = [bold, f"desc-motion_bold:{node}"]
+        for brain, mask_variant in anat:
+            add(
+                "from-bold_to-T1w_mode-image_desc-linear_xfm",
+                [brain, motion, "from-bold_to-T1w_mode-image_desc-linear_xfm:coreg"],
+                {**mask_variant, **mc_variant},
+            )
+        for masking in forks["func_masking"]:
+            node = f"bold_mask_{masking}"
+            masking_variant = {
+                **mc_variant,
+                **variant("func_masking", "space-bold_desc-brain_mask", node),
+            }
+            mask = [motion, f"space-bold_desc-brain_mask:{node}"]
+            add("space-bold_desc-brain_mask", mask, masking_variant)
+            for regressors in forks["nuisance_regression"]:
+                node = f"nuisance_regression_{regressors}"
+                add(
+                    "desc-preproc_bold",
+                    [motion, mask, f"desc-preproc_bold:{node}"],
+                    {
+                        **masking_variant,
+                        **variant("nuisance_regression", "desc-preproc_bold", node),
+                    },
+                )
+    return rpool
+
+
+def _pools(rpool: ResourcePool, resources: list) -> tuple[list, list, dict]:
+    """Return the strategies, linked inputs and variants ``get_strats`` combines."""
+    linked_resources = []
+    resource_list = []
+    for resource in resources:
+        if isinstance(resource, tuple):
+            linked = [label for label in resource if rpool.get(label, optional=True)]
+            resource_list += linked
+            if len(linked) > 1:
+                linked_resources.append(linked)
+        else:
+            resource_list.append(resource)
+    total_pool = []
+    variant_pool = {}
+    for resource in resource_list:
+        rp_dct, fetched_resource = rpool.get(
+            resource, report_fetched=True, optional=True
+        )
+        sub_pool = []
+        for strat in rp_dct.keys():
+            json_info = rpool.get_json(fetched_resource, strat)
+            sub_pool.append(json_info["CpacProvenance"])
+            variant_pool.setdefault(fetched_resource, [])
+            for val in json_info.get("CpacVariant", {}).values():
+                if val not in variant_pool[fetched_resource]:
+                    variant_pool[fetched_resource] += val
+                    variant_pool[fetched_resource].append(f"NO-{val[0]}")
+        total_pool.append(sub_pool)
+    return total_pool, linked_resources, variant_pool
+
+
+def _reference_combine(
+    rpool: ResourcePool, total_pool: list, linked_resources: list, variant_pool: dict
+) -> list[list]:
+    """Combine strategies by filtering the whole product, as C-PAC did."""
+    strat_str_list = []
+    strat_list_list = []
+    for strat_tuple in product(*total_pool):
+        strat_list = list(copy.deepcopy(strat_tuple))
+        strat_str = str(strat_list)
+        if strat_str not in strat_str_list:
+            strat_str_list.append(strat_str)
+            strat_list_list.append(strat_list)
+    kept = []
+    for strat_list in strat_list_list:
+        json_dct = {}
+        for strat in strat_list:
+            strat_resource, strat_idx = rpool.generate_prov_string(strat)
+            json_dct[strat_resource] = rpool.get_json(strat_resource, strat=strat_idx)
+        drop = False
+        for linked in linked_resources:
+            for xlabel in linked:
+                for ylabel in linked:
+                    if xlabel == ylabel:
+                        continue
+                    strats = []
+                    for label in (xlabel, ylabel):
+                        label_strat = [
+                            val[0] if isinstance(val, list) else val
+                            for val in json_dct[label].get("CpacVariant", {}).values()
+                        ]
+                        for spread_label in set(variant_pool[label]):
+                            if "NO-" not in spread_label and (
+                                spread_label not in label_strat
+                            ):
+                                label_strat.append(f"NO-{spread_label}")
+                        strats.append(label_strat)
+                    current_strat, other_strat = strats
+                    other_spread = set(variant_pool[ylabel])
+                    for variant in set(variant_pool[xlabel]):
+                        in_current_strat = variant is None or variant in current_strat
+                        in_other_strat = (
+                            variant is None and None in other_spread
+                        ) or variant in other_strat
+                        if variant in other_spread and (
+                            in_current_strat != in_other_strat
+                        ):
+                            drop = True
+        if not drop:
+            kept.append(strat_list)
+    return kept
+
+
+def _reference_strats(rpool: ResourcePool, resources: list) -> list[str]:
+    """Return the strategy keys C-PAC combined for a node block's inputs."""
+    return [
+        str(strat_list)
+        for strat_list in _reference_combine(rpool, *_pools(rpool, resources))
+    ]
+
+
+@pytest.mark.parametrize("preconfig", ALL_PIPELINE_CONFIGS)
+def test_preconfig_strats_unchanged(preconfig):
+    """Test strategies are combined as before for each preconfiguration."""
+    rpool = _forked_pool(_forks(_preconfig(preconfig)))
+    expected = _reference_strats(rpool, INPUTS)
+    strats = rpool.get_strats(INPUTS)
+    assert list(strats.keys()) == expected
+    assert len(rpool.pipe_list) == len(expected) * 6
+
+
+def test_duplicate_and_unlinked_strats():
+    """Test duplicate strategies are combined once, in product order."""
+    forks = {fork: ["a", "b"] for fork in FORK_POINTS}
+    rpool = _forked_pool(forks)
+    resources = ["desc-brain_T1w", "desc-brain_T1w", "space-bold_desc-brain_mask"]
+    expected = _reference_strats(rpool, resources)
+    assert list(rpool.get_strats(resources).keys()) == expected
+    assert len(expected) == 2 * 2 * 4
+
+
+def test_benchmark_preconfig_strats(record_property):
+    """Benchmark combining strategies for every preconfiguration.
+
+    Also combines strategies for a pipeline forked at every fork point with
+    two options each.
+    """
+    pools = {
+        preconfig: _forked_pool(_forks(_preconfig(preconfig)))
+        for preconfig in ALL_PIPELINE_CONFIGS
+    }
+    pools["forked"] = _forked_pool({fork: ["a", "b"] for fork in FORK_POINTS})
+    seconds = {"reference": {}, "indexed": {}}
+    for name, rpool in pools.items():
+        strat_pools = _pools(rpool, INPUTS)
+        before = perf_counter()
+        expected = _reference_combine(rpool, *strat_pools)
+        seconds["reference"][name] = perf_counter() - before
+        before = perf_counter()
+        combined = rpool._combine_strats(*strat_pools)
+        seconds["indexed"][name] = perf_counter() - before
+        assert [list(strat_tuple) for strat_tuple in combined] == expected
+    record_property("seconds", seconds)
+    assert sum(seconds["indexed"].values()) < sum(seconds["reference"].values()) / 10
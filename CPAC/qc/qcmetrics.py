@@ -27,28 +27,152 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-# Modifications copyright (C) 2022-2024  C-PAC Developers
+# Modifications copyright (C) 2022-2026  C-PAC Developers
 """QC metrics from XCP-D v0.0.9.
 
 https://github.com/PennLINC/xcp_d/blob/0.0.9/xcp_d/utils/qcmetrics.py
 """
 
 # pylint: disable=invalid-name, redefined-outer-name
+from math import sqrt
+from typing import Iterable, NamedTuple, Union
+
 import numpy as np
 import nibabel as nib
 
+Mask = Union[str, np.ndarray]
+"""A path to a NIfTI mask or a mask array."""
+
+
+class OverlapCounts(NamedTuple):
+    """Voxel counts shared by every overlap metric of a pair of masks."""
+
+    size: int
+    """total voxels"""
+    input1: int
+    """voxels in the first mask"""
+    input2: int
+    """voxels in the second mask"""
+    intersection: int
+    """voxels in both masks"""
+
+    @property
+    def union(self) -> int:
+        """Voxels in either mask."""
+        return self.input1 + self.input2 - self.intersection
+
+    def dc(self) -> float:
+        """Dice coefficient; see :py:func:`dc`."""
+        try:
+            return 2.0 * self.intersection / float(self.input1 + self.input2)
+        except ZeroDivisionError:
+            return 0.0
+
+    def jc(self) -> float:
+        """Jaccard coefficient; see :py:func:`jc`."""
+        return float(self.intersection) / float(self.union)
+
+    def crosscorr(self) -> float:
+        """Pearson correlation of the flattened binary masks.
+
+        ``nan`` if either mask is empty or full, like :py:func:`numpy.corrcoef`.
+        """
+        numerator = self.size * self.intersection - self.input1 * self.input2
+        denominator = (
+            self.input1
+            * (self.size - self.input1)
+            * self.input2
+            * (self.size - self.input2)
+        )
+        if not denominator:
+            return np.nan
+        return min(1.0, max(-1.0, numerator / sqrt(denominator)))
+
+    def coverage(self) -> float:
+        """Intersection over the smaller mask; see :py:func:`coverage`."""
+        return float(self.intersection) / float(min(self.input1, self.input2))
+
+
+def load_mask(mask: Mask) -> np.ndarray:
+    """Load a mask as a boolean array: background where 0, object elsewhere."""
+    if isinstance(mask, str):
+        mask = np.asanyarray(nib.load(mask).dataobj)
+    return np.atleast_1d(np.asarray(mask).astype(bool))
+
+
+def overlap_counts(pairs: Iterable[tuple[Mask, Mask]]) -> list[OverlapCounts]:
+    """Count the voxels every overlap metric needs for a batch of mask pairs.
+
+    Each distinct mask path is loaded (and counted) only once per batch.
+    """
+    masks: dict[str, np.ndarray] = {}
+    sizes: dict[str, int] = {}
+
+    def _load(mask: Mask) -> tuple[np.ndarray, int]:
+        if not isinstance(mask, str):
+            mask = load_mask(mask)
+            return mask, np.count_nonzero(mask)
+        if mask not in masks:
+            masks[mask] = load_mask(mask)
+            sizes[mask] = np.count_nonzero(masks[mask])
+        return masks[mask], sizes[mask]
+
+    counts = []
+    for mask1, mask2 in pairs:
+        (input1, size1), (input2, size2) = _load(mask1), _load(mask2)
+        intersection = np.logical_and(input1, input2)
+        counts.append(
+            OverlapCounts(
+                intersection.size,
+                int(size1),
+                int(size2),
+                int(np.count_nonzero(intersection)),
+            )
+        )
+    return counts
+
+
+def overlap_metrics(
+    pairs: Iterable[tuple[Mask, Mask]],
+) -> list[dict[str, float]]:
+    """Compute Dice, Jaccard, cross-correlation and coverage for mask pairs.
+
+    Parameters
+    ----------
+    pairs : iterable of 2-tuples
+        pairs of mask paths or arrays
+
+    Returns
+    -------
+    list of dict
+        ``{"Dice", "Jaccard", "CrossCorr", "Coverage"}`` for each pair
+
+    Examples
+    --------
+    >>> a = np.array([1, 1, 0, 0])
+    >>> overlap_metrics([(a, a), (a, np.array([0, 1, 1, 0]))])
+    [{'Dice': 1.0, 'Jaccard': 1.0, 'CrossCorr': 1.0, 'Coverage': 1.0}, \
+{'Dice': 0.5, 'Jaccard': 0.3333333333333333, 'CrossCorr': 0.0, 'Coverage': 0.5}]
+    """
+    return [
+        {
+            "Dice": counts.dc(),
+            "Jaccard": counts.jc(),
+            "CrossCorr": counts.crosscorr(),
+            "Coverage": counts.coverage(),
+        }
+        for counts in overlap_counts(pairs)
+    ]
+
 
 def regisQ(bold2t1w_mask, t1w_mask, bold2template_mask, template_mask):
     """Collect a dictionary of registration QC metrics."""
+    coreg, norm = overlap_metrics(
+        [(bold2t1w_mask, t1w_mask), (bold2template_mask, template_mask)]
+    )
     return {
-        "coregDice": [dc(bold2t1w_mask, t1w_mask)],
-        "coregJaccard": [jc(bold2t1w_mask, t1w_mask)],
-        "coregCrossCorr": [crosscorr(bold2t1w_mask, t1w_mask)],
-        "coregCoverage": [coverage(bold2t1w_mask, t1w_mask)],
-        "normDice": [dc(bold2template_mask, template_mask)],
-        "normJaccard": [jc(bold2template_mask, template_mask)],
-        "normCrossCorr": [crosscorr(bold2template_mask, template_mask)],
-        "normCoverage": [coverage(bold2template_mask, template_mask)],
+        **{f"coreg{metric}": [value] for metric, value in coreg.items()},
+        **{f"norm{metric}": [value] for metric, value in norm.items()},
     }
 
 
@@ -88,22 +212,7 @@ def dc(input1, input2):
     -----
     This is a real metric.
     """
-    input1 = nib.load(input1).get_fdata()
-    input2 = nib.load(input2).get_fdata()
-    input1 = np.atleast_1d(input1.astype(bool))
-    input2 = np.atleast_1d(input2.astype(bool))
-
-    intersection = np.count_nonzero(input1 & input2)
-
-    size_i1 = np.count_nonzero(input1)
-    size_i2 = np.count_nonzero(input2)
-
-    try:
-        dc = 2.0 * intersection / float(size_i1 + size_i2)
-    except ZeroDivisionError:
-        dc = 0.0
-
-    return dc
+    return overlap_counts([(input1, input2)])[0].dc()
 
 
 def jc(input1, input2):
@@ -132,35 +241,14 @@ def jc(input1, input2):
     -----
     This is a real metric.
     """
-    input1 = nib.load(input1).get_fdata()
-    input2 = nib.load(input2).get_fdata()
-    input1 = np.atleast_1d(input1.astype(bool))
-    input2 = np.atleast_1d(input2.astype(bool))
-
-    intersection = np.count_nonzero(input1 & input2)
-    union = np.count_nonzero(input1 | input2)
-
-    return float(intersection) / float(union)
+    return overlap_counts([(input1, input2)])[0].jc()
 
 
 def crosscorr(input1, input2):
     r"""Cross correlation: compute cross correction bewteen input masks."""
-    input1 = nib.load(input1).get_fdata()
-    input2 = nib.load(input2).get_fdata()
-    input1 = np.atleast_1d(input1.astype(bool)).flatten()
-    input2 = np.atleast_1d(input2.astype(bool)).flatten()
-    return np.corrcoef(input1, input2)[0][1]
+    return overlap_counts([(input1, input2)])[0].crosscorr()
 
 
 def coverage(input1, input2):
     """Estimate the coverage between two masks."""
-    input1 = nib.load(input1).get_fdata()
-    input2 = nib.load(input2).get_fdata()
-    input1 = np.atleast_1d(input1.astype(bool))
-    input2 = np.atleast_1d(input2.astype(bool))
-    intsec = np.count_nonzero(input1 & input2)
-    if np.sum(input1) > np.sum(input2):
-        smallv = np.sum(input2)
-    else:
-        smallv = np.sum(input1)
-    return float(intsec) / float(smallv)
+    return overlap_counts([(input1, input2)])[0].coverage()
@@ -0,0 +1,88 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for registration overlap QC metrics."""
+
+import numpy as np
+import pytest
+import nibabel as nib
+
+from CPAC.qc import qcmetrics
+from CPAC.qc.qcmetrics import overlap_metrics, regisQ
+
+RNG = np.random.default_rng(7)
+
+
+def _legacy_metrics(input1: str, input2: str) -> dict:
+    """Compute each metric from freshly loaded masks, as XCP-D v0.0.9 did."""
+    input1 = np.atleast_1d(nib.load(input1).get_fdata().astype(bool))
+    input2 = np.atleast_1d(nib.load(input2).get_fdata().astype(bool))
+    intersection = np.count_nonzero(input1 & input2)
+    size1, size2 = np.count_nonzero(input1), np.count_nonzero(input2)
+    return {
+        "Dice": 2.0 * intersection / float(size1 + size2),
+        "Jaccard": float(intersection) / float(np.count_nonzero(input1 | input2)),
+        "CrossCorr": np.corrcoef(input1.flatten(), input2.flatten())[0][1],
+        "Coverage": float(intersection) / float(min(np.sum(input1), np.sum(input2))),
+    }
+
+
+@pytest.fixture
+def masks(tmp_path):
+    """Write four overlapping masks of different data types."""
+    paths = []
+    for i, dtype in enumerate([np.uint8, np.int16, np.float32, np.float64]):
+        data = (RNG.random((20, 22, 18)) > 0.3 + 0.1 * i).astype(dtype)
+        paths.append(str(tmp_path / f"mask_{i}.nii.gz"))
+        nib.save(nib.Nifti1Image(data, np.eye(4)), paths[-1])
+    return paths
+
+
+def test_overlap_metrics(masks):
+    """Test one-load metrics match the per-metric reloads."""
+    pairs = [(masks[0], masks[1]), (masks[2], masks[3]), (masks[1], masks[1])]
+    for metrics, pair in zip(overlap_metrics(pairs), pairs):
+        expected = _legacy_metrics(*pair)
+        assert metrics.keys() == expected.keys()
+        for metric in ("Dice", "Jaccard", "Coverage"):
+            assert metrics[metric] == expected[metric]
+        assert metrics["CrossCorr"] == pytest.approx(expected["CrossCorr"])
+
+
+def test_regisQ_loads_each_mask_once(masks, monkeypatch):
+    """Test regisQ loads every distinct mask once and keeps its keys."""
+    loaded = []
+    nib_load = nib.load
+
+    def load(path):
+        loaded.append(path)
+        return nib_load(path)
+
+    monkeypatch.setattr(qcmetrics.nib, "load", load)
+    overlap = regisQ(masks[0], masks[1], masks[2], masks[1])
+    monkeypatch.undo()
+    assert sorted(loaded) == masks[:3]
+    assert list(overlap) == [
+        f"{kind}{metric}"
+        for kind in ("coreg", "norm")
+        for metric in ("Dice", "Jaccard", "CrossCorr", "Coverage")
+    ]
+    assert overlap["normDice"] == [_legacy_metrics(masks[2], masks[1])["Dice"]]
+
+
+def test_crosscorr_empty_mask():
+    """Test an empty mask has an undefined cross-correlation."""
+    assert np.isnan(qcmetrics.crosscorr(np.zeros(8), np.arange(8)))
@@ -27,6 +27,64 @@ def normalize_segment(segment, df):
     return segment / np.sqrt(np.dot(segment, segment))
 
 
+def window_statistics(data, window_length):
+    """Mean and centered norm of every sliding window of ``data``.
+
+    Windows span all voxels and ``window_length`` consecutive TRs, as in
+    :py:func:`flattened_segment`. Sums are taken over per-TR column sums, so
+    each statistic costs O(1) per window after one pass over the data.
+
+    Returns
+    -------
+    means, norms : numpy.ndarray
+        One value per window start, ``trs - window_length + 1`` each.
+    """
+    df = data.shape[0] * window_length
+    # the global offset cancels in centered windows but would cost precision
+    # in the sum-of-squares identity below
+    centered = data - data.mean()
+    kernel = np.ones(window_length)
+    sums = np.convolve(centered.sum(axis=0), kernel, "valid")
+    squares = np.convolve(np.einsum("ij,ij->j", centered, centered), kernel, "valid")
+    means = sums / df + data.mean()
+    norms = np.sqrt(np.maximum(squares - sums**2 / df, 0))
+    return means, norms
+
+
+def sliding_window_correlation(templates, data, window_length, means, norms):
+    """Correlate normalized templates with every sliding window of ``data``.
+
+    Equivalent to ``np.dot(template, normalize_segment(flattened_segment(data,
+    window_length, tr), df))`` for every window start ``tr``, computed as one
+    matrix product per window offset instead of one slice per TR.
+
+    Parameters
+    ----------
+    templates : numpy.ndarray
+        ``(n, voxels * window_length)`` templates, flattened like
+        :py:func:`flattened_segment`.
+    data : numpy.ndarray
+        ``(voxels, trs)`` data.
+    window_length : int
+    means, norms : numpy.ndarray
+        Output of :py:func:`window_statistics`.
+
+    Returns
+    -------
+    numpy.ndarray
+        ``(n, trs - window_length + 1)`` correlations.
+    """
+    voxels = data.shape[0]
+    positions = means.shape[0]
+    templates = templates.reshape(len(templates), window_length, voxels)
+    dots = np.zeros((len(templates), positions))
+    for offset in range(window_length):
+        dots += templates[:, offset] @ data[:, offset : offset + positions]
+    dots -= templates.sum(axis=(1, 2))[:, np.newaxis] * means
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return dots / norms
+
+
 def detect_qpp(
     data,
     num_scans,
@@ -36,11 +94,15 @@ def detect_qpp(
     iterations,
     convergence_iterations=1,
     random_state=None,
+    max_memory_gb=1.0,
 ):
     """
     This code is adapted from the paper "Quasi-periodic patterns (QP): Large-
     scale dynamics in resting state fMRI that correlate with local infraslow
     electrical activity", Shella Keilholz et al. NeuroImage, 2014.
+
+    Permutations' initial windows are scored in batches whose templates fit
+    in about ``max_memory_gb``.
     """
     random_state = check_random_state(random_state)
 
@@ -62,17 +124,32 @@ def detect_qpp(
 
     initial_trs = random_state.choice(inpectable_trs, permutations)
 
+    means, norms = window_statistics(data, window_length)
+
+    def score(templates):
+        return sliding_window_correlation(templates, data, window_length, means, norms)[
+            :, inpectable_trs
+        ]
+
+    # initial windows are scored a batch of permutations at a time; each
+    # template is held twice while its batch is stacked
+    batch_size = int(max(1, max_memory_gb * 1024**3 // (2 * 8 * df)))
+
     permutation_result = [{} for _ in range(permutations)]
     for perm in range(permutations):
-        template_holder = np.zeros(trs)
-        random_initial_window = normalize_segment(
-            flattened_segment(data, window_length, initial_trs[perm]), df
-        )
-        for tr in inpectable_trs:
-            scan_window = normalize_segment(
-                flattened_segment(data, window_length, tr), df
+        if perm % batch_size == 0:
+            initial_holders = np.zeros((min(batch_size, permutations - perm), trs))
+            initial_holders[:, inpectable_trs] = score(
+                np.array(
+                    [
+                        normalize_segment(
+                            flattened_segment(data, window_length, tr), df
+                        )
+                        for tr in initial_trs[perm : perm + batch_size]
+                    ]
+                )
             )
-            template_holder[tr] = np.dot(random_initial_window, scan_window)
+        template_holder = initial_holders[perm % batch_size]
 
         template_holder_convergence = np.zeros((convergence_iterations, trs))
 
@@ -99,11 +176,7 @@ def detect_qpp(
             peaks_segments = peaks_segments / found_peaks
             peaks_segments = normalize_segment(peaks_segments, df)
 
-            for tr in inpectable_trs:
-                scan_window = normalize_segment(
-                    flattened_segment(data, window_length, tr), df
-                )
-                template_holder[tr] = np.dot(peaks_segments, scan_window)
+            template_holder[inpectable_trs] = score(peaks_segments[np.newaxis])[0]
 
             if np.all(
                 correlation(template_holder, template_holder_convergence) > 0.9999
@@ -1,7 +1,14 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import pytest
 
-from CPAC.qpp.qpp import detect_qpp
+from CPAC.qpp.qpp import (
+    detect_qpp,
+    flattened_segment,
+    normalize_segment,
+    sliding_window_correlation,
+    window_statistics,
+)
 
 RNG = np.random.default_rng(10)
 
@@ -75,3 +82,86 @@ def test_qpp():
         plt.axvline(x=xc, color="r")
     plt.legend()
     plt.show()
+
+
+@pytest.mark.parametrize("offset", [0.0, 100.0])
+def test_sliding_window_correlation(offset):
+    """Test batched window correlations against per-TR normalized segments."""
+    voxels, trs, window_length = 40, 90, 7
+    df = voxels * window_length
+    x = RNG.normal(size=(voxels, trs)) + offset
+    templates = np.array(
+        [
+            normalize_segment(flattened_segment(x, window_length, tr), df)
+            for tr in (0, 13, 50)
+        ]
+    )
+    expected = np.array(
+        [
+            [
+                np.dot(
+                    template,
+                    normalize_segment(flattened_segment(x, window_length, tr), df),
+                )
+                for tr in range(trs - window_length + 1)
+            ]
+            for template in templates
+        ]
+    )
+    means, norms = window_statistics(x, window_length)
+    np.testing.assert_allclose(
+        sliding_window_correlation(templates, x, window_length, means, norms),
+        expected,
+        atol=1e-12,
+    )
+
+
+def test_qpp_random_state():
+    """Test QPP detection is reproducible for a fixed random state."""
+    voxels, trs = 100, 240
+    x = np.tile(np.sin(np.linspace(0, 24 * np.pi, trs)), (voxels, 1))
+    x += RNG.uniform(0, 1, (voxels, trs))
+    kwargs = {
+        "data": x,
+        "num_scans": 2,
+        "window_length": 10,
+        "permutations": 8,
+        "correlation_threshold": 0.3,
+        "iterations": 4,
+        "random_state": 42,
+    }
+    segment, peaks, metrics = detect_qpp(**kwargs)
+    repeat_segment, repeat_peaks, repeat_metrics = detect_qpp(**kwargs)
+    np.testing.assert_array_equal(segment, repeat_segment)
+    np.testing.assert_array_equal(peaks, repeat_peaks)
+    assert metrics == repeat_metrics
+
+    # one permutation per batch, scoring each window as the original loop did
+    df = voxels * kwargs["window_length"]
+
+    def legacy_correlation(templates, data, window_length, means, norms):
+        return np.array(
+            [
+                [
+                    np.dot(
+                        template,
+                        normalize_segment(
+                            flattened_segment(data, window_length, tr), df
+                        ),
+                    )
+                    for tr in range(len(means))
+                ]
+                for template in templates
+            ]
+        )
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(
+            "CPAC.qpp.qpp.sliding_window_correlation", legacy_correlation
+        )
+        legacy_segment, legacy_peaks, legacy_metrics = detect_qpp(
+            **kwargs, max_memory_gb=1e-9
+        )
+    np.testing.assert_allclose(segment, legacy_segment, atol=1e-12)
+    np.testing.assert_array_equal(peaks, legacy_peaks)
+    np.testing.assert_allclose(metrics, legacy_metrics, atol=1e-12)
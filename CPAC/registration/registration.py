@@ -25,7 +25,7 @@ from nipype.interfaces.afni import utils as afni_utils
 
 from CPAC.anat_preproc.lesion_preproc import create_lesion_preproc
 from CPAC.func_preproc.func_preproc import fsl_afni_subworkflow
-from CPAC.func_preproc.utils import chunk_ts, split_ts_chunks
+from CPAC.func_preproc.utils import split_ts
 from CPAC.pipeline import nipype_pipeline_engine as pe
 from CPAC.pipeline.nodeblock import nodeblock
 from CPAC.registration.utils import (
@@ -52,8 +52,13 @@ def apply_transform(
     multi_input=False,
     num_cpus=1,
     num_ants_cores=1,
+    mem_gb=None,
 ):
-    """Apply transform."""
+    """Apply transform.
+
+    Time series are split into chunks to transform in parallel when
+    ``num_cpus`` > 1, sized to fit ``num_cpus`` chunks in ``mem_gb``.
+    """
     if not reg_tool:
         msg = (
             "\n[!] Developer info: the 'reg_tool' parameter sent to the"
@@ -135,39 +140,21 @@ def apply_transform(
         # parallelize the apply warp, if multiple CPUs, and it's a time
         # series!
         if int(num_cpus) > 1 and time_series:
-            chunk_imports = ["import nibabel as nib"]
-            chunk = pe.Node(
-                Function(
-                    input_names=["func_file", "n_chunks", "chunk_size"],
-                    output_names=["TR_ranges"],
-                    function=chunk_ts,
-                    imports=chunk_imports,
-                ),
-                name=f"chunk_{wf_name}",
-                mem_gb=2.5,
-            )
-
-            # chunk.inputs.n_chunks = int(num_cpus)
-
-            # 10-TR sized chunks
-            chunk.inputs.chunk_size = 10
-
-            wf.connect(inputNode, "input_image", chunk, "func_file")
-
-            split_imports = ["import os", "import subprocess"]
             split = pe.Node(
                 Function(
-                    input_names=["func_file", "tr_ranges"],
+                    input_names=["func_file", "n_cpus", "mem_gb", "reference"],
                     output_names=["split_funcs"],
-                    function=split_ts_chunks,
-                    imports=split_imports,
+                    function=split_ts,
                 ),
                 name=f"split_{wf_name}",
                 mem_gb=2.5,
             )
+            split.inputs.n_cpus = int(num_cpus)
+            if mem_gb:
+                split.inputs.mem_gb = mem_gb
 
             wf.connect(inputNode, "input_image", split, "func_file")
-            wf.connect(chunk, "TR_ranges", split, "tr_ranges")
+            wf.connect(inputNode, "reference", split, "reference")
 
             wf.connect(split, "split_funcs", apply_warp, "input_image")
 
@@ -222,39 +209,21 @@ def apply_transform(
         # parallelize the apply warp, if multiple CPUs, and it's a time
         # series!
         if int(num_cpus) > 1 and time_series:
-            chunk_imports = ["import nibabel as nib"]
-            chunk = pe.Node(
-                Function(
-                    input_names=["func_file", "n_chunks", "chunk_size"],
-                    output_names=["TR_ranges"],
-                    function=chunk_ts,
-                    imports=chunk_imports,
-                ),
-                name=f"chunk_{wf_name}",
-                mem_gb=2.5,
-            )
-
-            # chunk.inputs.n_chunks = int(num_cpus)
-
-            # 10-TR sized chunks
-            chunk.inputs.chunk_size = 10
-
-            wf.connect(inputNode, "input_image", chunk, "func_file")
-
-            split_imports = ["import os", "import subprocess"]
             split = pe.Node(
                 Function(
-                    input_names=["func_file", "tr_ranges"],
+                    input_names=["func_file", "n_cpus", "mem_gb", "reference"],
                     output_names=["split_funcs"],
-                    function=split_ts_chunks,
-                    imports=split_imports,
+                    function=split_ts,
                 ),
                 name=f"split_{wf_name}",
                 mem_gb=2.5,
             )
+            split.inputs.n_cpus = int(num_cpus)
+            if mem_gb:
+                split.inputs.mem_gb = mem_gb
 
             wf.connect(inputNode, "input_image", split, "func_file")
-            wf.connect(chunk, "TR_ranges", split, "tr_ranges")
+            wf.connect(inputNode, "reference", split, "reference")
 
             wf.connect(split, "split_funcs", apply_warp, "in_file")
 
@@ -3803,6 +3772,7 @@ def apply_blip_to_timeseries_separately(wf, cfg, strat_pool, pipe_num, opt=None)
         time_series=True,
         num_cpus=num_cpus,
         num_ants_cores=num_ants_cores,
+        mem_gb=cfg.pipeline_setup["system_config"]["maximum_memory_per_participant"],
     )
 
     if reg_tool == "ants":
@@ -3980,6 +3950,7 @@ def warp_timeseries_to_T1template(wf, cfg, strat_pool, pipe_num, opt=None):
         time_series=True,
         num_cpus=num_cpus,
         num_ants_cores=num_ants_cores,
+        mem_gb=cfg.pipeline_setup["system_config"]["maximum_memory_per_participant"],
     )
 
     if reg_tool == "ants":
@@ -4043,6 +4014,7 @@ def warp_timeseries_to_T1template_deriv(wf, cfg, strat_pool, pipe_num, opt=None)
         time_series=True,
         num_cpus=num_cpus,
         num_ants_cores=num_ants_cores,
+        mem_gb=cfg.pipeline_setup["system_config"]["maximum_memory_per_participant"],
     )
 
     if reg_tool == "ants":
@@ -5549,6 +5521,7 @@ def warp_resource_to_template(
         time_series=time_series,
         num_cpus=cfg.pipeline_setup["system_config"]["max_cores_per_participant"],
         num_ants_cores=cfg.pipeline_setup["system_config"]["num_ants_threads"],
+        mem_gb=cfg.pipeline_setup["system_config"]["maximum_memory_per_participant"],
     )
     # set appropriate 'interpolation' input based on registration tool
     if reg_tool == "ants":
@@ -1,4 +1,11 @@
 from .reho import create_reho
-from .utils import compute_reho, f_kendall, getOpString
+from .utils import compute_reho, f_kendall, getOpString, reho_map, tied_ranks
 
-__all__ = ["create_reho", "f_kendall", "getOpString", "compute_reho"]
+__all__ = [
+    "create_reho",
+    "f_kendall",
+    "getOpString",
+    "compute_reho",
+    "reho_map",
+    "tied_ranks",
+]
@@ -108,23 +108,17 @@ def create_reho(wf_name):
         util.IdentityInterface(fields=["raw_reho_map"]), name="outputspec"
     )
 
-    reho_imports = [
-        "import os",
-        "import sys",
-        "import nibabel as nib",
-        "import numpy as np",
-        "from CPAC.reho.utils import f_kendall",
-    ]
     raw_reho_map = pe.Node(
         Function(
-            input_names=["in_file", "mask_file", "cluster_size"],
+            input_names=["in_file", "mask_file", "cluster_size", "max_memory_gb"],
             output_names=["out_file"],
             function=compute_reho,
-            imports=reho_imports,
         ),
         name="reho_map",
         mem_gb=6.0,
     )
+    # working memory for ranking, beyond the timeseries counted in ``mem_gb``
+    raw_reho_map.inputs.max_memory_gb = 1.0
 
     reHo.connect(inputNode, "rest_res_filt", raw_reho_map, "in_file")
     reHo.connect(inputNode, "rest_mask", raw_reho_map, "mask_file")
@@ -0,0 +1,143 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for the vectorized ReHo engine."""
+
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+import numpy as np
+import pytest
+import nibabel as nib
+
+from CPAC.reho.utils import compute_reho, f_kendall, reho_map, tied_ranks
+
+RNG = np.random.default_rng(2012)
+
+
+def _legacy_ranks(res_data: np.ndarray) -> np.ndarray:
+    """Rank ``(timepoints, voxels)`` data with the original per-voxel tie loop."""
+    n_t = res_data.shape[0]
+    sorted_ranks = np.tile(np.arange(n_t)[:, np.newaxis], [1, res_data.shape[1]])
+    db = np.diff(np.sort(res_data, 0, kind="mergesort"), 1, 0) == 0
+    sort_index = np.argsort(res_data, axis=0, kind="mergesort")
+    for voxel in np.flatnonzero(np.sum(db, 0)):
+        ranks = sorted_ranks[:, voxel]
+        tieloc = np.append(np.flatnonzero(db[:, voxel]), n_t + 2)
+        tiecount = 0
+        while tiecount < len(tieloc) - 1:
+            tiestart = tieloc[tiecount]
+            ntied = 2
+            while tieloc[tiecount + 1] == (tieloc[tiecount] + 1):
+                tiecount += 1
+                ntied += 1
+            ranks[tiestart : tiestart + ntied] = np.ceil(
+                np.float32(np.sum(ranks[tiestart : tiestart + ntied]))
+                / np.float32(ntied)
+            )
+            tiecount += 1
+    out = np.zeros(res_data.shape)
+    np.put_along_axis(out, sort_index, sorted_ranks, axis=0)
+    return out
+
+
+def _legacy_reho(
+    res_data: np.ndarray, res_mask_data: np.ndarray, cluster_size: int
+) -> np.ndarray:
+    """Compute ReHo with the original triple voxel loop."""
+    n_x, n_y, n_z, n_t = res_data.shape
+    ranks = _legacy_ranks(
+        np.reshape(res_data, (n_x * n_y * n_z, n_t), order="F").T
+    ).reshape((n_t, n_x, n_y, n_z), order="F")
+    mask_cluster = np.ones((3, 3, 3))
+    distance = np.abs(np.indices((3, 3, 3)) - 1).sum(axis=0)
+    if cluster_size == 19:  # noqa: PLR2004
+        mask_cluster[distance == 3] = 0  # noqa: PLR2004
+    elif cluster_size == 7:  # noqa: PLR2004
+        mask_cluster[distance > 1] = 0
+    K = np.zeros((n_x, n_y, n_z))
+    for i in range(1, n_x - 1):
+        for j in range(1, n_y - 1):
+            for k in range(1, n_z - 1):
+                block = ranks[:, i - 1 : i + 2, j - 1 : j + 2, k - 1 : k + 2]
+                mask_block = res_mask_data[i - 1 : i + 2, j - 1 : j + 2, k - 1 : k + 2]
+                if int(mask_block[1, 1, 1]) != 0:
+                    mask_block = np.multiply(mask_block, mask_cluster)
+                    R_block = np.reshape(block, (n_t, 27), order="F")
+                    K[i, j, k] = f_kendall(
+                        R_block[:, np.reshape(mask_block, 27, order="F") > 0]
+                    )
+    return K
+
+
+def _synthetic_run(shape: tuple[int, int, int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """Return a quantized (tie-heavy) timeseries and a blob mask."""
+    data = np.round(RNG.normal(size=shape) * 3)
+    center = (np.array(shape[:3]) - 1) / 2
+    radius = np.linalg.norm(np.indices(shape[:3]).T - center, axis=-1).T
+    mask = (radius < min(shape[:3]) / 2.5).astype(float)
+    return data, mask
+
+
+def test_tied_ranks() -> None:
+    """Test ranks match the original tie adjustment, including all-tied rows."""
+    data = np.round(RNG.normal(size=(50, 40)))
+    data[:, 0] = 0
+    assert np.array_equal(tied_ranks(data.T).T, _legacy_ranks(data))
+
+
+@pytest.mark.parametrize("cluster_size", [7, 19, 27])
+@pytest.mark.parametrize("max_memory_gb", [None, 1e-6])
+@pytest.mark.parametrize("order", ["C", "F"])
+def test_reho_matches_legacy(
+    cluster_size: int, max_memory_gb: float | None, order: str
+) -> None:
+    """Test the vectorized ReHo map is identical to the voxel loop.
+
+    ``order="F"`` is the memory layout ``get_fdata`` returns.
+    """
+    data, mask = _synthetic_run((9, 10, 8, 30))
+    assert np.array_equal(
+        reho_map(np.asarray(data, order=order), mask, cluster_size, max_memory_gb),
+        _legacy_reho(data, mask, cluster_size),
+    )
+
+
+def test_compute_reho(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test ReHo NIfTI output from files on disk."""
+    data, mask = _synthetic_run((8, 8, 8, 20))
+    for name, array in {"bold": data, "mask": mask}.items():
+        nib.Nifti1Image(array, np.eye(4)).to_filename(tmp_path / f"{name}.nii.gz")
+    monkeypatch.chdir(tmp_path)
+    reho_file = compute_reho(
+        str(tmp_path / "bold.nii.gz"), str(tmp_path / "mask.nii.gz"), 27
+    )
+    assert np.array_equal(nib.load(reho_file).get_fdata(), _legacy_reho(data, mask, 27))
+
+
+def test_reho_benchmark(record_property: Callable[[str, object], None]) -> None:
+    """Benchmark the vectorized ReHo engine against the legacy voxel loop."""
+    data, mask = _synthetic_run((20, 24, 20, 150))
+    timings = {}
+    results = {}
+    for label, engine in {"legacy": _legacy_reho, "vectorized": reho_map}.items():
+        start = perf_counter()
+        results[label] = engine(data, mask, 27)
+        timings[label] = perf_counter() - start
+        record_property(f"{label}_seconds", timings[label])
+    assert np.array_equal(results["legacy"], results["vectorized"])
+    assert timings["vectorized"] < timings["legacy"]
@@ -15,11 +15,12 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
 import os
-import sys
+from typing import Optional
 
 import numpy as np
 import nibabel as nib
 
+from CPAC.utils.interfaces.function import Function
 from CPAC.utils.monitoring import IFLOGGER
 
 
@@ -79,11 +80,190 @@ def f_kendall(timeseries_matrix):
     return 12 * s / np.power(k, 2) / (np.power(n, 3) - n)
 
 
-def compute_reho(in_file, mask_file, cluster_size):
+def _cluster_offsets(cluster_size: int) -> np.ndarray:
+    """Return the ``(i, j, k)`` offsets of a 7-, 19- or 27-voxel neighbourhood.
+
+    Parameters
+    ----------
+    cluster_size : int
+        7 (faces), 19 (faces and edges) or 27 (faces, edges and corners).
+        Anything else is treated as 27.
+
+    Returns
+    -------
+    offsets : ndarray
+        ``(cluster_size, 3)`` array of offsets in ``{-1, 0, 1}``
+    """
+    offsets = np.array(
+        [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)]
+    )
+    distance = np.abs(offsets).sum(axis=1)
+    if cluster_size == 19:  # noqa: PLR2004
+        return offsets[distance < 3]  # noqa: PLR2004
+    if cluster_size == 7:  # noqa: PLR2004
+        return offsets[distance < 2]  # noqa: PLR2004
+    return offsets
+
+
+def _rows_per_chunk(n_rows: int, n_t: int, max_memory_gb: Optional[float]) -> int:
+    """Return how many ``n_t``-long rows to process at once within a memory cap.
+
+    Ranking a row needs about six ``n_t``-long 8-byte working arrays, which
+    also bounds the neighbourhood sums. Without a cap, all rows are processed
+    at once.
+    """
+    if not max_memory_gb:
+        return max(n_rows, 1)
+    return int(max(1, min(n_rows, max_memory_gb * 1024**3 // (n_t * 8 * 6))))
+
+
+def tied_ranks(data: np.ndarray) -> np.ndarray:
+    """Rank each row of ``data`` along its last axis, adjusting ties.
+
+    Ranks are 0-based. Each run of ``n`` tied values starting at sorted
+    position ``s`` receives ``ceil(mean(s, ..., s + n - 1))``, matching the
+    tie adjustment C-PAC has always used for ReHo.
+
+    Parameters
+    ----------
+    data : ndarray
+        ``(..., timepoints)`` array
+
+    Returns
+    -------
+    ranks : ndarray
+        float64 array of the same shape as ``data``
+    """
+    n_t = data.shape[-1]
+    order = np.argsort(data, axis=-1, kind="mergesort")
+    sorted_data = np.take_along_axis(data, order, axis=-1)
+    position = np.arange(n_t)
+
+    # a run starts wherever the sorted value differs from its predecessor
+    run_start = np.ones(data.shape, dtype=bool)
+    run_start[..., 1:] = np.diff(sorted_data, axis=-1) != 0
+    del sorted_data
+    run_end = np.ones(data.shape, dtype=bool)
+    run_end[..., :-1] = run_start[..., 1:]
+
+    start = np.maximum.accumulate(np.where(run_start, position, 0), axis=-1)
+    del run_start
+    end = np.flip(
+        np.minimum.accumulate(
+            np.flip(np.where(run_end, position, n_t - 1), axis=-1), axis=-1
+        ),
+        axis=-1,
+    )
+    del run_end
+    n_tied = end - start + 1
+    # same float32 mean and ceiling as the original per-voxel tie loop
+    tied_sum = n_tied * start + n_tied * (n_tied - 1) // 2
+    sorted_ranks = np.where(
+        n_tied > 1,
+        np.ceil(tied_sum.astype(np.float32) / n_tied.astype(np.float32)),
+        start,
+    )
+    del start, end, n_tied, tied_sum
+
+    ranks = np.empty(data.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=-1)
+    return ranks
+
+
+def reho_map(
+    data: np.ndarray,
+    mask: np.ndarray,
+    cluster_size: int,
+    max_memory_gb: Optional[float] = 1.0,
+) -> np.ndarray:
+    """Compute Kendall's coefficient of concordance for every in-mask voxel.
+
+    Only voxels with a positive mask value are ranked, and each ReHo value is
+    built from neighbourhood sums of those ranks gathered for all in-mask
+    voxels at once.
+
+    Parameters
+    ----------
+    data : ndarray
+        4D ``(x, y, z, t)`` timeseries
+
+    mask : ndarray
+        3D ``(x, y, z)`` mask. ReHo is computed for interior voxels whose
+        integer mask value is nonzero, using neighbours whose mask value is
+        positive.
+
+    cluster_size : int
+        7, 19 or 27 (default for any other value)
+
+    max_memory_gb : float, optional
+        Cap on the working memory used beyond the masked timeseries and its
+        ranks. Voxels are processed in chunks small enough to respect it.
+        If ``None``, all voxels are processed in one pass.
+
+    Returns
+    -------
+    K : ndarray
+        3D ``(x, y, z)`` ReHo map
     """
-    Computes the ReHo Map, by computing tied ranks of the timepoints,
-    followed by computing Kendall's coefficient concordance(KCC) of a
-    timeseries with its neighbours.
+    n_x, n_y, n_z, n_t = data.shape
+    n_voxels = n_x * n_y * n_z
+    K = np.zeros(n_voxels)
+
+    interior = np.zeros((n_x, n_y, n_z), dtype=bool)
+    interior[1:-1, 1:-1, 1:-1] = True
+    centers = np.flatnonzero(interior & (np.trunc(mask) != 0))
+    if not centers.size:
+        return K.reshape((n_x, n_y, n_z))
+
+    # rank only voxels that can be somebody's neighbour; everything else
+    # points at a trailing row of zeros
+    in_mask = (mask > 0).ravel()
+    rank_row = np.full(n_voxels, np.count_nonzero(in_mask), dtype=np.intp)
+    rank_row[in_mask] = np.arange(np.count_nonzero(in_mask))
+    # gather in-mask voxels directly: reshaping a Fortran-ordered image (as
+    # ``get_fdata`` returns) to C-ordered rows would copy the whole series
+    timeseries = data[mask > 0]
+    ranks = np.zeros((timeseries.shape[0] + 1, n_t))
+    chunk = _rows_per_chunk(timeseries.shape[0], n_t, max_memory_gb)
+    for first in range(0, timeseries.shape[0], chunk):
+        ranks[first : first + chunk] = tied_ranks(timeseries[first : first + chunk])
+    del timeseries
+
+    strides = np.array([n_y * n_z, n_z, 1])
+    neighbour_steps = _cluster_offsets(cluster_size) @ strides
+    chunk = _rows_per_chunk(centers.size, n_t, max_memory_gb)
+    for first in range(0, centers.size, chunk):
+        voxels = centers[first : first + chunk]
+        rows = rank_row[voxels[:, np.newaxis] + neighbour_steps]
+        sr = np.zeros((voxels.size, n_t))
+        for column in rows.T:
+            sr += ranks[column]
+        k = np.count_nonzero(in_mask[voxels[:, np.newaxis] + neighbour_steps], axis=1)
+        sr_bar = np.mean(sr, axis=1)
+        s = np.sum(np.power(sr, 2), axis=1) - n_t * np.power(sr_bar, 2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            K[voxels] = 12 * s / np.power(k, 2) / (np.power(n_t, 3) - n_t)
+    return K.reshape((n_x, n_y, n_z))
+
+
+@Function.sig_imports(
+    [
+        "import os",
+        "from typing import Optional",
+        "import nibabel as nib",
+        "from CPAC.reho.utils import reho_map",
+    ]
+)
+def compute_reho(
+    in_file: str,
+    mask_file: str,
+    cluster_size: int,
+    max_memory_gb: Optional[float] = 1.0,
+) -> str:
+    """Compute the ReHo map.
+
+    Computes tied ranks of the timepoints, followed by Kendall's
+    coefficient concordance(KCC) of a timeseries with its neighbours.
 
     Parameters
     ----------
@@ -97,6 +277,10 @@ def compute_reho(in_file, mask_file, cluster_size):
         for a brain voxel the number of neighbouring brain voxels to use for
         KCC.
 
+    max_memory_gb : float, optional
+        Cap on the working memory beyond the masked timeseries; see
+        :py:func:`reho_map`.
+
 
     Returns
     -------
@@ -104,184 +288,15 @@ def compute_reho(in_file, mask_file, cluster_size):
         ReHo map of the input EPI image
 
     """
-    res_fname = in_file
-    res_mask_fname = mask_file
-    CUTNUMBER = 10
-
     if cluster_size not in (27, 19, 7):
         cluster_size = 27
 
-    nvoxel = cluster_size
-
-    res_img = nib.load(res_fname)
-    res_mask_img = nib.load(res_mask_fname)
-
-    res_data = res_img.get_fdata()
-    res_mask_data = res_mask_img.get_fdata()
-
+    res_img = nib.load(in_file)
+    res_mask_data = nib.load(mask_file).get_fdata()
+    res_data = res_img.get_fdata(caching="unchanged")
     IFLOGGER.info(res_data.shape)
-    (n_x, n_y, n_z, n_t) = res_data.shape
-
-    # "flatten" each volume of the timeseries into one big array instead of
-    # x,y,z - produces (timepoints, N voxels) shaped data array
-    res_data = np.reshape(res_data, (n_x * n_y * n_z, n_t), order="F").T
-
-    # create a blank array of zeroes of size n_voxels, one for each time point
-    Ranks_res_data = np.tile(
-        (np.zeros((1, (res_data.shape)[1]))), [(res_data.shape)[0], 1]
-    )
-
-    # divide the number of total voxels by the cutnumber (set to 10)
-    # ex. end up with a number in the thousands if there are tens of thousands
-    # of voxels
-    segment_length = np.ceil(float((res_data.shape)[1]) / float(CUTNUMBER))
-
-    for icut in range(0, CUTNUMBER):
-        segment = None
-
-        # create a Numpy array of evenly spaced values from the segment
-        # starting point up until the segment_length integer
-        if not (icut == (CUTNUMBER - 1)):
-            segment = np.array(
-                np.arange(icut * segment_length, (icut + 1) * segment_length)
-            )
-        else:
-            segment = np.array(np.arange(icut * segment_length, (res_data.shape[1])))
-
-        segment = np.int64(segment[np.newaxis])
-
-        # res_data_piece is a chunk of the original timeseries in_file, but
-        # aligned with the current segment index spacing
-        res_data_piece = res_data[:, segment[0]]
-        nvoxels_piece = res_data_piece.shape[1]
 
-        # run a merge sort across the time axis, re-ordering the flattened
-        # volume voxel arrays
-        res_data_sorted = np.sort(res_data_piece, 0, kind="mergesort")
-        sort_index = np.argsort(res_data_piece, axis=0, kind="mergesort")
-
-        # subtract each volume from each other
-        db = np.diff(res_data_sorted, 1, 0)
-
-        # convert any zero voxels into "True" flag
-        db = db == 0
-
-        # return an n_voxel (n voxels within the current segment) sized array
-        # of values, each value being the sum total of TRUE values in "db"
-        sumdb = np.sum(db, 0)
-
-        temp_array = np.array(np.arange(0, n_t))
-        temp_array = temp_array[:, np.newaxis]
-
-        sorted_ranks = np.tile(temp_array, [1, nvoxels_piece])
-
-        if np.any(sumdb[:]):
-            tie_adjust_index = np.flatnonzero(sumdb)
-
-            for i in range(0, len(tie_adjust_index)):
-                ranks = sorted_ranks[:, tie_adjust_index[i]]
-
-                ties = db[:, tie_adjust_index[i]]
-
-                tieloc = np.append(np.flatnonzero(ties), n_t + 2)
-                maxties = len(tieloc)
-                tiecount = 0
-
-                while tiecount < maxties - 1:
-                    tiestart = tieloc[tiecount]
-                    ntied = 2
-                    while tieloc[tiecount + 1] == (tieloc[tiecount] + 1):
-                        tiecount += 1
-                        ntied += 1
-
-                    ranks[tiestart : tiestart + ntied] = np.ceil(
-                        np.float32(np.sum(ranks[tiestart : tiestart + ntied]))
-                        / np.float32(ntied)
-                    )
-                    tiecount += 1
-
-                sorted_ranks[:, tie_adjust_index[i]] = ranks
-
-        del db, sumdb
-        sort_index_base = np.tile(
-            np.multiply(np.arange(0, nvoxels_piece), n_t), [n_t, 1]
-        )
-        sort_index += sort_index_base
-        del sort_index_base
-
-        ranks_piece = np.zeros((n_t, nvoxels_piece))
-
-        ranks_piece = ranks_piece.flatten(order="F")
-        sort_index = sort_index.flatten(order="F")
-        sorted_ranks = sorted_ranks.flatten(order="F")
-
-        ranks_piece[sort_index] = np.array(sorted_ranks)
-
-        ranks_piece = np.reshape(ranks_piece, (n_t, nvoxels_piece), order="F")
-
-        del sort_index, sorted_ranks
-
-        Ranks_res_data[:, segment[0]] = ranks_piece
-
-        sys.stdout.write(".")
-
-    Ranks_res_data = np.reshape(Ranks_res_data, (n_t, n_x, n_y, n_z), order="F")
-
-    K = np.zeros((n_x, n_y, n_z))
-
-    mask_cluster = np.ones((3, 3, 3))
-
-    if nvoxel == 19:
-        mask_cluster[0, 0, 0] = 0
-        mask_cluster[0, 2, 0] = 0
-        mask_cluster[2, 0, 0] = 0
-        mask_cluster[2, 2, 0] = 0
-        mask_cluster[0, 0, 2] = 0
-        mask_cluster[0, 2, 2] = 0
-        mask_cluster[2, 0, 2] = 0
-        mask_cluster[2, 2, 2] = 0
-
-    elif nvoxel == 7:
-        mask_cluster[0, 0, 0] = 0
-        mask_cluster[0, 1, 0] = 0
-        mask_cluster[0, 2, 0] = 0
-        mask_cluster[0, 0, 1] = 0
-        mask_cluster[0, 2, 1] = 0
-        mask_cluster[0, 0, 2] = 0
-        mask_cluster[0, 1, 2] = 0
-        mask_cluster[0, 2, 2] = 0
-        mask_cluster[1, 0, 0] = 0
-        mask_cluster[1, 2, 0] = 0
-        mask_cluster[1, 0, 2] = 0
-        mask_cluster[1, 2, 2] = 0
-        mask_cluster[2, 0, 0] = 0
-        mask_cluster[2, 1, 0] = 0
-        mask_cluster[2, 2, 0] = 0
-        mask_cluster[2, 0, 1] = 0
-        mask_cluster[2, 2, 1] = 0
-        mask_cluster[2, 0, 2] = 0
-        mask_cluster[2, 1, 2] = 0
-        mask_cluster[2, 2, 2] = 0
-
-    for i in range(1, n_x - 1):
-        for j in range(1, n_y - 1):
-            for k in range(1, n_z - 1):
-                block = Ranks_res_data[:, i - 1 : i + 2, j - 1 : j + 2, k - 1 : k + 2]
-                mask_block = res_mask_data[i - 1 : i + 2, j - 1 : j + 2, k - 1 : k + 2]
-
-                if not (int(mask_block[1, 1, 1]) == 0):
-                    if nvoxel in (19, 7):
-                        mask_block = np.multiply(mask_block, mask_cluster)
-
-                    R_block = np.reshape(block, (block.shape[0], 27), order="F")
-                    mask_R_block = R_block[
-                        :,
-                        np.argwhere(np.reshape(mask_block, (1, 27), order="F") > 0)[
-                            :, 1
-                        ],
-                    ]
-
-                    K[i, j, k] = f_kendall(mask_R_block)
+    K = reho_map(res_data, res_mask_data, cluster_size, max_memory_gb)
 
     img = nib.Nifti1Image(K, header=res_img.header, affine=res_img.affine)
     reho_file = os.path.join(os.getcwd(), "ReHo.nii.gz")
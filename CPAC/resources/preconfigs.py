@@ -0,0 +1,51 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Preconfigured pipelines included with C-PAC.
+
+Listed here rather than in :py:mod:`CPAC.pipeline`, which monkeypatches
+Nipype on import, so that the CLI can offer them without importing Nipype.
+"""
+
+import os
+
+CONFIGS_DIR = os.path.join(os.path.dirname(__file__), "configs")
+"""directory of the preconfigured pipelines' YAML files"""
+
+
+def preconfig_path(preconfig_name: str) -> str:
+    """Return the path of a preconfigured pipeline's YAML file."""
+    return os.path.join(CONFIGS_DIR, f"pipeline_config_{preconfig_name}.yml")
+
+
+ALL_PIPELINE_CONFIGS = sorted(
+    x.split("_")[2].replace(".yml", "")
+    for x in os.listdir(CONFIGS_DIR)
+    if "pipeline_config" in x
+)
+AVAILABLE_PIPELINE_CONFIGS = [
+    preconfig
+    for preconfig in ALL_PIPELINE_CONFIGS
+    if preconfig not in ["benchmark-ANTS", "monkey-ABCD"]
+    and not preconfig.startswith("regtest-")
+]
+
+__all__ = [
+    "ALL_PIPELINE_CONFIGS",
+    "AVAILABLE_PIPELINE_CONFIGS",
+    "CONFIGS_DIR",
+    "preconfig_path",
+]
@@ -0,0 +1,177 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for timeseries extraction."""
+
+from ast import literal_eval
+import csv
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+import nibabel as nib
+
+from CPAC.timeseries.timeseries_analysis import (
+    gen_roi_timeseries,
+    gen_voxel_timeseries,
+)
+
+RNG = np.random.default_rng(2024)
+
+
+def _legacy_roi_timeseries(data_file: str, template: str) -> str:
+    """Write the ROI 1D file with the original one-mask-per-node loop."""
+    unit_data = np.int64(np.ceil(nib.load(template).get_fdata()))
+    img_data = nib.load(data_file).get_fdata()
+    node_dict = {}
+    for n in sorted(np.unique(unit_data).tolist()):
+        if n > 0:
+            node_dict[f"node_{n}"] = np.round(
+                np.mean(img_data[unit_data == n], axis=0), 6
+            ).tolist()
+    keys = sorted(int(float(key.split("node_")[1])) for key in node_dict)
+    value_list = [str("{0}\n".format(node_dict[f"node_{key}"])) for key in keys]
+    oneD_file = os.path.abspath("legacy.1D")
+    with open(oneD_file, "w") as f:
+        writer = csv.writer(f, delimiter=",")
+        writer.writerow(["#" + str(key) for key in keys])
+        for column in zip(*value_list):
+            writer.writerow(list(column))
+    return oneD_file
+
+
+def _legacy_voxel_timeseries(data_file: str, template: str) -> tuple[bytes, bytes]:
+    """Return the voxel 1D and CSV contents from the original per-row loops."""
+    unit_data = nib.load(template).get_fdata()
+    datafile = nib.load(data_file)
+    img_data = datafile.get_fdata()
+    qform = datafile.header.get_qform()
+    node_array = img_data[unit_data != 0].T
+    oneD = "".join(
+        f"{np.round(np.mean(node_array[t]), 6)!s}\n" for t in range(node_array.shape[0])
+    )
+    with open("legacy.csv", "wt") as f:
+        writer = csv.writer(f, delimiter=",", quoting=csv.QUOTE_MINIMAL)
+        headers = ["volume/xyz"]
+        for coordinate in np.argwhere(unit_data != 0):
+            product = np.dot(qform, np.concatenate([coordinate, np.array([1])]).T)
+            headers.append(tuple(product.tolist()[0:3]))
+        writer.writerow(headers)
+        writer.writerows([t, *node_array[t].tolist()] for t in range(len(node_array)))
+    return oneD.encode(), Path("legacy.csv").read_bytes()
+
+
+@pytest.mark.parametrize(
+    ("extension", "scaled", "max_memory_gb"),
+    [
+        (".nii.gz", False, None),
+        (".nii.gz", True, None),
+        (".nii", False, 1e-5),
+        (".nii", True, 1e-5),
+    ],
+)
+def test_gen_roi_timeseries(tmp_path, extension, scaled, max_memory_gb):
+    """Test single-pass ROI means write byte-identical 1D and txt files."""
+    os.chdir(tmp_path)
+    data = RNG.normal(size=(9, 8, 7, 25))
+    data[0, 0, 0] = -0.0
+    if scaled:
+        img = nib.Nifti1Image((data * 1000).astype(np.int16), np.eye(4))
+        img.header.set_slope_inter(0.0013, 2.5)
+    else:
+        img = nib.Nifti1Image(data, np.eye(4))
+    data_file = str(tmp_path / f"bold{extension}")
+    nib.save(img, data_file)
+    atlas = RNG.integers(0, 6, size=(9, 8, 7)) + 0.4
+    atlas[0, 0, 0] = 12
+    template = str(tmp_path / "atlas.nii.gz")
+    nib.save(nib.Nifti1Image(atlas, np.eye(4)), template)
+
+    expected = Path(_legacy_roi_timeseries(data_file, template)).read_bytes()
+    oneD_file = gen_roi_timeseries(
+        data_file, template, [False, False], max_memory_gb=max_memory_gb
+    )
+    assert Path(oneD_file).read_bytes() == expected
+    assert Path(oneD_file.replace(".1D", ".txt")).read_bytes() == expected
+
+
+@pytest.mark.parametrize(
+    ("extension", "scaled", "max_memory_gb", "binary_format"),
+    [
+        (".nii.gz", False, None, None),
+        (".nii.gz", True, None, "npz"),
+        (".nii", False, 1e-5, "npy"),
+        (".nii", True, 1e-5, None),
+    ],
+)
+def test_gen_voxel_timeseries(
+    tmp_path, extension, scaled, max_memory_gb, binary_format
+):
+    """Test streamed voxel timeseries match the per-row loops byte for byte."""
+    os.chdir(tmp_path)
+    affine = np.diag([-2.0, 2.5, 3.0, 1.0])
+    affine[:3, 3] = [90.0, -126.0, -72.0]
+    data = RNG.normal(size=(9, 8, 7, 25))
+    if scaled:
+        img = nib.Nifti1Image((data * 1000).astype(np.int16), affine)
+        img.header.set_slope_inter(0.0013, 2.5)
+    else:
+        img = nib.Nifti1Image(data, affine)
+    img.set_qform(affine, code=1)
+    data_file = str(tmp_path / f"bold{extension}")
+    nib.save(img, data_file)
+    mask = RNG.integers(0, 2, size=(9, 8, 7)).astype(np.uint8)
+    template = str(tmp_path / "mask.nii.gz")
+    nib.save(nib.Nifti1Image(mask, affine), template)
+
+    expected_1D, expected_csv = _legacy_voxel_timeseries(data_file, template)
+    oneD_file = gen_voxel_timeseries(
+        data_file, template, binary_format, max_memory_gb=max_memory_gb
+    )
+    assert Path(oneD_file).read_bytes() == expected_1D
+    assert Path(oneD_file.replace(".1D", ".csv")).read_bytes() == expected_csv
+    expected = nib.load(data_file).get_fdata()[mask != 0].T
+    if binary_format == "npy":
+        np.testing.assert_array_equal(np.load("mask_mask.npy"), expected)
+    elif binary_format == "npz":
+        assert not os.path.exists("mask_mask.npy")
+        with np.load("mask_mask.npz") as npz:
+            np.testing.assert_array_equal(npz["timeseries"], expected)
+            np.testing.assert_array_equal(
+                npz["coordinates"],
+                nib.affines.apply_affine(affine, np.argwhere(mask != 0)),
+            )
+
+
+def test_gen_voxel_timeseries_oblique(tmp_path):
+    """Test voxel coordinates from one matrix product under an oblique qform."""
+    os.chdir(tmp_path)
+    affine = nib.affines.from_matvec(
+        nib.eulerangles.euler2mat(0.3, -0.2, 0.1) * 2.0, [90.0, -126.0, -72.0]
+    )
+    img = nib.Nifti1Image(RNG.normal(size=(6, 5, 4, 3)), affine)
+    img.set_qform(affine, code=1)
+    nib.save(img, "bold.nii")
+    mask = np.ones((6, 5, 4), dtype=np.uint8)
+    nib.save(nib.Nifti1Image(mask, affine), "mask.nii")
+    gen_voxel_timeseries("bold.nii", "mask.nii")
+    with open("mask_mask.csv") as f:
+        headers = next(csv.reader(f))[1:]
+    np.testing.assert_allclose(
+        [literal_eval(header) for header in headers],
+        nib.affines.apply_affine(img.header.get_qform(), np.argwhere(mask)),
+    )
@@ -14,6 +14,8 @@
 
 # You should have received a copy of the GNU Lesser General Public
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+from typing import Optional
+
 from nipype.interfaces import afni, fsl, utility as util
 
 from CPAC.connectome.connectivity_matrix import (
@@ -460,10 +462,53 @@ def get_normalized_moments(wf_name="normalized_moments"):
     return wflow
 
 
-def gen_roi_timeseries(data_file, template, output_type):
+def time_chunks(img, max_memory_gb=None):
+    """Yield ``(start, stop, data)`` blocks of a 4D image along time.
+
+    Each block is read as float64 and scaled exactly as ``img.get_fdata()``
+    would scale it. Uncompressed images are memory-mapped, so only the
+    requested volumes are read from disk.
+
+    Parameters
+    ----------
+    img : nibabel.spatialimages.SpatialImage
+        4D image
+
+    max_memory_gb : float, optional
+        approximate cap on the size of each block; the whole series is read
+        at once if unset
+
+    Yields
+    ------
+    start, stop : int
+        time indices of the block
+
+    data : numpy.ndarray
+        ``(x, y, z, stop - start)`` data
+    """
+    import numpy as np
+
+    trs = img.shape[3]
+    volume_bytes = np.prod(img.shape[:3]) * np.dtype(np.float64).itemsize
+    chunk_size = trs
+    if max_memory_gb is not None:
+        chunk_size = int(max(1, min(trs, max_memory_gb * 1024**3 // volume_bytes)))
+    for start in range(0, trs, chunk_size):
+        stop = min(start + chunk_size, trs)
+        yield (
+            start,
+            stop,
+            np.asarray(img.dataobj[..., start:stop], dtype=np.float64),
+        )
+
+
+def gen_roi_timeseries(data_file, template, output_type, max_memory_gb=None):
     """
     Extract mean of voxel across all timepoints for each node in roi mask.
 
+    All node means are computed in a single pass over the data, optionally
+    in blocks of TRs (see ``max_memory_gb``).
+
     Parameters
     ----------
     data_file : string
@@ -474,6 +519,8 @@ def gen_roi_timeseries(data_file, template, output_type):
         list of two boolean values suggesting
         the output types - numpy npz file and csv
         format
+    max_memory_gb : float, optional
+        approximate cap on the memory used to hold functional data at once
 
     Returns
     -------
@@ -494,14 +541,14 @@ def gen_roi_timeseries(data_file, template, output_type):
     import numpy as np
     import nibabel as nib
 
+    from CPAC.timeseries.timeseries_analysis import time_chunks
+
     unit_data = nib.load(template).get_fdata()
     # Cast as rounded-up integer
     unit_data = np.int64(np.ceil(unit_data))
     datafile = nib.load(data_file)
-    img_data = datafile.get_fdata()
-    img_data.shape[3]
 
-    if unit_data.shape != img_data.shape[:3]:
+    if unit_data.shape != datafile.shape[:3]:
         msg = (
             "\n\n[!] CPAC says: Invalid Shape Error."
             "Please check the voxel dimensions. "
@@ -509,96 +556,72 @@ def gen_roi_timeseries(data_file, template, output_type):
         )
         raise Exception(msg)
 
-    nodes = np.unique(unit_data).tolist()
-    sorted_list = []
-    node_dict = {}
-    out_list = []
+    # group in-ROI voxels by node, keeping each node's voxels in array order so
+    # sums accumulate exactly as a per-node mean over img_data[unit_data == n]
+    labels = unit_data.ravel()
+    in_roi = np.flatnonzero(labels > 0)
+    order = in_roi[np.argsort(labels[in_roi], kind="stable")]
+    nodes, starts, counts = np.unique(
+        labels[order], return_index=True, return_counts=True
+    )
+    # NIfTI data are stored (and memory-mapped) in Fortran order
+    order = np.ravel_multi_index(
+        np.unravel_index(order, unit_data.shape), unit_data.shape, order="F"
+    )
+    sums = np.empty((len(nodes), datafile.shape[3]))
+    for start, stop, data in time_chunks(datafile, max_memory_gb):
+        sums[:, start:stop] = np.add.reduceat(
+            data.reshape(-1, stop - start, order="F")[order], starts, axis=0
+        )
+    # reduceat starts from each node's first voxel where the per-node mean
+    # started from 0, so add 0 to turn lone -0.0 sums into 0.0 as before
+    sums += 0.0
+    averages = np.round(sums / counts[:, np.newaxis], 6)
 
     # extracting filename from input template
     tmp_file = os.path.splitext(os.path.basename(template))[0]
     tmp_file = os.path.splitext(tmp_file)[0]
     oneD_file = os.path.abspath("roi_" + tmp_file + ".1D")
     txt_file = os.path.abspath("roi_" + tmp_file + ".txt")
-    os.path.abspath("roi_" + tmp_file + ".csv")
-    os.path.abspath("roi_" + tmp_file + ".npz")
-
-    nodes.sort()
-    for n in nodes:
-        if n > 0:
-            node_array = img_data[unit_data == n]
-            node_str = f"node_{n}"
-            avg = np.mean(node_array, axis=0)
-            avg = np.round(avg, 6)
-            list1 = [n, *avg.tolist()]
-            sorted_list.append(list1)
-            node_dict[node_str] = avg.tolist()
 
     # writing to 1Dfile
     FMLOGGER.info("writing 1D file..")
-    f = open(oneD_file, "w")
-    writer = csv.writer(f, delimiter=",")
-
-    value_list = []
-
-    new_keys = sorted([int(float(key.split("node_")[1])) for key in node_dict])
-
-    roi_number_list = [str(n) for n in new_keys]
-
-    roi_number_str = []
-    for number in roi_number_list:
-        roi_number_str.append("#" + number)
-
-    for key in new_keys:
-        value_list.append(str("{0}\n".format(node_dict[f"node_{key}"])))
-
-    column_list = list(zip(*value_list))
-
-    writer.writerow(roi_number_str)
-
-    for column in column_list:
-        writer.writerow(list(column))
-    f.close()
-
-    out_list.append(oneD_file)
+    value_list = [f"{average.tolist()}\n" for average in averages]
+    with open(oneD_file, "w") as f:
+        writer = csv.writer(f, delimiter=",")
+        writer.writerow([f"#{node}" for node in nodes])
+        writer.writerows(zip(*value_list))
 
     # copy the 1D contents to txt file
     shutil.copy(oneD_file, txt_file)
-    out_list.append(txt_file)
-
-    # if csv is required
-    """
-    if output_type[0]:
-        FMLOGGER.info("writing csv file..")
-        f = open(csv_file, 'wt')
-        writer = csv.writer(f, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-        headers = ['node/volume'] + np.arange(vol).tolist()
-        writer.writerow(headers)
-        writer.writerows(sorted_list)
-        f.close()
-        out_list.append(csv_file)
-
-    # if npz file is required
-    if output_type[1]:
-        FMLOGGER.info("writing npz file..")
-        np.savez(numpy_file, roi_data=value_list, roi_numbers=roi_number_list)
-        out_list.append(numpy_file)
-
-    return out_list
-    """
 
     return oneD_file
 
 
-def gen_voxel_timeseries(data_file: str, template: str) -> str:
+def gen_voxel_timeseries(
+    data_file: str,
+    template: str,
+    binary_format: Optional[str] = None,
+    max_memory_gb: Optional[float] = None,
+) -> str:
     """
     Extract timeseries for each voxel in the data that is present in the input mask.
 
+    Timepoints are read, masked and written in blocks, so memory use stays
+    near the size of the masked timeseries rather than the whole image.
+
     Parameters
     ----------
     datafile : string (nifti file)
         path to input functional data
     template : string (nifti file)
         path to input mask in functional native space
+    binary_format : {None, "npy", "npz"}, optional
+        also write the masked timeseries (timepoints x voxels) next to the
+        CSV; an ``.npz`` also holds the voxel coordinates
+    max_memory_gb : float, optional
+        approximate cap on each block read from ``data_file``; defaults to
+        the size of the masked timeseries
 
     Returns
     -------
@@ -607,7 +630,8 @@ def gen_voxel_timeseries(data_file: str, template: str) -> str:
 
     Raises
     ------
-    Exception
+    ValueError
+        if ``binary_format`` is not one of the above
 
     """
     import csv
@@ -616,46 +640,65 @@ def gen_voxel_timeseries(data_file: str, template: str) -> str:
     import numpy as np
     import nibabel as nib
 
-    unit = nib.load(template)
-    unit_data = unit.get_fdata()
+    from CPAC.timeseries.timeseries_analysis import time_chunks
+
+    if binary_format not in (None, "npy", "npz"):
+        msg = f"binary_format must be None, 'npy' or 'npz', not {binary_format!r}"
+        raise ValueError(msg)
+
+    unit_data = np.asanyarray(nib.load(template).dataobj)
     datafile = nib.load(data_file)
-    img_data = datafile.get_fdata()
-    header_data = datafile.header
-    qform = header_data.get_qform()
-    sorted_list = []
+    qform = datafile.header.get_qform()
+    time_points = datafile.shape[3]
+
+    coordinates = np.argwhere(unit_data != 0)
+    del unit_data
+    # mask voxels (in C order, like the coordinates) within Fortran-ordered volumes
+    voxels = np.ravel_multi_index(coordinates.T, datafile.shape[:3], order="F")
+    if max_memory_gb is None:
+        max_memory_gb = len(voxels) * time_points * 8 / 1024**3
+    # every voxel's scanner coordinates in one matrix product
+    xyz = np.dot(qform, np.c_[coordinates, np.ones(len(coordinates), dtype=int)].T)
 
     tmp_file = os.path.splitext(os.path.basename(template))[0]
     tmp_file = os.path.splitext(tmp_file)[0]
     oneD_file = os.path.abspath("mask_" + tmp_file + ".1D")
-    f = open(oneD_file, "wt")
-
-    node_array = img_data[unit_data != 0]
-    node_array = node_array.T
-    time_points = node_array.shape[0]
-    for t in range(0, time_points):
-        f.write(str(np.round(np.mean(node_array[t]), 6)))
-        f.write("\n")
-        val = node_array[t].tolist()
-        val.insert(0, t)
-        sorted_list.append(val)
-
-    f.close()
-
     csv_file = os.path.abspath("mask_" + tmp_file + ".csv")
-    f = open(csv_file, "wt")
-    writer = csv.writer(f, delimiter=str(","), quoting=csv.QUOTE_MINIMAL)
-    one = np.array([1])
-    headers = ["volume/xyz"]
-    coordinates = np.argwhere(unit_data != 0)
-    for val in range(len(coordinates)):
-        ijk_mat = np.concatenate([coordinates[val], one])
-        ijk_mat = ijk_mat.T
-        product = np.dot(qform, ijk_mat)
-        val = tuple(product.tolist()[0:3])
-        headers.append(val)
-    writer.writerow(headers)
-    writer.writerows(sorted_list)
-    f.close()
+    npy_file = None
+    if binary_format:
+        npy_file = os.path.abspath("mask_" + tmp_file + ".npy")
+        binary = np.lib.format.open_memmap(
+            npy_file, mode="w+", dtype=np.float64, shape=(time_points, len(voxels))
+        )
+
+    with open(oneD_file, "wt") as oneD, open(csv_file, "wt") as f:
+        writer = csv.writer(f, delimiter=str(","), quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(["volume/xyz", *map(tuple, xyz[0:3].T.tolist())])
+        for start, stop, data in time_chunks(datafile, max_memory_gb):
+            node_array = np.ascontiguousarray(
+                data.reshape(-1, stop - start, order="F")[voxels].T
+            )
+            del data
+            oneD.writelines(
+                f"{mean}\n" for mean in np.round(np.mean(node_array, axis=1), 6)
+            )
+            writer.writerows(
+                [t, *values]
+                for t, values in enumerate(node_array.tolist(), start=start)
+            )
+            if npy_file:
+                binary[start:stop] = node_array
+
+    if npy_file:
+        binary.flush()
+        del binary
+        if binary_format == "npz":
+            np.savez(
+                npy_file[:-4] + ".npz",
+                timeseries=np.load(npy_file, mmap_mode="r"),
+                coordinates=xyz[0:3].T,
+            )
+            os.remove(npy_file)
 
     return oneD_file
 
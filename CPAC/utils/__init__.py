@@ -14,20 +14,54 @@
 
 # You should have received a copy of the GNU Lesser General Public
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
-"""General utilities for C-PAC."""
-
-from . import build_data_config, create_fsl_flame_preset, versioning
-from .configuration import check_pname, Configuration, set_subject
-from .datatypes import ListFromItem
-from .interfaces import function
-from .sklearn import check_random_state
-from .utils import (
-    correlation,
-    find_files,
-    get_zscore,
-    repickle,
-    safe_shape,
-)
+"""General utilities for C-PAC.
+
+Attributes are imported on first access, so importing a submodule (e.g.,
+:py:mod:`CPAC.utils.docs`) doesn't import Nipype and the configuration
+schema along with every other utility.
+"""
+
+from importlib import import_module
+from importlib.util import find_spec
+
+_LAZY_ATTRIBUTES = {
+    "build_data_config": (".build_data_config", None),
+    "check_pname": (".configuration", "check_pname"),
+    "check_random_state": (".sklearn", "check_random_state"),
+    "Configuration": (".configuration", "Configuration"),
+    "correlation": (".utils", "correlation"),
+    "create_fsl_flame_preset": (".create_fsl_flame_preset", None),
+    "find_files": (".utils", "find_files"),
+    "function": (".interfaces", "function"),
+    "get_zscore": (".utils", "get_zscore"),
+    "ListFromItem": (".datatypes", "ListFromItem"),
+    "repickle": (".utils", "repickle"),
+    "safe_shape": (".utils", "safe_shape"),
+    "set_subject": (".configuration", "set_subject"),
+    "versioning": (".versioning", None),
+}
+"""{attribute: (module, attribute in module or None for the module itself)}"""
+
+
+def __getattr__(name: str):
+    """Import an exported attribute or a submodule on first access."""
+    if name in _LAZY_ATTRIBUTES:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    elif not name.startswith("__") and find_spec(f"{__name__}.{name}"):
+        module_name, attribute = f".{name}", None
+    else:
+        msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(msg)
+    module = import_module(module_name, __name__)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    """List exported attributes, including those not yet imported."""
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
+
 
 __all__ = [
     "build_data_config",
@@ -0,0 +1,417 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""A persistent, incremental index of the files in a BIDS directory.
+
+:py:class:`BIDSLayoutIndex` stores the NIfTI files and JSON sidecars C-PAC
+reads from a local or S3 BIDS directory in an SQLite file, with their
+parsed entities and sidecar contents, keyed by path and size & modification
+time (or ETag on S3). Rescanning only reads sidecars that changed, so
+relaunching on a large dataset doesn't reread every sidecar. Participants'
+files and the sidecars that apply to them can then be queried directly.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sqlite3
+from typing import Any, Callable, Iterable, Optional
+
+from CPAC.utils.monitoring import UTLOGGER
+from CPAC.utils.s3 import s3_client, S3_PREFIX
+
+SCHEMA_VERSION = 1
+"""version of the index's tables; indices of other versions are rebuilt"""
+SUFFIXES = (
+    "T1w",
+    "T2w",
+    "bold",
+    "epi",
+    "phasediff",
+    "phase1",
+    "phase2",
+    "magnitude",
+    "magnitude1",
+    "magnitude2",
+)
+"""BIDS suffixes of the files C-PAC reads"""
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    stamp TEXT NOT NULL,
+    sub TEXT,
+    ses TEXT,
+    suffix TEXT,
+    entities TEXT NOT NULL,
+    sidecar TEXT,
+    PRIMARY KEY (root, path)
+);
+CREATE INDEX IF NOT EXISTS files_sub ON files (root, kind, sub);
+"""
+
+
+def file_kind(filename: str) -> Optional[str]:
+    """Return whether C-PAC reads a file as a "json" sidecar or "nii" image.
+
+    Examples
+    --------
+    >>> file_kind("sub-1_ses-1_T1w.nii.gz")
+    'nii'
+    >>> file_kind("task-rest_bold.json")
+    'json'
+    >>> file_kind("sub-1_dir-AP_epi.nii.gz") is None
+    True
+    >>> file_kind("sub-1_acq-fMRI_dir-AP_epi.nii.gz")
+    'nii'
+    >>> file_kind("sub-1_dwi.nii.gz") is None
+    True
+    """
+    if not any(
+        suffix in filename
+        for suffix in SUFFIXES
+        if suffix != "epi" or "acq-fMRI" in filename
+    ):
+        return None
+    if filename.endswith("json"):
+        return "json"
+    if "nii" in filename:
+        return "nii"
+    return None
+
+
+def parse_entities(path: str) -> dict[str, str]:
+    """Parse the entities and suffix of a BIDS path.
+
+    A participant label in a ``sub-`` directory is used if the filename has
+    none, so participant-level sidecars apply to their participant.
+
+    Examples
+    --------
+    >>> parse_entities("sub-1/ses-2/func/sub-1_ses-2_task-rest_bold.nii.gz")
+    {'sub': '1', 'ses': '2', 'task': 'rest', 'suffix': 'bold'}
+    >>> parse_entities("sub-1/dir-AP_epi.json")
+    {'dir': 'AP', 'suffix': 'epi', 'sub': '1'}
+    """
+    entities = {}
+    for chunk in os.path.basename(path).split(".")[0].split("_"):
+        if "-" in chunk:
+            key, value = chunk.split("-", 1)
+            entities[key] = value
+        else:
+            entities["suffix"] = chunk
+    if "sub" not in entities:
+        for directory in os.path.dirname(path).split("/"):
+            if directory.startswith("sub-"):
+                entities["sub"] = directory[4:]
+                break
+    return entities
+
+
+def _participants(participant_labels: Optional[Iterable[str]]) -> Optional[list]:
+    """Strip any "sub-" prefixes from participant labels."""
+    if participant_labels is None:
+        return None
+    return [
+        label[4:] if label.startswith("sub-") else label for label in participant_labels
+    ]
+
+
+class BIDSLayoutIndex:
+    """An SQLite index of the images and sidecars in a BIDS directory.
+
+    Paths are stored relative to the BIDS directory, as
+    :py:func:`~CPAC.utils.bids_utils.collect_bids_files_configs` returns
+    them. One index file can hold several BIDS directories.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> bids_dir = tempfile.mkdtemp()
+    >>> os.makedirs(os.path.join(bids_dir, "sub-1", "anat"))
+    >>> open(os.path.join(bids_dir, "sub-1", "anat", "sub-1_T1w.nii.gz"), "w").close()
+    >>> with open(os.path.join(bids_dir, "T1w.json"), "w") as sidecar:
+    ...     _ = sidecar.write('{"RepetitionTime": 2}')
+    >>> with BIDSLayoutIndex(bids_dir) as index:
+    ...     index.scan()
+    ...     index.niftis(["sub-1"]), index.sidecars()
+    {'added': 2, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    (['sub-1/anat/sub-1_T1w.nii.gz'], {'T1w.json': {'RepetitionTime': 2}})
+    """
+
+    def __init__(
+        self,
+        bids_dir: str,
+        index_path: Optional[str] = None,
+        creds_path: Optional[str] = None,
+        max_workers: int = 16,
+        get_client: Callable[[Optional[str], str], Any] = s3_client,
+    ) -> None:
+        """Open (or create) an index.
+
+        Parameters
+        ----------
+        bids_dir : str
+            local path or S3 URI of the BIDS directory
+        index_path : str, optional
+            SQLite file to keep the index in between runs; by default, the
+            index is kept in memory
+        creds_path : str, optional
+            AWS credentials for an S3 BIDS directory
+        max_workers : int
+            concurrent S3 listings and sidecar reads
+        get_client : callable
+            ``(creds_path, bucket_name) -> client``
+        """
+        self.bids_dir = bids_dir
+        self.creds_path = creds_path
+        self.max_workers = max_workers
+        self._get_client = get_client
+        self.is_s3 = bids_dir.lower().startswith(S3_PREFIX)
+        if self.is_s3:
+            self.bucket_name = bids_dir.split("/")[2]
+            self.prefix = "/".join(bids_dir.split("/")[3:]).strip("/")
+            self.root = f"{S3_PREFIX}{self.bucket_name}/{self.prefix}"
+        else:
+            self.root = os.path.realpath(bids_dir)
+        if index_path:
+            os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self.index_path = index_path or ":memory:"
+        self._db = sqlite3.connect(self.index_path, timeout=600)
+        if index_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS files")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self) -> "BIDSLayoutIndex":
+        """Use the index as a context manager."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Close the index."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the index's database connection."""
+        self._db.close()
+
+    def scan(self) -> dict[str, int]:
+        """Bring the index up to date with the BIDS directory.
+
+        Only sidecars that were added or changed since the last scan are read.
+
+        Returns
+        -------
+        dict
+            counts of files "added", "updated", "removed" and "unchanged"
+        """
+        UTLOGGER.info("Indexing %s in %s", self.bids_dir, self.index_path)
+        found = self._list_s3() if self.is_s3 else self._list_local()
+        stamps = dict(
+            self._db.execute(
+                "SELECT path, stamp FROM files WHERE root = ?", (self.root,)
+            )
+        )
+        changed = [
+            path for path, (stamp, _) in found.items() if stamps.get(path) != stamp
+        ]
+        read = self._read_s3 if self.is_s3 else self._read_local
+        to_read = [path for path in changed if found[path][1] == "json"]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            sidecars = dict(zip(to_read, pool.map(read, to_read)))
+        rows = [self._row(path, *found[path], sidecars.get(path)) for path in changed]
+        removed = [(self.root, path) for path in stamps if path not in found]
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.executemany(
+                "DELETE FROM files WHERE root = ? AND path = ?", removed
+            )
+        counts = {
+            "added": len([path for path in changed if path not in stamps]),
+            "updated": len([path for path in changed if path in stamps]),
+            "removed": len(removed),
+            "unchanged": len(found) - len(changed),
+        }
+        UTLOGGER.info(
+            "Indexed %s: %d added, %d updated, %d removed, %d unchanged",
+            self.bids_dir,
+            *counts.values(),
+        )
+        return counts
+
+    def _row(self, path: str, stamp: str, kind: str, sidecar: Optional[str]) -> tuple:
+        """Return a file's row in the index."""
+        entities = parse_entities(path)
+        return (
+            self.root,
+            path,
+            kind,
+            stamp,
+            entities.get("sub"),
+            entities.get("ses"),
+            entities.get("suffix"),
+            json.dumps(entities),
+            sidecar,
+        )
+
+    def niftis(self, participant_labels: Optional[Iterable[str]] = None) -> list[str]:
+        """Return the indexed NIfTI images, of some participants if given."""
+        return [
+            path for (path,) in self._query("path", "nii", participant_labels, False)
+        ]
+
+    def sidecars(
+        self, participant_labels: Optional[Iterable[str]] = None
+    ) -> dict[str, dict]:
+        """Return the indexed sidecars' contents by path.
+
+        If participants are given, only their sidecars and the sidecars that
+        aren't specific to any participant (which they may inherit) are
+        returned.
+        """
+        return {
+            path: json.loads(sidecar)
+            for path, sidecar in self._query(
+                "path, sidecar", "json", participant_labels, True
+            )
+        }
+
+    def _query(
+        self,
+        columns: str,
+        kind: str,
+        participant_labels: Optional[Iterable[str]],
+        shared: bool,
+    ) -> sqlite3.Cursor:
+        """Select files of a kind in path order, of some participants if given."""
+        query = f"SELECT {columns} FROM files WHERE root = ? AND kind = ?"
+        params = [self.root, kind]
+        participants = _participants(participant_labels)
+        if participants is not None:
+            query += (
+                f" AND (sub IN ({', '.join('?' * len(participants))})"
+                f"{' OR sub IS NULL' if shared else ''})"
+            )
+            params += participants
+        return self._db.execute(f"{query} ORDER BY path", params)
+
+    def _list_local(self) -> dict[str, tuple[str, str]]:
+        """List the files C-PAC reads in a local BIDS directory.
+
+        Returns
+        -------
+        dict
+            relative path: (size & modification time, kind)
+        """
+        found = {}
+        for root, _dirs, files in os.walk(self.root, followlinks=True):
+            rel_root = root[len(self.root) :].lstrip("/")
+            for filename in files:
+                kind = file_kind(filename)
+                if kind is None:
+                    continue
+                try:
+                    stat = os.stat(f"{root}/{filename}")
+                except FileNotFoundError:
+                    continue
+                found[f"{rel_root}/{filename}" if rel_root else filename] = (
+                    f"{stat.st_size}:{stat.st_mtime_ns}",
+                    kind,
+                )
+        return found
+
+    def _read_local(self, path: str) -> str:
+        """Read a local sidecar."""
+        file_path = os.path.join(self.root, path)
+        try:
+            with open(file_path, "r") as sidecar:
+                return json.dumps(json.load(sidecar))
+        except UnicodeDecodeError as unicode_decode_error:
+            msg = f"Could not decode {file_path}"
+            raise UnicodeDecodeError(
+                unicode_decode_error.encoding,
+                unicode_decode_error.object,
+                unicode_decode_error.start,
+                unicode_decode_error.end,
+                msg,
+            ) from unicode_decode_error
+
+    @property
+    def _client(self) -> Any:
+        """Return the S3 client for the BIDS directory's bucket."""
+        return self._get_client(self.creds_path, self.bucket_name)
+
+    def _list_s3_prefix(
+        self, prefix: str, delimiter: str = ""
+    ) -> tuple[dict[str, tuple[str, str]], list[str]]:
+        """List the files C-PAC reads under an S3 prefix.
+
+        Returns
+        -------
+        dict
+            relative path: (ETag, kind)
+        list
+            common prefixes, if listed with a delimiter
+        """
+        found = {}
+        prefixes = []
+        for page in self._client.get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket_name, Prefix=prefix, Delimiter=delimiter
+        ):
+            prefixes += [common["Prefix"] for common in page.get("CommonPrefixes", [])]
+            for s3_obj in page.get("Contents", []):
+                kind = file_kind(s3_obj["Key"].rsplit("/", 1)[-1])
+                if kind is not None:
+                    found[s3_obj["Key"][len(self.prefix) :].lstrip("/")] = (
+                        s3_obj["ETag"],
+                        kind,
+                    )
+        return found, prefixes
+
+    def _list_s3(self) -> dict[str, tuple[str, str]]:
+        """List the files C-PAC reads in an S3 BIDS directory.
+
+        The top level is listed first, then each directory in it concurrently.
+        """
+        found, prefixes = self._list_s3_prefix(
+            f"{self.prefix}/" if self.prefix else "", "/"
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for sub_found, _ in pool.map(self._list_s3_prefix, prefixes):
+                found.update(sub_found)
+        return found
+
+    def _read_s3(self, path: str) -> str:
+        """Fetch an S3 sidecar."""
+        from CPAC.utils.bids_utils import SpecifiedBotoCoreError
+
+        key = f"{self.prefix}/{path}" if self.prefix else path
+        try:
+            return json.dumps(
+                json.loads(
+                    self._client.get_object(Bucket=self.bucket_name, Key=key)[
+                        "Body"
+                    ].read()
+                )
+            )
+        except Exception as exception:
+            msg = f"Error retrieving {path} ({exception})"
+            raise SpecifiedBotoCoreError(msg) from exception
@@ -16,7 +16,6 @@
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
 from base64 import b64decode
 from collections.abc import Iterable
-import json
 import os
 import re
 import sys
@@ -26,6 +25,7 @@ from warnings import warn
 from botocore.exceptions import BotoCoreError
 import yaml
 
+from CPAC.utils.bids_index import BIDSLayoutIndex
 from CPAC.utils.monitoring import UTLOGGER
 
 
@@ -565,6 +565,8 @@ def bids_gen_cpac_sublist(
     dbg=False,
     raise_error=True,
     only_one_anat=True,
+    index=None,
+    participant_labels=None,
 ):
     """
     Generates a CPAC formatted subject list from information contained in a
@@ -604,12 +606,23 @@ def bids_gen_cpac_sublist(
         temporarily store a list instead by passing True here if we
         will be filtering that list down to a single string later
 
+    index : BIDSLayoutIndex, optional
+        a scanned index of bids_dir to query for the nifti files and
+        sidecars instead of paths_list and config_dict
+
+    participant_labels : list, optional
+        participants to query index for; by default, all
+
     Returns
     -------
     list
         a list of dictionaries suitable for use by CPAC to specify data
         to be processed
     """
+    if index is not None:
+        paths_list = index.niftis(participant_labels)
+        config_dict = index.sidecars(participant_labels)
+
     if dbg:
         UTLOGGER.debug(
             "gen_bids_sublist called with:\n  bids_dir: %s\n  # paths: %s"
@@ -802,96 +815,17 @@ def bids_gen_cpac_sublist(
     return sublist
 
 
-def collect_bids_files_configs(bids_dir, aws_input_creds=""):
-    """
-    :param bids_dir:
-    :param aws_input_creds:
-    :return:
-    """
-    file_paths = []
-    config_dict = {}
-
-    suffixes = [
-        "T1w",
-        "T2w",
-        "bold",
-        "epi",
-        "phasediff",
-        "phase1",
-        "phase2",
-        "magnitude",
-        "magnitude1",
-        "magnitude2",
-    ]
-
-    if bids_dir.lower().startswith("s3://"):
-        # s3 paths begin with s3://bucket/
-        bucket_name = bids_dir.split("/")[2]
-        s3_prefix = "/".join(bids_dir.split("/")[:3])
-        prefix = bids_dir.replace(s3_prefix, "").lstrip("/")
-
-        if aws_input_creds:
-            if not os.path.isfile(aws_input_creds):
-                raise IOError("Could not find aws_input_creds (%s)" % (aws_input_creds))
-
-        from indi_aws import fetch_creds
+def _scan_bids_index(bids_dir, aws_input_creds="", index_path=None):
+    """Index a BIDS directory's images and sidecars, raising if there are none."""
+    if bids_dir.lower().startswith("s3://") and aws_input_creds:
+        if not os.path.isfile(aws_input_creds):
+            raise IOError("Could not find aws_input_creds (%s)" % (aws_input_creds))
 
-        bucket = fetch_creds.return_bucket(aws_input_creds, bucket_name)
+    index = BIDSLayoutIndex(bids_dir, index_path, aws_input_creds)
+    index.scan()
 
-        UTLOGGER.info("gathering files from S3 bucket (%s) for %s", bucket, prefix)
-
-        for s3_obj in bucket.objects.filter(Prefix=prefix):
-            for suf in suffixes:
-                if suf in str(s3_obj.key):
-                    if suf == "epi" and "acq-fMRI" not in s3_obj.key:
-                        continue
-                    if str(s3_obj.key).endswith("json"):
-                        try:
-                            config_dict[s3_obj.key.replace(prefix, "").lstrip("/")] = (
-                                json.loads(s3_obj.get()["Body"].read())
-                            )
-                        except Exception as e:
-                            msg = (
-                                f"Error retrieving {s3_obj.key.replace(prefix, '')}"
-                                f" ({e.message})"
-                            )
-                            raise SpecifiedBotoCoreError(msg) from e
-                    elif "nii" in str(s3_obj.key):
-                        file_paths.append(
-                            str(s3_obj.key).replace(prefix, "").lstrip("/")
-                        )
-
-    else:
-        for root, dirs, files in os.walk(bids_dir, topdown=False, followlinks=True):
-            if files:
-                for f in files:
-                    for suf in suffixes:
-                        if suf == "epi" and "acq-fMRI" not in f:
-                            continue
-                        if "nii" in f and suf in f:
-                            file_paths += [
-                                os.path.join(root, f).replace(bids_dir, "").lstrip("/")
-                            ]
-                        if f.endswith("json") and suf in f:
-                            try:
-                                config_dict.update(
-                                    {
-                                        os.path.join(
-                                            root.replace(bids_dir, "").lstrip("/"), f
-                                        ): json.load(open(os.path.join(root, f), "r"))
-                                    }
-                                )
-                            except UnicodeDecodeError as unicode_decode_error:
-                                msg = f"Could not decode {os.path.join(root, f)}"
-                                raise UnicodeDecodeError(
-                                    unicode_decode_error.encoding,
-                                    unicode_decode_error.object,
-                                    unicode_decode_error.start,
-                                    unicode_decode_error.end,
-                                    msg,
-                                )
-
-    if not file_paths and not config_dict:
+    if not index.niftis() and not index.sidecars():
+        index.close()
         msg = (
             f"Didn't find any files in {bids_dir}. Please verify that the path is"
             " typed correctly, that you have read access to the directory, and that it"
@@ -899,7 +833,35 @@ def collect_bids_files_configs(bids_dir, aws_input_creds=""):
         )
         raise IOError(msg)
 
-    return file_paths, config_dict
+    return index
+
+
+def collect_bids_files_configs(bids_dir, aws_input_creds="", index_path=None):
+    """
+    Collect the NIfTI images and JSON sidecars C-PAC reads from a BIDS directory.
+
+    Parameters
+    ----------
+    bids_dir : str
+        local path or S3 URI
+
+    aws_input_creds : str
+
+    index_path : str, optional
+        SQLite file in which to keep a
+        :py:class:`~CPAC.utils.bids_index.BIDSLayoutIndex` of ``bids_dir``
+        between runs, so only changed sidecars are reread
+
+    Returns
+    -------
+    file_paths : list
+        NIfTI paths relative to ``bids_dir``, in path order
+
+    config_dict : dict
+        sidecar contents by path relative to ``bids_dir``
+    """
+    with _scan_bids_index(bids_dir, aws_input_creds, index_path) as index:
+        return index.niftis(), index.sidecars()
 
 
 def camelCase(string: str) -> str:  # pylint: disable=invalid-name
@@ -1091,6 +1053,7 @@ def create_cpac_data_config(
     aws_input_creds=None,
     skip_bids_validator=False,
     only_one_anat=True,
+    index_path=None,
 ):
     """
     Create a C-PAC data config YAML file from a BIDS directory.
@@ -1110,38 +1073,36 @@ def create_cpac_data_config(
         can temporarily store a list instead by passing True here if
         we will be filtering that list down to a single string later
 
+    index_path : str, optional
+        SQLite file in which to keep a
+        :py:class:`~CPAC.utils.bids_index.BIDSLayoutIndex` of ``bids_dir``
+        between runs
+
     Returns
     -------
     list
     """
     UTLOGGER.info("Parsing %s..", bids_dir)
 
-    (file_paths, config) = collect_bids_files_configs(bids_dir, aws_input_creds)
-
-    if participant_labels and file_paths:
-        file_paths = [
-            file_path
-            for file_path in file_paths
-            if any(
-                participant_label in file_path
-                for participant_label in participant_labels
+    with _scan_bids_index(bids_dir, aws_input_creds, index_path) as index:
+        if not index.niftis(participant_labels or None):
+            UTLOGGER.error(
+                "Did not find data for %s", ", ".join(participant_labels or [bids_dir])
             )
-        ]
-
-    if not file_paths:
-        UTLOGGER.error("Did not find data for %s", ", ".join(participant_labels))
-        sys.exit(1)
+            sys.exit(1)
 
-    raise_error = not skip_bids_validator
+        raise_error = not skip_bids_validator
 
-    sub_list = bids_gen_cpac_sublist(
-        bids_dir,
-        file_paths,
-        config,
-        aws_input_creds,
-        raise_error=raise_error,
-        only_one_anat=only_one_anat,
-    )
+        sub_list = bids_gen_cpac_sublist(
+            bids_dir,
+            None,
+            None,
+            aws_input_creds,
+            raise_error=raise_error,
+            only_one_anat=only_one_anat,
+            index=index,
+            participant_labels=participant_labels or None,
+        )
 
     if not sub_list:
         UTLOGGER.error("Did not find data in %s", bids_dir)
@@ -16,7 +16,7 @@
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
 """C-PAC Configuration module."""
 
-from . import configuration, diff
+from . import cache, configuration, diff
 from .configuration import (
     check_pname,
     Configuration,
@@ -26,6 +26,7 @@ from .configuration import (
 )
 
 __all__ = [
+    "cache",
     "check_pname",
     "Configuration",
     "configuration",
@@ -0,0 +1,159 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Cache of parsed pipeline configuration files and validated configurations.
+
+Loading a :py:class:`~CPAC.utils.configuration.Configuration` parses the
+YAML of the configuration and of each ancestor in its ``FROM`` chain (down
+to the blank preconfiguration) and validates each against the
+:py:data:`~CPAC.pipeline.schema.schema`. Both steps are cached here by
+content hash: parsed YAML by the file's bytes, and validated configurations
+by the merged, unvalidated configuration (the configuration with its whole
+``FROM`` chain applied). Entries are kept in memory and pickled to
+:py:func:`cache_dir`, so later processes reuse them too.
+
+Keys also hash the C-PAC version and the source of the schema and the
+configuration modules, so entries are rebuilt when either changes.
+"""
+
+from copy import deepcopy
+from functools import lru_cache
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Optional
+from uuid import uuid4
+
+import yaml
+
+from CPAC.utils.monitoring import UTLOGGER
+
+CACHE_DIR_ENV = "CPAC_CONFIG_CACHE"
+"""environment variable to set the cache directory; set it empty to only cache
+in memory"""
+_MEMORY: dict[str, Any] = {}
+
+
+def cache_dir() -> Optional[str]:
+    """Return the directory configurations are cached in, if any.
+
+    ``$CPAC_CONFIG_CACHE`` if set, otherwise ``cpac/configs`` in the user's
+    cache directory (``$XDG_CACHE_HOME`` or ``~/.cache``).
+    """
+    if CACHE_DIR_ENV in os.environ:
+        return os.environ[CACHE_DIR_ENV] or None
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "cpac",
+        "configs",
+    )
+
+
+@lru_cache(maxsize=None)
+def cache_token() -> str:
+    """Hash the C-PAC version and the code that parses and validates configs."""
+    from CPAC import __version__
+    from CPAC.pipeline import schema
+    from CPAC.utils.configuration import configuration
+
+    digest = hashlib.sha256(__version__.encode("utf-8"))
+    for module_file in (schema.__file__, configuration.__file__, __file__):
+        with open(module_file, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def _path(key: str) -> Optional[str]:
+    """Return the path of a cache entry, if caching on disk."""
+    directory = cache_dir()
+    return os.path.join(directory, f"{key}.pkl") if directory else None
+
+
+def get(key: str) -> Optional[Any]:
+    """Return a copy of a cached value, or None if it isn't cached."""
+    if key not in _MEMORY:
+        path = _path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as entry:
+                _MEMORY[key] = pickle.load(entry)
+        except (OSError, EOFError, pickle.UnpicklingError) as error:
+            UTLOGGER.debug("Could not read cached config %s: %s", path, error)
+            return None
+    return deepcopy(_MEMORY[key])
+
+
+def put(key: str, value: Any) -> None:
+    """Cache a copy of a value in memory and, if possible, on disk.
+
+    Entries are written to a temporary file and atomically renamed into
+    place, so concurrent processes never read partial entries.
+    """
+    _MEMORY[key] = deepcopy(value)
+    path = _path(key)
+    if path is None:
+        return
+    partial = f"{path}.{uuid4().hex}.partial"
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        with open(partial, "wb") as entry:
+            pickle.dump(value, entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial, path)
+    except OSError as error:
+        UTLOGGER.debug("Could not cache config in %s: %s", path, error)
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def load_yaml(path: str) -> Any:
+    """Load a YAML file, parsing each distinct file content only once."""
+    with open(path, "rb") as yaml_file:
+        content = yaml_file.read()
+    key = f"yaml-{hashlib.sha256(content).hexdigest()}"
+    loaded = get(key)
+    if loaded is None:
+        loaded = yaml.safe_load(content)
+        put(key, loaded)
+    return loaded
+
+
+def validated_key(config_map: dict) -> Optional[str]:
+    """Return the cache key of a merged configuration before validation.
+
+    Returns None for configurations that aren't cached: those that can't be
+    hashed canonically (e.g., with keys of mixed types), and those whose
+    validation checks the environment (U-Net brain extraction, unless
+    ``skip env check``).
+    """
+    if not config_map.get("skip env check"):
+        try:
+            using = config_map["anatomical_preproc"]["brain_extraction"]["using"]
+        except (KeyError, TypeError):
+            using = []
+        if isinstance(using, str):
+            using = [using]
+        if "unet" in [str(option).lower() for option in (using or [])]:
+            return None
+    try:
+        content = json.dumps(config_map, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return (
+        "validated-"
+        + hashlib.sha256(f"{cache_token()}\n{content}".encode("utf-8")).hexdigest()
+    )
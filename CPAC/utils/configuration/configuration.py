@@ -16,15 +16,15 @@
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
 """C-PAC Configuration class and related functions."""
 
+from copy import deepcopy
 import os
 import re
 from typing import Optional
 from warnings import warn
 
 from click import BadParameter
-import pkg_resources as p
-import yaml
 
+from . import cache as config_cache
 from .diff import dct_diff
 
 CONFIG_KEY_TYPE = str | list[str]
@@ -89,6 +89,7 @@ class Configuration:
     >>> c['pipeline_setup', 'pipeline_name']
     'new_pipeline2'
 
+    >>> import yaml
     >>> from CPAC.utils.tests.configs import SLACK_420349
 
     # test "FROM: /path/to/file"
@@ -158,7 +159,13 @@ class Configuration:
                 # make Regressor 'Name's Nipype-friendly
                 regressor["Name"] = nipype_friendly_name(regressor["Name"])
 
-        config_map = schema(config_map)
+        cache_key = config_cache.validated_key(config_map)
+        validated = config_cache.get(cache_key) if cache_key else None
+        if validated is None:
+            validated = schema(config_map)
+            if cache_key:
+                config_cache.put(cache_key, validated)
+        config_map = validated
 
         # remove 'skip env check' now that the config is validated
         if "skip env check" in config_map:
@@ -193,9 +200,16 @@ class Configuration:
         return str(self.dict())
 
     def __copy__(self):
-        newone = type(self)({})
-        newone.__dict__.update(self.__dict__)
-        newone._update_attr()
+        """Copy a Configuration without reloading or revalidating it.
+
+        Nested values are copied too, so changing the copy doesn't change the
+        original.
+        """
+        newone = type(self).__new__(type(self))
+        newone.__dict__.update(deepcopy(self.dict()))
+        os.environ["CPAC_WORKDIR"] = newone[
+            "pipeline_setup", "working_directory", "path"
+        ]
         return newone
 
     def __getitem__(self, key):
@@ -701,8 +715,7 @@ def configuration_from_file(config_file):
     -------
     Configuration
     """
-    with open(config_file, "r", encoding="utf-8") as config:
-        return Configuration(yaml.safe_load(config))
+    return Configuration(config_cache.load_yaml(config_file))
 
 
 def preconfig_yaml(preconfig_name="default", load=False):
@@ -722,7 +735,11 @@ def preconfig_yaml(preconfig_name="default", load=False):
     str or dict
         path to YAML file or dict loaded from YAML
     """
-    from CPAC.pipeline import ALL_PIPELINE_CONFIGS, AVAILABLE_PIPELINE_CONFIGS
+    from CPAC.resources.preconfigs import (
+        ALL_PIPELINE_CONFIGS,
+        AVAILABLE_PIPELINE_CONFIGS,
+        preconfig_path,
+    )
 
     if preconfig_name not in ALL_PIPELINE_CONFIGS:
         msg = (
@@ -735,12 +752,8 @@ def preconfig_yaml(preconfig_name="default", load=False):
             param="preconfig",
         )
     if load:
-        with open(preconfig_yaml(preconfig_name), "r", encoding="utf-8") as _f:
-            return yaml.safe_load(_f)
-    return p.resource_filename(
-        "CPAC",
-        os.path.join("resources", "configs", f"pipeline_config_{preconfig_name}.yml"),
-    )
+        return config_cache.load_yaml(preconfig_yaml(preconfig_name))
+    return preconfig_path(preconfig_name)
 
 
 class Preconfiguration(Configuration):
@@ -18,6 +18,7 @@
 
 import csv
 import json
+from math import prod
 from pathlib import Path
 import re
 
@@ -30,6 +31,7 @@ from CPAC.utils import function
 from CPAC.utils.bids_utils import bids_remove_entity
 from CPAC.utils.interfaces.function import Function
 from CPAC.utils.monitoring import FMLOGGER
+from CPAC.utils.nifti_utils import image_metadata
 from CPAC.utils.utils import get_scan_params
 
 
@@ -889,7 +891,8 @@ def check_for_s3(
 
     import botocore.exceptions
     import nibabel as nib
-    from indi_aws import fetch_creds
+
+    from CPAC.utils.s3 import download_s3_file, s3_client
 
     # Init variables
     s3_str = "s3://"
@@ -930,21 +933,23 @@ def check_for_s3(
         else:
             # Download file
             try:
-                bucket = fetch_creds.return_bucket(creds_path, bucket_name)
                 FMLOGGER.info("Attempting to download from AWS S3: %s", file_path)
-                bucket.download_file(Key=s3_key, Filename=local_path)
+                download_s3_file(
+                    s3_client(creds_path, bucket_name), bucket_name, s3_key, local_path
+                )
             except botocore.exceptions.ClientError as exc:
-                error_code = int(exc.response["Error"]["Code"])
+                # S3 reports both HTTP statuses ("404") and names ("NoSuchKey")
+                error_code = exc.response.get("Error", {}).get("Code")
 
                 err_msg = str(exc)
-                if error_code == 403:  # noqa: PLR2004
+                if error_code in {"403", "AccessDenied"}:
                     err_msg = (
                         f'Access to bucket: "{bucket_name}" is denied; using'
                         f' credentials in subject list: "{creds_path}"; cannot access'
                         f' the file "{file_path}"'
                     )
                     error_type = PermissionError
-                elif error_code == 404:  # noqa: PLR2004
+                elif error_code in {"404", "NoSuchKey", "NotFound"}:
                     err_msg = (
                         f"File: {os.path.join(bucket_name, s3_key)} does not exist;"
                         " check spelling and try again"
@@ -1125,18 +1130,29 @@ def get_highest_local_res(template: Path | str, tagname: str) -> Path:
         .replace("$", "")
         .join([re.escape(_part) for _part in template.name.split(tagname, 1)])
     )
-    matching_templates = [
-        file
-        for file in template.parent.iterdir()
-        if re.match(template_pattern, file.name)
-    ]
-    matching_templates.sort()
     try:
-        return matching_templates[0]
-    except (FileNotFoundError, IndexError):
+        matching_templates = [
+            file
+            for file in template.parent.iterdir()
+            if re.match(template_pattern, file.name)
+        ]
+    except FileNotFoundError:
+        matching_templates = []
+    if not matching_templates:
         msg = f"Could not find template {template}"
         raise LookupError(msg)
 
+    def voxel_volume(file: Path) -> tuple[float, str]:
+        """Sort by voxel volume from the header, then by name."""
+        try:
+            zooms = image_metadata(file).zooms[:3]
+        except Exception:  # pylint: disable=broad-except
+            # not a readable image; fall back to sorting by name
+            return (float("inf"), file.name)
+        return (float(prod(zooms)), file.name)
+
+    return min(matching_templates, key=voxel_volume)
+
 
 def res_string_to_tuple(resolution):
     """Convert a resolution string to a tuple of floats.
@@ -1156,8 +1172,24 @@ def res_string_to_tuple(resolution):
     return (float(resolution.replace("mm", "")),) * 3
 
 
-def resolve_resolution(orientation, resolution, template, template_name, tag=None):
-    """Resample a template to a given resolution."""
+def resolve_resolution(
+    orientation,
+    resolution,
+    template,
+    template_name,
+    tag=None,
+    cache_dir=None,
+    cache_max_gb=10.0,
+):
+    """Resample a template to a given resolution.
+
+    If ``cache_dir`` is given, resampled templates are shared through a
+    :py:class:`~CPAC.utils.template_cache.TemplateCache` in that directory
+    (bounded to ``cache_max_gb``) instead of being resampled for every
+    participant.
+    """
+    import os
+
     from nipype.interfaces import afni
 
     from CPAC.pipeline import nipype_pipeline_engine as pe
@@ -1192,6 +1224,7 @@ def resolve_resolution(orientation, resolution, template, template_name, tag=Non
         else:
             local_path = template
 
+        resample_mode = "Cu"
         resample = pe.Node(
             interface=afni.Resample(),
             name=template_name,
@@ -1200,13 +1233,25 @@ def resolve_resolution(orientation, resolution, template, template_name, tag=Non
         )
         resample.inputs.voxel_size = res_string_to_tuple(resolution)
         resample.inputs.outputtype = "NIFTI_GZ"
-        resample.inputs.resample_mode = "Cu"
+        resample.inputs.resample_mode = resample_mode
         resample.inputs.in_file = local_path
         resample.base_dir = "."
         resample.inputs.orientation = orientation
 
-        resampled_template = resample.run()
-        local_path = resampled_template.outputs.out_file
+        if cache_dir is None:
+            return resample.run().outputs.out_file
+
+        from CPAC.utils.template_cache import TemplateCache
+
+        cache = TemplateCache(cache_dir, cache_max_gb)
+        local_path = cache.fetch(
+            cache.key(local_path, resolution, orientation, resample_mode),
+            lambda: resample.run().outputs.out_file,
+            os.path.join(
+                template_name,
+                os.path.basename(local_path).split(".nii")[0] + "_resample.nii.gz",
+            ),
+        )
 
     return local_path
 
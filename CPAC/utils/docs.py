@@ -23,7 +23,6 @@ from urllib.error import ContentTooShortError, HTTPError, URLError
 from warnings import warn
 
 from CPAC import __version__
-from CPAC.utils import versioning
 
 
 def deprecated(
@@ -125,6 +124,8 @@ def _docs_url_prefix() -> str:
 
 def version_report() -> str:
     """Return a formatted block of versions included in CPAC's environment."""
+    from CPAC.utils import versioning
+
     version_list = []
     for pkg, version in versioning.REPORTED.items():
         version_list.append(f"{pkg}: {version}")
@@ -168,4 +169,14 @@ def outdent_lines(docstring: str, spaces: int = 4) -> str:
     return "\n".join(new_docstring)
 
 
-DOCS_URL_PREFIX = _docs_url_prefix()
+def __getattr__(name: str) -> str:
+    """Determine ``DOCS_URL_PREFIX`` on first access.
+
+    Checking which docs exist for this version takes a web request, so it
+    isn't made just to import these utilities.
+    """
+    if name == "DOCS_URL_PREFIX":
+        globals()[name] = _docs_url_prefix()
+        return globals()[name]
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
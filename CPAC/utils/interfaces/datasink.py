@@ -10,6 +10,7 @@
 #     * Logs a debugging message instead of crashing if src == dst for copyfile
 #     * Explicitly lowercases "s3"
 #     * Handles empty file lists
+#     * Uploads to S3 concurrently, skipping files already uploaded
 #     * Docstrings updated accordingly
 #     * Style modifications
 
@@ -30,7 +31,7 @@
 
 #     Prior to release 0.12, Nipype was licensed under a BSD license.
 
-# Modifications Copyright (C) 2019-2024  C-PAC Developers
+# Modifications Copyright (C) 2019-2026  C-PAC Developers
 
 # This file is part of C-PAC.
 """Interface that allow interaction with data.
@@ -49,11 +50,7 @@ import time
 
 from nipype import config
 from nipype.interfaces.base import isdefined
-from nipype.interfaces.io import (
-    copytree,
-    DataSink as NipypeDataSink,
-    ProgressPercentage,
-)
+from nipype.interfaces.io import copytree, DataSink as NipypeDataSink
 from nipype.utils.filemanip import copyfile, ensure_list
 from nipype.utils.misc import str2bool
 
@@ -61,6 +58,7 @@ from CPAC.utils.monitoring import FMLOGGER, IFLOGGER
 
 RETRY = 5
 RETRY_WAIT = 5
+UPLOAD_MANIFEST = "s3_upload_manifest.jsonl"
 
 
 def _get_head_bucket(s3_resource, bucket_name):
@@ -197,81 +195,65 @@ class DataSink(NipypeDataSink):  # noqa: D101
 
     _fetch_bucket.__doc__ = NipypeDataSink._fetch_bucket.__doc__
 
-    def _upload_to_s3(self, bucket, src, dst):
-        """Upload outputs to S3 bucket instead of on local disk."""
+    def _upload_to_s3(self, bucket, uploads):
+        """Upload outputs to S3 bucket instead of on local disk.
+
+        Files are uploaded concurrently, skipping those already on S3 or
+        recorded in this node's upload manifest by an earlier run.
+        """
         # Import packages
-        import hashlib
         import os
 
-        from botocore.exceptions import ClientError
+        from CPAC.utils.s3 import upload_s3
 
         # Init variables
         s3_str = "s3://"
         s3_prefix = s3_str + bucket.name
 
-        # Explicitly lower-case the "s3"
-        if dst[: len(s3_str)].lower() == s3_str:
-            dst = s3_str + dst[len(s3_str) :]
-
-        # If src is a directory, collect files (this assumes dst is a dir too)
-        if os.path.isdir(src):
-            src_files = []
-            for root, dirs, files in os.walk(src):
-                src_files.extend([os.path.join(root, fil) for fil in files])
-            # Make the dst files have the dst folder as base dir
-            dst_files = [os.path.join(dst, src_f.split(src)[1]) for src_f in src_files]
-        else:
-            src_files = [src]
-            dst_files = [dst]
-
-        # Iterate over src and copy to dst
-        for src_idx, src_f in enumerate(src_files):
-            # Get destination filename/keyname
-            dst_f = dst_files[src_idx]
-            dst_k = dst_f.replace(s3_prefix, "").lstrip("/")
-
-            # See if same file is already up there
-            try:
-                dst_obj = bucket.Object(key=dst_k)
-                dst_md5 = dst_obj.e_tag.strip('"')
-
-                # See if same file is already there
-                src_read = open(src_f, "rb").read()
-                src_md5 = hashlib.md5(src_read).hexdigest()
-                # Move to next loop iteration
-                if dst_md5 == src_md5:
-                    FMLOGGER.info("File %s already exists on S3, skipping...", dst_f)
-                    continue
-                FMLOGGER.info("Overwriting previous S3 file...")
-
-            except ClientError:
-                FMLOGGER.info("New file to S3")
-
-            # Copy file up to S3 (either encrypted or not)
-            FMLOGGER.info(
-                "Uploading %s to S3 bucket, %s, as %s...", src_f, bucket.name, dst_f
-            )
-            if self.inputs.encrypt_bucket_keys:
-                extra_args = {"ServerSideEncryption": "AES256"}
+        key_to_local = {}
+        for src, _dst in uploads:
+            dst = _dst
+            # Explicitly lower-case the "s3"
+            if dst[: len(s3_str)].lower() == s3_str:
+                dst = s3_str + dst[len(s3_str) :]
+
+            # If src is a directory, collect files (this assumes dst is a dir too)
+            if os.path.isdir(src):
+                src_files = []
+                for root, dirs, files in os.walk(src):
+                    src_files.extend([os.path.join(root, fil) for fil in files])
+                # Make the dst files have the dst folder as base dir
+                dst_files = [
+                    os.path.join(dst, src_f.split(src)[1]) for src_f in src_files
+                ]
             else:
-                extra_args = {}
+                src_files = [src]
+                dst_files = [dst]
 
-            retry_exc = None
-            for _ in range(RETRY):
-                try:
-                    bucket.upload_file(
-                        src_f,
-                        dst_k,
-                        ExtraArgs=extra_args,
-                        Callback=ProgressPercentage(src_f),
-                    )
-                    break
-                except Exception as exc:
-                    time.sleep(RETRY_WAIT)
-                    retry_exc = exc
+            for src_f, dst_f in zip(src_files, dst_files):
+                # Get destination keyname
+                key_to_local[dst_f.replace(s3_prefix, "").lstrip("/")] = src_f
 
-            if retry_exc is not None:
-                raise retry_exc
+        # Copy files up to S3 (either encrypted or not)
+        if self.inputs.encrypt_bucket_keys:
+            extra_args = {"ServerSideEncryption": "AES256"}
+        else:
+            extra_args = {}
+
+        FMLOGGER.info(
+            "Uploading %d files to S3 bucket, %s...", len(key_to_local), bucket.name
+        )
+        results = upload_s3(
+            bucket.meta.client,
+            bucket.name,
+            key_to_local,
+            extra_args=extra_args,
+            manifest_path=os.path.join(os.getcwd(), UPLOAD_MANIFEST),
+            retries=RETRY,
+        )
+        if results["failed"]:
+            msg = f"Could not upload to S3 bucket {bucket.name}: {results['failed']}"
+            raise OSError(msg)
 
     # List outputs, main run routine
     def _list_outputs(self):
@@ -338,6 +320,7 @@ class DataSink(NipypeDataSink):  # noqa: D101
                     else:
                         raise (inst)
 
+        s3_uploads = []
         # Iterate through outputs attributes {key : path(s)}
         for key, _files in list(self.inputs._outputs.items()):
             files = _files
@@ -377,7 +360,7 @@ class DataSink(NipypeDataSink):  # noqa: D101
 
                 # If we're uploading to S3
                 if s3_flag:
-                    self._upload_to_s3(bucket, src, s3dst)
+                    s3_uploads.append((src, s3dst))
                     out_files.append(s3dst)
                 # Otherwise, copy locally src -> dst
                 if not s3_flag or isdefined(self.inputs.local_copy):
@@ -415,6 +398,9 @@ class DataSink(NipypeDataSink):  # noqa: D101
                     except SameFileError:
                         FMLOGGER.debug(f"copyfile (same file): {src} {dst}")
 
+        if s3_uploads:
+            self._upload_to_s3(bucket, s3_uploads)
+
         # Return outputs dictionary
         outputs["out_file"] = out_files
 
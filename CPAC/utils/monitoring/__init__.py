@@ -26,31 +26,37 @@ from .custom_logging import (
     FMLOGGER,
     getLogger,
     IFLOGGER,
+    log_nipype_to_thread_file,
     set_up_logger,
     UTLOGGER,
     WFLOGGER,
 )
 from .monitoring import (
+    callback_logger_name,
     log_nodes_cb,
     log_nodes_initial,
     LoggingHTTPServer,
     LoggingRequestHandler,
     monitor_server,
     recurse_nodes,
+    set_callback_logger_name,
 )
 
 __all__ = [
+    "callback_logger_name",
     "failed_to_start",
     "FMLOGGER",
     "getLogger",
     "IFLOGGER",
     "LoggingHTTPServer",
     "LoggingRequestHandler",
+    "log_nipype_to_thread_file",
     "log_nodes_cb",
     "log_nodes_initial",
     "LOGTAIL",
     "monitor_server",
     "recurse_nodes",
+    "set_callback_logger_name",
     "set_up_logger",
     "UTLOGGER",
     "WARNING_FREESURFER_OFF_WITH_DATA",
@@ -17,13 +17,15 @@
 """Funtions for logging."""
 
 import logging
+from logging.handlers import RotatingFileHandler
 import os
 import subprocess
 from sys import exc_info as sys_exc_info
+import threading
 from traceback import print_exception
 from typing import Optional, Sequence
 
-from nipype import logging as nipype_logging
+from nipype import config as nipype_config, logging as nipype_logging
 
 from CPAC.utils.docs import docstring_parameter
 from CPAC.utils.monitoring.config import MOCK_LOGGERS
@@ -70,6 +72,61 @@ def getLogger(name):  # pylint: disable=invalid-name
     return logger
 
 
+class ThreadLogHandler(logging.Handler):
+    """Hand each record to the handler registered for the thread that logged it.
+
+    Records from threads without a registered handler are dropped.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._handlers: dict[int, logging.Handler] = {}
+
+    def register(self, handler: logging.Handler) -> None:
+        """Handle the current thread's records with ``handler``."""
+        self.unregister()
+        self._handlers[threading.get_ident()] = handler
+
+    def unregister(self) -> None:
+        """Stop handling the current thread's records and close its handler."""
+        handler = self._handlers.pop(threading.get_ident(), None)
+        if handler is not None:
+            handler.close()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Pass a record to its thread's handler, if any."""
+        handler = self._handlers.get(record.thread)
+        if handler is not None:
+            handler.handle(record)
+
+
+_NIPYPE_THREAD_LOGS = ThreadLogHandler()
+
+
+def log_nipype_to_thread_file(log_dir: Optional[str]) -> None:
+    """Log Nipype's records from the current thread to ``log_dir``/pypeline.log.
+
+    Nipype's own file logging is process-wide, but participants run in
+    threads of one process under a global scheduler, so each thread gets its
+    own file. ``None`` stops the current thread's file logging.
+    """
+    if log_dir is None:
+        _NIPYPE_THREAD_LOGS.unregister()
+        return
+    for logger in nipype_logging.loggers.values():
+        if _NIPYPE_THREAD_LOGS not in logger.handlers:
+            logger.addHandler(_NIPYPE_THREAD_LOGS)
+    handler = RotatingFileHandler(
+        os.path.join(log_dir, "pypeline.log"),
+        maxBytes=int(nipype_config.get("logging", "log_size")),
+        backupCount=int(nipype_config.get("logging", "log_rotate")),
+    )
+    handler.setFormatter(
+        logging.Formatter(fmt=nipype_logging.fmt, datefmt=nipype_logging.datefmt)
+    )
+    _NIPYPE_THREAD_LOGS.register(handler)
+
+
 # Nipype built-in loggers
 IFLOGGER = getLogger("nipype.interface")
 FMLOGGER = getLogger("nipype.filemanip")
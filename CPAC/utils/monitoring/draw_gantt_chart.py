@@ -5,6 +5,9 @@
 # CHANGES:
 #     * Resolves bugs preventing the original from generating the chart
 #     * Handles when chart-drawing is called but no nodes were run (all cached)
+#     * Streams callback logs, sweeps start and finish events for resource
+#       timeseries, draws a bounded number of nodes and resource bars, and
+#       summarizes nodes by type
 
 # ORIGINAL WORK'S ATTRIBUTION NOTICE:
 #     Copyright (c) 2015-2019, Nipype developers
@@ -23,7 +26,7 @@
 
 #     Prior to release 0.12, Nipype was licensed under a BSD license.
 
-# Modifications Copyright (C) 2021-2023 C-PAC Developers
+# Modifications Copyright (C) 2021-2026 C-PAC Developers
 
 # This file is part of C-PAC.
 
@@ -43,14 +46,40 @@
 ``CPAC.utils.monitoring.log_nodes_cb()``.
 
 See https://nipype.readthedocs.io/en/latest/api/generated/nipype.utils.draw_gantt_chart.html
+
+Callback logs are read one line at a time, so the report for a run with
+hundreds of thousands of nodes draws only the longest (and any failed) nodes
+and a downsampled resource timeline, alongside a per-node-type summary table
+of every node.
 """
 
 from collections import OrderedDict
-from datetime import datetime
+from datetime import datetime, timedelta
+import heapq
+import json
+import os
 import random
+from typing import Iterator, Optional
 from warnings import warn
 
-from nipype.utils.draw_gantt_chart import draw_lines, draw_resource_bar, log_to_dict
+import numpy as np
+import pandas as pd
+from nipype.utils.draw_gantt_chart import draw_lines, draw_resource_bar
+
+from CPAC.utils.monitoring.resource_model import node_type
+
+MAX_DRAWN_NODES = 2000
+"""most nodes drawn in a Gantt chart"""
+MAX_RESOURCE_POINTS = 1000
+"""most bars drawn per resource timeseries in a Gantt chart"""
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_RESOURCES = (
+    "estimated_memory_gb",
+    "runtime_memory_gb",
+    "estimated_threads",
+    "runtime_threads",
+)
 
 
 def create_event_dict(start_time, nodes_list):
@@ -161,6 +190,217 @@ def calculate_resource_timeseries(events, resource):
     # Return the new time series
 
 
+def iter_callback_log(logfile: str) -> Iterator[dict]:
+    """Yield each node dictionary in a callback log, one line at a time.
+
+    Lines that aren't JSON, like a partially written last line, are skipped.
+    """
+    with open(logfile, "r", encoding="utf-8") as log:
+        for line in log:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _amount(value, default: float) -> float:
+    """Return a logged resource amount, or NaN if it wasn't measured."""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def resource_timeseries(starts, finishes, amounts) -> pd.Series:
+    """Sweep start and finish events for the total of a resource in use.
+
+    Parameters
+    ----------
+    starts, finishes : array-like of float
+        each node's start and finish, in microseconds since 1970-01-01
+
+    amounts : array-like of float
+        each node's amount of the resource (NaN for unmeasured)
+
+    Returns
+    -------
+    pandas.Series
+        the total in use after each change, indexed by time
+
+    Examples
+    --------
+    >>> resource_timeseries([0, 10, 10], [20, 30, 15], [1, 2, 0.5]).tolist()
+    [1.0, 3.5, 3.0, 2.0, 0.0]
+    """
+    amounts = np.nan_to_num(np.asarray(amounts, dtype=np.float64))
+    times = np.concatenate([starts, finishes]).astype(np.int64)
+    order = np.argsort(times, kind="stable")
+    times = times[order]
+    totals = np.round(np.cumsum(np.concatenate([amounts, -amounts])[order]), 9)
+    # the total after the last event at each time
+    last = np.append(times[1:] != times[:-1], True)
+    times, totals = times[last], totals[last]
+    changed = np.insert(np.diff(totals) != 0, 0, True)
+    return pd.Series(totals[changed], index=pd.to_datetime(times[changed], unit="us"))
+
+
+def downsample_timeseries(time_series: pd.Series, max_points: int) -> pd.Series:
+    """Keep the peak of each of at most ``max_points`` equal spans of time.
+
+    Examples
+    --------
+    >>> time_series = pd.Series(range(10), index=pd.to_datetime(range(10), unit="s"))
+    >>> downsampled = downsample_timeseries(time_series, 3)
+    >>> downsampled.tolist(), downsampled.index.second.tolist()
+    ([2, 5, 9], [0, 3, 6])
+    """
+    if len(time_series) <= max_points:
+        return time_series
+    times = time_series.index.asi8.astype(np.float64)
+    span = times[-1] - times[0]
+    bins = np.minimum(
+        ((times - times[0]) / span * max_points).astype(int), max_points - 1
+    )
+    firsts = np.flatnonzero(np.insert(np.diff(bins) != 0, 0, True))
+    return pd.Series(
+        np.maximum.reduceat(time_series.to_numpy(), firsts),
+        index=time_series.index[firsts],
+    )
+
+
+class CallbackLogSummary:
+    """What a Gantt chart needs from a callback log, gathered in one pass.
+
+    Parameters
+    ----------
+    logfile : str
+        path to a callback log
+
+    max_nodes : int
+        how many of the longest nodes to keep for drawing; failed nodes are
+        always drawn too
+    """
+
+    def __init__(self, logfile: str, max_nodes: int = MAX_DRAWN_NODES) -> None:
+        self.nodes = 0
+        self.start: Optional[datetime] = None
+        self.finish: Optional[datetime] = None
+        self.starts: list[int] = []
+        self.finishes: list[int] = []
+        self.resources: dict[str, list[float]] = {
+            resource: [] for resource in _RESOURCES
+        }
+        self.node_types: dict[str, dict] = {}
+        self._max_nodes = max_nodes
+        self._longest: list[tuple[float, int, dict]] = []
+        self._failed: list[dict] = []
+        for node in iter_callback_log(logfile):
+            self._add(node)
+
+    def _add(self, node: dict) -> None:
+        if "id" not in node or ("start" not in node and "error" not in node):
+            # initial node listing
+            return
+        totals = self.node_types.setdefault(
+            node_type(node["id"]),
+            {
+                "nodes": 0,
+                "errors": 0,
+                "total_runtime_seconds": 0.0,
+                "max_runtime_seconds": 0.0,
+                "max_estimated_memory_gb": np.nan,
+                "max_runtime_memory_gb": np.nan,
+                "over_memory_estimate": 0,
+            },
+        )
+        if node.get("error"):
+            totals["errors"] += 1
+        try:
+            node = _timing_timestamp(node)
+        except ValueError:
+            return
+        if not (
+            isinstance(node.get("start"), datetime)
+            and isinstance(node.get("finish"), datetime)
+        ):
+            return
+        node["duration"] = (node["finish"] - node["start"]).total_seconds()
+        amounts = {
+            "estimated_memory_gb": _amount(node.get("estimated_memory_gb"), 1.0),
+            "runtime_memory_gb": _amount(node.get("runtime_memory_gb"), 0.0),
+            "estimated_threads": _amount(node.get("num_threads"), 1.0),
+            "runtime_threads": _amount(node.get("runtime_threads"), 0.0),
+        }
+        self.nodes += 1
+        self.start = min(self.start or node["start"], node["start"])
+        self.finish = max(self.finish or node["finish"], node["finish"])
+        self.starts.append((node["start"] - _EPOCH) // _MICROSECOND)
+        self.finishes.append((node["finish"] - _EPOCH) // _MICROSECOND)
+        for resource, amount in amounts.items():
+            self.resources[resource].append(amount)
+        totals["nodes"] += 1
+        totals["total_runtime_seconds"] += node["duration"]
+        totals["max_runtime_seconds"] = max(
+            totals["max_runtime_seconds"], node["duration"]
+        )
+        for resource in ("estimated_memory_gb", "runtime_memory_gb"):
+            totals[f"max_{resource}"] = np.fmax(
+                totals[f"max_{resource}"], amounts[resource]
+            )
+        if amounts["runtime_memory_gb"] > amounts["estimated_memory_gb"]:
+            totals["over_memory_estimate"] += 1
+        if node.get("error"):
+            self._failed.append(node)
+            return
+        longest = (node["duration"], self.nodes, node)
+        if len(self._longest) < self._max_nodes:
+            heapq.heappush(self._longest, longest)
+        elif self._longest and longest > self._longest[0]:
+            heapq.heapreplace(self._longest, longest)
+
+    def drawn_nodes(self) -> list[dict]:
+        """Return the longest and the failed nodes in order of their start."""
+        return sorted(
+            [*(node for _, _, node in self._longest), *self._failed],
+            key=lambda node: node["start"],
+        )
+
+    def timeseries(
+        self, resource: str, max_points: int = MAX_RESOURCE_POINTS
+    ) -> pd.Series:
+        """Return a downsampled timeseries of a resource in use."""
+        return downsample_timeseries(
+            resource_timeseries(self.starts, self.finishes, self.resources[resource]),
+            max_points,
+        )
+
+    def summary_table(self) -> pd.DataFrame:
+        """Summarize every node by type, longest total runtime first."""
+        table = pd.DataFrame.from_dict(self.node_types, orient="index")
+        table.index.name = "node_type"
+        table.insert(
+            3,
+            "mean_runtime_seconds",
+            table["total_runtime_seconds"] / table["nodes"].replace(0, np.nan),
+        )
+        return table.sort_values(
+            ["total_runtime_seconds", "nodes"], ascending=False
+        ).reset_index()
+
+
+def write_summary_table(table: pd.DataFrame, path: str) -> None:
+    """Write a summary table as Parquet if ``path`` ends with ``.parquet``, else CSV.
+
+    Parquet requires ``pyarrow`` or ``fastparquet``.
+    """
+    if path.endswith(".parquet"):
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+
+
 def draw_nodes(start, nodes_list, cores, minute_scale, space_between_minutes, colors):
     """
     Function to return the html-string of the node drawings for the
@@ -270,6 +510,9 @@ def generate_gantt_chart(
     minute_scale=10,
     space_between_minutes=50,
     colors=["#7070FF", "#4E4EB2", "#2D2D66", "#9B9BFF"],
+    max_nodes=MAX_DRAWN_NODES,
+    max_resource_points=MAX_RESOURCE_POINTS,
+    summary_format="csv",
 ):
     """
     Generates a gantt chart in html showing the workflow execution based on a callback log file.
@@ -292,12 +535,21 @@ def generate_gantt_chart(
     colors : list (optional)
         a list of colors to choose from when coloring the nodes in the
         gantt chart
+    max_nodes : integer (optional); default=MAX_DRAWN_NODES
+        how many of the longest nodes to draw
+    max_resource_points : integer (optional); default=MAX_RESOURCE_POINTS
+        how many bars to draw per resource timeseries, each the peak of
+        its span of time
+    summary_format : string or None (optional); default="csv"
+        "csv" or "parquet" to also write a table of every node summarized
+        by type, or None not to
 
     Returns
     -------
     None
         the function does not return any value but writes out an html
-        file in the same directory as the callback log path passed in
+        file (and a summary table) in the same directory as the callback
+        log path passed in
 
     Usage
     -----
@@ -386,49 +638,41 @@ def generate_gantt_chart(
     </div>
     """
 
-    # Read in json-log to get list of node dicts
-    nodes_list = log_to_dict(logfile)
-
-    # Only include nodes with timing information, and covert timestamps
-    # from strings to datetimes
-    try:
-        nodes_list = _timing(nodes_list)
-    except ProcessLookupError:
-        warn(str(ProcessLookupError))
-        nodes_list = []
-
-    if not nodes_list:
+    # Read the log one node at a time, keeping the longest nodes to draw and
+    # compact arrays of every node's resources
+    summary = CallbackLogSummary(logfile, max_nodes)
+    if not summary.nodes:
         return
-
-    for node in nodes_list:
-        if "duration" not in node:
-            node["duration"] = (node["finish"] - node["start"]).total_seconds()
-
-    # Create the header of the report with useful information
-    start_node = nodes_list[0]
-    last_node = nodes_list[-1]
-    duration = (last_node["finish"] - start_node["start"]).total_seconds()
-
-    # Get events based dictionary of node run stats
-    events = create_event_dict(start_node["start"], nodes_list)
+    start, finish = summary.start, summary.finish
+    duration = (finish - start).total_seconds()
+    nodes_list = summary.drawn_nodes()
+
+    if summary_format:
+        summary_path = f"{logfile}.summary.{summary_format}"
+        write_summary_table(summary.summary_table(), summary_path)
+        close_header = close_header.replace(
+            "Failed Node</span></p>",
+            "Failed Node</span></p>\n        <p><a href='"
+            + os.path.basename(summary_path)
+            + "'>Summary by node type</a></p>",
+        )
 
     # Summary strings of workflow at top
-    html_string += (
-        "<p>Start: " + start_node["start"].strftime("%Y-%m-%d %H:%M:%S") + "</p>"
-    )
-    html_string += (
-        "<p>Finish: " + last_node["finish"].strftime("%Y-%m-%d %H:%M:%S") + "</p>"
-    )
+    html_string += "<p>Start: " + start.strftime("%Y-%m-%d %H:%M:%S") + "</p>"
+    html_string += "<p>Finish: " + finish.strftime("%Y-%m-%d %H:%M:%S") + "</p>"
     html_string += "<p>Duration: " + f"{duration / 60:.2f}" + " minutes</p>"
-    html_string += "<p>Nodes: " + str(len(nodes_list)) + "</p>"
+    html_string += "<p>Nodes: " + str(summary.nodes)
+    if len(nodes_list) < summary.nodes:
+        failed = sum(1 for node in nodes_list if node.get("error"))
+        html_string += f" (drawing the {len(nodes_list) - failed} longest"
+        html_string += f" and {failed} failed)" if failed else ")"
+    html_string += "</p>"
     html_string += "<p>Cores: " + str(cores) + "</p>"
     html_string += close_header
     # Draw nipype nodes Gantt chart and runtimes
-    html_string += draw_lines(
-        start_node["start"], duration, minute_scale, space_between_minutes
-    )
+    html_string += draw_lines(start, duration, minute_scale, space_between_minutes)
     html_string += draw_nodes(
-        start_node["start"],
+        start,
         nodes_list,
         cores,
         minute_scale,
@@ -436,56 +680,24 @@ def generate_gantt_chart(
         colors,
     )
 
-    # Get memory timeseries
-    estimated_mem_ts = calculate_resource_timeseries(events, "estimated_memory_gb")
-    runtime_mem_ts = calculate_resource_timeseries(events, "runtime_memory_gb")
-    # Plot gantt chart
     resource_offset = 120 + 30 * cores
-    html_string += draw_resource_bar(
-        start_node["start"],
-        last_node["finish"],
-        estimated_mem_ts,
-        space_between_minutes,
-        minute_scale,
-        "#90BBD7",
-        resource_offset * 2 + 120,
-        "Memory",
-    )
-    html_string += draw_resource_bar(
-        start_node["start"],
-        last_node["finish"],
-        runtime_mem_ts,
-        space_between_minutes,
-        minute_scale,
-        "#03969D",
-        resource_offset * 2 + 120,
-        "Memory",
-    )
-
-    # Get threads timeseries
-    estimated_threads_ts = calculate_resource_timeseries(events, "estimated_threads")
-    runtime_threads_ts = calculate_resource_timeseries(events, "runtime_threads")
-    # Plot gantt chart
-    html_string += draw_resource_bar(
-        start_node["start"],
-        last_node["finish"],
-        estimated_threads_ts,
-        space_between_minutes,
-        minute_scale,
-        "#90BBD7",
-        resource_offset,
-        "Threads",
-    )
-    html_string += draw_resource_bar(
-        start_node["start"],
-        last_node["finish"],
-        runtime_threads_ts,
-        space_between_minutes,
-        minute_scale,
-        "#03969D",
-        resource_offset,
-        "Threads",
-    )
+    for resource, color in (
+        ("estimated_memory_gb", "#90BBD7"),
+        ("runtime_memory_gb", "#03969D"),
+        ("estimated_threads", "#90BBD7"),
+        ("runtime_threads", "#03969D"),
+    ):
+        memory = resource.endswith("memory_gb")
+        html_string += draw_resource_bar(
+            start,
+            finish,
+            summary.timeseries(resource, max_resource_points),
+            space_between_minutes,
+            minute_scale,
+            color,
+            resource_offset * 2 + 120 if memory else resource_offset,
+            "Memory" if memory else "Threads",
+        )
 
     # finish html
     html_string += """
@@ -512,7 +724,7 @@ def resource_overusage_report(cblog):
 
     excessive: dict
     """
-    cb_dict_list = log_to_dict(cblog)
+    cb_dict_list = iter_callback_log(cblog)
     excessive = {
         node["id"]: [
             node["runtime_memory_gb"]
@@ -0,0 +1,462 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Live scheduler and node metrics in the Prometheus text format.
+
+Participants can run in separate processes, so each participant's plugin
+keeps a :py:class:`NodeMetrics` and periodically writes it as a
+``metrics.json`` snapshot in that participant's log directory.
+:py:func:`metrics_server` serves every snapshot of a pipeline's run at
+``/metrics``, with scheduler gauges labelled by participant and node
+histograms summed by node type.
+"""
+
+from datetime import datetime
+from glob import glob
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+from time import time
+from typing import Iterable, Optional
+
+from .resource_model import node_type
+
+RUNTIME_BUCKETS: tuple[float, ...] = (
+    1,
+    5,
+    15,
+    30,
+    60,
+    120,
+    300,
+    600,
+    1800,
+    3600,
+    7200,
+)
+"""upper bounds (s) of node runtime histogram buckets"""
+MEMORY_RATIO_BUCKETS: tuple[float, ...] = (0.1, 0.25, 0.5, 0.75, 1, 1.25, 1.5, 2, 4)
+"""upper bounds of observed / estimated memory histogram buckets"""
+WRITE_INTERVAL: float = 5
+"""minimum seconds between snapshots, unless the scheduler's state changes"""
+
+_METRICS = threading.local()
+
+
+def node_metrics() -> Optional["NodeMetrics"]:
+    """Return the metrics the current thread's plugin records, if any."""
+    return getattr(_METRICS, "registry", None)
+
+
+def set_node_metrics(registry: Optional["NodeMetrics"]) -> None:
+    """Set the metrics the current thread's plugin records."""
+    _METRICS.registry = registry
+
+
+def _histogram(buckets: tuple[float, ...]) -> dict:
+    return {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+
+
+def _observe(histogram: dict, buckets: tuple[float, ...], value: float) -> None:
+    index = next((i for i, bound in enumerate(buckets) if value <= bound), -1)
+    histogram["buckets"][index] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class NodeMetrics:
+    """Scheduler state and finished-node metrics for one participant.
+
+    Parameters
+    ----------
+    participant : str
+
+    path : str, optional
+        where to write ``metrics.json`` snapshots
+
+    Examples
+    --------
+    >>> metrics = NodeMetrics("sub-1")
+    >>> metrics.update_scheduler(
+    ...     ready_jobs=2, running_jobs=1, free_memory_gb=3.5, reserved_memory_gb=4,
+    ...     overhead_memory_gb=0.5, total_memory_gb=8, free_processors=3,
+    ...     reserved_processors=1, total_processors=4)
+    >>> metrics.node_finished({"id": "cpac_sub-1.anat_preproc.warp_3",
+    ...     "start": "2026-01-01T00:00:00", "finish": "2026-01-01T00:00:42",
+    ...     "estimated_memory_gb": 2, "runtime_memory_gb": 1.5})
+    >>> print(metrics.render())  # doctest: +ELLIPSIS
+    # HELP cpac_scheduler_ready_jobs Jobs whose dependencies have finished, waiting for resources.
+    # TYPE cpac_scheduler_ready_jobs gauge
+    cpac_scheduler_ready_jobs{participant="sub-1"} 2
+    ...
+    cpac_node_runtime_seconds_bucket{node_type="warp",le="30"} 0
+    cpac_node_runtime_seconds_bucket{node_type="warp",le="60"} 1
+    ...
+    cpac_node_memory_observed_ratio_sum{node_type="warp"} 0.75
+    ...
+    """
+
+    def __init__(self, participant: str, path: Optional[str] = None) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._written: Optional[float] = None
+        self._changed = False
+        self.snapshot: dict = {
+            "participant": participant,
+            "updated": time(),
+            "progress": None,
+            "scheduler": {},
+            "nodes": {},
+        }
+
+    def update_scheduler(
+        self,
+        ready_jobs: int,
+        running_jobs: int,
+        free_memory_gb: float,
+        reserved_memory_gb: float,
+        overhead_memory_gb: float,
+        total_memory_gb: float,
+        free_processors: int,
+        reserved_processors: int,
+        total_processors: int,
+    ) -> None:
+        """Record the resources the scheduler sees in one scheduling round."""
+        scheduler = {
+            "ready_jobs": ready_jobs,
+            "running_jobs": running_jobs,
+            "memory_gb": {
+                "free": free_memory_gb,
+                "reserved": reserved_memory_gb,
+                "overhead": overhead_memory_gb,
+                "total": total_memory_gb,
+            },
+            "processors": {
+                "free": free_processors,
+                "reserved": reserved_processors,
+                "total": total_processors,
+            },
+        }
+        with self._lock:
+            self.snapshot["updated"] = time()
+            if scheduler != self.snapshot["scheduler"]:
+                self.snapshot["scheduler"] = scheduler
+                self._changed = True
+
+    def node_finished(self, status: dict) -> None:
+        """Record a finished node from its ``log_nodes_cb`` status."""
+        _type = node_type(status["id"])
+        with self._lock:
+            node = self.snapshot["nodes"].setdefault(
+                _type,
+                {
+                    "runtime_seconds": _histogram(RUNTIME_BUCKETS),
+                    "memory_observed_ratio": _histogram(MEMORY_RATIO_BUCKETS),
+                    "estimated_memory_gb": 0.0,
+                    "observed_memory_gb": 0.0,
+                    "errors": 0,
+                },
+            )
+            self.snapshot["progress"] = time()
+            self._changed = True
+            if status.get("error"):
+                node["errors"] += 1
+                return
+            runtime = (
+                datetime.fromisoformat(status["finish"])
+                - datetime.fromisoformat(status["start"])
+            ).total_seconds()
+            _observe(node["runtime_seconds"], RUNTIME_BUCKETS, runtime)
+            estimated = _float(status.get("estimated_memory_gb"))
+            observed = _float(status.get("runtime_memory_gb"))
+            if estimated is None or observed is None:
+                # not monitored
+                return
+            node["estimated_memory_gb"] += estimated
+            node["observed_memory_gb"] += observed
+            if estimated > 0:
+                _observe(
+                    node["memory_observed_ratio"],
+                    MEMORY_RATIO_BUCKETS,
+                    observed / estimated,
+                )
+
+    def finish(self) -> None:
+        """Record that nothing is running or ready, and write a snapshot."""
+        with self._lock:
+            scheduler = self.snapshot["scheduler"]
+            if scheduler:
+                scheduler.update(ready_jobs=0, running_jobs=0)
+                scheduler["memory_gb"]["reserved"] = 0
+                scheduler["processors"]["reserved"] = 0
+            self.snapshot["updated"] = time()
+        self.write(force=True)
+
+    def write(self, force: bool = False) -> None:
+        """Atomically write a snapshot if the state changed or one is due."""
+        if self.path is None:
+            return
+        now = time()
+        with self._lock:
+            if not (
+                force
+                or self._changed
+                or self._written is None
+                or now - self._written >= WRITE_INTERVAL
+            ):
+                return
+            snapshot = json.dumps(self.snapshot)
+            self._written = now
+            self._changed = False
+        partial = f"{self.path}.partial"
+        with open(partial, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(snapshot)
+        os.replace(partial, self.path)
+
+    def render(self) -> str:
+        """Return this participant's metrics in the Prometheus text format."""
+        with self._lock:
+            return render_metrics([json.loads(json.dumps(self.snapshot))])
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+_SCHEDULER_FAMILIES = (
+    (
+        "cpac_scheduler_ready_jobs",
+        "Jobs whose dependencies have finished, waiting for resources.",
+        "ready_jobs",
+        None,
+    ),
+    (
+        "cpac_scheduler_running_jobs",
+        "Jobs running on workers.",
+        "running_jobs",
+        None,
+    ),
+    (
+        "cpac_scheduler_memory_gb",
+        "Memory (GB) the scheduler sees as free, reserved by running jobs, used"
+        " by the scheduling process itself, or in total.",
+        "memory_gb",
+        "state",
+    ),
+    (
+        "cpac_scheduler_processors",
+        "Threads the scheduler sees as free, reserved by running jobs, or in" " total.",
+        "processors",
+        "state",
+    ),
+)
+
+
+def render_metrics(snapshots: Iterable[dict]) -> str:
+    """Render participants' snapshots in the Prometheus text format.
+
+    Scheduler gauges are labelled by participant. Node metrics are summed
+    across participants by node type.
+    """
+    snapshots = sorted(snapshots, key=lambda snapshot: snapshot["participant"])
+    lines = []
+
+    def family(name: str, help_text: str, kind: str) -> None:
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+
+    for name, help_text, key, sublabel in _SCHEDULER_FAMILIES:
+        family(name, help_text, "gauge")
+        for snapshot in snapshots:
+            value = snapshot["scheduler"].get(key)
+            if value is None:
+                continue
+            participant = snapshot["participant"]
+            if sublabel is None:
+                lines.append(f"{name}{_labels(participant=participant)} {value}")
+                continue
+            for state, amount in value.items():
+                labels = _labels(participant=participant, **{sublabel: state})
+                lines.append(f"{name}{labels} {_number(amount)}")
+    for name, help_text, key in (
+        (
+            "cpac_scheduler_last_update_timestamp_seconds",
+            "When the participant's scheduler last ran a scheduling round.",
+            "updated",
+        ),
+        (
+            "cpac_scheduler_last_progress_timestamp_seconds",
+            "When a node of the participant's workflow last finished.",
+            "progress",
+        ),
+    ):
+        family(name, help_text, "gauge")
+        for snapshot in snapshots:
+            if snapshot.get(key) is not None:
+                lines.append(
+                    f"{name}{_labels(participant=snapshot['participant'])}"
+                    f" {_number(snapshot[key])}"
+                )
+
+    nodes: dict[str, dict] = {}
+    for snapshot in snapshots:
+        for _type, observed in snapshot["nodes"].items():
+            if _type not in nodes:
+                nodes[_type] = json.loads(json.dumps(observed))
+                continue
+            total = nodes[_type]
+            for key in ("estimated_memory_gb", "observed_memory_gb", "errors"):
+                total[key] += observed[key]
+            for key in ("runtime_seconds", "memory_observed_ratio"):
+                total[key]["buckets"] = [
+                    a + b
+                    for a, b in zip(total[key]["buckets"], observed[key]["buckets"])
+                ]
+                total[key]["sum"] += observed[key]["sum"]
+                total[key]["count"] += observed[key]["count"]
+    for key, buckets, help_text in (
+        (
+            "runtime_seconds",
+            RUNTIME_BUCKETS,
+            "Runtime (s) of finished nodes.",
+        ),
+        (
+            "memory_observed_ratio",
+            MEMORY_RATIO_BUCKETS,
+            "Observed peak memory of finished nodes relative to their estimates.",
+        ),
+    ):
+        name = f"cpac_node_{key}"
+        family(name, help_text, "histogram")
+        for _type in sorted(nodes):
+            histogram = nodes[_type][key]
+            cumulative = 0
+            for bound, count in zip(
+                [*(_number(float(bound)) for bound in buckets), "+Inf"],
+                histogram["buckets"],
+            ):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_labels(node_type=_type, le=bound)} {cumulative}"
+                )
+            lines.append(
+                f"{name}_sum{_labels(node_type=_type)} {_number(histogram['sum'])}"
+            )
+            lines.append(f"{name}_count{_labels(node_type=_type)} {cumulative}")
+    for key, help_text in (
+        (
+            "estimated_memory_gb",
+            "Total memory (GB) estimated for finished, monitored nodes.",
+        ),
+        (
+            "observed_memory_gb",
+            "Total observed peak memory (GB) of finished, monitored nodes.",
+        ),
+        ("errors", "Nodes that finished without a result."),
+    ):
+        name = f"cpac_node_{key}_total"
+        family(name, help_text, "counter")
+        for _type in sorted(nodes):
+            lines.append(
+                f"{name}{_labels(node_type=_type)} {_number(nodes[_type][key])}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def find_snapshots(pipeline_name: str, logging_dir: str) -> list[dict]:
+    """Load every participant's ``metrics.json`` for a pipeline."""
+    snapshots = []
+    for path in sorted(
+        glob(
+            os.path.join(logging_dir, f"pipeline_{pipeline_name}", "*", "metrics.json")
+        )
+    ):
+        try:
+            with open(path, "r", encoding="utf-8") as metrics_file:
+                snapshots.append(json.load(metrics_file))
+        except (OSError, ValueError):
+            # removed or replaced between globbing and reading
+            continue
+    return snapshots
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve a pipeline's live metrics at ``/metrics``."""
+
+    server: "MetricsHTTPServer"
+
+    def do_GET(self) -> None:
+        """Render every participant's latest snapshot."""
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics(
+            find_snapshots(self.server.pipeline_name, self.server.logging_dir)
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        """Don't log every scrape."""
+
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    """HTTP server for a pipeline's live metrics."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        pipeline_name: str,
+        logging_dir: str = "",
+        host: str = "",
+        port: int = 9100,
+    ) -> None:
+        super().__init__((host, port), MetricsRequestHandler)
+        self.logging_dir = logging_dir or os.getcwd()
+        self.pipeline_name = pipeline_name
+
+
+def metrics_server(
+    pipeline_name: str, logging_dir: str, host: str = "0.0.0.0", port: int = 9100
+) -> MetricsHTTPServer:
+    """Serve a pipeline's live metrics from a background thread.
+
+    Call ``shutdown()`` on the returned server to stop it.
+    """
+    httpd = MetricsHTTPServer(pipeline_name, logging_dir, host, port)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
@@ -11,6 +11,23 @@ from nipype.utils.profiler import log_nodes_cb as _nipype_log_nodes_cb
 
 from CPAC.pipeline import nipype_pipeline_engine as pe
 from .custom_logging import getLogger
+from .metrics import node_metrics
+
+_CALLBACK = threading.local()
+
+
+def callback_logger_name() -> str:
+    """Return the name of the callback logger for the current thread.
+
+    Participants run in separate threads under a global scheduler, so each
+    thread can log node callbacks to its own participant's callback log.
+    """
+    return getattr(_CALLBACK, "name", "callback")
+
+
+def set_callback_logger_name(name: str) -> None:
+    """Set the name of the callback logger for the current thread."""
+    _CALLBACK.name = name
 
 
 # Log initial information from all the nodes
@@ -27,7 +44,7 @@ def recurse_nodes(workflow, prefix=""):
 
 
 def log_nodes_initial(workflow):
-    logger = getLogger("callback")
+    logger = getLogger(callback_logger_name())
     for node in recurse_nodes(workflow):
         logger.debug(json.dumps(node))
 
@@ -45,6 +62,8 @@ def log_nodes_cb(node, status):
     #     * Skips logging not-found Nodes
     #     * Sets `None` default for start and finish
     #     * Uses a MockLogger for the callback logger
+    #     * Uses the current thread's callback logger
+    #     * Records finished Nodes in the current thread's live metrics
     #     * Modified docstring to reflect local changes
     #     * Updated style to match C-PAC codebase
 
@@ -89,13 +108,13 @@ def log_nodes_cb(node, status):
     #    See the License for the specific language governing permissions and
     #    limitations under the License.
 
-    # Modifications copyright (C) 2019 - 2024  C-PAC Developers
+    # Modifications copyright (C) 2019 - 2026  C-PAC Developers
     if status != "end":
         return
 
     from nipype.pipeline.engine import nodes
 
-    logger = getLogger("callback")
+    logger = getLogger(callback_logger_name())
 
     if isinstance(node, nodes.MapNode):
         return
@@ -127,6 +146,10 @@ def log_nodes_cb(node, status):
 
     logger.debug(json.dumps(status_dict))
 
+    metrics = node_metrics()
+    if metrics is not None:
+        metrics.node_finished(status_dict)
+
 
 log_nodes_cb.__doc__ = f"""{_nipype_log_nodes_cb.__doc__}
 
@@ -0,0 +1,354 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Learn per-node-type memory and runtime from accumulated callback logs.
+
+Each node type's observed peak memory and runtime are fit as linear functions
+of its input data size (``input_data_shape``, in millions of voxels x TRs)
+and its number of threads, with non-negative coefficients:
+
+* memory ~ a + b * size + c * threads
+* runtime ~ a + b * size + (c + d * size) / threads
+
+Memory predictions add the largest underestimate seen while fitting, so they
+bound every observation. Node types without recorded shapes, and nodes whose
+shape isn't known yet, fall back to models of threads alone.
+"""
+
+import csv
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+MODEL_VERSION = 1
+MAX_SAMPLES = 1000
+"""most recent observations kept per node type"""
+
+_MEMORY = "memory_gb"
+_RUNTIME = "runtime_seconds"
+
+
+class Prediction(NamedTuple):
+    """Predicted peak memory and runtime of one node."""
+
+    memory_gb: float
+    runtime_seconds: float
+
+
+def node_type(node_id: str) -> str:
+    """Return the name a node shares across participants, forks and pipelines.
+
+    Examples
+    --------
+    >>> node_type("cpac_sub-01.anat_preproc_ants_0.anat_skullstrip_ants_3")
+    'anat_skullstrip_ants'
+    >>> node_type("cpac_sub-01.func_preproc_12._apply_warp_12_7")
+    'apply_warp'
+    """
+    name = node_id.rsplit(".", 1)[-1].lstrip("_")
+    return re.sub(r"(_?\d+)+$", "", name) or name
+
+
+def data_size(input_data_shape: Optional[Iterable[int]]) -> Optional[float]:
+    """Return the number of data points in millions, if the shape is known.
+
+    Examples
+    --------
+    >>> data_size([100, 100, 100, 200])
+    200.0
+    >>> data_size(None) is None
+    True
+    """
+    if not input_data_shape:
+        return None
+    return float(np.prod(input_data_shape, dtype=np.float64)) / 1e6
+
+
+def _features(
+    target: str, size: np.ndarray, threads: np.ndarray, sized: bool
+) -> np.ndarray:
+    """Return the design matrix for one target."""
+    columns = [np.ones_like(threads)]
+    if target == _MEMORY:
+        if sized:
+            columns.append(size)
+        columns.append(threads)
+    else:
+        if sized:
+            columns.append(size)
+        columns.append(1 / threads)
+        if sized:
+            columns.append(size / threads)
+    return np.column_stack(columns)
+
+
+def _fit(features: np.ndarray, observed: np.ndarray, margin: bool) -> dict:
+    """Fit non-negative coefficients, optionally bounding the observations."""
+    from scipy.optimize import nnls
+
+    coef = nnls(features, observed)[0]
+    residual = observed - features @ coef
+    return {
+        "coef": coef.tolist(),
+        "margin": float(max(residual.max(), 0)) if margin else 0.0,
+    }
+
+
+class ResourceModel:
+    """Per-node-type resource observations and the models fit to them.
+
+    Examples
+    --------
+    >>> model = ResourceModel()
+    >>> for threads in (1, 2, 4):
+    ...     model.add("warp", [10, 10, 10, 100], threads, 1 + 0.5, 4 + 8 / threads)
+    >>> prediction = model.fit().predict("warp_3", [10, 10, 10, 100], 8)
+    >>> round(prediction.memory_gb, 3), round(prediction.runtime_seconds, 3)
+    (1.5, 5.0)
+    >>> model.predict("unobserved") is None
+    True
+    """
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[list]] = {}
+        """node type: ``[size, threads, memory_gb, runtime_seconds]`` rows"""
+        self.fits: dict[str, dict] = {}
+        self.sources: list[str] = []
+        """digests of ingested callback logs"""
+
+    @classmethod
+    def load(cls, path: str) -> "ResourceModel":
+        """Load a model saved with :py:meth:`save`."""
+        with open(path, "r", encoding="utf-8") as model_file:
+            saved = json.load(model_file)
+        if saved.get("version") != MODEL_VERSION:
+            msg = (
+                f"{path} is a version {saved.get('version')} resource model; "
+                f"rebuild it as version {MODEL_VERSION} from callback logs."
+            )
+            raise ValueError(msg)
+        model = cls()
+        model.samples = saved["samples"]
+        model.fits = saved["fits"]
+        model.sources = saved["sources"]
+        return model
+
+    def save(self, path: str) -> None:
+        """Atomically write the model, with its observations, as JSON."""
+        partial = f"{path}.partial"
+        with open(partial, "w", encoding="utf-8") as model_file:
+            json.dump(
+                {
+                    "version": MODEL_VERSION,
+                    "fits": self.fits,
+                    "samples": self.samples,
+                    "sources": self.sources,
+                },
+                model_file,
+            )
+        os.replace(partial, path)
+
+    def add(
+        self,
+        node_id: str,
+        input_data_shape: Optional[Iterable[int]],
+        threads: int,
+        memory_gb: float,
+        runtime_seconds: float,
+    ) -> None:
+        """Record one observation of a node."""
+        samples = self.samples.setdefault(node_type(node_id), [])
+        samples.append(
+            [
+                data_size(input_data_shape),
+                max(int(threads), 1),
+                float(memory_gb),
+                float(runtime_seconds),
+            ]
+        )
+        del samples[:-MAX_SAMPLES]
+
+    def ingest(self, callback_log: str) -> int:
+        """Record the finished nodes in a ``callback.log``.
+
+        Logs already ingested (by content) are skipped.
+
+        Returns
+        -------
+        int
+            number of observations added
+        """
+        digest = hashlib.sha256(Path(callback_log).read_bytes()).hexdigest()
+        if digest in self.sources:
+            return 0
+        added = 0
+        with open(callback_log, "r", encoding="utf-8") as log:
+            for line in log:
+                try:
+                    status = json.loads(line)
+                    runtime = (
+                        datetime.fromisoformat(status["finish"])
+                        - datetime.fromisoformat(status["start"])
+                    ).total_seconds()
+                    memory_gb = float(status["runtime_memory_gb"])
+                except (KeyError, TypeError, ValueError):
+                    # initial node listings, errors and unmonitored nodes
+                    continue
+                if status.get("error"):
+                    continue
+                self.add(
+                    status["id"],
+                    status.get("input_data_shape"),
+                    status.get("num_threads", 1),
+                    memory_gb,
+                    runtime,
+                )
+                added += 1
+        self.sources.append(digest)
+        return added
+
+    def fit(self) -> "ResourceModel":
+        """Fit memory and runtime models for every observed node type."""
+        self.fits = {}
+        for _type, samples in self.samples.items():
+            rows = np.array(samples, dtype=np.float64)
+            threads = rows[:, 1]
+            sized = ~np.isnan(rows[:, 0])
+            self.fits[_type] = {"samples": len(samples)}
+            for column, target in ((2, _MEMORY), (3, _RUNTIME)):
+                models = {
+                    "unsized": _fit(
+                        _features(target, rows[:, 0], threads, sized=False),
+                        rows[:, column],
+                        margin=target == _MEMORY,
+                    )
+                }
+                if sized.sum() > 1 and np.ptp(rows[sized, 0]) > 0:
+                    models["sized"] = _fit(
+                        _features(target, rows[sized, 0], threads[sized], sized=True),
+                        rows[sized, column],
+                        margin=target == _MEMORY,
+                    )
+                self.fits[_type][target] = models
+        return self
+
+    def predict(
+        self,
+        node_id: str,
+        input_data_shape: Optional[Iterable[int]] = None,
+        threads: int = 1,
+    ) -> Optional[Prediction]:
+        """Predict a node's peak memory and runtime.
+
+        Returns
+        -------
+        Prediction or None
+            ``None`` for node types without observations
+        """
+        fit = self.fits.get(node_type(node_id))
+        if fit is None:
+            return None
+        size = data_size(input_data_shape)
+        predicted = []
+        for target in (_MEMORY, _RUNTIME):
+            sized = size is not None and "sized" in fit[target]
+            model = fit[target]["sized" if sized else "unsized"]
+            features = _features(
+                target,
+                np.array([size or 0.0]),
+                np.array([float(max(threads, 1))]),
+                sized,
+            )
+            predicted.append(float(features[0] @ model["coef"]) + model["margin"])
+        return Prediction(*predicted)
+
+    def summary(self) -> list[dict]:
+        """Summarize observations and fits per node type."""
+        rows = []
+        for _type in sorted(self.fits):
+            observed = np.array(self.samples[_type], dtype=np.float64)
+            fit = self.fits[_type]
+            rows.append(
+                {
+                    "node_type": _type,
+                    "samples": fit["samples"],
+                    "sized_samples": int((~np.isnan(observed[:, 0])).sum()),
+                    "max_memory_gb": float(observed[:, 2].max()),
+                    "median_runtime_seconds": float(np.median(observed[:, 3])),
+                    **{
+                        f"{target}_{kind}": json.dumps(model)
+                        for target in (_MEMORY, _RUNTIME)
+                        for kind, model in fit[target].items()
+                    },
+                }
+            )
+        return rows
+
+    def export(self, path: str) -> None:
+        """Write :py:meth:`summary` as CSV."""
+        rows = self.summary()
+        fieldnames = [
+            "node_type",
+            "samples",
+            "sized_samples",
+            "max_memory_gb",
+            "median_runtime_seconds",
+        ] + [
+            f"{target}_{kind}"
+            for target in (_MEMORY, _RUNTIME)
+            for kind in ("unsized", "sized")
+        ]
+        with open(path, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def find_callback_logs(paths: Iterable[str]) -> list[str]:
+    """Expand directories into the ``callback.log`` files beneath them."""
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            logs.extend(sorted(str(log) for log in Path(path).rglob("callback.log")))
+        else:
+            logs.append(path)
+    return logs
+
+
+def node_input_shape(node) -> Optional[tuple[int, ...]]:
+    """Return a node's input data shape if it is known before the node runs."""
+    from traits.trait_base import Undefined
+
+    from CPAC.utils.nifti_utils import image_metadata
+
+    shape = getattr(node, "input_data_shape", Undefined)
+    if shape is not Undefined and shape:
+        return tuple(shape)
+    mem_x = getattr(node, "mem_x", None)
+    if mem_x and mem_x.get("file"):
+        path = getattr(node.inputs, mem_x["file"], Undefined)
+        if isinstance(path, (list, tuple)):
+            path = path[0] if path else Undefined
+        if isinstance(path, str) and os.path.exists(path):
+            node.input_data_shape = image_metadata(path).shape
+            return node.input_data_shape
+    return None
@@ -16,12 +16,73 @@
 # License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
 """Utlities for NIfTI images."""
 
+from functools import lru_cache
 import os
+from typing import NamedTuple, Optional
 
 import numpy as np
 import nibabel as nib
 
 
+class ImageMetadata(NamedTuple):
+    """Header metadata of an image file."""
+
+    shape: tuple[int, ...]
+    """Image dimensions"""
+    zooms: tuple[float, ...]
+    """Voxel sizes (and TR for 4D images) in header units"""
+    time_unit: Optional[str]
+    """Unit of the 4th zoom, e.g. "sec" or "msec", if specified"""
+
+    @property
+    def tr(self) -> Optional[float]:
+        """Repetition time in seconds, if the image has a 4th dimension."""
+        if len(self.zooms) < 4:  # noqa: PLR2004
+            return None
+        tr = float(self.zooms[3])
+        if self.time_unit == "msec":
+            return tr / 1000
+        if self.time_unit == "usec":
+            return tr / 1000000
+        return tr
+
+
+@lru_cache(maxsize=4096)
+def _image_metadata(path: str, mtime_ns: int, size: int) -> ImageMetadata:
+    """Read header metadata, memoized by path and file modification."""
+    header = nib.load(path).header
+    try:
+        time_unit = header.get_xyzt_units()[1]
+    except AttributeError:
+        time_unit = None
+    return ImageMetadata(
+        tuple(int(dim) for dim in header.get_data_shape()),
+        tuple(float(zoom) for zoom in header.get_zooms()),
+        None if time_unit == "unknown" else time_unit,
+    )
+
+
+def image_metadata(path: str | os.PathLike) -> ImageMetadata:
+    """Return an image's shape, zooms and TR from its header alone.
+
+    Image data are never read, and results are cached until the file at
+    ``path`` changes (by modification time or size), so repeated lookups of
+    one image (e.g., for every ``mem_x`` estimate) only cost a ``stat``.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+        path to an image file nibabel can load
+
+    Returns
+    -------
+    ImageMetadata
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return _image_metadata(path, stat.st_mtime_ns, stat.st_size)
+
+
 def nifti_image_input(
     image: str | nib.nifti1.Nifti1Image,
 ) -> nib.nifti1.Nifti1Image:
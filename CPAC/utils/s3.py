@@ -0,0 +1,495 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Shared S3 clients, resumable parallel downloads and concurrent uploads."""
+
+from concurrent.futures import as_completed, ThreadPoolExecutor
+from functools import lru_cache
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from botocore.exceptions import ClientError
+
+from CPAC.utils.monitoring import FMLOGGER
+
+S3_PREFIX = "s3://"
+_CHUNK_SIZE = 2**20
+MULTIPART_THRESHOLD = 8 * 2**20
+"""size at which ``boto3`` uploads files in parts, by default"""
+MULTIPART_CHUNKSIZE = 8 * 2**20
+"""size of the parts ``boto3`` uploads, by default"""
+_UNRETRYABLE = {"403", "404", "AccessDenied", "NoSuchBucket", "NoSuchKey"}
+
+
+def _none_creds(creds_path: Optional[str]) -> Optional[str]:
+    """Treat 'None'-like credentials strings as no credentials."""
+    if creds_path and any(none in creds_path for none in ("None", "none", "null")):
+        return None
+    return creds_path or None
+
+
+@lru_cache(maxsize=None)
+def s3_client(creds_path: Optional[str], bucket_name: str) -> Any:
+    """Return one (thread-safe) S3 client per credentials file and bucket."""
+    from indi_aws import fetch_creds
+
+    return fetch_creds.return_bucket(_none_creds(creds_path), bucket_name).meta.client
+
+
+def split_s3_path(file_path: str, dl_dir: str) -> tuple[str, str, str]:
+    """Split an S3 URI into bucket, key and local download path.
+
+    Examples
+    --------
+    >>> split_s3_path("S3://bucket/sub-1/anat/T1w.nii.gz", "/work")
+    ('bucket', 'sub-1/anat/T1w.nii.gz', '/work/bucket/sub-1/anat/T1w.nii.gz')
+    """
+    bucket_name, _, key = file_path[len(S3_PREFIX) :].partition("/")
+    return bucket_name, key, os.path.join(dl_dir, bucket_name, key)
+
+
+def _md5(path: str) -> str:
+    """Return the hex MD5 digest of a file's contents."""
+    digest = hashlib.md5()
+    with open(path, "rb") as _file:
+        for chunk in iter(lambda: _file.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def matches_remote(local_path: str, size: int, etag: str) -> bool:
+    """Check whether a local file matches an S3 object's size and ETag.
+
+    Multipart ETags aren't content MD5s, so only the size is compared for
+    those objects.
+    """
+    if not os.path.isfile(local_path) or os.path.getsize(local_path) != size:
+        return False
+    etag = etag.strip('"')
+    return "-" in etag or _md5(local_path) == etag
+
+
+def download_s3_file(
+    client: Any, bucket_name: str, key: str, local_path: str, retries: int = 3
+) -> bool:
+    """Download one S3 object, resuming partial downloads and retrying.
+
+    Data are written to ``{local_path}.partial`` and renamed into place once
+    complete, so ``local_path`` never holds a partial file. A ``.partial`` left
+    behind by an interrupted download is resumed with a ranged request.
+
+    Returns
+    -------
+    bool
+        ``False`` if a matching ``local_path`` already existed.
+
+    Raises
+    ------
+    botocore.exceptions.ClientError
+        Immediately for missing objects and denied access, otherwise once
+        ``retries`` retries are exhausted.
+    """
+    partial = f"{local_path}.partial"
+    os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+    for attempt in range(retries + 1):
+        try:
+            head = client.head_object(Bucket=bucket_name, Key=key)
+            size, etag = head["ContentLength"], head["ETag"]
+            if matches_remote(local_path, size, etag):
+                return False
+            offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+            if offset > size:
+                os.remove(partial)
+                offset = 0
+            if offset < size:
+                request = {"Bucket": bucket_name, "Key": key, "IfMatch": etag}
+                if offset:
+                    request["Range"] = f"bytes={offset}-"
+                body = client.get_object(**request)["Body"]
+                with open(partial, "ab") as partial_file:
+                    for chunk in iter(lambda: body.read(_CHUNK_SIZE), b""):
+                        partial_file.write(chunk)
+            if not matches_remote(partial, size, etag):
+                os.remove(partial)
+                msg = f"Download of s3://{bucket_name}/{key} does not match its ETag"
+                raise OSError(msg)
+            os.replace(partial, local_path)
+            return True
+        except (ClientError, OSError) as exception:
+            code = (
+                exception.response.get("Error", {}).get("Code")
+                if isinstance(exception, ClientError)
+                else None
+            )
+            if code in _UNRETRYABLE or attempt == retries:
+                raise
+            if code in {"412", "PreconditionFailed"} and os.path.exists(partial):
+                # the object changed since the partial download started
+                os.remove(partial)
+            FMLOGGER.warning(
+                "Retrying download of s3://%s/%s (%s)", bucket_name, key, exception
+            )
+            time.sleep(2**attempt)
+    return True
+
+
+def gather_s3_paths(
+    obj: Any,
+    creds_path: Optional[str] = None,
+    paths: Optional[dict[str, Optional[str]]] = None,
+) -> dict[str, Optional[str]]:
+    """Collect S3 URIs from a data or pipeline configuration.
+
+    Templated paths (containing ``${``) are resolved later in the pipeline and
+    are skipped. Each participant's ``creds_path`` applies to its own paths.
+
+    Returns
+    -------
+    dict
+        S3 URI: credentials path
+    """
+    if paths is None:
+        paths = {}
+    if isinstance(obj, dict):
+        creds_path = _none_creds(obj.get("creds_path", creds_path))
+        items = [*obj.keys(), *obj.values()]
+    elif isinstance(obj, (list, tuple, set)):
+        items = obj
+    else:
+        items = [obj]
+    for item in items:
+        if isinstance(item, (dict, list, tuple, set)):
+            gather_s3_paths(item, creds_path, paths)
+        elif (
+            isinstance(item, str)
+            and item.lower().startswith(S3_PREFIX)
+            and "${" not in item
+        ):
+            paths.setdefault(S3_PREFIX + item[len(S3_PREFIX) :], creds_path)
+    return paths
+
+
+def prefetch_s3(
+    paths: dict[str, Optional[str]],
+    dl_dir: str,
+    max_workers: int = 8,
+    retries: int = 3,
+    get_client: Callable[[Optional[str], str], Any] = s3_client,
+) -> dict[str, list[str]]:
+    """Download S3 inputs in parallel to where ``check_for_s3`` looks for them.
+
+    Failures are logged rather than raised: ``check_for_s3`` retries those
+    files, and reports errors, when their nodes run.
+
+    Parameters
+    ----------
+    paths : dict
+        S3 URI: credentials path, e.g. from :py:func:`gather_s3_paths`
+    dl_dir : str
+        download directory (the pipeline's working directory)
+    max_workers : int
+        concurrent downloads
+    retries : int
+        retries per file
+    get_client : callable
+        ``(creds_path, bucket_name) -> client``; clients are shared by all
+        threads
+
+    Returns
+    -------
+    dict
+        lists of S3 URIs that were "downloaded", "skipped" (already present)
+        and "failed"
+    """
+    results = {"downloaded": [], "skipped": [], "failed": []}
+    if not paths:
+        return results
+    FMLOGGER.info("Prefetching %d files from S3 to %s", len(paths), dl_dir)
+    clients = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for file_path, creds_path in paths.items():
+            bucket_name, key, local_path = split_s3_path(file_path, dl_dir)
+            try:
+                if (creds_path, bucket_name) not in clients:
+                    clients[creds_path, bucket_name] = get_client(
+                        creds_path, bucket_name
+                    )
+            except Exception as exception:  # pylint: disable=broad-except
+                FMLOGGER.warning("Could not prefetch %s: %s", file_path, exception)
+                results["failed"].append(file_path)
+                continue
+            futures[
+                pool.submit(
+                    download_s3_file,
+                    clients[creds_path, bucket_name],
+                    bucket_name,
+                    key,
+                    local_path,
+                    retries,
+                )
+            ] = file_path
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                results["downloaded" if future.result() else "skipped"].append(
+                    file_path
+                )
+            except Exception as exception:  # pylint: disable=broad-except
+                FMLOGGER.warning("Could not prefetch %s: %s", file_path, exception)
+                results["failed"].append(file_path)
+    FMLOGGER.info(
+        "S3 prefetch: %d downloaded, %d already present, %d failed",
+        *(len(results[status]) for status in ("downloaded", "skipped", "failed")),
+    )
+    return results
+
+
+def s3_etag(
+    path: str,
+    multipart_threshold: int = MULTIPART_THRESHOLD,
+    multipart_chunksize: int = MULTIPART_CHUNKSIZE,
+) -> str:
+    """Return the ETag S3 gives a file uploaded with these transfer settings.
+
+    Files smaller than ``multipart_threshold`` are uploaded whole and tagged
+    with the MD5 of their contents. Larger files are uploaded in parts of
+    ``multipart_chunksize`` (adjusted to S3's limits as ``boto3`` adjusts
+    it) and tagged with the MD5 of their parts' MD5s and the number of
+    parts. The file is read once, in blocks.
+    """
+    from s3transfer.utils import ChunksizeAdjuster
+
+    size = os.path.getsize(path)
+    if size < multipart_threshold:
+        return _md5(path)
+    multipart_chunksize = ChunksizeAdjuster().adjust_chunksize(
+        multipart_chunksize, size
+    )
+    part_digests = []
+    with open(path, "rb") as _file:
+        for _ in range(0, size, multipart_chunksize):
+            part = hashlib.md5()
+            remaining = multipart_chunksize
+            while remaining:
+                chunk = _file.read(min(_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                part.update(chunk)
+                remaining -= len(chunk)
+            part_digests.append(part.digest())
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+class UploadManifest:
+    """Keys uploaded by earlier runs, to skip without checking S3 again.
+
+    Each upload is appended to a JSON Lines file as it completes, with the
+    size and modification time of the file uploaded, so an interrupted run
+    keeps its record of completed uploads.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._completed: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as manifest:
+                for line in manifest:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a partially written last line
+                        continue
+                    self._completed[entry["key"]] = entry["stat"]
+
+    @staticmethod
+    def _stat(local_path: str) -> list[int]:
+        stat = os.stat(local_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def completed(self, key: str, local_path: str) -> bool:
+        """Check whether this file was uploaded to ``key`` by an earlier run."""
+        return self._completed.get(key) == self._stat(local_path)
+
+    def record(self, key: str, local_path: str, etag: str) -> None:
+        """Record a completed upload."""
+        stat = self._stat(local_path)
+        with self._lock:
+            self._completed[key] = stat
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as manifest:
+                    manifest.write(
+                        json.dumps({"key": key, "stat": stat, "etag": etag}) + "\n"
+                    )
+
+
+def upload_s3_file(
+    client: Any,
+    manager: Any,
+    bucket_name: str,
+    key: str,
+    local_path: str,
+    extra_args: Optional[dict] = None,
+    manifest: Optional[UploadManifest] = None,
+    retries: int = 3,
+) -> bool:
+    """Upload one file to S3 unless an identical object is already there.
+
+    The file's ETag is computed for ``manager``'s transfer settings, so
+    objects uploaded in parts are recognized too.
+
+    Returns
+    -------
+    bool
+        ``False`` if the upload was skipped.
+
+    Raises
+    ------
+    botocore.exceptions.ClientError
+        Immediately for denied access and missing buckets, otherwise once
+        ``retries`` retries are exhausted.
+    """
+    if manifest is None:
+        manifest = UploadManifest()
+    if manifest.completed(key, local_path):
+        return False
+    etag = s3_etag(
+        local_path,
+        manager.config.multipart_threshold,
+        manager.config.multipart_chunksize,
+    )
+    for attempt in range(retries + 1):
+        try:
+            try:
+                head = client.head_object(Bucket=bucket_name, Key=key)
+            except ClientError as exception:
+                if exception.response.get("Error", {}).get("Code") not in {
+                    "404",
+                    "NoSuchKey",
+                    "NotFound",
+                }:
+                    raise
+            else:
+                if head["ContentLength"] == os.path.getsize(local_path) and (
+                    head["ETag"].strip('"') == etag
+                ):
+                    manifest.record(key, local_path, etag)
+                    return False
+            manager.upload(local_path, bucket_name, key, extra_args=extra_args).result()
+            manifest.record(key, local_path, etag)
+            return True
+        except (ClientError, OSError) as exception:
+            code = (
+                exception.response.get("Error", {}).get("Code")
+                if isinstance(exception, ClientError)
+                else None
+            )
+            if code in _UNRETRYABLE or attempt == retries:
+                raise
+            FMLOGGER.warning(
+                "Retrying upload of %s to s3://%s/%s (%s)",
+                local_path,
+                bucket_name,
+                key,
+                exception,
+            )
+            time.sleep(2**attempt)
+    return True
+
+
+def upload_s3(
+    client: Any,
+    bucket_name: str,
+    uploads: dict[str, str],
+    max_workers: int = 8,
+    extra_args: Optional[dict] = None,
+    manifest_path: Optional[str] = None,
+    retries: int = 3,
+    transfer_config: Any = None,
+) -> dict[str, list[str]]:
+    """Upload files to S3 in parallel, skipping those already uploaded.
+
+    ``max_workers`` threads hash files and check S3 for existing objects in
+    parallel, and hand uploads to one transfer manager shared over
+    ``client``, which bounds the concurrent transfers.
+
+    Parameters
+    ----------
+    client : botocore.client.S3
+    bucket_name : str
+    uploads : dict
+        S3 key: local path
+    max_workers : int
+        files to check and upload at once
+    extra_args : dict, optional
+        ``ExtraArgs`` for each upload, e.g. ``{"ServerSideEncryption": "AES256"}``
+    manifest_path : str, optional
+        path of an :py:class:`UploadManifest` to skip uploads completed by an
+        earlier run and record this run's
+    retries : int
+        retries per file
+    transfer_config : boto3.s3.transfer.TransferConfig, optional
+
+    Returns
+    -------
+    dict
+        lists of S3 keys that were "uploaded", "skipped" (already present)
+        and "failed"
+    """
+    from boto3.s3.transfer import create_transfer_manager, TransferConfig
+
+    results = {"uploaded": [], "skipped": [], "failed": []}
+    if not uploads:
+        return results
+    manifest = UploadManifest(manifest_path)
+    with (
+        create_transfer_manager(client, transfer_config or TransferConfig()) as manager,
+        ThreadPoolExecutor(max_workers=max_workers) as pool,
+    ):
+        futures = {
+            pool.submit(
+                upload_s3_file,
+                client,
+                manager,
+                bucket_name,
+                key,
+                local_path,
+                extra_args,
+                manifest,
+                retries,
+            ): key
+            for key, local_path in uploads.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results["uploaded" if future.result() else "skipped"].append(key)
+            except Exception as exception:  # pylint: disable=broad-except
+                FMLOGGER.warning(
+                    "Could not upload s3://%s/%s: %s", bucket_name, key, exception
+                )
+                results["failed"].append(key)
+    FMLOGGER.info(
+        "S3 upload to %s: %d uploaded, %d already present, %d failed",
+        bucket_name,
+        *(len(results[status]) for status in ("uploaded", "skipped", "failed")),
+    )
+    return results
@@ -0,0 +1,243 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Content-addressed cache of resampled templates shared across participants."""
+
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import time
+from typing import Callable, Iterator, Optional
+from uuid import uuid4
+
+from CPAC.utils.monitoring import FMLOGGER
+
+_CHUNK_SIZE = 2**20
+_KEY_PATTERN = re.compile(r"[0-9a-f]{64}(\.nii\.gz|\.[^.]+)?")
+"""names of cached entries: :py:meth:`TemplateCache.key` outputs"""
+_LOCK_DIR = ".locks"
+_LOCK_FILE = "cache.lock"
+_STATS_FILE = "stats.json"
+
+
+def _file_digest(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as _file:
+        for chunk in iter(lambda: _file.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _nifti_suffix(path: str) -> str:
+    """Return ``.nii.gz`` or the last suffix of ``path``."""
+    return ".nii.gz" if path.endswith(".nii.gz") else Path(path).suffix
+
+
+class TemplateCache:
+    """Directory of resampled templates keyed by content and resampling options.
+
+    Entries are written to a temporary file and atomically renamed into
+    place, so readers never see partial files. Builds of the same entry are
+    serialized with a per-entry file lock so concurrent participants resample
+    each template once. Lock files are kept in a subdirectory, apart from the
+    entries. The least recently used entries are evicted once the cache grows
+    past ``max_size_gb``.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> cache = TemplateCache(tempfile.mkdtemp(), max_size_gb=1)
+    >>> source = os.path.join(cache.path, "source.nii.gz")
+    >>> Path(source).write_bytes(b"template")
+    8
+    >>> key = cache.key(source, "2mm", "RPI", "Cu")
+    >>> cache.get(key) is None
+    True
+    >>> cached = cache.put(key, source)
+    >>> cache.get(key) == cached
+    True
+    """
+
+    def __init__(self, path: str, max_size_gb: float = 10.0) -> None:
+        self.path = os.path.abspath(path)
+        self.max_size = int(float(max_size_gb) * 1024**3)
+        os.makedirs(os.path.join(self.path, _LOCK_DIR), exist_ok=True)
+
+    @staticmethod
+    def key(
+        template: str, resolution: str, orientation: str, resample_mode: str
+    ) -> str:
+        """Hash a template's contents with the options it is resampled with."""
+        from CPAC.utils.datasource import res_string_to_tuple
+
+        options = json.dumps(
+            [res_string_to_tuple(resolution), orientation, resample_mode]
+        )
+        digest = hashlib.sha256(_file_digest(template).encode())
+        digest.update(options.encode())
+        return digest.hexdigest() + _nifti_suffix(template)
+
+    @contextmanager
+    def lock(self, name: str = _LOCK_FILE) -> Iterator[None]:
+        """Hold an exclusive lock on ``name`` in the cache's lock directory."""
+        with open(os.path.join(self.path, _LOCK_DIR, name), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def entries(self) -> list[os.DirEntry]:
+        """List cached templates, least recently used first."""
+        with os.scandir(self.path) as scan:
+            entries = [
+                entry
+                for entry in scan
+                if entry.is_file() and _KEY_PATTERN.fullmatch(entry.name)
+            ]
+        return sorted(entries, key=lambda entry: entry.stat().st_atime_ns)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached path for ``key`` and mark it as used, if cached."""
+        path = os.path.join(self.path, key)
+        try:
+            # recency is tracked by access time; modification time is left
+            # alone because hard-linked copies share it and Nipype hashes it
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, source: str, out_file: Optional[str] = None) -> str:
+        """Atomically copy ``source`` into the cache under ``key``.
+
+        If ``out_file`` is given, the new entry is placed there before the
+        cache is trimmed to its bound, so it can't be evicted first.
+        """
+        path = os.path.join(self.path, key)
+        partial = f"{path}.{uuid4().hex}.partial"
+        shutil.copyfile(source, partial)
+        os.replace(partial, path)
+        with self.lock():
+            self.get(key)
+            if out_file is not None:
+                self._link(path, out_file)
+        self.evict()
+        return path
+
+    def evict(self) -> list[str]:
+        """Remove least recently used entries until the cache fits its bound."""
+        removed = []
+        with self.lock():
+            entries = self.entries()
+            size = sum(entry.stat().st_size for entry in entries)
+            # never evict the most recently used entry
+            for entry in entries[:-1]:
+                if size <= self.max_size:
+                    break
+                size -= entry.stat().st_size
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                removed.append(entry.name)
+        if removed:
+            FMLOGGER.info("Evicted from template cache: %s", ", ".join(removed))
+        return removed
+
+    def record(self, hit: bool) -> dict[str, int]:
+        """Count a cache hit or miss and return the running totals."""
+        stats_path = os.path.join(self.path, _STATS_FILE)
+        with self.lock():
+            try:
+                with open(stats_path, "r", encoding="utf-8") as stats_file:
+                    stats = json.load(stats_file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                stats = {"hits": 0, "misses": 0}
+            stats["hits" if hit else "misses"] += 1
+            partial = f"{stats_path}.{uuid4().hex}.partial"
+            with open(partial, "w", encoding="utf-8") as stats_file:
+                json.dump(stats, stats_file)
+            os.replace(partial, stats_path)
+        return stats
+
+    def _link(self, source: str, out_file: str) -> None:
+        """Hard link (or copy across filesystems) ``source`` to ``out_file``."""
+        if os.path.realpath(source) == os.path.realpath(out_file):
+            return
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        if os.path.lexists(out_file):
+            os.remove(out_file)
+        try:
+            os.link(source, out_file)
+        except OSError:
+            shutil.copyfile(source, out_file)
+
+    def checkout(self, key: str, out_file: str) -> bool:
+        """Place the entry for ``key`` at ``out_file`` if it is cached."""
+        # hold the cache lock so the entry can't be evicted mid-link
+        with self.lock():
+            cached = self.get(key)
+            if cached is None:
+                return False
+            self._link(cached, out_file)
+        return True
+
+    def fetch(self, key: str, build: Callable[[], str], out_file: str) -> str:
+        """Place the entry for ``key`` at ``out_file``, building it if needed.
+
+        Parameters
+        ----------
+        key : str
+            Output of :py:meth:`TemplateCache.key`.
+        build : callable
+            Called without arguments on a cache miss; returns the path of a
+            newly resampled template.
+        out_file : str
+            Where to place the template. A hard link keeps it valid if the
+            entry is later evicted.
+
+        Returns
+        -------
+        str
+            absolute path to ``out_file``
+        """
+        out_file = os.path.abspath(out_file)
+        hit = self.checkout(key, out_file)
+        if not hit:
+            with self.lock(f"{key}.lock"):
+                # another participant may have built it while we waited
+                hit = self.checkout(key, out_file)
+                if not hit:
+                    built = build()
+                    # link from the cached entry: ``built`` may be ``out_file``
+                    self.put(key, built, out_file)
+        stats = self.record(hit)
+        FMLOGGER.info(
+            "Template cache %s for %s (%d hits, %d misses in %s)",
+            "hit" if hit else "miss",
+            os.path.basename(out_file),
+            stats["hits"],
+            stats["misses"],
+            self.path,
+        )
+        return out_file
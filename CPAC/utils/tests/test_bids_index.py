@@ -0,0 +1,222 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests and a benchmark for the persistent BIDS layout index."""
+
+import json
+import os
+from pathlib import Path
+from time import perf_counter
+
+import pytest
+
+from CPAC.utils.bids_index import BIDSLayoutIndex, SUFFIXES
+from CPAC.utils.bids_utils import (
+    bids_gen_cpac_sublist,
+    collect_bids_files_configs,
+    create_cpac_data_config,
+)
+
+FILES_PER_PARTICIPANT = 14
+"""images and sidecars C-PAC reads for each participant in the test dataset"""
+
+
+def _write_dataset(root: Path, participants: int) -> None:
+    """Write a BIDS dataset of empty images and sidecars."""
+    root.mkdir(parents=True, exist_ok=True)
+    (root / "task-rest_bold.json").write_text(json.dumps({"RepetitionTime": 2}))
+    (root / "dataset_description.json").write_text("{}")
+    for i in range(participants):
+        sub = f"sub-{i:05d}"
+        for datatype, names in {
+            "anat": ["T1w", "acq-VNavNorm_T1w"],
+            "func": ["task-rest_run-1_bold", "task-rest_run-2_bold"],
+            "fmap": ["magnitude1", "phasediff", "acq-fMRI_dir-AP_epi", "dir-PA_epi"],
+            "dwi": ["dwi"],
+        }.items():
+            (root / sub / datatype).mkdir(parents=True)
+            for name in names:
+                stem = root / sub / datatype / f"{sub}_{name}"
+                Path(f"{stem}.nii.gz").touch()
+                Path(f"{stem}.json").write_text(
+                    json.dumps({"RepetitionTime": 2, "EchoTime": i / 1000})
+                )
+
+
+def _legacy_collect(bids_dir: str) -> tuple[list, dict]:
+    """Walk and read a BIDS directory as C-PAC did before indexing it."""
+    file_paths = []
+    config_dict = {}
+    for root, _dirs, files in os.walk(bids_dir, topdown=False, followlinks=True):
+        for f in files:
+            for suf in SUFFIXES:
+                if suf == "epi" and "acq-fMRI" not in f:
+                    continue
+                if "nii" in f and suf in f:
+                    file_paths += [
+                        os.path.join(root, f).replace(bids_dir, "").lstrip("/")
+                    ]
+                if f.endswith("json") and suf in f:
+                    with open(os.path.join(root, f), "r") as sidecar:
+                        config_dict[
+                            os.path.join(root.replace(bids_dir, "").lstrip("/"), f)
+                        ] = json.load(sidecar)
+    return file_paths, config_dict
+
+
+def test_collect_matches_walk(tmp_path):
+    """Test the index collects the same files and sidecars as walking did."""
+    _write_dataset(tmp_path, 3)
+    legacy_paths, legacy_config = _legacy_collect(str(tmp_path))
+    file_paths, config_dict = collect_bids_files_configs(str(tmp_path))
+    assert file_paths == sorted(set(legacy_paths))
+    assert config_dict == legacy_config
+    assert not any("dwi" in path or "dir-PA" in path for path in file_paths)
+
+
+def test_incremental_rescan(tmp_path):
+    """Test rescans only pick up added, changed and removed files."""
+    bids_dir = tmp_path / "bids"
+    _write_dataset(bids_dir, 2)
+    index_path = str(tmp_path / "index" / "bids.sqlite")
+    with BIDSLayoutIndex(str(bids_dir), index_path) as index:
+        counts = index.scan()
+    assert counts["added"] == 1 + 2 * FILES_PER_PARTICIPANT
+    sidecar = bids_dir / "sub-00001" / "func" / "sub-00001_task-rest_run-1_bold.json"
+    sidecar.write_text(json.dumps({"RepetitionTime": 0.8, "EchoTime": 0.03}))
+    os.utime(sidecar, ns=(0, 0))
+    os.remove(bids_dir / "sub-00000" / "anat" / "sub-00000_T1w.nii.gz")
+    (bids_dir / "sub-00000" / "anat" / "sub-00000_T2w.nii.gz").touch()
+    with BIDSLayoutIndex(str(bids_dir), index_path) as index:
+        assert index.scan() == {
+            "added": 1,
+            "updated": 1,
+            "removed": 1,
+            "unchanged": 2 * FILES_PER_PARTICIPANT - 1,
+        }
+        assert index.sidecars()[os.path.relpath(sidecar, bids_dir)] == {
+            "RepetitionTime": 0.8,
+            "EchoTime": 0.03,
+        }
+        assert index.scan()["unchanged"] == 1 + 2 * FILES_PER_PARTICIPANT
+    file_paths, config_dict = collect_bids_files_configs(
+        str(bids_dir), index_path=index_path
+    )
+    legacy_paths, legacy_config = _legacy_collect(str(bids_dir))
+    assert file_paths == sorted(set(legacy_paths))
+    assert config_dict == legacy_config
+
+
+def test_query_participants(tmp_path):
+    """Test querying participants' files and the sidecars they inherit."""
+    _write_dataset(tmp_path, 3)
+    with BIDSLayoutIndex(str(tmp_path)) as index:
+        index.scan()
+        niftis = index.niftis(["sub-00001", "00002"])
+        assert {path.split("/")[0] for path in niftis} == {"sub-00001", "sub-00002"}
+        sidecars = index.sidecars(["sub-00001"])
+        assert "task-rest_bold.json" in sidecars
+        assert {path.split("/")[0] for path in sidecars} == {
+            "task-rest_bold.json",
+            "sub-00001",
+        }
+        sub_list = bids_gen_cpac_sublist(
+            str(tmp_path),
+            None,
+            None,
+            None,
+            index=index,
+            participant_labels=["sub-00001"],
+        )
+    file_paths, config_dict = collect_bids_files_configs(str(tmp_path))
+    expected = [
+        sub
+        for sub in bids_gen_cpac_sublist(str(tmp_path), file_paths, config_dict, None)
+        if sub["subject_id"] == "sub-00001"
+    ]
+    assert sub_list == expected
+
+
+@pytest.fixture
+def s3_bids():
+    """Serve a BIDS dataset from a local S3 stand-in."""
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    mock_aws = getattr(moto, "mock_aws", None) or moto.mock_s3
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="bucket")
+        client.put_object(
+            Bucket="bucket", Key="data/task-rest_bold.json", Body=b'{"TR": 2}'
+        )
+        for i in range(4):
+            for name, body in {
+                f"sub-{i}/anat/sub-{i}_T1w.nii.gz": b"",
+                f"sub-{i}/func/sub-{i}_task-rest_bold.nii.gz": b"",
+                f"sub-{i}/func/sub-{i}_task-rest_bold.json": b'{"EchoTime": 0.03}',
+                f"sub-{i}/dwi/sub-{i}_dwi.json": b"{}",
+            }.items():
+                client.put_object(Bucket="bucket", Key=f"data/{name}", Body=body)
+        yield client
+
+
+def test_s3_index(s3_bids):
+    """Test indexing and incrementally rescanning an S3 BIDS directory."""
+    with BIDSLayoutIndex("s3://bucket/data/", get_client=lambda *_: s3_bids) as index:
+        assert index.scan()["added"] == 1 + 4 * 3
+        assert index.niftis(["sub-1"]) == [
+            "sub-1/anat/sub-1_T1w.nii.gz",
+            "sub-1/func/sub-1_task-rest_bold.nii.gz",
+        ]
+        assert index.sidecars(["sub-1"]) == {
+            "sub-1/func/sub-1_task-rest_bold.json": {"EchoTime": 0.03},
+            "task-rest_bold.json": {"TR": 2},
+        }
+        s3_bids.put_object(
+            Bucket="bucket", Key="data/task-rest_bold.json", Body=b'{"TR": 1}'
+        )
+        assert index.scan()["updated"] == 1
+        assert index.sidecars([])["task-rest_bold.json"] == {"TR": 1}
+
+
+def test_benchmark_rescan(tmp_path, record_property):
+    """Benchmark launching one of 2,000 participants by walking vs. rescanning.
+
+    Walking reads every sidecar and parses them all into the subject list;
+    a rescan reads only changed sidecars, and only the participant's files
+    and the sidecars they can inherit are queried.
+    """
+    bids_dir = str(tmp_path / "bids")
+    _write_dataset(Path(bids_dir), 2000)
+    index_path = str(tmp_path / "bids.sqlite")
+
+    def walk():
+        file_paths, config_dict = _legacy_collect(bids_dir)
+        file_paths = [path for path in file_paths if "sub-00042" in path]
+        return bids_gen_cpac_sublist(bids_dir, file_paths, config_dict, None)
+
+    def rescan():
+        return create_cpac_data_config(bids_dir, ["sub-00042"], index_path=index_path)
+
+    seconds = {}
+    sub_lists = {}
+    for name, launch in {"walk": walk, "first scan": rescan, "rescan": rescan}.items():
+        before = perf_counter()
+        sub_lists[name] = launch()
+        seconds[name] = perf_counter() - before
+    record_property("seconds", seconds)
+    assert sub_lists["rescan"] == sub_lists["walk"]
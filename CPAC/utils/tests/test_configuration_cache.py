@@ -0,0 +1,141 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests and a benchmark for cached configuration loading and copies."""
+
+from copy import copy
+import os
+from time import perf_counter
+
+import pytest
+import yaml
+
+from CPAC.utils.configuration import cache, Configuration, Preconfiguration
+
+PARTICIPANTS = 1000
+"""participants in the startup benchmark"""
+UNCACHED_SAMPLE = 10
+"""participants timed without the cache, to estimate the uncached startup"""
+
+
+@pytest.fixture
+def config_cache(tmp_path, monkeypatch):
+    """Cache configurations in an empty directory and nowhere else."""
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path / "config_cache"))
+    monkeypatch.setattr(cache, "_MEMORY", {})
+    return tmp_path / "config_cache"
+
+
+def _uncached(monkeypatch) -> None:
+    """Parse and validate configurations without the cache."""
+    monkeypatch.setattr(cache, "get", lambda key: None)
+    monkeypatch.setattr(cache, "put", lambda key, value: None)
+
+
+@pytest.mark.parametrize("preconfig", ["blank", "default", "fmriprep-options"])
+def test_cached_config_unchanged(preconfig, config_cache, monkeypatch):
+    """Test configurations loaded from the cache match freshly validated ones."""
+    cached = Preconfiguration(preconfig).dict()
+    assert any(config_cache.glob("validated-*.pkl"))
+    monkeypatch.setattr(cache, "_MEMORY", {})
+    assert Preconfiguration(preconfig).dict() == cached
+    with monkeypatch.context() as patch:
+        _uncached(patch)
+        assert Preconfiguration(preconfig).dict() == cached
+
+
+def test_from_chain_invalidates(tmp_path, config_cache, monkeypatch):
+    """Test editing an ancestor in a ``FROM`` chain invalidates cached configs."""
+    base = tmp_path / "base.yml"
+    base.write_text(
+        yaml.safe_dump({"FROM": "default", "pipeline_setup": {"pipeline_name": "base"}})
+    )
+    child = {"FROM": str(base), "anatomical_preproc": {"run": False}}
+    config = Configuration(dict(child))
+    assert config["pipeline_setup", "pipeline_name"] == "base"
+    assert config["anatomical_preproc", "run"] is False
+    base.write_text(
+        yaml.safe_dump(
+            {"FROM": "default", "pipeline_setup": {"pipeline_name": "edited"}}
+        )
+    )
+    monkeypatch.setattr(cache, "_MEMORY", {})
+    assert Configuration(dict(child))["pipeline_setup", "pipeline_name"] == "edited"
+
+
+def test_unet_not_cached(config_cache):
+    """Test configurations whose validation checks the environment aren't cached."""
+    config_map = {"anatomical_preproc": {"brain_extraction": {"using": ["UNet"]}}}
+    assert cache.validated_key(config_map) is None
+    assert cache.validated_key({**config_map, "skip env check": True})
+
+
+def test_copy_is_structural(config_cache, monkeypatch):
+    """Test copies are independent and don't reload the configuration."""
+    config = Preconfiguration("default")
+    config["pipeline_setup", "working_directory", "path"] = "/tmp/participant_wd"
+
+    def reload(*args, **kwargs):
+        msg = "copying reloaded the configuration"
+        raise AssertionError(msg)
+
+    monkeypatch.setattr(cache, "load_yaml", reload)
+    copied = copy(config)
+    assert isinstance(copied, Preconfiguration)
+    assert copied.dict() == config.dict()
+    assert os.environ["CPAC_WORKDIR"] == "/tmp/participant_wd"
+    copied["subject_id"] = "sub-1"
+    copied["pipeline_setup", "pipeline_name"] = "copied"
+    assert "subject_id" in copied.dict()
+    assert "subject_id" not in config.dict()
+    assert config["pipeline_setup", "pipeline_name"] == "cpac-default-pipeline"
+
+
+def _reload_copy(config: Configuration) -> Configuration:
+    """Copy a configuration by loading a blank one, as C-PAC did."""
+    newone = Configuration({})
+    newone.__dict__.update(config.__dict__)
+    newone._update_attr()
+    return newone
+
+
+def test_benchmark_startup(config_cache, monkeypatch, record_property):
+    """Benchmark loading a pipeline and copying it for 1,000 participants.
+
+    Uncached, each copy reloads and revalidates the blank preconfiguration,
+    so that startup is estimated from a sample of participants.
+    """
+    seconds = {}
+    with monkeypatch.context() as patch:
+        _uncached(patch)
+        before = perf_counter()
+        config = Preconfiguration("fmriprep-options")
+        load = perf_counter() - before
+        before = perf_counter()
+        for _ in range(UNCACHED_SAMPLE):
+            _reload_copy(config)
+        seconds["uncached (estimated)"] = load + (perf_counter() - before) * (
+            PARTICIPANTS / UNCACHED_SAMPLE
+        )
+    Preconfiguration("fmriprep-options")
+    monkeypatch.setattr(cache, "_MEMORY", {})
+    before = perf_counter()
+    config = Preconfiguration("fmriprep-options")
+    copies = [copy(config) for _ in range(PARTICIPANTS)]
+    seconds["cached"] = perf_counter() - before
+    record_property("seconds", seconds)
+    assert len(copies) == PARTICIPANTS
+    assert seconds["cached"] < seconds["uncached (estimated)"] / 20
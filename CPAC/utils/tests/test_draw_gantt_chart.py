@@ -0,0 +1,141 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests and a benchmark for streaming Gantt chart reports."""
+
+from datetime import datetime, timedelta
+import json
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from CPAC.utils.monitoring.draw_gantt_chart import (
+    calculate_resource_timeseries,
+    CallbackLogSummary,
+    create_event_dict,
+    generate_gantt_chart,
+)
+
+START = datetime(2026, 1, 1)
+NODE_TYPES = ["warp", "skullstrip", "despike", "smooth", "nuisance"]
+
+
+def _write_log(path: Path, nodes: int, seed: int = 0) -> Path:
+    """Write a callback log of ``nodes`` nodes with unique start times."""
+    rng = np.random.default_rng(seed)
+    starts = np.sort(rng.choice(nodes * 100, size=nodes, replace=False)) / 10
+    with open(path, "w", encoding="utf-8") as log:
+        log.write(json.dumps({"id": "cpac_sub-1.warp_0", "hash": "listing"}) + "\n")
+        for i, start in enumerate(starts):
+            _type = NODE_TYPES[i % len(NODE_TYPES)]
+            log.write(
+                json.dumps(
+                    {
+                        "id": f"cpac_sub-{i % 7}.func_{i}.{_type}_{i % 3}",
+                        "hash": str(i),
+                        "start": (START + timedelta(seconds=start)).isoformat(),
+                        "finish": (
+                            START
+                            + timedelta(seconds=start + float(rng.uniform(1, 600)))
+                        ).isoformat(),
+                        "runtime_threads": int(rng.integers(1, 4)),
+                        "runtime_memory_gb": "N/A"
+                        if i % 11 == 0
+                        else float(rng.uniform(0.1, 4)),
+                        "estimated_memory_gb": float(rng.uniform(0.1, 4)),
+                        "num_threads": int(rng.integers(1, 4)),
+                    }
+                )
+                + "\n"
+            )
+        log.write(
+            json.dumps({"id": "cpac_sub-1.anat.warp_1", "start": None, "error": True})
+            + "\n"
+        )
+        # a partially written last line
+        log.write('{"id": "cpac_sub-1.anat')
+    return path
+
+
+def test_sweep_matches_resampled_timeseries(tmp_path):
+    """Test event sweeps match the per-event timeseries they replace."""
+    logfile = str(_write_log(tmp_path / "callback.log", 300))
+    summary = CallbackLogSummary(logfile)
+    nodes = [
+        {**node, "runtime_memory_gb": 0.0}
+        if node["runtime_memory_gb"] == "N/A"
+        else node
+        for node in summary.drawn_nodes()
+    ]
+    events = create_event_dict(summary.start, nodes)
+    for resource in ("estimated_memory_gb", "runtime_memory_gb", "runtime_threads"):
+        expected = calculate_resource_timeseries(events, resource)
+        swept = summary.timeseries(resource, max_points=len(expected) + 1)
+        np.testing.assert_allclose(swept.to_numpy(), expected.to_numpy(), atol=1e-6)
+        assert (swept.index == pd.DatetimeIndex(expected.index)).all()
+
+
+def test_summary_by_node_type(tmp_path):
+    """Test every node is summarized by type, including failed nodes."""
+    logfile = str(_write_log(tmp_path / "callback.log", 500))
+    table = CallbackLogSummary(logfile).summary_table().set_index("node_type")
+    assert set(table.index) == set(NODE_TYPES)
+    assert table["nodes"].sum() == 500  # noqa: PLR2004
+    assert table.loc["warp", "errors"] == 1
+    assert (table["max_runtime_seconds"] <= 600).all()  # noqa: PLR2004
+    assert np.allclose(
+        table["mean_runtime_seconds"],
+        table["total_runtime_seconds"] / table["nodes"],
+    )
+
+
+def test_failed_nodes_drawn(tmp_path):
+    """Test failed nodes are drawn even when they aren't among the longest."""
+    logfile = _write_log(tmp_path / "callback.log", 300)
+    lines = logfile.read_text().splitlines()
+    failed = {
+        "id": "cpac_sub-1.anat.skullstrip_0",
+        "hash": "failed",
+        "start": START.isoformat(),
+        "finish": (START + timedelta(seconds=0.5)).isoformat(),
+        "error": True,
+    }
+    logfile.write_text("\n".join([*lines[:-1], json.dumps(failed), lines[-1]]))
+    drawn = CallbackLogSummary(str(logfile), max_nodes=10).drawn_nodes()
+    assert len(drawn) == 11  # noqa: PLR2004
+    assert [node["hash"] for node in drawn if node.get("error")] == ["failed"]
+    generate_gantt_chart(str(logfile), cores=8, max_nodes=10)
+    html = Path(f"{logfile}.html").read_text()
+    assert "(drawing the 10 longest and 1 failed)" in html
+    assert "background-color:red;" in html
+
+
+def test_benchmark_large_log(tmp_path, record_property):
+    """Benchmark a report for a 50,000-node multi-participant log."""
+    logfile = str(_write_log(tmp_path / "callback.log", 50_000))
+    before = perf_counter()
+    generate_gantt_chart(logfile, cores=8, max_nodes=1000, max_resource_points=500)
+    record_property("seconds", perf_counter() - before)
+    html = Path(f"{logfile}.html").read_text()
+    record_property("html_bytes", len(html))
+    assert html.count("class='node'") == 1000  # noqa: PLR2004
+    assert html.count("class='bar'") <= 4 * 500
+    assert "Nodes: 50000 (drawing the 1000 longest)" in html
+    summary = pd.read_csv(f"{logfile}.summary.csv")
+    assert summary["nodes"].sum() == 50_000  # noqa: PLR2004
+    assert "callback.log.summary.csv" in html
@@ -0,0 +1,166 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for live scheduler and node metrics."""
+
+import json
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from CPAC.pipeline.nipype_pipeline_engine import Node, Workflow
+from CPAC.pipeline.nipype_pipeline_engine.plugins import MultiProcPlugin
+from CPAC.utils.interfaces.function import Function
+from CPAC.utils.monitoring.metrics import (
+    metrics_server,
+    NodeMetrics,
+    render_metrics,
+)
+
+
+def _status(node_id: str, seconds: int, estimated, observed) -> dict:
+    return {
+        "id": node_id,
+        "start": "2026-01-01T00:00:00",
+        "finish": f"2026-01-01T00:{seconds // 60:02d}:{seconds % 60:02d}",
+        "estimated_memory_gb": estimated,
+        "runtime_memory_gb": observed,
+    }
+
+
+def _write_snapshot(path, participant: str, running: int, statuses: list) -> None:
+    metrics = NodeMetrics(participant, str(path / "metrics.json"))
+    metrics.update_scheduler(
+        ready_jobs=3,
+        running_jobs=running,
+        free_memory_gb=2.5,
+        reserved_memory_gb=5,
+        overhead_memory_gb=0.5,
+        total_memory_gb=8,
+        free_processors=4 - running,
+        reserved_processors=running,
+        total_processors=4,
+    )
+    for status in statuses:
+        metrics.node_finished(status)
+    path.mkdir(parents=True)
+    metrics.write()
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    """Write two participants' snapshots."""
+    pipeline_dir = tmp_path / "pipeline_cpac-test"
+    _write_snapshot(
+        pipeline_dir / "sub-1",
+        "sub-1",
+        2,
+        [
+            _status("cpac_sub-1.anat.warp_1", 45, 2, 1),
+            _status("cpac_sub-1.func.warp_2", 90, 2, 3),
+        ],
+    )
+    _write_snapshot(
+        pipeline_dir / "sub-2",
+        "sub-2",
+        1,
+        [
+            _status("cpac_sub-2.anat.warp_1", 3, 4, "N/A"),
+            {"id": "cpac_sub-2.anat.bet", "start": None, "finish": None, "error": 1},
+        ],
+    )
+    return tmp_path
+
+
+def test_render_aggregates_participants(log_dir):
+    """Test gauges stay per participant and node metrics sum by type."""
+    snapshots = [
+        json.loads((log_dir / "pipeline_cpac-test" / sub / "metrics.json").read_text())
+        for sub in ("sub-2", "sub-1")
+    ]
+    rendered = render_metrics(snapshots).splitlines()
+    assert rendered.count("# TYPE cpac_node_runtime_seconds histogram") == 1
+    assert 'cpac_scheduler_running_jobs{participant="sub-1"} 2' in rendered
+    assert 'cpac_scheduler_running_jobs{participant="sub-2"} 1' in rendered
+    assert (
+        'cpac_scheduler_memory_gb{participant="sub-1",state="reserved"} 5' in rendered
+    )
+    assert 'cpac_node_runtime_seconds_bucket{node_type="warp",le="5"} 1' in rendered
+    assert 'cpac_node_runtime_seconds_bucket{node_type="warp",le="60"} 2' in rendered
+    assert 'cpac_node_runtime_seconds_bucket{node_type="warp",le="+Inf"} 3' in rendered
+    assert 'cpac_node_runtime_seconds_sum{node_type="warp"} 138' in rendered
+    # the unmonitored node counts towards runtimes but not memory
+    assert 'cpac_node_estimated_memory_gb_total{node_type="warp"} 4' in rendered
+    assert 'cpac_node_observed_memory_gb_total{node_type="warp"} 4' in rendered
+    assert 'cpac_node_memory_observed_ratio_count{node_type="warp"} 2' in rendered
+    assert 'cpac_node_errors_total{node_type="bet"} 1' in rendered
+
+
+def test_metrics_server(log_dir):
+    """Test the server renders every participant's latest snapshot."""
+    server = metrics_server("cpac-test", str(log_dir), host="127.0.0.1", port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urlopen(f"{url}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            body = response.read().decode("utf-8")
+        assert 'cpac_scheduler_ready_jobs{participant="sub-1"} 3' in body
+        assert 'cpac_scheduler_ready_jobs{participant="sub-2"} 3' in body
+        with pytest.raises(HTTPError):
+            urlopen(f"{url}/missing")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _nap(seconds):
+    import time
+
+    time.sleep(seconds)
+    return seconds
+
+
+def test_plugin_writes_snapshots(tmp_path):
+    """Test a run records its scheduler state and finished nodes."""
+    wf = Workflow(name="metrics", base_dir=str(tmp_path))
+    wf.config["execution"]["poll_sleep_duration"] = 0.05
+    nodes = [
+        Node(
+            Function(input_names=["seconds"], output_names=["out"], function=_nap),
+            name=f"nap_{i}",
+            mem_gb=0.1,
+        )
+        for i in range(3)
+    ]
+    for node in nodes:
+        node.inputs.seconds = 0.1
+    wf.add_nodes(nodes)
+    path = tmp_path / "metrics.json"
+    wf.run(
+        plugin=MultiProcPlugin(
+            plugin_args={
+                "n_procs": 2,
+                "memory_gb": 4,
+                "metrics": {"participant": "sub-1", "path": str(path)},
+            }
+        )
+    )
+    snapshot = json.loads(path.read_text())
+    assert snapshot["participant"] == "sub-1"
+    assert snapshot["scheduler"]["running_jobs"] == 0
+    assert snapshot["scheduler"]["processors"]["total"] == 2  # noqa: PLR2004
+    assert snapshot["nodes"]["nap"]["runtime_seconds"]["count"] == 3  # noqa: PLR2004
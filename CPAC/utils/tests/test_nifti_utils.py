@@ -0,0 +1,71 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for NIfTI utilities."""
+
+import os
+
+import numpy as np
+import pytest
+import nibabel as nib
+import scipy.stats
+
+from CPAC.network_centrality.utils import convert_pvalue_to_r
+from CPAC.utils.datasource import get_highest_local_res
+from CPAC.utils.nifti_utils import image_metadata
+
+
+def _save(path, shape, zooms, time_unit="sec"):
+    img = nib.Nifti1Image(np.zeros(shape, dtype=np.float32), np.eye(4))
+    img.header.set_zooms(zooms)
+    img.header.set_xyzt_units("mm", time_unit)
+    nib.save(img, path)
+    return str(path)
+
+
+@pytest.mark.parametrize(("time_unit", "tr"), [("sec", 2.0), ("msec", 0.002)])
+def test_image_metadata(tmp_path, time_unit, tr):
+    """Test header metadata, TR units and invalidation on file changes."""
+    path = _save(tmp_path / "bold.nii.gz", (4, 5, 6, 7), (3, 3, 3, 2), time_unit)
+    metadata = image_metadata(path)
+    assert metadata.shape == (4, 5, 6, 7)
+    assert metadata.zooms == (3, 3, 3, 2)
+    assert metadata.tr == tr
+    assert image_metadata(path) is metadata
+
+    _save(path, (4, 5, 6, 9), (3, 3, 3, 2))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert image_metadata(path).shape == (4, 5, 6, 9)
+    assert image_metadata(_save(tmp_path / "t1w.nii", (4, 5, 6), (1, 1, 1))).tr is None
+
+
+def test_convert_pvalue_to_r(tmp_path):
+    """Test the correlation threshold only depends on the number of TRs."""
+    path = _save(tmp_path / "bold.nii.gz", (2, 2, 2, 100), (3, 3, 3, 2))
+    t_value = scipy.stats.t.isf(0.001, 98)
+    np.testing.assert_allclose(
+        convert_pvalue_to_r(path, 0.001), np.sqrt(t_value**2 / (98 + t_value**2))
+    )
+
+
+def test_get_highest_local_res(tmp_path):
+    """Test the finest template is chosen by voxel size, not file name."""
+    for res in (1, 2, 10):
+        _save(tmp_path / f"MNI_{res}mm.nii.gz", (2, 2, 2), (res,) * 3)
+    assert get_highest_local_res(tmp_path / "MNI_2mm.nii.gz", "2mm").name == (
+        "MNI_1mm.nii.gz"
+    )
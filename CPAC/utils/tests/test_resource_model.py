@@ -0,0 +1,213 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for learned per-node-type resource models."""
+
+import csv
+from datetime import datetime, timedelta
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+import networkx as nx
+import numpy as np
+import pytest
+import nibabel as nib
+
+from CPAC.__main__ import main
+from CPAC.pipeline.nipype_pipeline_engine import Node, UNDEFINED_SIZE
+from CPAC.pipeline.nipype_pipeline_engine.plugins import MultiProcPlugin
+from CPAC.utils.interfaces.function import Function
+from CPAC.utils.monitoring.resource_model import ResourceModel
+
+START = datetime(2026, 1, 1)
+
+
+def _memory_gb(size: float, threads: int) -> float:
+    return 0.5 + 0.01 * size + 0.1 * threads
+
+
+def _runtime(size: float, threads: int) -> float:
+    return 10 + 2 * size / threads
+
+
+def _write_log(path: Path, participant: str, sizes: list[int]) -> Path:
+    """Write a callback log of ``warp`` and ``slow`` nodes."""
+    lines = [{"id": f"cpac_{participant}.warp_0", "hash": "initial listing"}]
+    for i, side in enumerate(sizes):
+        shape = [side, side, side, 100]
+        size = side**3 * 100 / 1e6
+        for threads in (1, 2, 4):
+            lines.append(
+                {
+                    "id": f"cpac_{participant}.func_preproc_{i}.warp_{threads}",
+                    "start": START.isoformat(),
+                    "finish": (
+                        START + timedelta(seconds=_runtime(size, threads))
+                    ).isoformat(),
+                    "runtime_memory_gb": _memory_gb(size, threads),
+                    "num_threads": threads,
+                    "input_data_shape": shape,
+                }
+            )
+    lines.append(
+        {
+            "id": f"cpac_{participant}.slow",
+            "start": START.isoformat(),
+            "finish": (START + timedelta(seconds=600)).isoformat(),
+            "runtime_memory_gb": 3.0,
+            "num_threads": 1,
+        }
+    )
+    lines.append(
+        {
+            "id": f"cpac_{participant}.slow",
+            "start": START.isoformat(),
+            "finish": START.isoformat(),
+            "runtime_memory_gb": "N/A",
+            "error": True,
+        }
+    )
+    path.mkdir(parents=True)
+    callback_log = path / "callback.log"
+    callback_log.write_text("".join(f"{json.dumps(line)}\n" for line in lines))
+    return callback_log
+
+
+@pytest.fixture
+def model_path(tmp_path) -> str:
+    """Build and save a model from two participants' callback logs."""
+    _write_log(tmp_path / "logs" / "sub-1", "sub-1", [20, 40])
+    _write_log(tmp_path / "logs" / "sub-2", "sub-2", [30, 50])
+    result = CliRunner().invoke(
+        main,
+        [
+            "utils",
+            "resource-model",
+            "build",
+            str(tmp_path / "model.json"),
+            str(tmp_path / "logs"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Added 14 observations" in result.output
+    return str(tmp_path / "model.json")
+
+
+def test_predict(model_path):
+    """Test predictions recover the observed size and thread scaling."""
+    model = ResourceModel.load(model_path)
+    size = 45**3 * 100 / 1e6
+    prediction = model.predict("cpac_sub-3.func_preproc_0.warp_7", [45, 45, 45, 100], 3)
+    assert prediction.memory_gb == pytest.approx(_memory_gb(size, 3), abs=1e-6)
+    assert prediction.runtime_seconds == pytest.approx(_runtime(size, 3), rel=1e-3)
+    # without a shape, memory falls back to an upper bound of the observations
+    unsized = model.predict("warp", threads=4)
+    assert unsized.memory_gb >= _memory_gb(50**3 * 100 / 1e6, 4) - 1e-6
+    assert model.predict("slow") == pytest.approx((3.0, 600.0))
+    assert model.predict("never_observed") is None
+
+
+def test_ingest_once(model_path, tmp_path):
+    """Test callback logs already in a model aren't counted twice."""
+    model = ResourceModel.load(model_path)
+    assert model.ingest(str(tmp_path / "logs" / "sub-1" / "callback.log")) == 0
+    assert model.fits["warp"]["samples"] == 4 * 3
+    Path(model_path).write_text(json.dumps({"version": 0}))
+    with pytest.raises(ValueError, match="rebuild"):
+        ResourceModel.load(model_path)
+
+
+def test_inspect_and_export(model_path, tmp_path):
+    """Test the CLI summarizes, predicts and exports."""
+    runner = CliRunner()
+    result = runner.invoke(main, ["utils", "resource_model", "inspect", model_path])
+    assert result.exit_code == 0, result.output
+    assert "slow: 2 samples, max 3.00 GB, median 600.0 s" in result.output
+    result = runner.invoke(
+        main,
+        [
+            "utils",
+            "resource-model",
+            "inspect",
+            model_path,
+            "--node",
+            "warp",
+            "--shape",
+            "10,10,10,100",
+            "--threads",
+            "2",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert result.output == "warp: 0.70 GB, 10.1 s\n"
+    csv_path = str(tmp_path / "model.csv")
+    result = runner.invoke(
+        main, ["utils", "resource-model", "export", model_path, csv_path]
+    )
+    assert result.exit_code == 0, result.output
+    with open(csv_path, newline="", encoding="utf-8") as csv_file:
+        rows = {row["node_type"]: row for row in csv.DictReader(csv_file)}
+    assert set(rows) == {"slow", "warp"}
+    assert rows["warp"]["sized_samples"] == "12"
+    assert rows["slow"]["memory_gb_sized"] == ""
+
+
+def _identity(in_file):
+    return in_file
+
+
+def _node(name: str, **kwargs) -> Node:
+    return Node(
+        Function(input_names=["in_file"], output_names=["out"], function=_identity),
+        name=name,
+        **kwargs,
+    )
+
+
+def test_plugin_uses_model(model_path, tmp_path):
+    """Test the plugin estimates memory and orders jobs from the model."""
+    bold = str(tmp_path / "bold.nii.gz")
+    nib.save(nib.Nifti1Image(np.zeros((45, 45, 45, 100), np.int8), np.eye(4)), bold)
+    warp = _node("warp_3", mem_x=(1, "in_file"), n_procs=2)
+    warp.inputs.in_file = bold
+    unsized = _node("warp_4", mem_x=(1e-9, "in_file"), mem_gb=0.25)
+    slow = _node("slow", mem_gb=1)
+    unknown = _node("unknown", mem_gb=0.5)
+    graph = nx.DiGraph()
+    graph.add_nodes_from([warp, unsized, slow, unknown])
+    plugin = MultiProcPlugin(
+        plugin_args={
+            "n_procs": 4,
+            "memory_gb": 8,
+            "resource_model": {"path": model_path, "buffer": 10},
+        }
+    )
+    try:
+        plugin._prerun_check(graph)
+        size = 45**3 * 100 / 1e6
+        assert warp.mem_gb == pytest.approx(_memory_gb(size, 2) * 1.1)
+        assert warp.input_data_shape == (45, 45, 45, 100)
+        assert slow.mem_gb == pytest.approx(3.3)
+        assert unknown.mem_gb == 0.5  # noqa: PLR2004
+        # memory scales with an input that isn't available yet
+        assert unsized.mem_gb == pytest.approx(0.25 + 1e-9 * np.prod(UNDEFINED_SIZE))
+
+        plugin.procs = [unknown, warp, slow]
+        assert plugin._sort_jobs([0, 1, 2], scheduler=None) == [2, 1, 0]
+        assert plugin._sort_jobs([0, 1, 2], scheduler="tsort") == [0, 1, 2]
+    finally:
+        plugin.pool.shutdown()
@@ -1,3 +1,8 @@
+import pytest
+
+PARTICIPANTS = 6
+
+
 def test_check_s3():
     import os
 
@@ -36,3 +41,211 @@ def test_check_s3_node():
 
     res = node.run()
     assert os.path.isfile(res.outputs.local_path)
+
+
+@pytest.fixture
+def s3_bucket():
+    """Serve a bucket of test files from a local S3 stand-in."""
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    mock_aws = getattr(moto, "mock_aws", None) or moto.mock_s3
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="bucket")
+        for i in range(PARTICIPANTS):
+            client.put_object(
+                Bucket="bucket", Key=f"sub-{i}/anat/T1w.nii.gz", Body=bytes([i]) * 5000
+            )
+        yield client
+
+
+def test_gather_s3_paths():
+    """Test S3 inputs are collected from data and pipeline configurations."""
+    from CPAC.utils.s3 import gather_s3_paths
+
+    sublist = [
+        {
+            "anat": "s3://bucket/sub-0/anat/T1w.nii.gz",
+            "creds_path": "/creds.csv",
+            "func": {"rest": {"scan": "S3://bucket/sub-0/func/bold.nii.gz"}},
+        },
+        {"anat": "/local/T1w.nii.gz", "creds_path": "None"},
+    ]
+    config = {
+        "roi_paths": {"s3://bucket/roi.nii.gz": "Avg"},
+        "template": "s3://bucket/MNI_${resolution_for_anat}.nii.gz",
+    }
+    assert {**gather_s3_paths(config), **gather_s3_paths(sublist)} == {
+        "s3://bucket/roi.nii.gz": None,
+        "s3://bucket/sub-0/anat/T1w.nii.gz": "/creds.csv",
+        "s3://bucket/sub-0/func/bold.nii.gz": "/creds.csv",
+    }
+
+
+def test_prefetch_s3(s3_bucket, tmp_path):
+    """Test prefetching downloads in parallel, resumes, and skips matching files."""
+    import os
+
+    from CPAC.utils.s3 import prefetch_s3
+
+    paths = {f"s3://bucket/sub-{i}/anat/T1w.nii.gz": None for i in range(PARTICIPANTS)}
+    paths["s3://bucket/missing.nii.gz"] = None
+
+    def get_client(_creds_path, _bucket_name):
+        return s3_bucket
+
+    # a stale copy and an interrupted download from an earlier run
+    stale = tmp_path / "bucket/sub-1/anat/T1w.nii.gz"
+    stale.parent.mkdir(parents=True)
+    stale.write_bytes(bytes([1]) * 10)
+    partial = tmp_path / "bucket/sub-2/anat/T1w.nii.gz.partial"
+    partial.parent.mkdir(parents=True)
+    partial.write_bytes(bytes([2]) * 2000)
+
+    results = prefetch_s3(paths, str(tmp_path), max_workers=3, get_client=get_client)
+    assert len(results["downloaded"]) == PARTICIPANTS
+    assert results["failed"] == ["s3://bucket/missing.nii.gz"]
+    for i in range(PARTICIPANTS):
+        local_path = tmp_path / f"bucket/sub-{i}/anat/T1w.nii.gz"
+        assert local_path.read_bytes() == bytes([i]) * 5000
+    assert not os.path.exists(partial)
+
+    results = prefetch_s3(paths, str(tmp_path), get_client=get_client)
+    assert len(results["skipped"]) == PARTICIPANTS
+    assert not results["downloaded"]
+
+
+@pytest.mark.parametrize(
+    ("code", "error_type"),
+    [
+        ("404", FileNotFoundError),
+        ("NoSuchKey", FileNotFoundError),
+        ("AccessDenied", PermissionError),
+        ("PreconditionFailed", ConnectionError),
+    ],
+)
+def test_check_s3_errors(tmp_path, monkeypatch, code, error_type):
+    """Test S3 error codes, numeric or named, are reported by kind."""
+    from botocore.exceptions import ClientError
+
+    from CPAC.utils import s3
+    from CPAC.utils.datasource import check_for_s3
+
+    class FailingClient:
+        """Fail every request with one error code."""
+
+        def head_object(self, **kwargs):
+            raise ClientError({"Error": {"Code": code}}, "HeadObject")
+
+    monkeypatch.setattr(s3, "s3_client", lambda _creds_path, _bucket: FailingClient())
+    monkeypatch.setattr(s3.time, "sleep", lambda _seconds: None)
+    with pytest.raises(error_type):
+        check_for_s3(
+            "s3://bucket/sub-0/anat/T1w.nii.gz", creds_path=None, dl_dir=str(tmp_path)
+        )
+
+
+def test_download_s3_file_retries(s3_bucket, tmp_path):
+    """Test a download interrupted mid-stream is retried."""
+    from CPAC.utils.s3 import download_s3_file
+
+    class FlakyClient:
+        """Fail the first download mid-stream."""
+
+        def __init__(self):
+            self.failures = 1
+
+        def __getattr__(self, name):
+            return getattr(s3_bucket, name)
+
+        def get_object(self, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                msg = "connection reset"
+                raise ConnectionResetError(msg)
+            return s3_bucket.get_object(**kwargs)
+
+    local_path = tmp_path / "T1w.nii.gz"
+    assert download_s3_file(
+        FlakyClient(), "bucket", "sub-3/anat/T1w.nii.gz", str(local_path)
+    )
+    assert local_path.read_bytes() == bytes([3]) * 5000
+
+
+def test_s3_etag(tmp_path):
+    """Test local ETags match S3's single-part and multipart ETags."""
+    import hashlib
+
+    from CPAC.utils.s3 import s3_etag
+
+    data = bytes(range(256)) * (11 * 2**12)
+    path = tmp_path / "bold.nii.gz"
+    path.write_bytes(data)
+    assert s3_etag(str(path), multipart_threshold=len(data) + 1) == (
+        hashlib.md5(data).hexdigest()
+    )
+    for chunksize, expected_chunksize in [(8 * 2**20, 8 * 2**20), (2**20, 5 * 2**20)]:
+        parts = [
+            hashlib.md5(data[start : start + expected_chunksize]).digest()
+            for start in range(0, len(data), expected_chunksize)
+        ]
+        assert s3_etag(
+            str(path), multipart_threshold=2**20, multipart_chunksize=chunksize
+        ) == (f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}")
+
+
+def test_upload_s3(s3_bucket, tmp_path):
+    """Test uploads run in parallel and skip keys already matching in S3."""
+    from boto3.s3.transfer import TransferConfig
+
+    from CPAC.utils.s3 import upload_s3
+
+    uploads = {}
+    for i in range(PARTICIPANTS):
+        local_path = tmp_path / f"sub-{i}_bold.nii.gz"
+        # every other file is uploaded in parts
+        local_path.write_bytes(bytes([i]) * (6 * 2**20 if i % 2 else 5000))
+        uploads[f"output/sub-{i}/func/bold.nii.gz"] = str(local_path)
+    heads = []
+    s3_bucket.meta.events.register(
+        "before-call.s3.HeadObject", lambda **kwargs: heads.append(kwargs)
+    )
+    transfer_config = TransferConfig(
+        multipart_threshold=5 * 2**20, multipart_chunksize=5 * 2**20
+    )
+
+    def upload(manifest_path=None):
+        heads.clear()
+        return upload_s3(
+            s3_bucket,
+            "bucket",
+            uploads,
+            max_workers=3,
+            manifest_path=manifest_path,
+            transfer_config=transfer_config,
+        )
+
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    results = upload(manifest_path)
+    assert len(results["uploaded"]) == PARTICIPANTS
+    assert s3_bucket.head_object(Bucket="bucket", Key="output/sub-1/func/bold.nii.gz")[
+        "ETag"
+    ].endswith('-2"')
+    # multipart ETags match without a manifest
+    results = upload()
+    assert len(results["skipped"]) == PARTICIPANTS
+    assert len(heads) == PARTICIPANTS
+    # a resumed run skips completed keys without checking S3
+    (tmp_path / "sub-0_bold.nii.gz").write_bytes(b"changed")
+    results = upload(manifest_path)
+    assert results["uploaded"] == ["output/sub-0/func/bold.nii.gz"]
+    assert len(heads) == 1
+    body = s3_bucket.get_object(Bucket="bucket", Key="output/sub-0/func/bold.nii.gz")
+    assert body["Body"].read() == b"changed"
+    # one file can be uploaded to more than one key
+    uploads["output/sub-0/func/copy.nii.gz"] = str(tmp_path / "sub-0_bold.nii.gz")
+    results = upload(manifest_path)
+    assert results["uploaded"] == ["output/sub-0/func/copy.nii.gz"]
+    body = s3_bucket.get_object(Bucket="bucket", Key="output/sub-0/func/copy.nii.gz")
+    assert body["Body"].read() == b"changed"
@@ -0,0 +1,143 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Tests for the shared template resampling cache."""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import threading
+import time
+
+from CPAC.utils.template_cache import TemplateCache
+
+
+def _template(path: Path, contents: bytes) -> str:
+    path.write_bytes(contents)
+    return str(path)
+
+
+def test_key(tmp_path):
+    """Test keys follow template contents and resampling options."""
+    template = _template(tmp_path / "a.nii.gz", b"template")
+    same = _template(tmp_path / "b.nii.gz", b"template")
+    key = TemplateCache.key(template, "2mm", "RPI", "Cu")
+    assert key.endswith(".nii.gz")
+    assert key == TemplateCache.key(same, "2mmx2mmx2mm", "RPI", "Cu")
+    assert key != TemplateCache.key(template, "3mm", "RPI", "Cu")
+    assert key != TemplateCache.key(template, "2mm", "LPI", "Cu")
+    assert key != TemplateCache.key(template, "2mm", "RPI", "NN")
+    Path(template).write_bytes(b"changed")
+    assert key != TemplateCache.key(template, "2mm", "RPI", "Cu")
+
+
+def test_fetch_builds_once(tmp_path):
+    """Test concurrent fetches of one entry resample it only once."""
+    cache = TemplateCache(tmp_path / "cache")
+    source = _template(tmp_path / "source.nii.gz", b"template")
+    key = cache.key(source, "2mm", "RPI", "Cu")
+    builds = []
+    lock = threading.Lock()
+
+    def build(participant):
+        with lock:
+            builds.append(participant)
+        time.sleep(0.1)
+        return _template(tmp_path / f"built_{participant}.nii.gz", b"resampled")
+
+    def fetch(participant):
+        return cache.fetch(
+            key,
+            lambda: build(participant),
+            str(tmp_path / f"sub-{participant}" / "template.nii.gz"),
+        )
+
+    with ThreadPoolExecutor(4) as pool:
+        out_files = list(pool.map(fetch, range(8)))
+
+    assert len(builds) == 1
+    assert all(Path(out_file).read_bytes() == b"resampled" for out_file in out_files)
+    with open(os.path.join(cache.path, "stats.json"), encoding="utf-8") as stats:
+        assert json.load(stats) == {"hits": 7, "misses": 1}
+    assert not list(Path(cache.path).glob("*.partial"))
+
+
+def test_fetch_builds_in_place(tmp_path):
+    """Test a miss whose build writes ``out_file`` itself, as resampling does."""
+    cache = TemplateCache(tmp_path / "cache")
+    source = _template(tmp_path / "source.nii.gz", b"template")
+    key = cache.key(source, "2mm", "RPI", "Cu")
+    out_file = tmp_path / "template_name" / "source_resample.nii.gz"
+
+    def build():
+        out_file.parent.mkdir()
+        return _template(out_file, b"resampled")
+
+    assert cache.fetch(key, build, str(out_file)) == str(out_file)
+    assert out_file.read_bytes() == b"resampled"
+    assert Path(cache.get(key)).read_bytes() == b"resampled"
+    again = tmp_path / "sub-2" / "template_name" / "source_resample.nii.gz"
+    assert cache.fetch(key, build, str(again)) == str(again)
+    assert again.read_bytes() == b"resampled"
+
+
+def test_lru_eviction(tmp_path):
+    """Test least recently used entries are evicted past the size bound."""
+    cache = TemplateCache(tmp_path / "cache", max_size_gb=25 / 1024**3)
+    keys = []
+    for i in range(3):
+        source = _template(tmp_path / f"{i}.nii.gz", str(i).encode() * 10)
+        keys.append(cache.key(source, "2mm", "RPI", "Cu"))
+        cache.put(keys[-1], source)
+        if i == 1:
+            # use the first entry again so the second is least recently used
+            cache.get(keys[0])
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_eviction_keeps_checked_out_files(tmp_path):
+    """Test files placed in working directories outlive evicted entries."""
+    cache = TemplateCache(tmp_path / "cache", max_size_gb=0)
+    source = _template(tmp_path / "source.nii.gz", b"template")
+    key = cache.key(source, "2mm", "RPI", "Cu")
+    out_file = cache.fetch(key, lambda: source, str(tmp_path / "wd" / "t.nii.gz"))
+    mtime = os.stat(out_file).st_mtime_ns
+    other = _template(tmp_path / "other.nii.gz", b"other")
+    cache.put(cache.key(other, "2mm", "RPI", "Cu"), other)
+    assert cache.get(key) is None
+    assert Path(out_file).read_bytes() == b"template"
+    assert os.stat(out_file).st_mtime_ns == mtime
+
+
+def test_locks_are_not_entries(tmp_path):
+    """Test held entry locks are neither counted nor evicted as entries."""
+    cache = TemplateCache(tmp_path / "cache", max_size_gb=0)
+    source = _template(tmp_path / "source.nii.gz", b"template")
+    key = cache.key(source, "2mm", "RPI", "Cu")
+    other = _template(tmp_path / "other.nii.gz", b"other")
+    with cache.lock(f"{key}.lock"):
+        out_file = tmp_path / "wd" / "t.nii.gz"
+        cache.put(key, source, str(out_file))
+        cache.put(cache.key(other, "2mm", "RPI", "Cu"), other)
+        assert [entry.name for entry in cache.entries()] == [
+            cache.key(other, "2mm", "RPI", "Cu")
+        ]
+        assert cache.evict() == []
+        assert (Path(cache.path) / ".locks" / f"{key}.lock").exists()
+    assert out_file.read_bytes() == b"template"
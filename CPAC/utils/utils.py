@@ -225,7 +225,13 @@ def create_id_string(
 
 
 def write_output_json(json_data, filename, indent=3, basedir=None):
-    """Write a dictionary to a JSON file."""
+    """Write a dictionary to a JSON file.
+
+    Shared pipeline configurations (:py:class:`~CPAC.pipeline.provenance.SidecarConfig`)
+    are expanded here.
+    """
+    from CPAC.pipeline.provenance import expand_sidecar
+
     if not basedir:
         basedir = os.getcwd()
     if ".gii" in filename:
@@ -235,7 +241,9 @@ def write_output_json(json_data, filename, indent=3, basedir=None):
         filename = f"{filename}.json"
 
     json_file = os.path.join(basedir, filename)
-    json_data = json.dumps(json_data, indent=indent, sort_keys=True)
+    json_data = json.dumps(
+        json_data, indent=indent, sort_keys=True, default=expand_sidecar
+    )
     with open(json_file, "wt") as f:
         f.write(json_data)
     return json_file
@@ -73,6 +73,7 @@ def warp_timeseries_to_sym_template(wf, cfg, strat_pool, pipe_num, opt=None):
         time_series=True,
         num_cpus=num_cpus,
         num_ants_cores=num_ants_cores,
+        mem_gb=cfg.pipeline_setup["system_config"]["maximum_memory_per_participant"],
     )
 
     if reg_tool == "ants":
@@ -0,0 +1,91 @@
+# Copyright (C) 2026  C-PAC Developers
+
+# This file is part of C-PAC.
+
+# C-PAC is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+
+# C-PAC is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+
+# You should have received a copy of the GNU Lesser General Public
+# License along with C-PAC. If not, see <https://www.gnu.org/licenses/>.
+"""Import-time budget for C-PAC's command-line entry points.
+
+Each entry point is imported in a fresh interpreter with
+``python -X importtime``, so this also serves as a cold-start benchmark::
+
+    python -m pytest dev/circleci_data/test_import_time.py
+"""
+
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+CPAC_DIR = str(Path(__file__).parent.parent.parent)
+BUDGET_SECONDS = 0.5
+"""cumulative import time allowed for each entry point"""
+HEAVY_MODULES = ("nibabel", "nipype", "pandas", "scipy", "voluptuous")
+"""modules that must only be imported by the commands that use them"""
+RUNS = 3
+"""imports per entry point; the fastest is compared to the budget"""
+
+
+def _import_time(module: str) -> tuple[float, dict[str, int], list[str]]:
+    """Import a module in a fresh interpreter.
+
+    Returns
+    -------
+    seconds : float
+        cumulative time to import ``module``
+
+    imports : dict
+        {imported module: cumulative microseconds}
+
+    heavy : list
+        :py:data:`HEAVY_MODULES` imported along with ``module``
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys, {module}\n"
+            f"print(*(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+        ],
+        capture_output=True,
+        check=True,
+        cwd=CPAC_DIR,
+        env={**os.environ, "PYTHONPATH": CPAC_DIR},
+        text=True,
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _self, cumulative, name = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit():
+                imports[name.strip()] = int(cumulative)
+    return imports[module] / 1e6, imports, result.stdout.split()
+
+
+@pytest.mark.parametrize("module", ["CPAC", "CPAC.__main__", "CPAC._entrypoints.run"])
+def test_import_time(module, record_property):
+    """Test entry points import quickly and without heavy dependencies."""
+    runs = [_import_time(module) for _ in range(RUNS)]
+    seconds, imports, heavy = min(runs, key=lambda run: run[0])
+    record_property("seconds", seconds)
+    assert not heavy, f"importing {module} imported {', '.join(heavy)}"
+    slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert seconds < BUDGET_SECONDS, (
+        f"importing {module} took {seconds:.3f} s (budget: {BUDGET_SECONDS} s). "
+        "Slowest imports (cumulative µs):\n"
+        + "\n".join(f"{microseconds:>10}  {name}" for name, microseconds in slowest)
+    )